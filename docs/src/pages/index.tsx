@@ -108,7 +108,7 @@ function BeforeAfter() {
               <li>Generate SMBIOS with GenSMBIOS</li>
               <li>Figure out QEMU args for your CPU</li>
               <li>Download recovery from Apple API</li>
-              <li>Convert DMG with dmg2img</li>
+              <li>Convert DMG to a raw image</li>
               <li>Write 15+ qm commands</li>
               <li>Debug boot failures alone</li>
             </ul>
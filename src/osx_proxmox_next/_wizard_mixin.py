@@ -155,8 +155,14 @@ class WizardStepsMixin:
     def _update_download_progress(self, phase: str, pct: int) -> None:
         self.state.download_pct = pct  # type: ignore[attr-defined]
         self.state.download_phase = phase  # type: ignore[attr-defined]
-        self.query_one("#download_progress", ProgressBar).update(total=100, progress=pct)
-        msg = f"Finalizing {phase}..." if pct >= 100 else f"Downloading {phase}... {pct}%"
+        phases = self.state.download_phases  # type: ignore[attr-defined]
+        phases[phase] = pct
+        overall = sum(phases.values()) // len(phases)
+        self.query_one("#download_progress", ProgressBar).update(total=100, progress=overall)
+        msg = "  ·  ".join(
+            f"Finalizing {name}..." if value >= 100 else f"Downloading {name}... {value}%"
+            for name, value in phases.items()
+        )
         self.query_one("#download_status", Static).update(msg)
 
     def _finish_download(self, errors: list[str]) -> None:
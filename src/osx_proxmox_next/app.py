@@ -46,6 +46,9 @@ from .services import (
     run_preflight_worker,
 )
 
+# Live install lines kept for the log panel, which shows the last 15
+_LIVE_LOG_KEEP = 200
+
 
 class NextApp(WizardStepsMixin, ManageModeMixin, EditModeMixin, App):
     CSS_PATH = Path(__file__).with_suffix(".tcss")
@@ -245,6 +248,7 @@ class NextApp(WizardStepsMixin, ManageModeMixin, EditModeMixin, App):
             self.query_one("#download_progress").remove_class("hidden")
             self.query_one("#download_progress", ProgressBar).update(total=100, progress=0)
             self.state.download_running = True
+            self.state.download_phases.clear()
             Thread(target=self._download_worker, args=(config, missing), daemon=True).start()
         else:
             self.query_one("#download_status", Static).update(
@@ -305,6 +309,8 @@ class NextApp(WizardStepsMixin, ManageModeMixin, EditModeMixin, App):
         if not self.state.preflight_ok:
             self.notify("Preflight has failures. Fix before install.", severity="error")
             return
+        # A second press after a failure picks up where that run stopped
+        resume = self.state.live_done and not self.state.live_ok
         self.state.apply_running = True
         self.state.live_log_lines = []
         self.query_one("#install_btn").add_class("hidden")
@@ -318,9 +324,13 @@ class NextApp(WizardStepsMixin, ManageModeMixin, EditModeMixin, App):
         def callback(idx: int, total: int, step: PlanStep, result: StepResult | None) -> None:
             self.call_from_thread(self._update_live_progress, idx, total, step.title, result)
 
+        def output(idx: int, step: PlanStep, line: str) -> None:
+            self.call_from_thread(self._update_live_output, idx, line)
+
         def worker() -> None:
             result, snapshot = run_live_install(
-                self.state.config.vmid, self.state.plan_steps, on_step=callback
+                self.state.config.vmid, self.state.plan_steps, on_step=callback, on_output=output,
+                resume=resume,
             )
             self.call_from_thread(self._finish_live_install, result.ok, result.log_path, snapshot)
 
@@ -330,6 +340,11 @@ class NextApp(WizardStepsMixin, ManageModeMixin, EditModeMixin, App):
         self.query_one("#live_progress", ProgressBar).update(total=total, progress=idx)
         self._append_log("#live_log", self._step_log_line(idx, total, title, result), self.state.live_log_lines)
 
+    def _update_live_output(self, idx: int, line: str) -> None:
+        self._append_log("#live_log", f"  [{idx:02d}] {line}", self.state.live_log_lines)
+        # Only the last lines are shown; don't let a chatty step grow the list
+        del self.state.live_log_lines[:-_LIVE_LOG_KEEP]
+
     def _finish_live_install(
         self, ok: bool, log_path: Path, snapshot: RollbackSnapshot | None
     ) -> None:
@@ -347,6 +362,8 @@ class NextApp(WizardStepsMixin, ManageModeMixin, EditModeMixin, App):
             self.notify("macOS VM created", severity="information")
         else:
             result_box.add_class("result_fail")
+            self.query_one("#install_btn", Button).label = "Resume install"
+            self.query_one("#install_btn").remove_class("hidden")
             self.notify("Install failed", severity="error")
         result_box.update(text)
 
@@ -0,0 +1,266 @@
+"""Content-addressed store for downloaded OpenCore and recovery images.
+
+Every image the downloader fetches is hashed and kept as
+``<iso_dir>/.osx-next-store/<sha256>``.  The name Proxmox sees
+(``opencore-sequoia.iso``, ``sonoma-recovery.img``) is a hard link to that
+object, so the store costs no extra space.  A JSON index in
+:func:`~osx_proxmox_next.defaults.cache_dir` maps each placed path to its
+object, source URL, release tag, size, validator and last-used time.
+Lookups are therefore a dict access plus one ``stat``, never a directory
+scan.
+
+When the objects in the index exceed the byte budget, the least recently
+used ones are deleted together with their placed links.
+
+Sizes are the integrity check on reuse.  The recovery stamp step rewrites
+a few bytes of the image in place (through the hard link), so the recorded
+hash identifies what was downloaded, not what is on disk now.
+"""
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from collections.abc import Iterator
+
+from .defaults import cache_dir
+
+log = logging.getLogger(__name__)
+
+STORE_DIRNAME = ".osx-next-store"
+INDEX_NAME = "assets.json"
+DEFAULT_CACHE_BUDGET = 16 * 1024 ** 3
+
+_HASH_CHUNK = 1024 * 1024
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+# Serialises index updates between threads; the flock covers other processes
+_index_lock = threading.Lock()
+
+
+def parse_size(text: str) -> int:
+    """Parse ``"20G"``, ``"512M"``, ``"1.5GiB"`` or a plain byte count."""
+    match = _SIZE_RE.match(text)
+    if not match:
+        raise ValueError(f"Invalid size: {text!r} (expected e.g. 20G, 512M)")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.upper()])
+
+
+@dataclass
+class AssetEntry:
+    path: str  # placed file in an ISO directory
+    sha256: str
+    size: int
+    url: str
+    tag: str = ""
+    validator: str = ""
+    last_used: float = 0.0
+
+    @property
+    def object_path(self) -> Path:
+        return object_path_for(Path(self.path), self.sha256)
+
+
+def object_path_for(placed: Path, sha256: str) -> Path:
+    return placed.parent / STORE_DIRNAME / sha256
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class AssetStore:
+    def __init__(self, index_path: Path | None = None, budget: int = DEFAULT_CACHE_BUDGET) -> None:
+        self.index_path = index_path or cache_dir() / INDEX_NAME
+        # 0 or less disables eviction
+        self.budget = budget
+
+    # ── Queries ──────────────────────────────────────────────────────
+
+    def entry(self, path: Path) -> AssetEntry | None:
+        raw = self._read().get(str(path))
+        return AssetEntry(**raw) if raw else None
+
+    def find(self, name: str, roots: list[Path] | None = None) -> Path | None:
+        """Most recently used intact placement called *name*, if any.
+
+        With *roots*, only placements directly inside one of them count,
+        and an earlier root wins over a more recently used later one.
+        Read-only: stale entries are skipped here and cleaned up by
+        :meth:`reuse` the next time the downloader asks for them.
+        """
+        rank: dict[Path, int] | None = None
+        if roots is not None:
+            rank = {}
+            for root in roots:
+                rank.setdefault(root, len(rank))
+        best: AssetEntry | None = None
+        best_key: tuple[int, float] | None = None
+        for raw in self._by_name().get(name, []):
+            entry = AssetEntry(**raw)
+            parent = Path(entry.path).parent
+            if rank is not None and parent not in rank:
+                continue
+            if not _intact(entry):
+                continue
+            key = (-rank[parent] if rank is not None else 0, entry.last_used)
+            if best_key is None or key > best_key:
+                best, best_key = entry, key
+        return Path(best.path) if best else None
+
+    def entries(self) -> list[AssetEntry]:
+        """Every tracked asset whose placement is still intact."""
+        entries = (AssetEntry(**raw) for raw in self._read().values())
+        return [entry for entry in entries if _intact(entry)]
+
+    # ── Updates ──────────────────────────────────────────────────────
+
+    def reuse(self, path: Path) -> bool:
+        """Return True when *path* can be used without downloading it again.
+
+        Tracked assets must still have their recorded size.  A truncated
+        one is deleted with its object and reported missing.  A placement
+        deleted by hand is restored from its object when the object is
+        intact.  Untracked files placed by hand are accepted as they are.
+        """
+        with self._locked() as index:
+            raw = index.get(str(path))
+            if raw is None:
+                return path.exists()
+            entry = AssetEntry(**raw)
+            obj = entry.object_path
+            if not path.exists() and _size(obj) == entry.size:
+                log.debug("Restoring %s from asset store", path)
+                os.link(obj, path)
+            if _size(path) == entry.size:
+                raw["last_used"] = time.time()
+                return True
+            log.warning("Cached asset %s is missing or truncated — re-downloading", path)
+            _remove(entry)
+            del index[str(path)]
+            return False
+
+    def add(
+        self, path: Path, url: str, tag: str = "", validator: str = "", sha256: str = "",
+    ) -> AssetEntry:
+        """Hash a freshly downloaded *path*, link it into the store and index it.
+
+        Pass *sha256* when the caller has already hashed the file.
+        """
+        sha = sha256 or hash_file(path)
+        obj = object_path_for(path, sha)
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if obj.exists() and not obj.samefile(path):
+                # Same bytes already stored under another name: share the object
+                tmp = path.with_name(path.name + ".link")
+                tmp.unlink(missing_ok=True)
+                os.link(obj, tmp)
+                os.replace(tmp, path)
+            elif not obj.exists():
+                os.link(path, obj)
+        except OSError as exc:
+            # No hard links on this filesystem: the placement is the only copy
+            log.debug("Cannot link %s into asset store: %s", path, exc)
+        entry = AssetEntry(
+            path=str(path), sha256=sha, size=path.stat().st_size,
+            url=url, tag=tag, validator=validator, last_used=time.time(),
+        )
+        with self._locked() as index:
+            old = index.get(str(path))
+            if old and old["sha256"] != sha:
+                _drop_object_if_unused(AssetEntry(**old), index)
+            index[str(path)] = asdict(entry)
+            self._evict(index, keep=str(path))
+        return entry
+
+    def _evict(self, index: dict[str, dict], keep: str) -> None:
+        if self.budget <= 0:
+            return
+        # Budget is charged per object; names sharing one are evicted together
+        objects: dict[Path, list[str]] = {}
+        for key, raw in index.items():
+            objects.setdefault(AssetEntry(**raw).object_path, []).append(key)
+        sizes = {obj: index[keys[0]]["size"] for obj, keys in objects.items()}
+        used = {obj: max(index[k]["last_used"] for k in keys) for obj, keys in objects.items()}
+        total = sum(sizes.values())
+        for obj in sorted(objects, key=used.__getitem__):
+            if total <= self.budget:
+                break
+            if keep in objects[obj]:
+                continue
+            for key in objects[obj]:
+                log.info("Evicting cached asset %s (over %d-byte budget)", key, self.budget)
+                _remove(AssetEntry(**index.pop(key)))
+            total -= sizes[obj]
+
+    # ── Index I/O ────────────────────────────────────────────────────
+
+    def _read(self) -> dict[str, dict]:
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        assets = data.get("assets") if isinstance(data, dict) else None
+        return assets if isinstance(assets, dict) else {}
+
+    def _by_name(self) -> dict[str, list[dict]]:
+        by_name: dict[str, list[dict]] = {}
+        for key, raw in self._read().items():
+            by_name.setdefault(Path(key).name, []).append(raw)
+        return by_name
+
+    @contextmanager
+    def _locked(self) -> Iterator[dict[str, dict]]:
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        lock_path = self.index_path.with_name(self.index_path.name + ".lock")
+        with _index_lock, open(lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index = self._read()
+            yield index
+            tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+            tmp.write_text(json.dumps({"version": 1, "assets": index}, indent=1), encoding="utf-8")
+            os.replace(tmp, self.index_path)
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return -1
+
+
+def _intact(entry: AssetEntry) -> bool:
+    return _size(Path(entry.path)) == entry.size
+
+
+def _remove(entry: AssetEntry) -> None:
+    """Delete an entry's object and its placement, unless the placement was replaced."""
+    placed = Path(entry.path)
+    obj = entry.object_path
+    try:
+        if not obj.exists() or placed.samefile(obj):
+            placed.unlink()
+    except OSError:
+        pass
+    obj.unlink(missing_ok=True)
+
+
+def _drop_object_if_unused(entry: AssetEntry, index: dict[str, dict]) -> None:
+    obj = entry.object_path
+    if not any(AssetEntry(**raw).object_path == obj for key, raw in index.items() if key != entry.path):
+        obj.unlink(missing_ok=True)
@@ -4,6 +4,7 @@ from dataclasses import dataclass
 from fnmatch import fnmatch
 from pathlib import Path
 
+from .asset_store import AssetStore
 from .defaults import DEFAULT_ISO_DIR
 from .domain import VmConfig
 
@@ -55,7 +56,9 @@ def suggested_fetch_commands(config: VmConfig) -> list[str]:
 
 
 def resolve_opencore_path(macos: str, extra_dirs: list[Path] | None = None) -> Path:
-    match = _find_iso(
+    match = _find_stored(
+        ["opencore-osx-proxmox-vm.iso", f"opencore-{macos}.iso"], extra_dirs=extra_dirs,
+    ) or _find_iso(
         [
             "opencore-osx-proxmox-vm.iso",
             f"opencore-{macos}.iso",
@@ -73,7 +76,7 @@ def resolve_recovery_or_installer_path(
 ) -> Path:
     if config.installer_path:
         return Path(config.installer_path)
-    match = _find_iso(
+    match = _find_stored([f"{config.macos}-recovery.img"], extra_dirs=extra_dirs) or _find_iso(
         [
             f"{config.macos}-recovery.iso",
             f"{config.macos}-recovery.img",
@@ -86,9 +89,23 @@ def resolve_recovery_or_installer_path(
     return Path(DEFAULT_ISO_DIR) / f"{config.macos}-recovery.iso"
 
 
-def _find_iso(
-    patterns: list[str], extra_dirs: list[Path] | None = None,
-) -> Path | None:
+def _find_stored(names: list[str], extra_dirs: list[Path] | None = None) -> Path | None:
+    """Look *names* up in the asset store index, in priority order.
+
+    Only placements in the directories :func:`_find_iso` would scan count,
+    taken in the same order, so a copy on another storage never wins over
+    the configured ISO directory.
+    """
+    store = AssetStore()
+    roots = _iso_roots(extra_dirs)
+    for name in names:
+        match = store.find(name, roots=roots)
+        if match:
+            return match
+    return None
+
+
+def _iso_roots(extra_dirs: list[Path] | None = None) -> list[Path]:
     roots = [
         Path(DEFAULT_ISO_DIR),
     ]
@@ -100,6 +117,13 @@ def _find_iso(
     if mnt_pve.exists():
         for entry in sorted(mnt_pve.iterdir()):
             roots.append(entry / "template" / "iso")
+    return roots
+
+
+def _find_iso(
+    patterns: list[str], extra_dirs: list[Path] | None = None,
+) -> Path | None:
+    roots = _iso_roots(extra_dirs)
     # Try patterns in priority order so exact names match before globs
     lowered = [p.lower() for p in patterns]
     for pattern in lowered:
@@ -0,0 +1,153 @@
+"""Apple ``.chunklist`` parsing and incremental chunk verification.
+
+Apple publishes a chunklist next to every recovery ``BaseSystem.dmg``: a
+small binary file listing the SHA-256 of each consecutive chunk (usually
+10 MiB) of the image.  Hashing chunks as their bytes arrive lets a download
+catch corruption immediately and re-fetch only the affected byte range.
+
+The trailing RSA signature is not checked; the chunklist is fetched from
+Apple over the same recovery session as the image itself.
+"""
+from __future__ import annotations
+
+import hashlib
+import struct
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+
+__all__ = [
+    "Chunk",
+    "chunk_matches",
+    "Chunklist",
+    "ChunklistError",
+    "ChunkStreamVerifier",
+    "parse_chunklist",
+]
+
+_MAGIC = b"CNKL"
+# magic, header size, file version, chunk method, signature method, pad,
+# chunk count, chunk offset, signature offset
+_HEADER = struct.Struct("<4sIBBBxQQQ")
+_ENTRY = struct.Struct("<I32s")
+_CHUNK_METHOD_SHA256 = 1
+
+
+class ChunklistError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Chunk:
+    offset: int
+    size: int
+    sha256: bytes
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+
+@dataclass
+class Chunklist:
+    chunks: tuple[Chunk, ...]
+    digest: str  # sha256 of the raw chunklist file, identifies the image build
+    _offsets: list[int] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._offsets = [c.offset for c in self.chunks]
+
+    @property
+    def total(self) -> int:
+        return self.chunks[-1].end if self.chunks else 0
+
+    def index_at(self, offset: int) -> int:
+        """Index of the chunk containing byte *offset*."""
+        return bisect_right(self._offsets, offset) - 1
+
+    def boundary_at_or_after(self, offset: int) -> int:
+        """Smallest chunk boundary >= *offset* (``total`` past the last chunk)."""
+        idx = bisect_left(self._offsets, offset)
+        return self._offsets[idx] if idx < len(self._offsets) else self.total
+
+    def verify_file(self, path: Path, skip: set[int] | frozenset[int] = frozenset()) -> list[int]:
+        """Hash every chunk of *path* not in *skip*; return indices that do not match."""
+        bad: list[int] = []
+        with path.open("rb") as f:
+            for idx, chunk in enumerate(self.chunks):
+                if idx in skip:
+                    continue
+                f.seek(chunk.offset)
+                if not chunk_matches(chunk, f.read(chunk.size)):
+                    bad.append(idx)
+        return bad
+
+
+def chunk_matches(chunk: Chunk, data: bytes) -> bool:
+    return len(data) == chunk.size and hashlib.sha256(data).digest() == chunk.sha256
+
+
+def parse_chunklist(data: bytes) -> Chunklist:
+    if len(data) < _HEADER.size:
+        raise ChunklistError(f"Chunklist too short ({len(data)} bytes).")
+    magic, header_size, version, method, _sig_method, count, chunk_off, sig_off = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ChunklistError(f"Bad chunklist magic {magic!r}.")
+    if header_size != _HEADER.size or chunk_off != _HEADER.size:
+        raise ChunklistError(f"Unexpected chunklist header size {header_size}.")
+    if version != 1 or method != _CHUNK_METHOD_SHA256:
+        raise ChunklistError(f"Unsupported chunklist version {version} / chunk method {method}.")
+    if sig_off != chunk_off + count * _ENTRY.size or len(data) < sig_off:
+        raise ChunklistError("Chunklist entry table is truncated.")
+
+    chunks: list[Chunk] = []
+    offset = 0
+    for idx in range(count):
+        size, digest = _ENTRY.unpack_from(data, chunk_off + idx * _ENTRY.size)
+        if size == 0:
+            raise ChunklistError(f"Chunk {idx} has zero size.")
+        chunks.append(Chunk(offset=offset, size=size, sha256=digest))
+        offset += size
+    return Chunklist(chunks=tuple(chunks), digest=hashlib.sha256(data).hexdigest())
+
+
+class ChunkStreamVerifier:
+    """Hash chunks of a sequential byte stream that starts at *start*.
+
+    Only chunks that begin at or after *start* and are fully seen are
+    checked; a leading partial chunk is left for :meth:`Chunklist.verify_file`.
+    :meth:`feed` returns ``(index, ok)`` for each chunk completed by *data*.
+    """
+
+    def __init__(self, chunklist: Chunklist, start: int) -> None:
+        self._chunks = chunklist.chunks
+        self._pos = start
+        self._idx = chunklist.index_at(start) if chunklist.chunks else 0
+        self._hasher: hashlib._Hash | None = None  # type: ignore[name-defined]
+        if self._idx < len(self._chunks) and self._chunks[self._idx].offset == start:
+            self._hasher = hashlib.sha256()
+        else:
+            self._idx += 1
+
+    def feed(self, data: bytes | memoryview) -> list[tuple[int, bool]]:
+        done: list[tuple[int, bool]] = []
+        view = memoryview(data)
+        while view and self._idx < len(self._chunks):
+            chunk = self._chunks[self._idx]
+            if self._pos < chunk.offset:
+                skip = min(len(view), chunk.offset - self._pos)
+                view = view[skip:]
+                self._pos += skip
+                continue
+            if self._hasher is None:
+                self._hasher = hashlib.sha256()
+            take = min(len(view), chunk.end - self._pos)
+            self._hasher.update(view[:take])
+            view = view[take:]
+            self._pos += take
+            if self._pos == chunk.end:
+                done.append((self._idx, self._hasher.digest() == chunk.sha256))
+                self._hasher = None
+                self._idx += 1
+        self._pos += len(view)
+        return done
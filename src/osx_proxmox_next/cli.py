@@ -4,20 +4,29 @@ import argparse
 import dataclasses
 import json
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from . import __version__
+from .asset_store import parse_size
 from .assets import required_assets, suggested_fetch_commands
 from .defaults import DEFAULT_ISO_DIR, detect_cpu_info, detect_iso_storage, detect_net_model
 from .diagnostics import export_log_bundle, recovery_guide
 from .doctor import run_doctor, Severity
-from .domain import MIN_VMID, MAX_VMID, SUPPORTED_MACOS, VmConfig, EditChanges, validate_config, validate_edit_changes
-from .downloader import DownloadError, DownloadProgress, download_opencore, download_recovery
-from .executor import apply_plan
+from .domain import MIN_VMID, MAX_VMID, SUPPORTED_MACOS, PlanStep, VmConfig, EditChanges, validate_config, validate_edit_changes
+from .downloader import DownloadError, DownloadOptions, DownloadProgress, download_opencore, download_recovery
+from .executor import DEFAULT_JOBS, ApplyResult, StepResult, apply_plan
+from .journal import find_journal
+from .fleet import DEFAULT_IO_JOBS, ManifestError, VmOutcome, apply_fleet, load_manifest, stage_assets
 from .planner import build_plan, build_destroy_plan, build_edit_plan, build_clone_plan
 from .services import fetch_vm_info, get_proxmox_adapter, run_download_worker
 from .script_renderer import render_script
+from .mirror import DEFAULT_MIRROR_PORT, make_server, parse_peers
 from .preflight import run_preflight, has_missing_build_deps, install_missing_packages
+from .ratelimit import parse_rate_limit, parse_window
+from .refresh import RefreshReport, describe_report, refresh_assets
 from .rollback import create_snapshot, rollback_hints
 
 _MB = 1024 * 1024
@@ -48,18 +57,61 @@ def _config_from_args(args: argparse.Namespace) -> VmConfig:
     )
 
 
-def _cli_progress(p: DownloadProgress) -> None:
+def _format_progress(p: DownloadProgress) -> str:
     mb_down = p.downloaded / _MB
     if p.total > 0:
         mb_total = p.total / _MB
         pct = int(p.downloaded * 100 / p.total)
-        sys.stdout.write(f"\r[{p.phase}] {mb_down:.1f}/{mb_total:.1f} MB ({pct}%)")
+        text = f"[{p.phase}] {mb_down:.1f}/{mb_total:.1f} MB ({pct}%)"
     else:
-        sys.stdout.write(f"\r[{p.phase}] {mb_down:.1f} MB")
+        text = f"[{p.phase}] {mb_down:.1f} MB"
+    if p.rate > 0:
+        text += f" {p.rate / _MB:.1f} MB/s"
+    if p.throttled and p.limit > 0:
+        text += f" (capped {p.limit / _MB:.1f} MB/s)"
+    if p.eta is not None and p.downloaded < p.total:
+        text += f" ETA {_format_eta(p.eta)}"
+    return text
+
+
+def _format_eta(seconds: float) -> str:
+    secs = int(seconds + 0.5)
+    if secs >= 3600:
+        return f"{secs // 3600}h{secs % 3600 // 60:02d}m"
+    if secs >= 60:
+        return f"{secs // 60}m{secs % 60:02d}s"
+    return f"{secs}s"
+
+
+def _cli_progress(p: DownloadProgress) -> None:
+    sys.stdout.write(f"\r{_format_progress(p)}")
     sys.stdout.flush()
 
 
-def _auto_download_missing(config: VmConfig, dest_dir: Path) -> None:
+class _ProgressLine:
+    """One status line covering every phase downloading in parallel."""
+
+    def __init__(self) -> None:
+        self._phases: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, p: DownloadProgress) -> None:
+        self.update(p.phase, _format_progress(p))
+
+    def update(self, phase: str, text: str) -> None:
+        with self._lock:
+            self._phases[phase] = text
+            sys.stdout.write("\r" + "  ".join(self._phases.values()))
+            sys.stdout.flush()
+
+    def finish(self) -> None:
+        """End the status line, if anything was drawn."""
+        with self._lock:
+            if self._phases:
+                print()
+
+
+def _auto_download_missing(config: VmConfig, dest_dir: Path, options: DownloadOptions | None = None) -> None:
     assets = required_assets(config)
     missing = [a for a in assets if not a.ok and a.downloadable]
     if not missing:
@@ -68,11 +120,12 @@ def _auto_download_missing(config: VmConfig, dest_dir: Path) -> None:
     config_with_dir = config if config.iso_dir else \
         dataclasses.replace(config, iso_dir=str(dest_dir))
 
+    line = _ProgressLine()
+
     def _on_progress(phase: str, pct: int) -> None:
-        sys.stdout.write(f"\r[{phase}] {pct}%")
-        sys.stdout.flush()
+        line.update(phase, f"[{phase}] {pct}%")
 
-    errors = run_download_worker(config_with_dir, missing, on_progress=_on_progress)
+    errors = run_download_worker(config_with_dir, missing, on_progress=_on_progress, options=options)
     print()
     for err in errors:
         print(f"Download failed: {err}")
@@ -99,12 +152,20 @@ def _build_common_parser() -> argparse.ArgumentParser:
                         help="Configure for Apple services (iMessage, FaceTime, iCloud). Adds vmgenid and static MAC.")
     common.add_argument("--no-download", action="store_true", default=False,
                         help="Skip auto-download of missing assets")
+    common.add_argument("--offline", action="store_true", default=False,
+                        help="Use cached release metadata only; never contact GitHub or Apple")
+    common.add_argument("--limit-rate", type=str, default="",
+                        help="Cap auto-download bandwidth, e.g. 10M or 08:00-18:00=5M,0")
+    common.add_argument("--peer", action="append", default=[],
+                        help="serve-cache mirror (host[:port]) to try before upstream; repeatable")
     common.add_argument("--verbose-boot", action="store_true", default=False,
                         help="Show verbose kernel log instead of Apple logo during boot")
     common.add_argument("--iso-dir", type=str, default="",
                         help="Directory for ISO/recovery images (default: auto-detect)")
     common.add_argument("--cpu-model", type=str, default="",
                         help="Override QEMU CPU model (e.g. Skylake-Server-IBRS). Default: auto-detect")
+    common.add_argument("--no-optimize", action="store_true", default=False,
+                        help="Run each qm set change as its own call (for debugging)")
     common.add_argument("--net-model", type=str, default="",
                         help="NIC model: vmxnet3 (default) or e1000-82545em (recommended for Xeon/older Intel). Default: auto-detect")
     return common
@@ -125,6 +186,62 @@ def _add_download_subparser(sub: argparse._SubParsersAction) -> None:
     dl.add_argument("--dest", type=str, default=DEFAULT_ISO_DIR, help="Destination directory")
     dl.add_argument("--opencore-only", action="store_true", help="Only download OpenCore ISO")
     dl.add_argument("--recovery-only", action="store_true", help="Only download recovery image")
+    dl.add_argument("--connections", type=int, default=DownloadOptions.connections,
+                    help="Parallel ranged connections per file (1 disables segmented downloads)")
+    dl.add_argument("--cache-budget", type=str, default="16G",
+                    help="Disk budget for cached images, e.g. 20G (0 = never evict)")
+    dl.add_argument("--offline", action="store_true", default=False,
+                    help="Use cached release metadata only; never contact GitHub or Apple")
+    dl.add_argument("--no-pipeline", action="store_true", default=False,
+                    help="Save the recovery DMG before converting it instead of converting while downloading")
+    dl.add_argument("--limit-rate", type=str, default="",
+                    help="Cap download bandwidth in bytes/s, e.g. 10M, or a schedule like 08:00-18:00=5M,0")
+    dl.add_argument("--peer", action="append", default=[],
+                    help="serve-cache mirror (host[:port]) to try before upstream; repeatable")
+
+    serve = sub.add_parser("serve-cache", help="Serve this node's cached images to peers over HTTP")
+    serve.add_argument("--bind", type=str, default="0.0.0.0", help="Address to listen on")
+    serve.add_argument("--port", type=int, default=DEFAULT_MIRROR_PORT, help="TCP port to listen on")
+
+    assets = sub.add_parser("assets", help="Keep cached OpenCore and recovery images up to date")
+    assets_sub = assets.add_subparsers(dest="assets_cmd", required=True)
+    refresh = assets_sub.add_parser("refresh", help="Download new OpenCore and recovery builds for every macOS")
+    refresh.add_argument("--dest", type=str, default=DEFAULT_ISO_DIR, help="ISO directory to keep warm")
+    refresh.add_argument("--macos", action="append", default=[], choices=list(SUPPORTED_MACOS),
+                         help="Only this macOS version; repeatable (default: all supported)")
+    refresh.add_argument("--check-only", action="store_true", default=False,
+                         help="Report what is out of date without downloading")
+    refresh.add_argument("--window", type=str, default="",
+                         help="Only download inside this local-time window, e.g. 01:00-05:00")
+    refresh.add_argument("--interval", type=int, default=0,
+                         help="Keep running and re-check every N minutes (0 = run once, e.g. from a timer)")
+    refresh.add_argument("--cache-budget", type=str, default="16G",
+                         help="Disk budget for cached images, e.g. 20G (0 = never evict)")
+    refresh.add_argument("--limit-rate", type=str, default="",
+                         help="Cap download bandwidth in bytes/s, e.g. 10M, or a schedule like 08:00-18:00=5M,0")
+    refresh.add_argument("--peer", action="append", default=[],
+                         help="serve-cache mirror (host[:port]) for images not cached yet; repeatable")
+    assets_sub.add_parser("status", help="Show the result of the last refresh (no network access)")
+
+
+def _add_fleet_subparser(sub: argparse._SubParsersAction) -> None:
+    fleet = sub.add_parser("fleet", help="Build many macOS VMs from one manifest")
+    fleet_sub = fleet.add_subparsers(dest="fleet_cmd", required=True)
+    fleet_apply = fleet_sub.add_parser("apply", help="Plan (or with --execute, build) every VM of a manifest")
+    fleet_apply.add_argument("manifest", type=str, help="TOML (Python 3.11+) or JSON manifest of VM entries")
+    fleet_apply.add_argument("--execute", action="store_true", help="Actually run (default is dry run)")
+    fleet_apply.add_argument("--jobs", type=int, default=DEFAULT_JOBS,
+                             help=f"Independent steps to run at once per VM (default: {DEFAULT_JOBS})")
+    fleet_apply.add_argument("--io-jobs", type=int, default=DEFAULT_IO_JOBS,
+                             help=f"Disk builds and imports to run at once per storage (default: {DEFAULT_IO_JOBS})")
+    fleet_apply.add_argument("--no-download", action="store_true", default=False,
+                             help="Skip auto-download of missing assets")
+    fleet_apply.add_argument("--offline", action="store_true", default=False,
+                             help="Use cached release metadata only; never contact GitHub or Apple")
+    fleet_apply.add_argument("--limit-rate", type=str, default="",
+                             help="Cap auto-download bandwidth, e.g. 10M or 08:00-18:00=5M,0")
+    fleet_apply.add_argument("--peer", action="append", default=[],
+                             help="serve-cache mirror (host[:port]) to try before upstream; repeatable")
 
 
 def _add_vm_subparsers(sub: argparse._SubParsersAction, common: argparse.ArgumentParser) -> None:
@@ -135,6 +252,10 @@ def _add_vm_subparsers(sub: argparse._SubParsersAction, common: argparse.Argumen
 
     apply_cmd = sub.add_parser("apply", parents=[common])
     apply_cmd.add_argument("--execute", action="store_true")
+    apply_cmd.add_argument("--jobs", type=int, default=DEFAULT_JOBS,
+                           help=f"Independent steps to run at once (default: {DEFAULT_JOBS}, 1 = one at a time)")
+    apply_cmd.add_argument("--resume", action="store_true", default=False,
+                           help="Continue this VM's last failed apply, skipping the steps it completed")
 
     status = sub.add_parser("status", help="Show info about an existing macOS VM")
     status.add_argument("--vmid", type=int, required=True, help="VM ID to query")
@@ -158,6 +279,8 @@ def _add_vm_subparsers(sub: argparse._SubParsersAction, common: argparse.Argumen
                       help="NIC model to use when updating bridge (default: preserve existing)")
     edit.add_argument("--start", action="store_true", default=False,
                       help="Start VM after applying changes")
+    edit.add_argument("--no-optimize", action="store_true", default=False,
+                      help="Run each qm set change as its own call (for debugging)")
     edit.add_argument("--execute", action="store_true", help="Actually run (default is dry run)")
 
     clone = sub.add_parser("clone", help="Clone a macOS VM with a fresh SMBIOS identity")
@@ -172,6 +295,8 @@ def _add_vm_subparsers(sub: argparse._SubParsersAction, common: argparse.Argumen
     clone.add_argument("--no-apple-services", action="store_true", default=False,
                        dest="no_apple_services",
                        help="Skip vmgenid and MAC regeneration (not recommended — breaks Apple services isolation)")
+    clone.add_argument("--no-optimize", action="store_true", default=False,
+                       help="Run each qm set change as its own call (for debugging)")
     clone.add_argument("--execute", action="store_true",
                        help="Actually run (default is dry run)")
 
@@ -182,6 +307,7 @@ def build_parser() -> argparse.ArgumentParser:
     sub = parser.add_subparsers(dest="cmd", required=True)
     _add_simple_subparsers(sub)
     _add_download_subparser(sub)
+    _add_fleet_subparser(sub)
     common = _build_common_parser()
     _add_vm_subparsers(sub, common)
     return parser
@@ -191,17 +317,24 @@ def _handle_list_command(args: argparse.Namespace, config: VmConfig, steps: list
     """Render the plan as JSON or human-readable text."""
     if getattr(args, "json", False):
         plan_data = [
-            {"step": idx, "title": step.title, "command": step.command, "risk": step.risk}
+            {"step": idx, "title": step.title, "command": step.command, "risk": step.risk, "parts": step.parts}
             for idx, step in enumerate(steps, start=1)
         ]
         print(json.dumps(plan_data, indent=2))
     else:
-        for idx, step in enumerate(steps, start=1):
-            print(f"{idx:02d}. {step.title}")
-            print(f"    {step.command}")
+        _print_plan(steps)
     return 0
 
 
+def _print_plan(steps: list[PlanStep]) -> None:
+    """Numbered steps with their commands; merged qm set changes one per line."""
+    for idx, step in enumerate(steps, start=1):
+        print(f"{idx:02d}. {step.parts[0] if step.parts else step.title}")
+        for part in step.parts[1:]:
+            print(f"    + {part}")
+        print(f"    {step.command}")
+
+
 def _handle_script_command(args: argparse.Namespace, config: VmConfig, steps: list) -> None:
     """Write the plan as a shell script if --script-out is set."""
     if args.script_out:
@@ -211,10 +344,59 @@ def _handle_script_command(args: argparse.Namespace, config: VmConfig, steps: li
         print(f"Script written: {out}")
 
 
+def _print_step(idx: int, total: int, step: PlanStep, result: StepResult | None) -> None:
+    if result is None:
+        print(f"[{idx:02d}/{total:02d}] {step.parts[0] if step.parts else step.title}", flush=True)
+        for part in step.parts[1:]:
+            print(f"        + {part}", flush=True)
+    elif result.already_done:
+        print(f"[{idx:02d}/{total:02d}] Already done, skipped: {step.title}", flush=True)
+    elif not result.ok:
+        print(f"[{idx:02d}/{total:02d}] FAILED (rc={result.returncode}): {step.title}", flush=True)
+
+
+def _print_step_output(idx: int, step: PlanStep, line: str) -> None:
+    print(f"  [{idx:02d}] {line}", flush=True)
+
+
+def _print_timings(result: ApplyResult) -> None:
+    """Per-step wall time, CPU time, peak memory and disk I/O, slowest first."""
+    if not result.results:
+        return
+    print()
+    print(f"{'Step':<40} {'Wall':>8} {'CPU':>8} {'Peak RSS':>9} {'Read':>9} {'Written':>9}")
+    for step in sorted(result.results, key=lambda r: r.duration, reverse=True):
+        print(
+            f"{step.title[:40]:<40} {step.duration:>7.1f}s {step.cpu_seconds:>7.1f}s "
+            f"{step.max_rss_kb * 1024 / _MB:>6.0f} MB {step.read_bytes / _MB:>6.0f} MB {step.write_bytes / _MB:>6.0f} MB"
+        )
+    started = min(r.started for r in result.results)
+    finished = max(r.finished for r in result.results)
+    print(f"{'Total':<40} {finished - started:>7.1f}s {sum(r.cpu_seconds for r in result.results):>7.1f}s")
+    if result.json_log_path is not None:
+        print(f"Timings: {result.json_log_path}")
+    print()
+
+
 def _handle_apply_command(args: argparse.Namespace, config: VmConfig, steps: list) -> int:
     """Execute the plan and report apply result."""
+    if args.resume:
+        # The failed run's own plan: re-planning would draw a new SMBIOS identity
+        journal = find_journal(f"vm:{config.vmid}")
+        if journal is None:
+            print(f"ERROR: No failed apply of VM {config.vmid} to resume.")
+            return 2
+        steps = journal.steps
+        print(f"Resuming {journal.path}: {len(journal.completed)} of {len(steps)} steps done")
     snapshot = create_snapshot(config.vmid)
-    result = apply_plan(steps, execute=bool(args.execute))
+    if args.execute:
+        result = apply_plan(
+            steps, execute=True, jobs=args.jobs, on_step=_print_step, on_output=_print_step_output,
+            resume=args.resume,
+        )
+        _print_timings(result)
+    else:
+        result = apply_plan(steps, execute=False, jobs=args.jobs)
     if result.ok:
         print(f"Apply OK. Log: {result.log_path}")
         print()
@@ -226,6 +408,10 @@ def _handle_apply_command(args: argparse.Namespace, config: VmConfig, steps: lis
         return 0
 
     print(f"Apply FAILED. Log: {result.log_path}")
+    if result.failed:
+        print(f"Failed step: {result.failed}")
+    if result.skipped:
+        print(f"Not started: {', '.join(result.skipped)}")
     for hint in rollback_hints(snapshot):
         print(f"ROLLBACK: {hint}")
     return 4
@@ -253,6 +439,12 @@ def _dispatch_simple_commands(args: argparse.Namespace) -> int | None:
         return _run_doctor(args)
     if args.cmd == "download":
         return _run_download(args)
+    if args.cmd == "serve-cache":
+        return _run_serve_cache(args)
+    if args.cmd == "assets":
+        return _run_assets(args)
+    if args.cmd == "fleet":
+        return _run_fleet(args)
     if args.cmd == "status":
         return _run_status(args)
     if args.cmd == "uninstall":
@@ -277,7 +469,13 @@ def _validate_and_fetch_assets(args: argparse.Namespace, config: VmConfig) -> in
 
     if missing and not getattr(args, "no_download", False):
         dest_dir = Path(config.iso_dir) if config.iso_dir else Path(detect_iso_storage()[0])
-        _auto_download_missing(config, dest_dir)
+        options = None
+        if getattr(args, "offline", False) or getattr(args, "limit_rate", "") or getattr(args, "peer", []):
+            options = DownloadOptions(offline=getattr(args, "offline", False))
+            error = _apply_network_flags(args, options)
+            if error is not None:
+                return error
+        _auto_download_missing(config, dest_dir, options)
         # Re-check after download
         assets = required_assets(config)
         missing = [a for a in assets if not a.ok]
@@ -356,7 +554,7 @@ def run_cli(argv: list[str] | None = None) -> int:
         return rc
 
     _print_cpu_info(args, config)
-    steps = build_plan(config)
+    steps = build_plan(config, optimize=not args.no_optimize)
 
     if args.cmd == "plan":
         rc = _handle_list_command(args, config, steps)
@@ -421,30 +619,195 @@ def _run_uninstall(args: argparse.Namespace) -> int:
     return 6
 
 
+def _apply_network_flags(args: argparse.Namespace, options: DownloadOptions) -> int | None:
+    """Apply --limit-rate and --peer to *options*. Returns error code or None."""
+    try:
+        if getattr(args, "limit_rate", ""):
+            options.rate_limit = parse_rate_limit(args.limit_rate)
+    except ValueError as exc:
+        print(f"ERROR: --limit-rate: {exc}")
+        return 2
+    try:
+        if getattr(args, "peer", []):
+            options.peers = parse_peers(",".join(args.peer))
+    except ValueError as exc:
+        print(f"ERROR: --peer: {exc}")
+        return 2
+    return None
+
+
+def _run_serve_cache(args: argparse.Namespace) -> int:
+    try:
+        server = make_server(args.bind, args.port)
+    except OSError as exc:
+        print(f"ERROR: cannot listen on {args.bind}:{args.port}: {exc}")
+        return 2
+    host, port = server.server_address[:2]
+    print(f"Serving {len(server.mirror.refresh())} cached image(s) on http://{host}:{port}/ (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def _run_assets(args: argparse.Namespace) -> int:
+    if args.assets_cmd == "status":
+        report = RefreshReport.load()
+        _print_refresh_report(report)
+        return 0 if report and report.up_to_date else 1
+
+    try:
+        cache_budget = parse_size(args.cache_budget)
+        window = parse_window(args.window) if args.window else None
+    except ValueError as exc:
+        print(f"ERROR: {exc}")
+        return 2
+    if args.interval < 0:
+        print("ERROR: --interval must not be negative.")
+        return 2
+    options = DownloadOptions(cache_budget=cache_budget)
+    error = _apply_network_flags(args, options)
+    if error is not None:
+        return error
+    dest_dir = Path(args.dest)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    releases = args.macos or list(SUPPORTED_MACOS)
+
+    try:
+        while True:
+            progress = _ProgressLine()
+            try:
+                report = refresh_assets(
+                    dest_dir, releases, options=options, window=window, check_only=args.check_only,
+                    on_progress=progress,
+                )
+            finally:
+                progress.finish()
+            _print_refresh_report(report)
+            if not args.interval:
+                return 0 if report.up_to_date else 1
+            time.sleep(args.interval * 60)
+    except KeyboardInterrupt:
+        # Ctrl-C is how a long-running warmer is stopped, downloading or not
+        return 0
+
+
+def _print_refresh_report(report: RefreshReport | None) -> None:
+    for status in report.assets if report else []:
+        detail = f" ({status.detail})" if status.detail else ""
+        print(f"{status.state.upper():8} {status.label}{detail}")
+    print(describe_report(report))
+
+
+def _run_fleet(args: argparse.Namespace) -> int:
+    try:
+        configs = load_manifest(Path(args.manifest))
+    except ManifestError as exc:
+        for line in str(exc).splitlines():
+            print(f"ERROR: {line}")
+        return 2
+    if args.jobs < 1 or args.io_jobs < 1:
+        print("ERROR: --jobs and --io-jobs must be at least 1.")
+        return 2
+
+    if not args.no_download:
+        options = DownloadOptions(offline=args.offline)
+        error = _apply_network_flags(args, options)
+        if error is not None:
+            return error
+        line = _ProgressLine()
+        errors = stage_assets(configs, options, on_progress=lambda phase, pct: line.update(phase, f"[{phase}] {pct}%"))
+        line.finish()
+        for err in errors:
+            print(f"Download failed: {err}")
+
+    snapshots = {c.vmid: create_snapshot(c.vmid) for c in configs} if args.execute else {}
+
+    def _on_step(config: VmConfig, idx: int, total: int, step: PlanStep, result: StepResult | None) -> None:
+        if result is None:
+            print(f"[{config.vmid}] [{idx:02d}/{total:02d}] {step.title}", flush=True)
+        elif not result.ok:
+            print(f"[{config.vmid}] [{idx:02d}/{total:02d}] FAILED (rc={result.returncode}): {step.title}", flush=True)
+
+    outcomes = apply_fleet(
+        configs, execute=args.execute, on_step=_on_step if args.execute else None,
+        jobs=args.jobs, io_jobs=args.io_jobs,
+    )
+    print()
+    _print_fleet_table(outcomes)
+    for outcome in outcomes:
+        if outcome.result is not None and not outcome.ok and outcome.config.vmid in snapshots:
+            for hint in rollback_hints(snapshots[outcome.config.vmid]):
+                print(f"ROLLBACK [{outcome.config.vmid}]: {hint}")
+    return 0 if all(o.ok for o in outcomes) else 4
+
+
+def _print_fleet_table(outcomes: list[VmOutcome]) -> None:
+    rows = [("VMID", "NAME", "STATUS", "DETAIL", "LOG")]
+    for o in outcomes:
+        rows.append((
+            str(o.config.vmid), o.config.name, o.status.upper(),
+            (f"failed: {o.detail}" if o.result is not None else o.detail) if o.detail else "",
+            str(o.result.log_path) if o.result is not None else "-",
+        ))
+    widths = [max(len(row[col]) for row in rows) for col in range(len(rows[0]) - 1)]
+    for row in rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)) + "  " + row[-1])
+    failed = sum(not o.ok for o in outcomes)
+    print()
+    print(f"{len(outcomes) - failed}/{len(outcomes)} VMs OK" + (f", {failed} not OK" if failed else ""))
+
+
 def _run_download(args: argparse.Namespace) -> int:
     macos = args.macos
     dest_dir = Path(args.dest)
     dest_dir.mkdir(parents=True, exist_ok=True)
-    ok = True
-
+    if args.connections < 1:
+        print("ERROR: --connections must be at least 1.")
+        return 2
+    try:
+        cache_budget = parse_size(args.cache_budget)
+    except ValueError as exc:
+        print(f"ERROR: --cache-budget: {exc}")
+        return 2
+    options = DownloadOptions(
+        connections=args.connections, cache_budget=cache_budget, pipeline=not args.no_pipeline,
+    )
+    if args.offline:
+        options.offline = True
+    error = _apply_network_flags(args, options)
+    if error is not None:
+        return error
+    jobs = []
     if not args.recovery_only:
         print(f"Downloading OpenCore image for {macos}...")
-        try:
-            path = download_opencore(macos, dest_dir, on_progress=_cli_progress)
-            print(f"\nDownloaded: {path}")
-        except DownloadError as exc:
-            print(f"\nOpenCore download failed: {exc}")
-            ok = False
-
+        jobs.append(("OpenCore", download_opencore))
     if not args.opencore_only:
         print(f"Downloading recovery image for {macos}...")
+        jobs.append(("Recovery", download_recovery))
+    if not jobs:
+        return 0
+
+    # Both assets download in parallel; results print once the progress line is done
+    progress = _ProgressLine()
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = [
+            (label, pool.submit(fn, macos, dest_dir, on_progress=progress, options=options))
+            for label, fn in jobs
+        ]
+    print()
+
+    ok = True
+    for label, future in futures:
         try:
-            path = download_recovery(macos, dest_dir, on_progress=_cli_progress)
-            print(f"\nDownloaded: {path}")
-        except DownloadError as exc:
-            print(f"\nRecovery download failed: {exc}")
+            print(f"Downloaded: {future.result()}")
+        # OSError: the image store or ISO directory failed, not the transfer
+        except (DownloadError, OSError) as exc:
+            print(f"{label} download failed: {exc}")
             ok = False
-
     return 0 if ok else 5
 
 
@@ -481,14 +844,14 @@ def _run_edit(args: argparse.Namespace) -> int:
         print(f"Snapshot saved: {snapshot.path}")
         current_net0 = info.config_raw
 
-    steps = build_edit_plan(vmid, changes, start_after=args.start, current_net0=current_net0)
+    steps = build_edit_plan(
+        vmid, changes, start_after=args.start, current_net0=current_net0, optimize=not args.no_optimize,
+    )
 
     if not args.execute:
         print("DRY RUN — pass --execute to apply:\n")
 
-    for idx, step in enumerate(steps, start=1):
-        print(f"{idx:02d}. {step.title}")
-        print(f"    {step.command}")
+    _print_plan(steps)
 
     if not args.execute:
         return 0
@@ -547,14 +910,13 @@ def _run_clone(args: argparse.Namespace) -> int:
         macos=args.macos,
         apple_services=apple_services,
         current_net0=current_net0,
+        optimize=not args.no_optimize,
     )
 
     if not args.execute:
         print("DRY RUN — pass --execute to apply:\n")
 
-    for idx, step in enumerate(steps, start=1):
-        print(f"{idx:02d}. {step.title}")
-        print(f"    {step.command}")
+    _print_plan(steps)
 
     if not args.execute:
         return 0
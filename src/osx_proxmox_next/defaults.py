@@ -179,6 +179,18 @@ def detect_memory_mb() -> int:
 DEFAULT_ISO_DIR = "/var/lib/vz/template/iso"
 
 
+def cache_dir() -> Path:
+    """Directory for the tool's own state: asset index, metadata cache, logs.
+
+    ``OSX_NEXT_CACHE_DIR`` overrides the XDG default.
+    """
+    override = os.environ.get("OSX_NEXT_CACHE_DIR")
+    if override:
+        return Path(override)
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "osx-proxmox-next"
+
+
 def detect_iso_storage() -> list[str]:
     """Return ISO directory paths from Proxmox storage pools that support ISO content."""
     from .services import get_proxmox_adapter
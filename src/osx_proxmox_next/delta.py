@@ -0,0 +1,148 @@
+"""Delta refresh of recovery images from chunklist hashes.
+
+When Apple publishes a new ``BaseSystem.dmg`` for a board ID, many of its
+chunks are often byte-identical to the previous build.  Each converted
+recovery image therefore gets a :class:`BlockMap` in
+:func:`~osx_proxmox_next.defaults.cache_dir`: the chunklist it was built
+from, and for every UDIF run the SHA-256 of the raw bytes it decoded to.
+
+:func:`plan_delta` compares a new chunklist and block map with it.  A run
+whose compressed bytes lie entirely in chunks that are unchanged (same
+offset, size and hash) and that the old image had too decodes to the same
+bytes, so :func:`copy_unchanged` copies it from the old image instead of
+downloading it.  Every copied run is checked against its recorded hash
+first.  The recovery stamp step edits images in place, and runs it touched
+fail that check and are downloaded like changed ones.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .chunklist import Chunklist
+from .defaults import cache_dir
+from .udif import Block, write_sparse
+
+log = logging.getLogger(__name__)
+
+MAPS_DIRNAME = "recovery-maps"
+
+_BlockKey = tuple[int, int, int, int]  # kind, in_offset, in_length, out_length
+
+
+@dataclass
+class BlockMap:
+    """What a converted recovery image was built from."""
+    digest: str  # chunklist digest, the asset store tag of the image
+    chunks: dict[tuple[int, int], bytes] = field(default_factory=dict)  # (offset, size) -> sha256
+    # run -> (output offset, sha256 of its decoded bytes)
+    blocks: dict[_BlockKey, tuple[int, bytes]] = field(default_factory=dict)
+
+
+@dataclass
+class DeltaPlan:
+    reuse: list[tuple[Block, int, bytes]]  # new run, old output offset, expected sha256
+    fetch: list[Block]
+
+    @property
+    def reused_bytes(self) -> int:
+        return sum(block.out_length for block, _, _ in self.reuse)
+
+
+def map_path(digest: str) -> Path:
+    return cache_dir() / MAPS_DIRNAME / f"{digest}.json"
+
+
+def save_block_map(image: Path, chunklist: Chunklist, blocks: list[Block]) -> None:
+    """Hash every decoded run of the freshly converted *image* and record it."""
+    runs = []
+    try:
+        with image.open("rb") as f:
+            for block in blocks:
+                if block.is_hole:
+                    continue
+                data = os.pread(f.fileno(), block.out_length, block.out_offset)
+                runs.append([
+                    block.kind, block.out_offset, block.out_length, block.in_offset, block.in_length,
+                    hashlib.sha256(data).hexdigest(),
+                ])
+        path = map_path(chunklist.digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({
+            "version": 1,
+            "chunks": [[c.offset, c.size, c.sha256.hex()] for c in chunklist.chunks],
+            "blocks": runs,
+        }), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as exc:
+        log.debug("Cannot record block map of %s: %s", image, exc)
+
+
+def load_block_map(digest: str) -> BlockMap | None:
+    try:
+        data = json.loads(map_path(digest).read_text(encoding="utf-8"))
+        return BlockMap(
+            digest=digest,
+            chunks={(off, size): bytes.fromhex(sha) for off, size, sha in data["chunks"]},
+            blocks={
+                (kind, in_off, in_len, out_len): (out_off, bytes.fromhex(sha))
+                for kind, out_off, out_len, in_off, in_len, sha in data["blocks"]
+            },
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def prune_block_maps(keep: set[str]) -> None:
+    """Delete the maps of builds no cached image was made from."""
+    try:
+        paths = list((cache_dir() / MAPS_DIRNAME).glob("*.json"))
+    except OSError:
+        return
+    for path in paths:
+        if path.stem not in keep:
+            path.unlink(missing_ok=True)
+
+
+def plan_delta(old: BlockMap, chunklist: Chunklist, blocks: list[Block]) -> DeltaPlan:
+    """Split the new build's runs into ones the old image has and ones to fetch."""
+    unchanged = [
+        old.chunks.get((chunk.offset, chunk.size)) == chunk.sha256 for chunk in chunklist.chunks
+    ]
+    plan = DeltaPlan(reuse=[], fetch=[])
+    for block in blocks:
+        if block.is_hole:
+            continue
+        previous = old.blocks.get((block.kind, block.in_offset, block.in_length, block.out_length))
+        first = chunklist.index_at(block.in_offset)
+        last = chunklist.index_at(block.in_offset + max(block.in_length, 1) - 1)
+        if previous is not None and first >= 0 and all(unchanged[first:last + 1]):
+            plan.reuse.append((block, *previous))
+        else:
+            plan.fetch.append(block)
+    return plan
+
+
+def copy_unchanged(old_image: Path, dest: Path, reuse: list[tuple[Block, int, bytes]]) -> list[Block]:
+    """Copy verified runs from *old_image* into *dest*; return the runs that failed."""
+    failed: list[Block] = []
+    src_fd = os.open(old_image, os.O_RDONLY)
+    dst_fd = os.open(dest, os.O_WRONLY)
+    try:
+        for block, old_offset, sha in reuse:
+            data = os.pread(src_fd, block.out_length, old_offset)
+            if hashlib.sha256(data).digest() != sha:
+                failed.append(block)
+                continue
+            write_sparse(dst_fd, data, block.out_offset)
+    finally:
+        os.close(src_fd)
+        os.close(dst_fd)
+    if failed:
+        log.debug("%d run(s) of %s changed since conversion; fetching them", len(failed), old_image)
+    return failed
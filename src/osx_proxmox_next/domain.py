@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from shlex import join as shlex_join
 
 
@@ -52,6 +52,22 @@ class PlanStep:
     title: str
     argv: list[str]
     risk: str = "safe"
+    # Name other steps refer to in *after*; empty = title
+    key: str = ""
+    # Keys of earlier steps this one waits for.  None = the step before it,
+    # so plans that declare nothing still run strictly in order.
+    after: list[str] | None = None
+    # Named locks (e.g. "vm:900"); steps sharing one never run at once
+    resources: list[str] = field(default_factory=list)
+    # Cheap command that exits 0 when the step's effect is in place;
+    # live applies run it first and skip the step when it passes
+    probe: list[str] | None = None
+    # Titles of the steps optimize_plan merged into this one
+    parts: list[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return self.key or self.title
 
     @property
     def command(self) -> str:
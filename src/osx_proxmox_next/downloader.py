@@ -1,19 +1,32 @@
 from __future__ import annotations
 
+import errno
 import logging
+import os
 import secrets
+import threading
 import time
 import urllib.error
 import urllib.request
-from dataclasses import dataclass
-from json import loads as json_loads
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from json import dumps as json_dumps, loads as json_loads
 from pathlib import Path
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
 from typing import Optional
 from urllib.parse import urlparse
 
-from . import __version__
+from . import __version__, http_pool
+from .asset_store import DEFAULT_CACHE_BUDGET, AssetStore, hash_file
+from .chunklist import Chunklist, ChunklistError, ChunkStreamVerifier, chunk_matches, parse_chunklist
+from .delta import BlockMap, copy_unchanged, load_block_map, plan_delta, prune_block_maps, save_block_map
 from .infrastructure import ProxmoxAdapter
+from .metadata_cache import MetadataCache, MetadataUnavailable, offline_mode
+from .mirror import peers_from_env
+from .ratelimit import RateLimit, TokenBucket, rate_limit_from_env, shared_bucket
+from .udif import (
+    KOLY_SIZE, StreamConverter, UdifError, convert_udif, disk_usage, parse_block_map, parse_koly, read_block_map,
+)
 
 log = logging.getLogger(__name__)
 
@@ -23,6 +36,11 @@ class DownloadProgress:
     downloaded: int
     total: int  # 0 if unknown
     phase: str  # "opencore" | "recovery"
+    rate: float = 0.0  # bytes/s, smoothed over recent events
+    avg_rate: float = 0.0  # bytes/s since this transfer started
+    eta: float | None = None  # seconds left; None while unknown
+    limit: int = 0  # bandwidth cap in force, bytes/s; 0 = none
+    throttled: bool = False  # the cap made this transfer wait in the last second
 
 
 ProgressCallback = Optional[Callable[[DownloadProgress], None]]
@@ -32,6 +50,38 @@ class DownloadError(Exception):
     pass
 
 
+@dataclass
+class DownloadOptions:
+    """Tuning knobs shared by every downloader entry point."""
+    # Parallel ranged connections per file. 1 disables segmented mode.
+    connections: int = 4
+    # Byte budget for the asset store; least recently used images beyond it
+    # are evicted. 0 keeps everything.
+    cache_budget: int = DEFAULT_CACHE_BUDGET
+    # Serve release metadata from the local cache only and never download;
+    # defaults to the OSX_NEXT_OFFLINE environment variable.
+    offline: bool = field(default_factory=offline_mode)
+    # Convert the recovery DMG while it downloads instead of saving it first.
+    pipeline: bool = True
+    # Bandwidth cap shared by every transfer; defaults to OSX_NEXT_LIMIT_RATE.
+    rate_limit: RateLimit | None = field(default_factory=rate_limit_from_env)
+    # LAN mirrors (``serve-cache``) asked before GitHub or Apple, even when
+    # offline; defaults to OSX_NEXT_PEERS.
+    peers: list[str] = field(default_factory=peers_from_env)
+    # Skip cached and peer copies and fetch the current upstream build;
+    # ``assets refresh`` sets this for images it found out of date.
+    refresh: bool = False
+
+
+@dataclass
+class UpstreamBuild:
+    """The build of an image that GitHub or Apple currently serves."""
+    name: str  # file name in the ISO directory
+    url: str
+    tag: str  # release tag (OpenCore) or chunklist digest (recovery)
+    size: int = 0  # bytes to download; 0 when unknown
+
+
 RECOVERY_BOARD_IDS: dict[str, str] = {
     "ventura": "Mac-4B682C642B45593E",
     "sonoma": "Mac-827FAC58A8FDFA22",
@@ -49,10 +99,34 @@ _OSRECOVERY_IMAGE_URL = "http://osrecovery.apple.com/InstallationPayload/Recover
 _MLB_ZERO = "00000000000000000"
 
 _GITHUB_API = "https://api.github.com/repos/lucid-fabrics/osx-proxmox-next/releases"
+# Reads start at _CHUNK_SIZE.  One that fills its buffer within _FAST_READ
+# seconds doubles the next read (up to _MAX_CHUNK_SIZE); one slower than
+# _SLOW_READ halves it (down to _MIN_CHUNK_SIZE).
 _CHUNK_SIZE = 65536
+_MIN_CHUNK_SIZE = 16 * 1024
+_MAX_CHUNK_SIZE = 1024 * 1024
+_FAST_READ = 0.01
+_SLOW_READ = 0.25
 _MAX_RETRIES = 3
 _BACKOFF_SECONDS = [1, 2, 4]
 
+# Segmented mode only kicks in for files large enough to split into at least
+# two segments; idle segments steal work from any segment with twice this left.
+_MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+# Per-read socket timeout on segment connections: a segment that delivers no
+# bytes for this long is dropped and restarted from its current offset.
+_SEGMENT_STALL_TIMEOUT = 30
+# Refresh the resume sidecar after this many new bytes reach the .part file.
+_RESUME_SAVE_BYTES = 4 * 1024 * 1024
+# Progress events: at least one every _PROGRESS_INTERVAL seconds while bytes
+# flow, and one per whole-percent step but never closer than _PROGRESS_MIN_GAP.
+_PROGRESS_INTERVAL = 0.5
+_PROGRESS_MIN_GAP = 0.05
+# Weight of the newest sample in the smoothed transfer rate
+_RATE_SMOOTHING = 0.3
+# A peer mirror that does not answer its index within this long is skipped
+_PEER_TIMEOUT = 5
+
 
 _OPENCORE_UNIVERSAL = "opencore-osx-proxmox-vm.iso"
 _ASSETS_TAG = "assets"
@@ -62,26 +136,52 @@ def download_opencore(
     macos: str,
     dest_dir: Path,
     on_progress: ProgressCallback = None,
+    options: DownloadOptions | None = None,
 ) -> Path:
-    version = __version__
+    opts = options or DownloadOptions()
+    store = AssetStore(budget=opts.cache_budget)
     # Try version-specific first, fall back to universal OC image
-    candidates = [f"opencore-{macos}.iso", _OPENCORE_UNIVERSAL]
-    for name in candidates:
-        dest = dest_dir / name
-        if dest.exists():
-            log.debug("OpenCore cache hit: %s", dest)
-            return dest
+    candidates = _opencore_candidates(macos)
+    if not opts.refresh:
+        for name in candidates:
+            dest = dest_dir / name
+            if store.reuse(dest):
+                log.debug("OpenCore cache hit: %s", dest)
+                return dest
+        for name in candidates:
+            dest = dest_dir / name
+            if _fetch_from_peers(opts, store, dest, on_progress, "opencore"):
+                return dest
+
+    build = opencore_upstream(macos, offline=opts.offline)
+    dest = dest_dir / build.name
+    if opts.offline:
+        raise DownloadError(f"Offline mode: {build.name} is not in {dest_dir} and cannot be downloaded.")
+    log.debug("Downloading OpenCore %s from %s", build.name, build.url)
+    validator = _download_file(
+        build.url, dest, on_progress, "opencore",
+        connections=opts.connections, limiter=shared_bucket(opts.rate_limit),
+    )
+    store.add(dest, url=build.url, tag=build.tag, validator=validator)
+    return dest
 
+
+def opencore_upstream(macos: str, offline: bool = False) -> UpstreamBuild:
+    """The OpenCore image :func:`download_opencore` would fetch for *macos*.
+
+    Costs only release metadata lookups, which go through the metadata cache.
+    """
+    candidates = _opencore_candidates(macos)
     # Check version-tagged release, latest release, then permanent 'assets' tag
-    releases = _fetch_github_releases(version)
+    releases = _fetch_github_releases(__version__, offline=offline)
     for release in releases:
         for name in candidates:
-            url = _find_release_asset(release, name, required=False)
-            if url:
-                dest = dest_dir / name
-                log.debug("Downloading OpenCore %s from %s", name, url)
-                _download_file(url, dest, on_progress, "opencore")
-                return dest
+            asset = next((a for a in release.get("assets", []) if a.get("name") == name), None)
+            if asset and asset.get("browser_download_url"):
+                return UpstreamBuild(
+                    name=name, url=asset["browser_download_url"], tag=release.get("tag_name", ""),
+                    size=int(asset.get("size") or 0),
+                )
 
     tags_tried = [r.get("tag_name", "?") for r in releases]
     raise DownloadError(
@@ -90,24 +190,33 @@ def download_opencore(
     )
 
 
+def _opencore_candidates(macos: str) -> list[str]:
+    return [f"opencore-{macos}.iso", _OPENCORE_UNIVERSAL]
+
+
 def download_recovery(
     macos: str,
     dest_dir: Path,
     on_progress: ProgressCallback = None,
+    options: DownloadOptions | None = None,
 ) -> Path:
+    opts = options or DownloadOptions()
     if macos not in RECOVERY_BOARD_IDS:
         raise DownloadError(f"No recovery board ID for '{macos}'.")
 
     dest = dest_dir / f"{macos}-recovery.img"
-    if dest.exists():
-        log.debug("Recovery cache hit: %s", dest)
-        return dest
+    store = AssetStore(budget=opts.cache_budget)
+    if not opts.refresh:
+        if store.reuse(dest):
+            log.debug("Recovery cache hit: %s", dest)
+            return dest
+        if _fetch_from_peers(opts, store, dest, on_progress, "recovery"):
+            return dest
+    if opts.offline:
+        raise DownloadError(f"Offline mode: {dest.name} is not in {dest_dir} and cannot be downloaded.")
 
-    board_id = RECOVERY_BOARD_IDS[macos]
-    os_type = _RECOVERY_OS_TYPE.get(macos, "default")
-    log.debug("Fetching %s recovery (board=%s, os_type=%s)", macos, board_id, os_type)
-    session = _get_recovery_session()
-    image_info = _get_recovery_image_info(session, board_id, os_type)
+    limiter = shared_bucket(opts.rate_limit)
+    image_info = _recovery_image_info(macos)
     image_url = image_info["AU"]
     chunklist_url = image_info["CU"]
     asset_token = image_info["AT"]
@@ -116,57 +225,377 @@ def download_recovery(
     dmg_path = dest_dir / f"{macos}-BaseSystem.dmg"
     chunklist_path = dest_dir / f"{macos}-BaseSystem.chunklist"
 
-    _download_file_with_token(image_url, asset_token, dmg_path, on_progress, "recovery")
-    _download_file_with_token(chunklist_url, chunklist_token, chunklist_path, None, "recovery")
+    # The chunklist comes first so the image can be verified while it streams in
+    _download_file_with_token(chunklist_url, chunklist_token, chunklist_path, None, "recovery", limiter=limiter)
+    chunklist = _load_chunklist(chunklist_path)
 
-    _build_recovery_image(dmg_path, chunklist_path, dest)
+    validator: str | None = None
+    # An older build of this image only needs the chunks that changed
+    old = store.entry(dest)
+    old_map = load_block_map(old.tag) if old and old.tag != chunklist.digest and dest.exists() else None
+    if old_map is not None:
+        validator = _delta_recovery_image(
+            image_url, _asset_headers(image_url, asset_token), chunklist, dest, old_map, on_progress, "recovery",
+            connections=opts.connections, limiter=limiter,
+        )
+    # A partial DMG from an earlier run is worth resuming rather than restarting
+    if validator is None and opts.pipeline and not (dest_dir / (dmg_path.name + ".part")).exists():
+        validator = _stream_recovery_image(
+            image_url, _asset_headers(image_url, asset_token), chunklist, dest, on_progress, "recovery",
+            limiter=limiter,
+        )
+    if validator is None:
+        validator = _download_file_with_token(
+            image_url, asset_token, dmg_path, on_progress, "recovery",
+            connections=opts.connections, chunklist=chunklist, limiter=limiter,
+        )
+        _build_recovery_image(dmg_path, chunklist_path, dest)
+        try:
+            save_block_map(dest, chunklist, read_block_map(dmg_path)[1])
+        except (OSError, UdifError) as exc:
+            log.debug("No block map recorded for %s: %s", dest, exc)
+        dmg_path.unlink(missing_ok=True)
 
-    dmg_path.unlink(missing_ok=True)
+    size, allocated = disk_usage(dest)
+    log.info("Recovery image %s: %d MiB, %d MiB allocated on disk", dest.name, size >> 20, allocated >> 20)
+    # Tagged with the chunklist digest, which identifies the recovery build
+    store.add(dest, url=image_url, tag=chunklist.digest, validator=validator)
     chunklist_path.unlink(missing_ok=True)
+    prune_block_maps({entry.tag for entry in store.entries()})
 
     return dest
 
 
+def recovery_upstream(macos: str) -> UpstreamBuild:
+    """The recovery build Apple currently serves for *macos*.
+
+    Costs the session and image-info requests plus the chunklist, a few
+    kilobytes; the image itself is not touched.
+    """
+    info = _recovery_image_info(macos)
+    req = urllib.request.Request(info["CU"], headers=_asset_headers(info["CU"], info["CT"]))
+    try:
+        with http_pool.urlopen(req, timeout=30) as resp:
+            chunklist = parse_chunklist(resp.read())
+    except (OSError, urllib.error.URLError, ChunklistError) as exc:
+        raise DownloadError(f"Failed to fetch recovery chunklist: {exc}") from exc
+    return UpstreamBuild(name=f"{macos}-recovery.img", url=info["AU"], tag=chunklist.digest, size=chunklist.total)
+
+
+def _recovery_image_info(macos: str) -> dict[str, str]:
+    if macos not in RECOVERY_BOARD_IDS:
+        raise DownloadError(f"No recovery board ID for '{macos}'.")
+    board_id = RECOVERY_BOARD_IDS[macos]
+    os_type = _RECOVERY_OS_TYPE.get(macos, "default")
+    log.debug("Fetching %s recovery (board=%s, os_type=%s)", macos, board_id, os_type)
+    session = _get_recovery_session()
+    return _get_recovery_image_info(session, board_id, os_type)
+
+
+def _fetch_from_peers(
+    opts: DownloadOptions,
+    store: AssetStore,
+    dest: Path,
+    on_progress: ProgressCallback,
+    phase: str,
+) -> bool:
+    """Copy *dest* from the first peer mirror that has it with a matching hash."""
+    for peer in opts.peers:
+        try:
+            with http_pool.urlopen(f"{peer}/index.json", timeout=_PEER_TIMEOUT) as resp:
+                assets = json_loads(resp.read()).get("assets", [])
+        except (OSError, urllib.error.URLError, ValueError, AttributeError) as exc:
+            log.debug("Peer %s unavailable: %s", peer, exc)
+            continue
+        entry = next((a for a in assets if isinstance(a, dict) and a.get("name") == dest.name), None)
+        if entry is None:
+            continue
+        sha = str(entry.get("sha256", ""))
+        log.debug("Fetching %s from peer %s", dest.name, peer)
+        try:
+            validator = _download_file(
+                f"{peer}/objects/{sha}", dest, on_progress, phase,
+                connections=opts.connections, limiter=shared_bucket(opts.rate_limit),
+            )
+        except DownloadError as exc:
+            log.warning("Peer %s failed to serve %s: %s", peer, dest.name, exc)
+            continue
+        if hash_file(dest) != sha:
+            log.warning("Discarding %s from peer %s: SHA-256 mismatch", dest.name, peer)
+            dest.unlink(missing_ok=True)
+            continue
+        store.add(
+            dest, url=entry.get("url") or f"{peer}/objects/{sha}", tag=entry.get("tag", ""),
+            validator=validator, sha256=sha,
+        )
+        return True
+    return False
+
+
+def _load_chunklist(path: Path) -> Chunklist:
+    try:
+        return parse_chunklist(path.read_bytes())
+    except (OSError, ChunklistError) as exc:
+        path.unlink(missing_ok=True)
+        raise DownloadError(f"Invalid recovery chunklist: {exc}") from exc
+
+
 def _build_recovery_image(dmg_path: Path, _chunklist_path: Path, dest: Path) -> None:
-    from .services import get_proxmox_adapter
-    adapter = get_proxmox_adapter()
-    result = adapter.run(["dmg2img", str(dmg_path), str(dest)])
-    if not result.ok:
-        if dest.exists():
-            dest.unlink()
-        if result.returncode == 127:
-            raise DownloadError(
-                "dmg2img is required but not installed. "
-                "Install it with: apt install dmg2img"
+    # A refresh replaces an image that is hard-linked into the asset store;
+    # unlink it rather than truncate the stored object through the link
+    dest.unlink(missing_ok=True)
+    try:
+        convert_udif(dmg_path, dest)
+    except (OSError, UdifError) as exc:
+        dest.unlink(missing_ok=True)
+        raise DownloadError(f"Failed to convert recovery DMG: {exc}") from exc
+
+
+def _stream_recovery_image(
+    url: str,
+    headers: dict[str, str],
+    chunklist: Chunklist,
+    dest: Path,
+    on_progress: ProgressCallback,
+    phase: str,
+    limiter: TokenBucket | None = None,
+) -> str | None:
+    """Download the recovery DMG and convert it to *dest* in one pass.
+
+    The koly trailer and block map are fetched first with ``Range``
+    requests.  The body then streams through in file order: each chunk is
+    checked against the chunklist (and re-fetched alone if it is corrupt)
+    before its bytes reach the :class:`~osx_proxmox_next.udif.StreamConverter`.
+    A dropped connection reopens from the first unverified chunk.
+
+    Returns the image's validator, or None when the server or image does
+    not allow streaming and the caller should download the DMG first.
+    """
+    total = chunklist.total
+    try:
+        trailer = _fetch_range(url, headers, total - KOLY_SIZE, total, limiter)
+        koly = parse_koly(trailer)
+        xml = _fetch_range(url, headers, koly.xml_offset, koly.xml_offset + koly.xml_length, limiter)
+        size, blocks = parse_block_map(xml, koly)
+    except (OSError, urllib.error.URLError, DownloadError, UdifError) as exc:
+        log.info("Cannot convert the recovery image while it downloads (%s); saving the DMG first", exc)
+        return None
+
+    part_path = dest.parent / (dest.name + ".part")
+    meter = _ProgressMeter(on_progress, phase, total, limiter=limiter)
+    validator = ""
+    tail = bytearray()  # verified bytes from the block map to the end, to compare with the probe
+    try:
+        with StreamConverter(blocks, part_path, size) as converter:
+            for attempt in range(_MAX_RETRIES):
+                try:
+                    req_headers = dict(headers)
+                    req_headers["Range"] = f"bytes={converter.position}-"
+                    if validator:
+                        req_headers["If-Range"] = validator
+                    req = urllib.request.Request(url, headers=req_headers)
+                    with http_pool.urlopen(req, timeout=_SEGMENT_STALL_TIMEOUT) as resp:
+                        if converter.position and getattr(resp, "status", 200) != 206:
+                            raise DownloadError("Recovery image changed upstream while streaming.")
+                        validator = validator or _response_validator(resp.headers)
+                        _pipe_chunks(resp, url, headers, chunklist, converter, tail, koly.xml_offset, meter,
+                                     limiter)
+                    break
+                except (OSError, urllib.error.URLError) as exc:
+                    if attempt == _MAX_RETRIES - 1:
+                        raise DownloadError(f"Download failed after {_MAX_RETRIES} attempts: {exc}") from exc
+                    log.debug("Recovery stream failed at %d: %s — reconnecting", converter.position, exc)
+                    time.sleep(_BACKOFF_SECONDS[attempt])
+            if tail[:len(xml)] != xml or tail[-KOLY_SIZE:] != trailer:
+                raise DownloadError("Recovery image block map changed while streaming.")
+            converter.finish()
+        part_path.rename(dest)
+    except UdifError as exc:
+        part_path.unlink(missing_ok=True)
+        raise DownloadError(f"Failed to convert recovery DMG: {exc}") from exc
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    save_block_map(dest, chunklist, blocks)
+    return validator
+
+
+def _delta_recovery_image(
+    url: str,
+    headers: dict[str, str],
+    chunklist: Chunklist,
+    dest: Path,
+    old_map: BlockMap,
+    on_progress: ProgressCallback,
+    phase: str,
+    connections: int = 1,
+    limiter: TokenBucket | None = None,
+) -> str | None:
+    """Update the image at *dest* to the build *chunklist* describes.
+
+    Runs in chunks unchanged since *old_map* are copied from the current
+    image; only the chunks holding the other runs are fetched, with
+    ``Range`` requests, and verified against the chunklist.  The new image
+    is assembled next to *dest* and renamed over it once complete.
+
+    Returns ``""`` on success, or None when the server does not allow
+    ``Range`` requests or nothing can be reused, and the caller should
+    download the whole image.
+    """
+    chunks = chunklist.chunks
+    have: dict[int, bytes] = {}  # chunks fetched for the block map, reused for their runs
+    try:
+        # The trailer and block map come from verified chunks, like everything else
+        for idx, data in _fetch_chunks(url, headers, chunklist, [len(chunks) - 1], have, connections, limiter):
+            have[idx] = data
+        koly = parse_koly(have[len(chunks) - 1][-KOLY_SIZE:])
+        first = chunklist.index_at(koly.xml_offset)
+        tail = list(range(first, len(chunks)))
+        for idx, data in _fetch_chunks(url, headers, chunklist, tail, have, connections, limiter):
+            have[idx] = data
+        start = koly.xml_offset - chunks[first].offset
+        xml = b"".join(have[idx] for idx in tail)[start:start + koly.xml_length]
+        size, blocks = parse_block_map(xml, koly)
+    except (OSError, urllib.error.URLError, DownloadError, UdifError) as exc:
+        log.info("Cannot refresh %s from its chunk delta (%s); downloading it whole", dest.name, exc)
+        return None
+
+    plan = plan_delta(old_map, chunklist, blocks)
+    if not plan.reuse:
+        return None
+    part_path = dest.parent / (dest.name + ".part")
+    try:
+        part_path.unlink(missing_ok=True)
+        with part_path.open("wb") as f:
+            f.truncate(size)
+        refetch = plan.fetch + copy_unchanged(dest, part_path, plan.reuse)
+        needed = sorted({
+            idx
+            for block in refetch
+            for idx in range(
+                chunklist.index_at(block.in_offset),
+                chunklist.index_at(block.in_offset + max(block.in_length, 1) - 1) + 1,
             )
-        raise DownloadError(f"Failed to convert recovery DMG: {result.output}")
+        })
+        total = sum(chunks[idx].size for idx in needed)
+        log.info(
+            "Delta refresh of %s: reusing %d MiB of the current image, fetching %d of %d MiB",
+            dest.name, plan.reused_bytes >> 20, total >> 20, chunklist.total >> 20,
+        )
+        meter = _ProgressMeter(on_progress, phase, total, limiter=limiter)
+        done = 0
+        with StreamConverter(refetch, part_path, size, truncate=False) as converter:
+            for idx, data in _fetch_chunks(url, headers, chunklist, needed, have, connections, limiter):
+                if converter.position != chunks[idx].offset:
+                    converter.skip_to(chunks[idx].offset)
+                converter.feed(data)
+                done += len(data)
+                meter.update(done)
+            converter.finish()
+        meter.flush(done)
+        part_path.rename(dest)
+    except UdifError as exc:
+        part_path.unlink(missing_ok=True)
+        raise DownloadError(f"Failed to convert recovery DMG: {exc}") from exc
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    save_block_map(dest, chunklist, blocks)
+    return ""
 
 
-def _fetch_github_releases(version: str) -> list[dict]:
-    """Return a list of releases to search for assets, in priority order.
+def _fetch_chunks(
+    url: str,
+    headers: dict[str, str],
+    chunklist: Chunklist,
+    indices: list[int],
+    have: dict[int, bytes],
+    connections: int,
+    limiter: TokenBucket | None,
+) -> Iterator[tuple[int, bytes]]:
+    """Yield ``(index, verified bytes)`` for each chunk in *indices*, in order.
 
-    Order: version-tagged → latest → permanent 'assets' tag.
+    Chunks in *have* are not requested again.  Up to *connections* others
+    are in flight at once.
     """
-    releases: list[dict] = []
-    seen_tags: set[str] = set()
+    width = max(1, connections)
+    with ThreadPoolExecutor(max_workers=width) as pool:
+        for start in range(0, len(indices), width):
+            batch = indices[start:start + width]
+            futures = [
+                None if idx in have else pool.submit(_refetch_chunk, url, headers, chunklist, idx, limiter)
+                for idx in batch
+            ]
+            for idx, future in zip(batch, futures):
+                yield idx, have[idx] if future is None else future.result()
+
 
-    for url in (
+def _pipe_chunks(
+    resp,
+    url: str,
+    headers: dict[str, str],
+    chunklist: Chunklist,
+    converter: StreamConverter,
+    tail: bytearray,
+    tail_from: int,
+    meter: _ProgressMeter,
+    limiter: TokenBucket | None = None,
+) -> None:
+    """Feed verified chunks from *resp*, which starts at ``converter.position``."""
+    chunks = chunklist.chunks
+    reader = _AdaptiveReader(resp)
+    # Each chunk is read straight into one reused buffer, then copied once by the converter
+    buf = memoryview(bytearray(max((c.size for c in chunks), default=0)))
+    for idx in range(chunklist.index_at(converter.position), len(chunks)):
+        chunk = chunks[idx]
+        filled = 0
+        while filled < chunk.size:
+            n = reader.readinto(buf[filled:chunk.size])
+            if not n:
+                raise ConnectionError(f"connection closed at byte {chunk.offset + filled}")
+            filled += n
+            if limiter:
+                limiter.consume(n)
+            meter.update(chunk.offset + filled)
+        data: bytes | memoryview = buf[:chunk.size]
+        if not chunk_matches(chunk, data):
+            log.warning("Chunk %d [%d, %d) failed SHA-256 verification", idx, chunk.offset, chunk.end)
+            data = _refetch_chunk(url, headers, chunklist, idx, limiter)
+        if chunk.end > tail_from:
+            tail += data[max(0, tail_from - chunk.offset):]
+        converter.feed(data)
+
+
+def _fetch_github_releases(version: str, offline: bool = False) -> list[dict]:
+    """Return a list of releases to search for assets, in priority order.
+
+    Order: version-tagged → latest → permanent 'assets' tag.  The three
+    lookups run concurrently through the metadata cache.
+    """
+    urls = (
         f"{_GITHUB_API}/tags/v{version}",
         f"{_GITHUB_API}/latest",
         f"{_GITHUB_API}/tags/{_ASSETS_TAG}",
-    ):
+    )
+    with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+        futures = [pool.submit(_http_get_json, url, offline) for url in urls]
+
+    releases: list[dict] = []
+    seen_tags: set[str] = set()
+    for url, future in zip(urls, futures):
         try:
-            data = _http_get_json(url)
+            data = future.result()
             tag = data.get("tag_name", "")
             if tag and tag not in seen_tags:
                 seen_tags.add(tag)
                 releases.append(data)
-        except (urllib.error.HTTPError, DownloadError) as exc:
+        except (urllib.error.HTTPError, MetadataUnavailable, DownloadError) as exc:
             log.debug("Release fetch failed for %s: %s", url, exc)
 
     if not releases:
+        where = " in the offline metadata cache" if offline else ""
         raise DownloadError(
-            f"Could not fetch any GitHub release (tried v{version}, latest, {_ASSETS_TAG})."
+            f"Could not fetch any GitHub release{where} (tried v{version}, latest, {_ASSETS_TAG})."
         )
     return releases
 
@@ -191,12 +620,11 @@ def _generate_id(length: int) -> str:
 def _get_recovery_session() -> str:
     headers = {
         "Host": "osrecovery.apple.com",
-        "Connection": "close",
         "User-Agent": "InternetRecovery/1.0",
     }
     req = urllib.request.Request(_OSRECOVERY_URL, headers=headers)
     try:
-        with urllib.request.urlopen(req, timeout=15) as resp:
+        with http_pool.urlopen(req, timeout=15) as resp:
             for key, value in resp.headers.items():
                 if key.lower() == "set-cookie":
                     for part in value.split("; "):
@@ -212,7 +640,6 @@ def _get_recovery_image_info(
 ) -> dict[str, str]:
     headers = {
         "Host": "osrecovery.apple.com",
-        "Connection": "close",
         "User-Agent": "InternetRecovery/1.0",
         "Cookie": session,
         "Content-Type": "text/plain",
@@ -228,7 +655,7 @@ def _get_recovery_image_info(
     body = "\n".join(f"{k}={v}" for k, v in post_data.items()).encode()
     req = urllib.request.Request(_OSRECOVERY_IMAGE_URL, data=body, headers=headers)
     try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
+        with http_pool.urlopen(req, timeout=30) as resp:
             output = resp.read().decode("utf-8")
     except (OSError, urllib.error.URLError) as exc:
         raise DownloadError(f"Failed to get recovery image info: {exc}") from exc
@@ -253,20 +680,34 @@ def _retry_download(
     on_progress: ProgressCallback,
     phase: str,
     extra_headers: dict[str, str] | None = None,
-) -> None:
+    connections: int = 1,
+    chunklist: Chunklist | None = None,
+    limiter: TokenBucket | None = None,
+) -> str:
+    """Download *url* to *dest*; return the response's ETag/Last-Modified validator."""
     dest.parent.mkdir(parents=True, exist_ok=True)
     part_path = dest.parent / (dest.name + ".part")
 
     last_error: Exception | None = None
     for attempt in range(_MAX_RETRIES):
         try:
-            _do_download(url, part_path, on_progress, phase, extra_headers=extra_headers)
+            validator = _do_download(
+                url, part_path, on_progress, phase,
+                extra_headers=extra_headers, connections=connections, chunklist=chunklist, limiter=limiter,
+            )
             part_path.rename(dest)
-            return
+            _resume_path(part_path).unlink(missing_ok=True)
+            return validator
+        except DownloadError:
+            # Not retryable (disk full, corrupt image): keep nothing half-written
+            part_path.unlink(missing_ok=True)
+            _resume_path(part_path).unlink(missing_ok=True)
+            raise
         except (OSError, urllib.error.URLError) as exc:
             last_error = exc
             log.debug("Download attempt %d/%d failed for %s: %s", attempt + 1, _MAX_RETRIES, url, exc)
-            if part_path.exists():
+            # Keep the partial file only when a sidecar says how to resume it
+            if part_path.exists() and not _resume_path(part_path).exists():
                 part_path.unlink()
             if attempt < _MAX_RETRIES - 1:
                 time.sleep(_BACKOFF_SECONDS[attempt])
@@ -280,15 +721,23 @@ def _download_file_with_token(
     dest: Path,
     on_progress: ProgressCallback,
     phase: str,
-) -> None:
-    parsed = urlparse(url)
-    headers = {
-        "Host": parsed.hostname,
-        "Connection": "close",
+    connections: int = 1,
+    chunklist: Chunklist | None = None,
+    limiter: TokenBucket | None = None,
+) -> str:
+    return _retry_download(
+        url, dest, on_progress, phase,
+        extra_headers=_asset_headers(url, asset_token), connections=connections, chunklist=chunklist,
+        limiter=limiter,
+    )
+
+
+def _asset_headers(url: str, asset_token: str) -> dict[str, str]:
+    return {
+        "Host": urlparse(url).hostname,
         "User-Agent": "InternetRecovery/1.0",
         "Cookie": f"AssetToken={asset_token}",
     }
-    _retry_download(url, dest, on_progress, phase, extra_headers=headers)
 
 
 def _download_file(
@@ -296,8 +745,190 @@ def _download_file(
     dest: Path,
     on_progress: ProgressCallback,
     phase: str,
-) -> None:
-    _retry_download(url, dest, on_progress, phase)
+    connections: int = 1,
+    chunklist: Chunklist | None = None,
+    limiter: TokenBucket | None = None,
+) -> str:
+    return _retry_download(
+        url, dest, on_progress, phase, connections=connections, chunklist=chunklist, limiter=limiter,
+    )
+
+
+# ── Resume sidecar ──────────────────────────────────────────────────
+
+
+def _resume_path(part_path: Path) -> Path:
+    return part_path.parent / (part_path.name + ".json")
+
+
+@dataclass
+class _ResumeState:
+    """What is already on disk in a ``.part`` file, persisted next to it.
+
+    *done* holds merged ``[start, end)`` byte ranges that were written
+    successfully.  *validator* is the ETag (or Last-Modified) the bytes were
+    fetched under; it is sent back as ``If-Range`` so the server answers with
+    the full body instead of a range if the file changed upstream.
+    """
+    url: str
+    validator: str
+    total: int
+    done: list[list[int]]
+
+    @classmethod
+    def load(cls, part_path: Path, url: str) -> _ResumeState | None:
+        sidecar = _resume_path(part_path)
+        if not part_path.exists() or not sidecar.exists():
+            return None
+        try:
+            data = json_loads(sidecar.read_text(encoding="utf-8"))
+            state = cls(
+                url=str(data["url"]),
+                validator=str(data["validator"]),
+                total=int(data["total"]),
+                done=[[int(a), int(b)] for a, b in data["done"]],
+            )
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            log.debug("Ignoring unreadable resume sidecar %s: %s", sidecar, exc)
+            return None
+        if state.url != url or not state.validator:
+            log.debug("Resume sidecar %s is for a different download", sidecar)
+            return None
+        return state
+
+    def save(self, part_path: Path) -> None:
+        sidecar = _resume_path(part_path)
+        tmp = sidecar.parent / (sidecar.name + ".tmp")
+        tmp.write_text(json_dumps({
+            "url": self.url,
+            "validator": self.validator,
+            "total": self.total,
+            "done": self.done,
+        }), encoding="utf-8")
+        tmp.replace(sidecar)
+
+    def first_missing(self) -> int:
+        if self.done and self.done[0][0] == 0:
+            return self.done[0][1]
+        return 0
+
+    def missing(self) -> list[tuple[int, int]]:
+        gaps: list[tuple[int, int]] = []
+        cursor = 0
+        for start, end in self.done:
+            if start > cursor:
+                gaps.append((cursor, start))
+            cursor = max(cursor, end)
+        if cursor < self.total:
+            gaps.append((cursor, self.total))
+        return gaps
+
+
+def _merge_ranges(ranges: list[list[int]]) -> list[list[int]]:
+    merged: list[list[int]] = []
+    for start, end in sorted(r for r in ranges if r[1] > r[0]):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _response_validator(headers) -> str:
+    """Return a validator usable in ``If-Range``: a strong ETag, else Last-Modified."""
+    etag = headers.get("ETag") or ""
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified") or ""
+
+
+def _content_range_total(headers) -> int:
+    """Parse the complete length out of ``Content-Range: bytes a-b/total``."""
+    value = headers.get("Content-Range") or ""
+    _, _, total = value.rpartition("/")
+    return int(total) if total.isdigit() else 0
+
+
+# ── Progress ────────────────────────────────────────────────────────
+
+
+class _ProgressMeter:
+    """Coalesce per-read byte counts into a bounded stream of progress events.
+
+    Transfers call :meth:`update` after every read; *on_progress* only sees
+    an event when a whole percent has passed (at most every
+    ``_PROGRESS_MIN_GAP`` seconds), when ``_PROGRESS_INTERVAL`` has elapsed,
+    and on the first and final byte counts.  Each event carries a smoothed
+    rate, the average rate since *start* and an ETA, plus the cap of
+    *limiter* and whether it is currently holding the transfer back.
+    Callers serialise updates themselves.
+    """
+
+    def __init__(
+        self,
+        on_progress: ProgressCallback,
+        phase: str,
+        total: int,
+        start: int = 0,
+        limiter: TokenBucket | None = None,
+    ) -> None:
+        self._on_progress = on_progress
+        self._limiter = limiter
+        self._phase = phase
+        self._total = total
+        self._start = start
+        self._t0 = self._last_t = time.monotonic()
+        self._last_bytes = start
+        self._last_pct = -1
+        self._emitted = -1
+        self._rate = 0.0
+
+    def update(self, downloaded: int) -> None:
+        if self._on_progress is None:
+            return
+        now = time.monotonic()
+        elapsed = now - self._last_t
+        pct = downloaded * 100 // self._total if self._total else 0
+        due = (
+            self._emitted < 0
+            or downloaded == self._total
+            or elapsed >= _PROGRESS_INTERVAL
+            or (pct > self._last_pct and elapsed >= _PROGRESS_MIN_GAP)
+        )
+        if due and downloaded != self._emitted:
+            self._emit(downloaded, pct, now)
+
+    def flush(self, downloaded: int) -> None:
+        """Report *downloaded* if the last event did not."""
+        if self._on_progress is not None and downloaded != self._emitted:
+            self._emit(downloaded, downloaded * 100 // self._total if self._total else 0, time.monotonic())
+
+    def _emit(self, downloaded: int, pct: int, now: float) -> None:
+        elapsed = now - self._last_t
+        if elapsed > 0 and self._emitted >= 0:
+            sample = (downloaded - self._last_bytes) / elapsed
+            self._rate = sample if not self._rate else (
+                _RATE_SMOOTHING * sample + (1 - _RATE_SMOOTHING) * self._rate
+            )
+        since = now - self._t0
+        avg_rate = (downloaded - self._start) / since if since > 0 else 0.0
+        eta = None
+        if self._total and self._rate > 0:
+            eta = max(0.0, (self._total - downloaded) / self._rate)
+        self._last_t, self._last_bytes, self._last_pct, self._emitted = now, downloaded, pct, downloaded
+        self._on_progress(DownloadProgress(
+            downloaded=downloaded,
+            total=self._total,
+            phase=self._phase,
+            rate=self._rate,
+            avg_rate=avg_rate,
+            eta=eta,
+            limit=self._limiter.rate if self._limiter else 0,
+            throttled=self._limiter.throttling if self._limiter else False,
+        ))
+
+
+# ── Transfer ────────────────────────────────────────────────────────
 
 
 def _do_download(
@@ -306,31 +937,466 @@ def _do_download(
     on_progress: ProgressCallback,
     phase: str,
     extra_headers: dict[str, str] | None = None,
-) -> None:
+    connections: int = 1,
+    chunklist: Chunklist | None = None,
+    limiter: TokenBucket | None = None,
+) -> str:
     headers = extra_headers or {"User-Agent": "osx-proxmox-next"}
-    req = urllib.request.Request(url, headers=headers)
-    with urllib.request.urlopen(req, timeout=60) as resp:
-        total = int(resp.headers.get("Content-Length", 0))
-        downloaded = 0
-        with open(dest, "wb") as f:
+    state = _ResumeState.load(dest, url)
+    req_headers = dict(headers)
+    if state:
+        req_headers["Range"] = f"bytes={state.first_missing()}-"
+        req_headers["If-Range"] = state.validator
+    req = urllib.request.Request(url, headers=req_headers)
+    with http_pool.urlopen(req, timeout=60) as resp:
+        resuming = (
+            state is not None
+            and getattr(resp, "status", 200) == 206
+            and _content_range_total(resp.headers) == state.total
+        )
+        if state and not resuming:
+            log.debug("Server ignored Range or %s changed upstream — restarting from zero", url)
+            _resume_path(dest).unlink(missing_ok=True)
+            state = None
+        validator = state.validator if resuming else _response_validator(resp.headers)
+        if resuming:
+            total = state.total
+        else:
+            total = int(resp.headers.get("Content-Length", 0))
+            accepts_ranges = (resp.headers.get("Accept-Ranges") or "").lower() == "bytes"
+            if accepts_ranges and validator and total > 0:
+                state = _ResumeState(url=url, validator=validator, total=total, done=[])
+
+        if chunklist and total and total != chunklist.total:
+            dest.unlink(missing_ok=True)
+            _resume_path(dest).unlink(missing_ok=True)
+            raise DownloadError(
+                f"Image size {total} does not match its chunklist ({chunklist.total} bytes)."
+            )
+        check = _ChunkCheck(chunklist) if chunklist else None
+
+        missing = state.missing() if state else [(0, total)]
+        remaining = sum(end - start for start, end in missing)
+        if resuming:
+            log.debug("Resuming %s: %d of %d bytes already on disk", url, total - remaining, total)
+        if connections > 1 and remaining >= 2 * _MIN_SEGMENT_SIZE and (resuming or _can_segment(resp.headers, total)):
+            log.debug("Segmented download of %s: %d bytes over %d connections", url, remaining, connections)
+            _SegmentedDownload(
+                url, headers, dest, total, on_progress, phase, connections,
+                state=state, missing=missing, resuming=resuming, check=check, limiter=limiter,
+            ).run(resp)
+        else:
+            # A single stream from the first gap simply rewrites any later ranges it crosses
+            offset = missing[0][0] if resuming else 0
+            _stream_to_file(resp, dest, offset, total, on_progress, phase, state, check, limiter)
+
+    if check:
+        _repair_chunks(url, headers, dest, check, limiter)
+    return validator
+
+
+class _ChunkCheck:
+    """Chunk verification results shared by every stream of one download."""
+
+    def __init__(self, chunklist: Chunklist) -> None:
+        self.chunklist = chunklist
+        self.verified: set[int] = set()
+        self.bad: set[int] = set()
+        self._lock = threading.Lock()
+
+    def stream(self, start: int) -> ChunkStreamVerifier:
+        return ChunkStreamVerifier(self.chunklist, start)
+
+    def record(self, results: list[tuple[int, bool]]) -> None:
+        if not results:
+            return
+        with self._lock:
+            for idx, ok in results:
+                if ok:
+                    self.verified.add(idx)
+                    self.bad.discard(idx)
+                else:
+                    chunk = self.chunklist.chunks[idx]
+                    log.warning("Chunk %d [%d, %d) failed SHA-256 verification", idx, chunk.offset, chunk.end)
+                    self.bad.add(idx)
+
+
+def _repair_chunks(
+    url: str,
+    headers: dict[str, str],
+    dest: Path,
+    check: _ChunkCheck,
+    limiter: TokenBucket | None = None,
+) -> None:
+    """Re-fetch every chunk that failed, or was never, verified in-stream.
+
+    Chunks streamed during this attempt were hashed on arrival; the rest
+    (bytes kept from an earlier resumed attempt, or partial chunks at range
+    edges) are hashed from disk.  Only mismatching chunks go back over the
+    network, each as its own ``Range`` request.
+    """
+    chunklist = check.chunklist
+    bad = sorted(set(chunklist.verify_file(dest, skip=check.verified)) | check.bad)
+    if not bad:
+        return
+    log.debug("Re-fetching %d corrupt chunk(s) of %s", len(bad), dest)
+    for idx in bad:
+        try:
+            data = _refetch_chunk(url, headers, chunklist, idx, limiter)
+        except DownloadError:
+            dest.unlink(missing_ok=True)
+            _resume_path(dest).unlink(missing_ok=True)
+            raise
+        with open(dest, "r+b") as f:
+            f.seek(chunklist.chunks[idx].offset)
+            f.write(data)
+
+
+def _refetch_chunk(
+    url: str,
+    headers: dict[str, str],
+    chunklist: Chunklist,
+    idx: int,
+    limiter: TokenBucket | None = None,
+) -> bytes:
+    chunk = chunklist.chunks[idx]
+    for attempt in range(_MAX_RETRIES):
+        data = _fetch_range(url, headers, chunk.offset, chunk.end, limiter)
+        if chunk_matches(chunk, data):
+            return data
+        log.warning("Chunk %d still corrupt after re-fetch %d/%d", idx, attempt + 1, _MAX_RETRIES)
+    raise DownloadError(f"Chunk {idx} of {url} failed verification after {_MAX_RETRIES} re-fetches.")
+
+
+def _fetch_range(
+    url: str,
+    headers: dict[str, str],
+    start: int,
+    end: int,
+    limiter: TokenBucket | None = None,
+) -> bytes:
+    req_headers = dict(headers)
+    req_headers["Range"] = f"bytes={start}-{end - 1}"
+    req = urllib.request.Request(url, headers=req_headers)
+    with http_pool.urlopen(req, timeout=_SEGMENT_STALL_TIMEOUT) as resp:
+        if getattr(resp, "status", 206) != 206:
+            raise DownloadError("Cannot re-fetch a corrupt chunk: server ignored the Range request.")
+        data = resp.read()
+    if limiter:
+        limiter.consume(len(data))
+    return data
+
+
+def _stream_to_file(
+    resp,
+    dest: Path,
+    offset: int,
+    total: int,
+    on_progress: ProgressCallback,
+    phase: str,
+    state: _ResumeState | None,
+    check: _ChunkCheck | None = None,
+    limiter: TokenBucket | None = None,
+) -> None:
+    downloaded = offset
+    saved_at = offset
+    verifier = check.stream(offset) if check else None
+    meter = _ProgressMeter(on_progress, phase, total, start=offset, limiter=limiter)
+    reader = _AdaptiveReader(resp)
+    # Unbuffered so every byte recorded in the sidecar has reached the OS.
+    # A resume from byte 0 keeps the part file: the sidecar may list later ranges
+    with open(dest, "r+b" if offset or (state and state.done) else "wb", buffering=0) as f:
+        if total:
+            _preallocate(f, total)
+        f.seek(offset)
+        try:
             while True:
-                chunk = resp.read(_CHUNK_SIZE)
+                chunk = reader.read()
                 if not chunk:
                     break
                 f.write(chunk)
+                if verifier:
+                    check.record(verifier.feed(chunk))
                 downloaded += len(chunk)
-                if on_progress:
-                    on_progress(DownloadProgress(
-                        downloaded=downloaded,
-                        total=total,
-                        phase=phase,
-                    ))
+                if limiter:
+                    limiter.consume(len(chunk))
+                if state and downloaded - saved_at >= _RESUME_SAVE_BYTES:
+                    state.done = _merge_ranges(state.done + [[offset, downloaded]])
+                    state.save(dest)
+                    saved_at = downloaded
+                meter.update(downloaded)
+        finally:
+            meter.flush(downloaded)
+            if state and downloaded > saved_at:
+                state.done = _merge_ranges(state.done + [[offset, downloaded]])
+                state.save(dest)
+    if total and downloaded < total:
+        raise ConnectionError(f"connection closed after {downloaded} of {total} bytes")
+
+
+class _AdaptiveReader:
+    """``readinto`` wrapper that sizes each read from the last one's speed.
+
+    :meth:`read` fills one reused buffer and returns a view of it that is
+    only valid until the next call, so steady-state reads allocate nothing.
+    """
+
+    def __init__(self, resp) -> None:
+        self._resp = resp
+        self.size = _CHUNK_SIZE
+        self._floor = min(_MIN_CHUNK_SIZE, _CHUNK_SIZE)
+        self._ceiling = max(_MAX_CHUNK_SIZE, _CHUNK_SIZE)
+        self._buf: memoryview | None = None
+
+    def readinto(self, view: memoryview) -> int:
+        want = min(self.size, len(view))
+        started = time.monotonic()
+        n = self._resp.readinto(view[:want]) or 0
+        elapsed = time.monotonic() - started
+        if n == self.size and elapsed < _FAST_READ:
+            self.size = min(self.size * 2, self._ceiling)
+        elif elapsed > _SLOW_READ:
+            self.size = max(self.size // 2, self._floor)
+        return n
+
+    def read(self, limit: int | None = None) -> memoryview:
+        if self._buf is None:
+            self._buf = memoryview(bytearray(self._ceiling))
+        view = self._buf if limit is None else self._buf[:limit]
+        return self._buf[:self.readinto(view)]
+
+
+def _preallocate(f, size: int) -> None:
+    """Reserve *size* bytes for *f* before any data arrives.
+
+    Uses ``posix_fallocate`` where the filesystem supports it, so the image
+    lands in as few extents as possible and a full disk fails the download
+    up front instead of part-way through.
+    """
+    if not hasattr(os, "posix_fallocate"):
+        f.truncate(size)
+        return
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError as exc:
+        if exc.errno == errno.ENOSPC:
+            raise DownloadError(
+                f"Not enough free space for {Path(f.name).name}: {size} bytes needed."
+            ) from exc
+        # No fallocate on this filesystem: an ordinary (sparse) extension
+        f.truncate(size)
+
+
+def _can_segment(headers, total: int) -> bool:
+    accept = headers.get("Accept-Ranges") or ""
+    return accept.lower() == "bytes" and total >= 2 * _MIN_SEGMENT_SIZE
+
+
+def _plan_segments(
+    missing: list[tuple[int, int]],
+    connections: int,
+    chunklist: Chunklist | None = None,
+) -> list[list[int]]:
+    """Halve the largest gap until there is one range per connection.
+
+    With a *chunklist*, split points snap to chunk boundaries so each
+    segment can hash whole chunks as they stream in.
+    """
+    ranges = [[start, end] for start, end in missing]
+    while len(ranges) < connections:
+        largest = max(ranges, key=lambda r: r[1] - r[0])
+        if largest[1] - largest[0] < 2 * _MIN_SEGMENT_SIZE:
+            break
+        mid = _split_point(largest[0], largest[1], chunklist)
+        ranges.append([mid, largest[1]])
+        largest[1] = mid
+    return sorted(ranges)
+
+
+def _split_point(start: int, end: int, chunklist: Chunklist | None) -> int:
+    mid = start + (end - start) // 2
+    if chunklist:
+        aligned = chunklist.boundary_at_or_after(mid)
+        if aligned < end:
+            return aligned
+    return mid
+
+
+@dataclass
+class _Segment:
+    """Byte range ``[start, end)`` of a segmented download; *pos* is the next byte to fetch."""
+    start: int
+    end: int
+    pos: int
+
+    @property
+    def remaining(self) -> int:
+        return self.end - self.pos
+
+
+class _SegmentedDownload:
+    """Fetch one file over several parallel ``Range`` connections.
+
+    The file is preallocated to its full size and every segment writes at its
+    own offset.  When a connection runs out of work it splits the segment with
+    the most bytes left and takes the upper half, so a slow edge ends up with
+    less to do instead of holding the whole download hostage.  A segment whose
+    connection errors or stalls is reopened from the last byte it wrote.
+
+    With a resume *state*, only the *missing* ranges are fetched and the
+    sidecar is refreshed as segments advance.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: dict[str, str],
+        dest: Path,
+        total: int,
+        on_progress: ProgressCallback,
+        phase: str,
+        connections: int,
+        state: _ResumeState | None = None,
+        missing: list[tuple[int, int]] | None = None,
+        resuming: bool = False,
+        check: _ChunkCheck | None = None,
+        limiter: TokenBucket | None = None,
+    ) -> None:
+        self._url = url
+        self._headers = dict(headers)
+        if state:
+            self._headers["If-Range"] = state.validator
+        self._dest = dest
+        self._total = total
+        self._connections = max(1, connections)
+        self._state = state
+        self._base_done = list(state.done) if state else []
+        self._resuming = resuming
+        self._check = check
+        self._chunklist = check.chunklist if check else None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._abort = threading.Event()
+        ranges = _plan_segments(
+            missing if missing is not None else [(0, total)], self._connections, self._chunklist,
+        )
+        self._segments = [_Segment(start, end, start) for start, end in ranges]
+        self._pending = self._segments[self._connections:]
+        self._downloaded = total - sum(seg.remaining for seg in self._segments)
+        self._saved_at = self._downloaded
+        self._limiter = limiter
+        self._meter = _ProgressMeter(on_progress, phase, total, start=self._downloaded, limiter=limiter)
+
+    def run(self, first_resp) -> None:
+        with open(self._dest, "r+b" if self._resuming else "wb") as f:
+            _preallocate(f, self._total)
+        active = self._segments[:self._connections]
+        try:
+            with ThreadPoolExecutor(max_workers=len(active)) as pool:
+                # The probe response already streams the first gap — reuse it for segment 0
+                futures = [pool.submit(self._worker, active[0], first_resp)]
+                futures += [pool.submit(self._worker, seg, None) for seg in active[1:]]
+                errors = [exc for exc in (f.exception() for f in futures) if exc is not None]
+        finally:
+            with self._lock:
+                self._meter.flush(self._downloaded)
+            self._save_state(force=True)
+        if errors:
+            raise errors[0]
+
+    def _worker(self, seg: _Segment | None, resp) -> None:
+        try:
+            while seg is not None and not self._abort.is_set():
+                self._fetch_segment(seg, resp)
+                resp = None
+                seg = self._next_segment()
+        except BaseException:
+            self._abort.set()
+            raise
+        finally:
+            if resp is not None:
+                resp.close()
+
+    def _next_segment(self) -> _Segment | None:
+        with self._lock:
+            if self._pending:
+                return self._pending.pop(0)
+            victim = max(self._segments, key=lambda s: s.remaining)
+            if victim.remaining < 2 * _MIN_SEGMENT_SIZE:
+                return None
+            mid = _split_point(victim.pos, victim.end, self._chunklist)
+            stolen = _Segment(mid, victim.end, mid)
+            victim.end = mid
+            self._segments.append(stolen)
+            log.debug("Re-split segment at %d: [%d, %d) handed to idle connection", mid, mid, stolen.end)
+            return stolen
+
+    def _fetch_segment(self, seg: _Segment, resp) -> None:
+        for attempt in range(_MAX_RETRIES):
+            try:
+                if resp is None:
+                    resp = self._open_range(seg)
+                with resp, open(self._dest, "r+b", buffering=0) as f:
+                    self._copy(seg, resp, f)
+                return
+            except (OSError, urllib.error.URLError) as exc:
+                resp = None
+                if self._abort.is_set() or attempt == _MAX_RETRIES - 1:
+                    raise
+                log.debug("Segment [%d, %d) failed at %d: %s — reconnecting", seg.start, seg.end, seg.pos, exc)
+                time.sleep(_BACKOFF_SECONDS[attempt])
+
+    def _open_range(self, seg: _Segment):
+        with self._lock:
+            first, last = seg.pos, seg.end - 1
+        headers = dict(self._headers)
+        headers["Range"] = f"bytes={first}-{last}"
+        req = urllib.request.Request(self._url, headers=headers)
+        resp = http_pool.urlopen(req, timeout=_SEGMENT_STALL_TIMEOUT)
+        if getattr(resp, "status", 206) != 206:
+            resp.close()
+            raise urllib.error.URLError(f"server ignored Range request (HTTP {resp.status})")
+        return resp
+
+    def _copy(self, seg: _Segment, resp, f) -> None:
+        f.seek(seg.pos)
+        verifier = self._check.stream(seg.pos) if self._check else None
+        reader = _AdaptiveReader(resp)
+        while not self._abort.is_set():
+            with self._lock:
+                want = seg.remaining
+            if want <= 0:
+                return
+            chunk = reader.read(want)
+            if not chunk:
+                raise ConnectionError(f"connection closed at byte {seg.pos} of segment ending {seg.end}")
+            f.write(chunk)
+            if verifier:
+                self._check.record(verifier.feed(chunk))
+            if self._limiter:
+                # Outside the lock, so segments wait on the shared bucket side by side
+                self._limiter.consume(len(chunk))
+            with self._lock:
+                seg.pos += len(chunk)
+                self._downloaded += len(chunk)
+                self._meter.update(self._downloaded)
+            self._save_state()
+
+    def _save_state(self, force: bool = False) -> None:
+        if self._state is None:
+            return
+        with self._lock:
+            if not force and self._downloaded - self._saved_at < _RESUME_SAVE_BYTES:
+                return
+            self._saved_at = self._downloaded
+            done = self._base_done + [[seg.start, seg.pos] for seg in self._segments]
+        with self._save_lock:
+            self._state.done = _merge_ranges(done)
+            self._state.save(self._dest)
 
 
-def _http_get_json(url: str) -> dict:
-    req = urllib.request.Request(url, headers={
+def _http_get_json(url: str, offline: bool = False) -> dict:
+    return MetadataCache().get_json(url, headers={
         "User-Agent": "osx-proxmox-next",
         "Accept": "application/vnd.github+json",
-    })
-    with urllib.request.urlopen(req, timeout=15) as resp:
-        return json_loads(resp.read())
+    }, offline=offline)
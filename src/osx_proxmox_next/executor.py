@@ -1,13 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+import contextlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
 from collections.abc import Callable
-from typing import Optional
+from typing import IO, Optional
 
-from .infrastructure import ProxmoxAdapter
+from .infrastructure import _EXIT_CODE_TIMEOUT, AsyncProxmoxAdapter, CommandResult, ProxmoxAdapter, ResourceUsage
 from .domain import PlanStep
+from .journal import Journal, open_journal
+
+# Steps run at once when the plan allows it; 1 = strictly one after another
+DEFAULT_JOBS = 4
 
 
 @dataclass
@@ -17,6 +26,20 @@ class StepResult:
     ok: bool
     returncode: int
     output: str
+    # Wall clock (time.time()) around the command; 0 in dry runs
+    started: float = 0.0
+    finished: float = 0.0
+    # From the adapter's ResourceUsage; 0 when it reports none
+    cpu_seconds: float = 0.0
+    max_rss_kb: int = 0
+    read_bytes: int = 0
+    write_bytes: int = 0
+    # Not run: its probe (or a resumed plan's journal) showed it done
+    already_done: bool = False
+
+    @property
+    def duration(self) -> float:
+        return max(self.finished - self.started, 0.0)
 
 
 @dataclass
@@ -24,9 +47,42 @@ class ApplyResult:
     ok: bool
     results: list[StepResult]
     log_path: Path
+    # Title of the step that failed, and the steps never started because of it
+    failed: str = ""
+    skipped: list[str] = field(default_factory=list)
+    # One JSON object per step, then one for the plan, next to *log_path*
+    json_log_path: Path | None = None
 
 
 StepCallback = Callable[[int, int, PlanStep, Optional[StepResult]], None]
+# Called from the step's worker thread with each line it prints
+OutputCallback = Callable[[int, PlanStep, str], None]
+
+
+def step_dependencies(steps: list[PlanStep]) -> list[set[int]]:
+    """Return, for each step, the indices of the steps it waits for.
+
+    Raises ValueError when a step waits for a name that is not an earlier
+    step, or that several earlier steps share.
+    """
+    index: dict[str, int] = {}
+    shared: set[str] = set()
+    deps: list[set[int]] = []
+    for idx, step in enumerate(steps):
+        if step.after is None:
+            wait_for = {idx - 1} if idx else set()
+        else:
+            wait_for = set()
+            for name in step.after:
+                if name not in index or name in shared:
+                    problem = "is ambiguous" if name in shared else "is not an earlier step"
+                    raise ValueError(f"Step {step.title!r} waits for {name!r}, which {problem}.")
+                wait_for.add(index[name])
+        if step.name in index:
+            shared.add(step.name)
+        index[step.name] = idx
+        deps.append(wait_for)
+    return deps
 
 
 def apply_plan(
@@ -34,47 +90,394 @@ def apply_plan(
     execute: bool = False,
     adapter: ProxmoxAdapter | None = None,
     on_step: StepCallback | None = None,
+    jobs: int = DEFAULT_JOBS,
+    on_output: OutputCallback | None = None,
+    resume: bool = False,
 ) -> ApplyResult:
-    out_dir = Path.cwd() / "generated" / "logs"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-    log_path = out_dir / f"apply-{ts}.log"
+    """Run *steps*, up to *jobs* at a time where their dependencies allow.
 
+    A step starts once the steps in its ``after`` list succeeded and no
+    running step holds one of its ``resources``.  The log and *on_step*
+    still see the steps in plan order, as if they ran one after another.
+    After a failure no new step starts; steps already running finish.
+
+    With *on_output*, commands stream their output: each line goes to it
+    and to the log, tagged ``[NN]`` with its step number, as it arrives,
+    and results keep only the last lines.  Step results always carry
+    start and end times; CPU time, peak RSS and bytes read and written
+    come with streamed commands, whose adapter reaps them itself.
+
+    In live runs a step with a ``probe`` runs it first and is skipped
+    when it succeeds, so re-applying a plan converges instead of
+    duplicating work.  Probes are not trusted below a probed step that
+    had to run again: whatever was built on it is rebuilt too.
+
+    Live runs also keep a :mod:`~osx_proxmox_next.journal` of the steps
+    that succeeded, removed once the whole plan has.  With *resume*,
+    steps the journal of this same plan lists as done are skipped too,
+    probe or not, unless their probe fails.
+
+    This runs :func:`apply_plan_async` on a private event loop, so it must
+    not be called from a coroutine.
+    """
     if adapter is None:
         from .services import get_proxmox_adapter
         adapter = get_proxmox_adapter()
-    runtime = adapter
+    return asyncio.run(apply_plan_async(steps, execute, adapter, on_step, jobs, on_output, resume=resume))
+
+
+async def apply_plan_async(
+    steps: list[PlanStep],
+    execute: bool = False,
+    adapter: ProxmoxAdapter | AsyncProxmoxAdapter | None = None,
+    on_step: StepCallback | None = None,
+    jobs: int = DEFAULT_JOBS,
+    on_output: OutputCallback | None = None,
+    timeout: float | None = None,
+    limits: dict[str, asyncio.Semaphore] | None = None,
+    resume: bool = False,
+) -> ApplyResult:
+    """Coroutine behind :func:`apply_plan`, for driving many plans on one loop.
+
+    *adapter* defaults to an :class:`AsyncProxmoxAdapter`; a blocking
+    :class:`ProxmoxAdapter` runs each command in a worker thread instead.
+    Steps still running *timeout* seconds after the start are cancelled
+    and reported as failed with exit code 124.  Cancelling the coroutine
+    cancels the running steps, logs it and propagates.  Cancelled commands
+    of an :class:`AsyncProxmoxAdapter` are killed; those of a blocking
+    adapter run to completion in their thread.
+
+    Resources named in *limits* are not exclusive: a step holding one
+    waits for a slot of its semaphore before its command runs.  Plans
+    given the same semaphores share those slots.
+    """
+    deps = step_dependencies(steps)
+    runtime = adapter if adapter is not None else AsyncProxmoxAdapter()
     results: list[StepResult] = []
     total = len(steps)
+    handle = _open_log()
+    log_path = Path(handle.name)
+    json_path = log_path.with_suffix(".jsonl")
 
-    with log_path.open("w", encoding="utf-8") as handle:
+    with handle, json_path.open("w", encoding="utf-8") as json_log:
         handle.write(f"# apply_plan execute={execute}\n")
+        if execute:
+            journal = open_journal(steps, resume=resume)
+            if journal.completed:
+                handle.write(f"# Resuming {journal.path.name}: {len(journal.completed)} step(s) done before\n")
+            reporter = _Reporter(steps, handle, on_step, on_output, json_log)
+            result = await _run_graph(
+                steps, deps, runtime, max(1, jobs), reporter, log_path, timeout, limits or {}, journal,
+            )
+            if result.ok:
+                journal.remove()
+            result.json_log_path = json_path
+            _write_plan_record(json_log, result, execute)
+            return result
+
         for idx, step in enumerate(steps, start=1):
             if on_step:
                 on_step(idx, total, step, None)
-
-            if not execute:
-                line = f"[DRY-RUN] {step.title}: {step.command}\n"
-                handle.write(line)
-                result = StepResult(step.title, step.command, True, 0, line.strip())
-                results.append(result)
-                if on_step:  # pragma: no branch
-                    on_step(idx, total, step, result)
-                continue
-
-            cmd_result = runtime.run(step.argv)
-            handle.write(f"## {step.title}\n$ {step.command}\n{cmd_result.output}\n")
-            result = StepResult(
-                title=step.title,
-                command=step.command,
-                ok=cmd_result.ok,
-                returncode=cmd_result.returncode,
-                output=cmd_result.output,
-            )
+            line = f"[DRY-RUN] {step.title}: {step.command}\n"
+            handle.write(line)
+            result = StepResult(step.title, step.command, True, 0, line.strip())
             results.append(result)
-            if on_step:
+            _write_step_record(json_log, idx, step, result)
+            if on_step:  # pragma: no branch
                 on_step(idx, total, step, result)
-            if not cmd_result.ok:
-                return ApplyResult(ok=False, results=results, log_path=log_path)
+        applied = ApplyResult(ok=True, results=results, log_path=log_path, json_log_path=json_path)
+        _write_plan_record(json_log, applied, execute)
+
+    return applied
+
+
+def _write_step_record(json_log: IO[str], idx: int, step: PlanStep, result: StepResult) -> None:
+    record = {
+        "event": "step", "step": idx, "key": step.name, "title": step.title, "command": step.command,
+        "ok": result.ok, "returncode": result.returncode,
+        "started": result.started, "finished": result.finished, "duration": round(result.duration, 3),
+        "cpu_seconds": round(result.cpu_seconds, 3), "max_rss_kb": result.max_rss_kb,
+        "read_bytes": result.read_bytes, "write_bytes": result.write_bytes,
+        "already_done": result.already_done,
+    }
+    json_log.write(json.dumps(record) + "\n")
+    json_log.flush()
+
+
+def _write_plan_record(json_log: IO[str], result: ApplyResult, execute: bool) -> None:
+    timed = [r for r in result.results if r.finished]
+    record = {
+        "event": "plan", "execute": execute, "ok": result.ok, "failed": result.failed, "skipped": result.skipped,
+        "started": min((r.started for r in timed), default=0.0),
+        "finished": max((r.finished for r in timed), default=0.0),
+        "cpu_seconds": round(sum(r.cpu_seconds for r in result.results), 3),
+        "read_bytes": sum(r.read_bytes for r in result.results),
+        "write_bytes": sum(r.write_bytes for r in result.results),
+    }
+    json_log.write(json.dumps(record) + "\n")
+
+
+def _open_log() -> IO[str]:
+    out_dir = Path.cwd() / "generated" / "logs"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    # Plans started in the same second (concurrent ones) get their own file
+    path, n = out_dir / f"apply-{ts}.log", 1
+    while True:
+        try:
+            return path.open("x", encoding="utf-8")
+        except FileExistsError:
+            n += 1
+            path = out_dir / f"apply-{ts}-{n}.log"
+
+
+class _Reporter:
+    """Hands started and finished steps to the log and *on_step* in plan order.
+
+    A step finishing early is held back until every step before it has
+    been reported, so progress output reads like a sequential run.
+    """
+
+    def __init__(
+        self,
+        steps: list[PlanStep],
+        handle: IO[str],
+        on_step: StepCallback | None,
+        on_output: OutputCallback | None = None,
+        json_log: IO[str] | None = None,
+    ) -> None:
+        self.steps = steps
+        self.handle = handle
+        self.on_step = on_step
+        self.on_output = on_output
+        self.json_log = json_log
+        # When each step's command started, after any limit slot was free
+        self.started_at: dict[int, float] = {}
+        # Steps skipped because an earlier run completed them
+        self.already_done: set[int] = set()
+        # Output arrives on worker threads while sections are written
+        self._lock = threading.Lock()
+        self.results: list[StepResult] = []
+        self._started: set[int] = set()
+        self._done: dict[int, StepResult] = {}
+        self._announced: set[int] = set()
+        self._next = 0
+
+    def started(self, idx: int) -> None:
+        self._started.add(idx)
+        self._flush()
+
+    def finished(self, idx: int, result: StepResult) -> None:
+        self._done[idx] = result
+        self._flush()
+
+    def output(self, idx: int, line: str) -> None:
+        with self._lock:
+            self.handle.write(f"[{idx + 1:02d}] {line}\n")
+            self.handle.flush()
+            if self.on_output:
+                self.on_output(idx + 1, self.steps[idx], line)
+
+    def close(self) -> None:
+        """Report the steps that finished after one that never started."""
+        for idx in range(self._next, len(self.steps)):
+            if idx in self._done:
+                self._report(idx)
+
+    def _flush(self) -> None:
+        while self._next < len(self.steps):
+            idx = self._next
+            if idx not in self._started:
+                return
+            if idx not in self._done:
+                self._announce(idx)
+                return
+            self._report(idx)
+            self._next += 1
+
+    def _announce(self, idx: int) -> None:
+        if idx not in self._announced:
+            self._announced.add(idx)
+            if self.on_step:
+                self.on_step(idx + 1, len(self.steps), self.steps[idx], None)
+
+    def _report(self, idx: int) -> None:
+        self._announce(idx)
+        step, result = self.steps[idx], self._done[idx]
+        with self._lock:
+            self.handle.write(f"## {step.title}\n$ {step.command}\n{result.output}\n")
+            self.handle.flush()
+        if self.json_log is not None:
+            _write_step_record(self.json_log, idx + 1, step, result)
+        self.results.append(result)
+        if self.on_step:
+            self.on_step(idx + 1, len(self.steps), step, result)
+
+
+async def _run_step(
+    runtime: ProxmoxAdapter | AsyncProxmoxAdapter,
+    step: PlanStep,
+    idx: int,
+    reporter: _Reporter,
+    limits: dict[str, asyncio.Semaphore],
+    journal: Journal | None = None,
+    stale: bool = False,
+) -> CommandResult:
+    kwargs = {}
+    if reporter.on_output is not None:
+        kwargs["on_output"] = lambda line: reporter.output(idx, line)
+    async with contextlib.AsyncExitStack() as stack:
+        # Sorted, so two steps wanting the same slots never wait on each other
+        for name in sorted(set(step.resources) & limits.keys()):
+            await stack.enter_async_context(limits[name])
+        reporter.started_at[idx] = time.time()
+        done = journal is not None and journal.is_done(idx)
+        if stale:
+            if done:
+                reporter.output(idx, "Done in an earlier run, but a step it builds on ran again; running it again")
+        elif step.probe is not None:
+            probe = await _run_argv(runtime, step.probe)
+            if probe.ok:
+                reporter.already_done.add(idx)
+                where = "done in an earlier run and still in place" if done else "already in place"
+                return CommandResult(ok=True, returncode=0, output=f"Skipped: {where}")
+            if done:
+                reporter.output(idx, "Done in an earlier run but no longer in place; running it again")
+        elif done:
+            reporter.already_done.add(idx)
+            return CommandResult(ok=True, returncode=0, output="Skipped: done in an earlier run")
+        return await _run_argv(runtime, step.argv, **kwargs)
+
+
+async def _run_argv(runtime: ProxmoxAdapter | AsyncProxmoxAdapter, argv: list[str], **kwargs) -> CommandResult:
+    if isinstance(runtime, AsyncProxmoxAdapter):
+        return await runtime.run(argv, **kwargs)
+    return await asyncio.to_thread(runtime.run, argv, **kwargs)
+
+
+async def _run_graph(
+    steps: list[PlanStep],
+    deps: list[set[int]],
+    runtime: ProxmoxAdapter | AsyncProxmoxAdapter,
+    jobs: int,
+    reporter: _Reporter,
+    log_path: Path,
+    timeout: float | None = None,
+    limits: dict[str, asyncio.Semaphore] | None = None,
+    journal: Journal | None = None,
+) -> ApplyResult:
+    limits = limits or {}
+    exclusive = [[name for name in step.resources if name not in limits] for step in steps]
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    pending = list(range(len(steps)))
+    running: dict[asyncio.Task, int] = {}
+    succeeded: set[int] = set()
+    # Steps that (re)built state this run; their probes' dependents can't be trusted
+    changed: set[int] = set()
+    held: set[str] = set()
+    failed: int | None = None
+
+    def finish(idx: int, cmd_result: CommandResult) -> None:
+        nonlocal failed
+        step = steps[idx]
+        held.difference_update(exclusive[idx])
+        now = time.time()
+        usage = cmd_result.usage or ResourceUsage()
+        reporter.finished(idx, StepResult(
+            title=step.title,
+            command=step.command,
+            ok=cmd_result.ok,
+            returncode=cmd_result.returncode,
+            output=cmd_result.output,
+            # A step cancelled while waiting for a limit slot never started
+            started=reporter.started_at.get(idx, now),
+            finished=now,
+            cpu_seconds=usage.cpu_seconds,
+            max_rss_kb=usage.max_rss_kb,
+            read_bytes=usage.read_bytes,
+            write_bytes=usage.write_bytes,
+            already_done=idx in reporter.already_done,
+        ))
+        if cmd_result.ok:
+            succeeded.add(idx)
+            if idx not in reporter.already_done and (step.probe is not None or deps[idx] & changed):
+                changed.add(idx)
+            if journal is not None and not journal.is_done(idx):
+                journal.record(idx, now)
+        elif failed is None:
+            failed = idx
+
+    async def stop(cancelled: CommandResult) -> None:
+        await _cancel(running)
+        for task, idx in sorted(running.items(), key=lambda item: item[1]):
+            # A task that finished while being cancelled keeps its own result
+            finish(idx, cancelled if task.cancelled() else _outcome(task))
+        running.clear()
+
+    try:
+        while True:
+            # Earlier steps first, so jobs=1 keeps plan order
+            for idx in list(pending) if failed is None else []:
+                if len(running) >= jobs:
+                    break
+                step = steps[idx]
+                if deps[idx] <= succeeded and held.isdisjoint(exclusive[idx]):
+                    pending.remove(idx)
+                    held.update(exclusive[idx])
+                    reporter.started(idx)
+                    stale = bool(deps[idx] & changed)
+                    running[asyncio.ensure_future(
+                        _run_step(runtime, step, idx, reporter, limits, journal, stale)
+                    )] = idx
+            if not running:
+                break
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            done, _ = await asyncio.wait(running, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                await stop(CommandResult(
+                    ok=False, returncode=_EXIT_CODE_TIMEOUT,
+                    output=f"Cancelled: plan timed out after {timeout:g}s",
+                ))
+                break
+            crashed = False
+            for task in sorted(done, key=running.__getitem__):
+                idx = running.pop(task)
+                crashed = crashed or task.exception() is not None
+                finish(idx, _outcome(task))
+            if crashed:
+                # Nothing says the adapter still works; don't wait on its other steps
+                await stop(CommandResult(ok=False, returncode=1, output="Cancelled: another step raised"))
+                break
+    except asyncio.CancelledError:
+        await _cancel(running)
+        reporter.close()
+        reporter.handle.write("# CANCELLED\n")
+        raise
+
+    reporter.close()
+    if failed is None:
+        return ApplyResult(ok=True, results=reporter.results, log_path=log_path)
+    skipped = [steps[idx].title for idx in pending]
+    reporter.handle.write(f"# FAILED: {steps[failed].title}\n")
+    if skipped:
+        reporter.handle.write(f"# Not started: {', '.join(skipped)}\n")
+    return ApplyResult(
+        ok=False, results=reporter.results, log_path=log_path, failed=steps[failed].title, skipped=skipped,
+    )
+
+
+def _outcome(task: asyncio.Task) -> CommandResult:
+    """The step's result, or a failed one if it raised instead of returning."""
+    try:
+        return task.result()
+    except Exception as exc:  # an adapter bug or a failed journal write
+        return CommandResult(
+            ok=False, returncode=1, output=f"Step raised {type(exc).__name__}: {exc}",
+        )
+
 
-    return ApplyResult(ok=True, results=results, log_path=log_path)
+async def _cancel(running: dict[asyncio.Task, int]) -> None:
+    for task in running:
+        task.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
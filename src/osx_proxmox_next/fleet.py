@@ -0,0 +1,283 @@
+"""Build a batch of macOS VMs from one manifest.
+
+``osx-next-cli fleet apply manifest.toml`` reads a list of VM entries, each
+shaped like a :class:`~osx_proxmox_next.domain.VmConfig`, with shared
+values in a ``[defaults]`` table::
+
+    [defaults]
+    macos = "sequoia"
+    cores = 4
+    memory = 8192
+    disk = 128
+    bridge = "vmbr0"
+    storage = "local-lvm"
+
+    [[vm]]
+    vmid = 910
+    name = "build-01"
+
+The OpenCore and recovery images are staged once per macOS release and
+ISO directory, not once per VM.  Every VM's plan then runs on one event
+loop through :func:`~osx_proxmox_next.executor.apply_plan_async`, so the
+cheap ``qm set`` steps of different VMs overlap freely, while the
+I/O-heavy steps (OpenCore disk build and the imports) share
+*io_jobs* slots per target storage.  Each VM keeps its own apply log.
+
+TOML manifests need Python 3.11 (``tomllib``); on older versions the same
+structure can be written as JSON.
+"""
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import functools
+import json
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from .assets import required_assets, resolve_opencore_path, resolve_recovery_or_installer_path
+from .defaults import detect_cpu_info, detect_iso_storage, detect_net_model
+from .domain import PlanStep, VmConfig, validate_config
+from .downloader import DownloadOptions
+from .executor import DEFAULT_JOBS, ApplyResult, StepResult, apply_plan_async
+from .infrastructure import AsyncProxmoxAdapter, ProxmoxAdapter
+from .planner import build_plan
+from .services import run_download_worker
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+log = logging.getLogger(__name__)
+
+# I/O-heavy steps of one storage running at once, across the whole fleet
+DEFAULT_IO_JOBS = 2
+
+# Steps that move whole disk images; everything else is a quick qm call
+IO_STEPS = ("opencore-build", "opencore-import", "recovery-import")
+# Steps that read or edit the recovery image every VM of a release shares
+_RECOVERY_STEPS = ("recovery-stamp", "recovery-import")
+# The OpenCore build first detaches every loop device backed by the source
+# ISO, so two builds from one ISO would tear down each other's mount
+_OPENCORE_STEPS = ("opencore-build",)
+
+# Manifest spellings of the CLI flags, next to the VmConfig field names
+_ALIASES = {"memory": "memory_mb", "disk": "disk_gb"}
+_FIELDS = {f.name: f for f in dataclasses.fields(VmConfig)}
+
+OK = "ok"
+FAILED = "failed"
+NOT_RUN = "not run"
+
+
+class ManifestError(ValueError):
+    pass
+
+
+@dataclass
+class VmOutcome:
+    config: VmConfig
+    status: str  # OK | FAILED | NOT_RUN
+    result: ApplyResult | None = None
+    detail: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.status == OK
+
+
+# StepCallback with the VM the step belongs to in front
+FleetStepCallback = Callable[[VmConfig, int, int, PlanStep, Optional[StepResult]], None]
+
+
+def load_manifest(path: Path) -> list[VmConfig]:
+    """Read and validate the VM entries of a TOML or JSON manifest."""
+    try:
+        raw = path.read_bytes()
+    except OSError as exc:
+        raise ManifestError(f"Cannot read {path}: {exc}") from exc
+    if path.suffix == ".json":
+        try:
+            data = json.loads(raw)
+        except ValueError as exc:
+            raise ManifestError(f"{path}: {exc}") from exc
+    elif tomllib is None:
+        raise ManifestError("TOML manifests need Python 3.11 or newer; write the manifest as .json instead.")
+    else:
+        try:
+            data = tomllib.loads(raw.decode("utf-8"))
+        except (UnicodeDecodeError, tomllib.TOMLDecodeError) as exc:
+            raise ManifestError(f"{path}: {exc}") from exc
+    if not isinstance(data, dict):
+        raise ManifestError(f"{path}: expected a table with a 'vm' list")
+    return parse_manifest(data)
+
+
+def parse_manifest(data: dict) -> list[VmConfig]:
+    defaults = data.get("defaults", {})
+    entries = data.get("vm", [])
+    if not isinstance(defaults, dict) or not isinstance(entries, list) or not entries:
+        raise ManifestError("The manifest needs a non-empty 'vm' list (and optionally a 'defaults' table).")
+    unknown = set(data) - {"defaults", "vm"}
+    if unknown:
+        raise ManifestError(f"Unknown manifest section(s): {', '.join(sorted(unknown))}")
+
+    configs: list[VmConfig] = []
+    problems: list[str] = []
+    net_model = ""
+    for n, entry in enumerate(entries, start=1):
+        label = f"vm #{n}"
+        if not isinstance(entry, dict):
+            problems.append(f"{label}: expected a table")
+            continue
+        values = _entry_values({**defaults, **entry}, label, problems)
+        if values is None:
+            continue
+        label = f"vm #{n} ({values.get('name') or values.get('vmid')})"
+        missing = [name for name, f in _FIELDS.items() if f.default is dataclasses.MISSING and name not in values]
+        if missing:
+            problems.append(f"{label}: missing {', '.join(missing)}")
+            continue
+        if "net_model" not in values:
+            # Same auto-detection as the apply command, done once for the fleet
+            net_model = net_model or detect_net_model(detect_cpu_info())
+            values["net_model"] = net_model
+        config = VmConfig(**values)
+        problems.extend(f"{label}: {issue}" for issue in validate_config(config))
+        configs.append(config)
+
+    seen: dict[int, str] = {}
+    for config in configs:
+        if config.vmid in seen:
+            problems.append(f"VMID {config.vmid} is used by both {seen[config.vmid]!r} and {config.name!r}")
+        seen.setdefault(config.vmid, config.name)
+    if problems:
+        raise ManifestError("\n".join(problems))
+    return configs
+
+
+def _entry_values(entry: dict, label: str, problems: list[str]) -> dict | None:
+    values: dict = {}
+    for key, value in entry.items():
+        name = _ALIASES.get(key, key)
+        if name not in _FIELDS:
+            problems.append(f"{label}: unknown setting {key!r}")
+            return None
+        expected = {"int": int, "bool": bool}.get(str(_FIELDS[name].type), str)
+        # bool is an int subclass; a VMID of true is a typo, not 1
+        if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+            problems.append(f"{label}: {key} must be {expected.__name__}, not {value!r}")
+            return None
+        values[name] = value
+    return values
+
+
+def stage_assets(
+    configs: list[VmConfig],
+    options: DownloadOptions | None = None,
+    on_progress: Callable[[str, int], None] | None = None,
+) -> list[str]:
+    """Download each release's missing images once for the whole fleet.
+
+    Returns the download errors; VMs still missing images afterwards are
+    reported by :func:`apply_fleet`.
+    """
+    errors: list[str] = []
+    staged: set[tuple[str, str]] = set()
+    for config in configs:
+        group = (config.macos, config.iso_dir)
+        if group in staged:
+            continue
+        staged.add(group)
+        missing = [a for a in required_assets(config) if not a.ok and a.downloadable]
+        if not missing:
+            continue
+        if not config.iso_dir:
+            config = dataclasses.replace(config, iso_dir=detect_iso_storage()[0])
+        log.info("Staging %s for %s", ", ".join(a.name for a in missing), config.macos)
+        errors.extend(run_download_worker(
+            config, missing, on_progress=on_progress or (lambda phase, pct: None), options=options,
+        ))
+    return errors
+
+
+def fleet_plan(config: VmConfig) -> list[PlanStep]:
+    """The VM's install plan, with the resources the fleet scheduler limits."""
+    steps = build_plan(config)
+    recovery = f"image:{resolve_recovery_or_installer_path(config)}"
+    opencore = f"image:{resolve_opencore_path(config.macos)}"
+    for step in steps:
+        if step.key in IO_STEPS:
+            step.resources.append(f"io:{config.storage}")
+        if step.key in _RECOVERY_STEPS:
+            # The stamp edits the image in place; no VM may import it meanwhile
+            step.resources.append(recovery)
+        if step.key in _OPENCORE_STEPS:
+            step.resources.append(opencore)
+    return steps
+
+
+def apply_fleet(
+    configs: list[VmConfig],
+    execute: bool = False,
+    adapter: ProxmoxAdapter | AsyncProxmoxAdapter | None = None,
+    on_step: FleetStepCallback | None = None,
+    jobs: int = DEFAULT_JOBS,
+    io_jobs: int = DEFAULT_IO_JOBS,
+) -> list[VmOutcome]:
+    """Run every VM's plan at once; see :func:`apply_fleet_async`."""
+    return asyncio.run(apply_fleet_async(configs, execute, adapter, on_step, jobs, io_jobs))
+
+
+async def apply_fleet_async(
+    configs: list[VmConfig],
+    execute: bool = False,
+    adapter: ProxmoxAdapter | AsyncProxmoxAdapter | None = None,
+    on_step: FleetStepCallback | None = None,
+    jobs: int = DEFAULT_JOBS,
+    io_jobs: int = DEFAULT_IO_JOBS,
+) -> list[VmOutcome]:
+    """Run the plans of *configs* on this loop; one outcome per config, in order.
+
+    Each plan runs up to *jobs* steps at once.  Across the fleet, at most
+    *io_jobs* of the :data:`IO_STEPS` write to one storage at a time, and
+    steps using a shared recovery image or OpenCore ISO take turns.  A VM
+    whose images are missing or whose plan cannot be built is not run;
+    the others are.
+    """
+    outcomes = [VmOutcome(config, NOT_RUN) for config in configs]
+    plans: list[tuple[VmOutcome, list[PlanStep]]] = []
+    for outcome in outcomes:
+        missing = [a.name for a in required_assets(outcome.config) if not a.ok]
+        if missing:
+            outcome.detail = f"missing {', '.join(missing)}"
+            continue
+        try:
+            plans.append((outcome, fleet_plan(outcome.config)))
+        except ValueError as exc:
+            outcome.detail = str(exc)
+
+    limits: dict[str, asyncio.Semaphore] = {}
+    for _, steps in plans:
+        for step in steps:
+            for name in step.resources:
+                if name.startswith("io:"):
+                    limits.setdefault(name, asyncio.Semaphore(max(1, io_jobs)))
+                elif name.startswith("image:"):
+                    limits.setdefault(name, asyncio.Semaphore(1))
+
+    async def run(outcome: VmOutcome, steps: list[PlanStep]) -> None:
+        callback = functools.partial(on_step, outcome.config) if on_step else None
+        result = await apply_plan_async(
+            steps, execute=execute, adapter=adapter, on_step=callback, jobs=jobs, limits=limits,
+        )
+        outcome.result = result
+        outcome.status = OK if result.ok else FAILED
+        outcome.detail = result.failed
+
+    await asyncio.gather(*(run(outcome, steps) for outcome, steps in plans))
+    return outcomes
@@ -0,0 +1,221 @@
+"""Keep-alive HTTP connections shared by every downloader request.
+
+:func:`urlopen` is a drop-in for :func:`urllib.request.urlopen` that takes
+a :class:`urllib.request.Request` (or URL) and returns an
+:class:`http.client.HTTPResponse`.  It raises :class:`urllib.error.HTTPError`
+for error statuses and :class:`urllib.error.URLError` when it cannot
+connect, exactly like urllib.  Connections are kept per
+``(scheme, host, port)`` once a response has been read to the end, and
+the next request to that host reuses them, so a run pays one TCP/TLS
+handshake per host instead of one per request.
+
+Idle connections are dropped after :data:`IDLE_TIMEOUT` seconds, and at
+most :data:`MAX_IDLE_PER_HOST` are kept per host.  A caller may also pass
+*max_connections* to queue behind busy connections instead of dialling
+new ones, which the metadata cache uses to send its concurrent GitHub
+lookups over a single connection.  A connection that turns out to be
+closed by the server is replaced and the request retried once.  Requests
+that would go through a proxy from the environment use urllib as before.
+"""
+from __future__ import annotations
+
+import http.client
+import io
+import logging
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from urllib.parse import urljoin, urlsplit
+
+log = logging.getLogger(__name__)
+
+IDLE_TIMEOUT = 30.0
+MAX_IDLE_PER_HOST = 8
+_MAX_REDIRECTS = 10
+_REDIRECTS = (301, 302, 303, 307, 308)
+# Errors that mean a reused connection was already closed by the server
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+_PoolKey = tuple[str, str, int]
+
+
+class _PooledResponse(http.client.HTTPResponse):
+    """Hands its connection back to the pool once closed after a full read."""
+
+    _release = None
+
+    def close(self) -> None:
+        complete = self.fp is None or (self.length == 0 and not self.chunked)
+        super().close()
+        release, self._release = self._release, None
+        if release:
+            release(complete and not self.will_close)
+
+
+class _HTTPConnection(http.client.HTTPConnection):
+    response_class = _PooledResponse
+
+
+class _HTTPSConnection(http.client.HTTPSConnection):
+    response_class = _PooledResponse
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        idle_timeout: float = IDLE_TIMEOUT,
+        max_idle_per_host: int = MAX_IDLE_PER_HOST,
+        ssl_context: ssl.SSLContext | None = None,
+    ) -> None:
+        self.idle_timeout = idle_timeout
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: dict[_PoolKey, deque[tuple[http.client.HTTPConnection, float]]] = {}
+        self._busy: dict[_PoolKey, int] = {}
+        self._cond = threading.Condition()
+        # Defaults to the system trust store; the Proxmox API brings its own CA
+        self._ssl_context = ssl_context
+        # Counts new connections, for logging and tests
+        self.opened = 0
+
+    def urlopen(
+        self,
+        req: urllib.request.Request | str,
+        timeout: float = 30,
+        max_connections: int | None = None,
+    ) -> http.client.HTTPResponse:
+        if isinstance(req, str):
+            req = urllib.request.Request(req)
+        if _uses_proxy(req.full_url):
+            return urllib.request.urlopen(req, timeout=timeout)
+        method, body = req.get_method(), req.data
+        headers = _request_headers(req)
+        url = req.full_url
+        for _ in range(_MAX_REDIRECTS + 1):
+            resp = self._send(url, method, body, headers, timeout, max_connections)
+            if resp.status in _REDIRECTS and resp.getheader("Location"):
+                resp.read()
+                resp.close()
+                target = urljoin(url, resp.getheader("Location"))
+                if urlsplit(target).netloc != urlsplit(url).netloc:
+                    headers = {k: v for k, v in headers.items() if k.lower() != "host"}
+                if resp.status == 303 or (resp.status in (301, 302) and method == "POST"):
+                    method, body = "GET", None
+                    headers = {k: v for k, v in headers.items() if k.lower() != "content-type"}
+                url = target
+                continue
+            resp.url = url
+            if not 200 <= resp.status < 300:
+                data = resp.read()
+                resp.close()
+                raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(data))
+            return resp
+        raise urllib.error.HTTPError(url, resp.status, "Too many redirects", resp.headers, None)
+
+    def close(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+    def _send(self, url, method, body, headers, timeout, max_connections) -> _PooledResponse:
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname or "", parts.port or (443 if parts.scheme == "https" else 80))
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        while True:
+            conn, reused = self._checkout(key, timeout, max_connections)
+            try:
+                conn.request(method, target, body=body, headers=headers)
+                resp = conn.getresponse()
+            except _STALE_ERRORS as exc:
+                self._discard(key, conn)
+                if reused:
+                    log.debug("Pooled connection to %s was closed; reconnecting", key[1])
+                    continue
+                raise urllib.error.URLError(exc) from exc
+            except OSError as exc:
+                self._discard(key, conn)
+                raise urllib.error.URLError(exc) from exc
+            except BaseException:
+                self._discard(key, conn)
+                raise
+            resp._release = lambda reusable: self._checkin(key, conn, reusable)
+            return resp
+
+    def _checkout(self, key: _PoolKey, timeout: float, max_connections: int | None):
+        with self._cond:
+            while True:
+                idle = self._idle.get(key)
+                now = time.monotonic()
+                while idle and now - idle[0][1] >= self.idle_timeout:
+                    idle.popleft()[0].close()
+                if idle:
+                    conn = idle.pop()[0]
+                    self._busy[key] = self._busy.get(key, 0) + 1
+                    conn.timeout = timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                    return conn, True
+                if max_connections is None or self._busy.get(key, 0) < max_connections:
+                    break
+                self._cond.wait()
+            self._busy[key] = self._busy.get(key, 0) + 1
+            self.opened += 1
+        scheme, host, port = key
+        if scheme == "https":
+            return _HTTPSConnection(host, port, timeout=timeout, context=self._context()), False
+        return _HTTPConnection(host, port, timeout=timeout), False
+
+    def _checkin(self, key: _PoolKey, conn: http.client.HTTPConnection, reusable: bool) -> None:
+        with self._cond:
+            self._busy[key] -= 1
+            idle = self._idle.setdefault(key, deque())
+            if reusable and conn.sock is not None and len(idle) < self.max_idle_per_host:
+                idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+        if conn is not None:
+            conn.close()
+
+    def _discard(self, key: _PoolKey, conn: http.client.HTTPConnection) -> None:
+        self._checkin(key, conn, reusable=False)
+
+    def _context(self) -> ssl.SSLContext:
+        # One context, so TLS sessions can be resumed across connections
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+
+def _request_headers(req: urllib.request.Request) -> dict[str, str]:
+    # Request capitalises header names; keep urllib's defaults where unset
+    headers = dict(req.header_items())
+    names = {name.lower() for name in headers}
+    if "user-agent" not in names:
+        headers["User-Agent"] = f"Python-urllib/{urllib.request.__version__}"
+    if req.data is not None and "content-type" not in names:
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    return headers
+
+
+def _uses_proxy(url: str) -> bool:
+    parts = urlsplit(url)
+    proxies = urllib.request.getproxies()
+    return parts.scheme in proxies and not urllib.request.proxy_bypass(parts.hostname or "")
+
+
+_pool = ConnectionPool()
+
+
+def urlopen(
+    req: urllib.request.Request | str,
+    timeout: float = 30,
+    max_connections: int | None = None,
+) -> http.client.HTTPResponse:
+    """Open *req* on a pooled keep-alive connection (see module docstring)."""
+    return _pool.urlopen(req, timeout=timeout, max_connections=max_connections)
@@ -1,7 +1,26 @@
 from __future__ import annotations
 
+import asyncio
+from collections import deque
+from collections.abc import Callable
 from dataclasses import dataclass
+import os
+from pathlib import Path
 import subprocess
+import threading
+
+
+@dataclass
+class ResourceUsage:
+    """What a finished command cost, from ``wait4()`` and ``/proc/<pid>/io``.
+
+    The figures include every child the command waited for, so a shell
+    script is charged for the tools it ran.
+    """
+    cpu_seconds: float = 0.0  # user + system
+    max_rss_kb: int = 0  # largest resident set of the command or one of its children
+    read_bytes: int = 0  # from storage, not page cache
+    write_bytes: int = 0
 
 
 @dataclass
@@ -9,15 +28,33 @@ class CommandResult:
     ok: bool
     returncode: int
     output: str
+    # Set by the streaming paths, which reap the command themselves
+    usage: ResourceUsage | None = None
 
 
 _SUBPROCESS_TIMEOUT = 300
 _EXIT_CODE_NOT_FOUND = 127
 _EXIT_CODE_TIMEOUT = 124
+# Lines of streamed output kept in CommandResult.output; the rest only
+# goes to the on_output hook
+OUTPUT_TAIL_LINES = 200
+# Longer lines (progress bars redrawn with \r) are passed on in pieces
+_MAX_LINE = 4096
+
+OutputCallback = Callable[[str], None]
 
 
 class ProxmoxAdapter:
-    def run(self, argv: list[str]) -> CommandResult:
+    def run(self, argv: list[str], on_output: OutputCallback | None = None) -> CommandResult:
+        """Run *argv* and return its exit status and output.
+
+        With *on_output*, each line of output is passed to it as soon as the
+        command prints it, only the last :data:`OUTPUT_TAIL_LINES` lines
+        are kept in the result, and the result carries its
+        :class:`ResourceUsage`.
+        """
+        if on_output is not None:
+            return _run_streaming(argv, on_output)
         try:
             proc = subprocess.run(argv, capture_output=True, text=True, check=False, timeout=_SUBPROCESS_TIMEOUT)
             output = (proc.stdout or "") + (proc.stderr or "")
@@ -40,6 +77,221 @@ class ProxmoxAdapter:
         return self.run(["pvesh", *args])
 
 
+class _OutputTail:
+    """Forwards output lines to *on_output* and keeps the last few for the result."""
+
+    def __init__(self, on_output: OutputCallback | None) -> None:
+        self.on_output = on_output
+        self.lines: deque[str] = deque(maxlen=OUTPUT_TAIL_LINES)
+        self.dropped = 0
+
+    def add(self, raw: bytes) -> None:
+        line = raw.decode(errors="replace").rstrip("\r\n")
+        if len(self.lines) == self.lines.maxlen:
+            self.dropped += 1
+        self.lines.append(line)
+        if self.on_output:
+            self.on_output(line)
+
+    def result(
+        self,
+        argv: list[str],
+        returncode: int,
+        timeout: float | None = None,
+        usage: ResourceUsage | None = None,
+    ) -> CommandResult:
+        output = "\n".join(self.lines).strip()
+        if self.dropped:
+            output = f"[{self.dropped} earlier lines not kept]\n{output}"
+        if timeout is not None:
+            output = f"Command timed out after {timeout:g}s: {' '.join(argv)}\n{output}"
+            return CommandResult(ok=False, returncode=_EXIT_CODE_TIMEOUT, output=output.strip(), usage=usage)
+        return CommandResult(ok=(returncode == 0), returncode=returncode, output=output, usage=usage)
+
+
+# Waiting without reaping (WNOWAIT) leaves /proc/<pid>/io readable until wait4()
+_ACCOUNTING = hasattr(os, "waitid") and hasattr(os, "wait4")
+
+
+def _reap(proc: subprocess.Popen) -> ResourceUsage | None:
+    """Reap *proc*, which has exited but not been waited for, and return its usage."""
+    io = _read_proc_io(proc.pid)
+    try:
+        _, status, ru = os.wait4(proc.pid, 0)
+    except ChildProcessError:  # Popen reaped it first (kill() polls)
+        proc.wait()
+        return None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    read, write = io if io is not None else (ru.ru_inblock * 512, ru.ru_oublock * 512)
+    return ResourceUsage(
+        cpu_seconds=ru.ru_utime + ru.ru_stime, max_rss_kb=ru.ru_maxrss, read_bytes=read, write_bytes=write,
+    )
+
+
+def _read_proc_io(pid: int) -> tuple[int, int] | None:
+    try:
+        text = Path(f"/proc/{pid}/io").read_text()
+    except OSError:
+        return None
+    fields = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(":")
+        fields[name] = value.strip()
+    try:
+        return int(fields["read_bytes"]), int(fields["write_bytes"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _wait_and_reap(proc: subprocess.Popen) -> ResourceUsage | None:
+    try:
+        os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+    except ChildProcessError:
+        proc.wait()
+        return None
+    return _reap(proc)
+
+
+def _run_streaming(argv: list[str], on_output: OutputCallback) -> CommandResult:
+    # stderr shares the pipe, so lines keep the order the command wrote them in
+    try:
+        proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except FileNotFoundError:
+        return CommandResult(ok=False, returncode=_EXIT_CODE_NOT_FOUND, output=f"Command not found: {argv[0]}")
+    expired = threading.Event()
+
+    def expire() -> None:
+        expired.set()
+        proc.kill()
+
+    timer = threading.Timer(_SUBPROCESS_TIMEOUT, expire)
+    timer.daemon = True
+    timer.start()
+    tail = _OutputTail(on_output)
+    usage = None
+    try:
+        for raw in iter(lambda: proc.stdout.readline(_MAX_LINE), b""):
+            tail.add(raw)
+        if _ACCOUNTING:
+            usage = _wait_and_reap(proc)
+        returncode = proc.wait()
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+    return tail.result(argv, returncode, timeout=_SUBPROCESS_TIMEOUT if expired.is_set() else None, usage=usage)
+
+
+class AsyncProxmoxAdapter:
+    """:class:`ProxmoxAdapter` for asyncio: the event loop watches the commands.
+
+    One thread can drive any number of commands at once.  Output always
+    streams, and results carry usage, as in ``ProxmoxAdapter.run(argv,
+    on_output=...)``.  A command
+    still running after *timeout* seconds is killed and reported with exit
+    code 124, and a cancelled :meth:`run` kills its command before the
+    cancellation propagates.
+    """
+
+    def __init__(self, timeout: float = _SUBPROCESS_TIMEOUT) -> None:
+        self.timeout = timeout
+
+    async def run(
+        self, argv: list[str], on_output: OutputCallback | None = None, timeout: float | None = None,
+    ) -> CommandResult:
+        limit = self.timeout if timeout is None else timeout
+        # A plain Popen rather than asyncio's subprocesses, whose child
+        # watcher would reap the command before its usage can be read
+        try:
+            proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except FileNotFoundError:
+            return CommandResult(ok=False, returncode=_EXIT_CODE_NOT_FOUND, output=f"Command not found: {argv[0]}")
+        tail = _OutputTail(on_output)
+        try:
+            returncode, usage = await asyncio.wait_for(_pump(proc, tail), limit)
+        except asyncio.TimeoutError:
+            await _kill(proc)
+            return tail.result(argv, _EXIT_CODE_TIMEOUT, timeout=limit)
+        except BaseException:
+            await _kill(proc)
+            raise
+        return tail.result(argv, returncode, usage=usage)
+
+    async def qm(self, *args: str) -> CommandResult:
+        return await self.run(["qm", *args])
+
+    async def pvesm(self, *args: str) -> CommandResult:
+        return await self.run(["pvesm", *args])
+
+    async def pvesh(self, *args: str) -> CommandResult:
+        return await self.run(["pvesh", *args])
+
+
+async def _pump(proc: subprocess.Popen, tail: _OutputTail) -> tuple[int, ResourceUsage | None]:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), proc.stdout)
+    buf = b""
+    try:
+        while True:
+            data = await reader.read(65536)
+            buf += data
+            # Same pieces as readline(_MAX_LINE) in the blocking adapter
+            while True:
+                cut = buf.find(b"\n", 0, _MAX_LINE)
+                if cut < 0 and len(buf) < _MAX_LINE:
+                    break
+                cut = cut + 1 if cut >= 0 else _MAX_LINE
+                tail.add(buf[:cut])
+                buf = buf[cut:]
+            if not data:
+                break
+    finally:
+        transport.close()
+    if buf:
+        tail.add(buf)
+    usage = await _exited(proc)
+    return proc.returncode, usage
+
+
+async def _exited(proc: subprocess.Popen) -> ResourceUsage | None:
+    """Wait for *proc* to exit without blocking the loop, then reap it."""
+    if proc.returncode is not None:  # already reaped by Popen
+        return None
+    if not _ACCOUNTING:
+        await asyncio.to_thread(proc.wait)
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        # Readable once the process exits; waiting on it does not reap
+        pidfd = os.pidfd_open(proc.pid)
+    except (AttributeError, OSError):
+        return await asyncio.to_thread(_wait_and_reap, proc)
+    exited = loop.create_future()
+    try:
+        loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+    except NotImplementedError:  # event loops without add_reader
+        os.close(pidfd)
+        return await asyncio.to_thread(_wait_and_reap, proc)
+    try:
+        await exited
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+    return _reap(proc)
+
+
+async def _kill(proc: subprocess.Popen) -> None:
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await _exited(proc)
+
+
 def run_command(cmd: list[str]) -> CommandResult:
     """Run an arbitrary command and return a CommandResult.
 
@@ -0,0 +1,117 @@
+"""Durable record of the steps a live apply completed, for ``--resume``.
+
+Every ``apply_plan(..., execute=True)`` keeps a journal in
+``generated/journal/<plan hash>.json``: the plan itself and the steps
+that succeeded so far, rewritten (and fsynced) as each one finishes.  A
+plan that succeeds removes its journal; a failed or interrupted one
+leaves it behind.
+
+Resuming runs the journaled plan again, but a step the journal lists as
+done is skipped once its :attr:`~osx_proxmox_next.domain.PlanStep.probe`
+confirms its effect is still in place; a step without a probe is trusted
+as is.  The plan is stored because re-planning would draw a new SMBIOS
+identity, and a different plan is a different journal.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .domain import PlanStep
+
+log = logging.getLogger(__name__)
+
+_STEP_FIELDS = ("title", "argv", "risk", "key", "after", "resources", "probe", "parts")
+
+
+def plan_hash(steps: list[PlanStep]) -> str:
+    """Identify a plan by everything that decides what it runs and in which order."""
+    canonical = json.dumps([[getattr(step, name) for name in _STEP_FIELDS] for step in steps])
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def journal_dir() -> Path:
+    return Path.cwd() / "generated" / "journal"
+
+
+@dataclass
+class Journal:
+    path: Path
+    steps: list[PlanStep]
+    # Index of each completed step -> when it finished
+    completed: dict[int, float] = field(default_factory=dict)
+    updated: float = 0.0
+
+    @property
+    def plan_hash(self) -> str:
+        return self.path.stem
+
+    def is_done(self, idx: int) -> bool:
+        return idx in self.completed
+
+    def record(self, idx: int, finished: float) -> None:
+        self.completed[idx] = finished
+        self.save()
+
+    def save(self) -> None:
+        self.updated = time.time()
+        data = {
+            "version": 1,
+            "updated": self.updated,
+            "steps": [{name: getattr(step, name) for name in _STEP_FIELDS} for step in self.steps],
+            "completed": {str(idx): ts for idx, ts in sorted(self.completed.items())},
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            log.warning("Cannot write journal %s: %s", self.path, exc)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, path: Path) -> Journal | None:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            steps = [PlanStep(**{name: raw[name] for name in _STEP_FIELDS}) for raw in data["steps"]]
+            completed = {int(idx): float(ts) for idx, ts in data["completed"].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+        # A hand-edited plan no longer matches its name; don't resume it
+        if plan_hash(steps) != path.stem or any(idx >= len(steps) for idx in completed):
+            return None
+        return cls(path=path, steps=steps, completed=completed, updated=float(data.get("updated", 0)))
+
+
+def open_journal(steps: list[PlanStep], resume: bool = False) -> Journal:
+    """The journal for *steps*: the existing one when resuming, else a fresh one."""
+    path = journal_dir() / f"{plan_hash(steps)}.json"
+    if resume:
+        existing = Journal.load(path)
+        if existing is not None:
+            return existing
+    journal = Journal(path=path, steps=steps)
+    journal.save()
+    return journal
+
+
+def find_journal(resource: str) -> Journal | None:
+    """Newest unfinished journal whose plan holds *resource* (e.g. ``vm:900``)."""
+    try:
+        paths = list(journal_dir().glob("*.json"))
+    except OSError:
+        return None
+    journals = [j for j in map(Journal.load, paths) if j is not None]
+    matching = [j for j in journals if any(resource in step.resources for step in j.steps)]
+    return max(matching, key=lambda j: j.updated, default=None)
@@ -0,0 +1,112 @@
+"""On-disk cache for small JSON API responses (GitHub release metadata).
+
+Each URL's last body is stored together with its ``ETag`` and
+``Last-Modified`` headers.  Within the TTL the body is served without any
+request.  After that a conditional request is sent, and a ``304 Not
+Modified`` only refreshes the timestamp, which GitHub does not count
+against the unauthenticated rate limit.  ``404`` answers are remembered
+for the same TTL, because a missing version tag is the common case on
+development builds.
+
+In offline mode (``OSX_NEXT_OFFLINE=1`` or ``--offline``) cached bodies
+are served whatever their age, and uncached URLs fail fast instead of
+touching the network.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from . import http_pool
+from .defaults import cache_dir
+
+log = logging.getLogger(__name__)
+
+CACHE_NAME = "metadata.json"
+DEFAULT_METADATA_TTL = 3600
+
+_lock = threading.Lock()
+
+
+class MetadataUnavailable(Exception):
+    """Raised when a URL is known to be missing or cannot be served offline."""
+
+
+def offline_mode() -> bool:
+    return os.environ.get("OSX_NEXT_OFFLINE", "").strip().lower() in ("1", "true", "yes")
+
+
+class MetadataCache:
+    def __init__(self, path: Path | None = None, ttl: float = DEFAULT_METADATA_TTL) -> None:
+        self.path = path or cache_dir() / CACHE_NAME
+        self.ttl = ttl
+
+    def get_json(self, url: str, headers: dict[str, str] | None = None, offline: bool = False) -> dict:
+        entry = self._entries().get(url)
+        fresh = entry is not None and time.time() - entry.get("fetched_at", 0) < self.ttl
+        if entry is not None and (fresh or offline):
+            log.debug("Metadata cache hit%s: %s", "" if fresh else " (offline, stale)", url)
+            return _cached_body(url, entry)
+        if offline:
+            raise MetadataUnavailable(f"{url} is not cached (offline mode).")
+
+        req_headers = dict(headers or {})
+        if entry and entry.get("etag"):
+            req_headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            req_headers["If-Modified-Since"] = entry["last_modified"]
+        req = urllib.request.Request(url, headers=req_headers)
+        try:
+            # One connection per host: concurrent lookups queue for it, not a new handshake
+            with http_pool.urlopen(req, timeout=15, max_connections=1) as resp:
+                body = json.loads(resp.read())
+                resp_headers = resp.headers
+        except urllib.error.HTTPError as exc:
+            if exc.code == 304 and entry and "body" in entry:
+                log.debug("Metadata not modified: %s", url)
+                self._store(url, {**entry, "fetched_at": time.time()})
+                return entry["body"]
+            if exc.code == 404:
+                self._store(url, {"status": 404, "fetched_at": time.time()})
+            raise
+
+        self._store(url, {
+            "body": body,
+            "etag": resp_headers.get("ETag") or "",
+            "last_modified": resp_headers.get("Last-Modified") or "",
+            "fetched_at": time.time(),
+        })
+        return body
+
+    def _entries(self) -> dict[str, dict]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        entries = data.get("entries") if isinstance(data, dict) else None
+        return entries if isinstance(entries, dict) else {}
+
+    def _store(self, url: str, entry: dict) -> None:
+        # Last writer wins between processes; a lost update only costs a refetch
+        with _lock:
+            entries = self._entries()
+            entries[url] = entry
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                tmp.write_text(json.dumps({"version": 1, "entries": entries}), encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError as exc:
+                log.debug("Cannot write metadata cache %s: %s", self.path, exc)
+
+
+def _cached_body(url: str, entry: dict) -> dict:
+    if entry.get("status") == 404:
+        raise MetadataUnavailable(f"{url} was not found (cached 404).")
+    return entry["body"]
@@ -0,0 +1,204 @@
+"""LAN mirror of the asset store, so a cluster downloads each image once.
+
+``osx-next-cli serve-cache`` publishes a node's cached OpenCore and
+recovery images over HTTP:
+
+``GET /index.json``
+    ``{"version": 1, "assets": [{"name", "sha256", "size", "tag", "url"}]}``,
+    one entry per file name (the most recently used placement wins).
+``GET|HEAD /objects/<sha256>``
+    The image bytes, with ``Range``/``If-Range`` support so peers can
+    resume and use segmented downloads.
+
+The advertised hash is the SHA-256 of the bytes on disk *now*, not the
+one recorded at download time: the recovery stamp step edits images in
+place.  Hashes are computed once per file and reused until its size or
+mtime changes.  Downloaders given peers (``--peer`` or ``OSX_NEXT_PEERS``)
+ask each peer in turn before going upstream and keep a peer's copy only
+when its SHA-256 matches the index.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from .asset_store import AssetEntry, AssetStore, hash_file
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MIRROR_PORT = 8470
+
+_OBJECT_RE = re.compile(r"^/objects/([0-9a-f]{64})$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def peers_from_env() -> list[str]:
+    """Peer mirrors listed in ``OSX_NEXT_PEERS``; an invalid list is ignored."""
+    try:
+        return parse_peers(os.environ.get("OSX_NEXT_PEERS", ""))
+    except ValueError as exc:
+        log.warning("Ignoring OSX_NEXT_PEERS: %s", exc)
+        return []
+
+
+def parse_peers(text: str) -> list[str]:
+    """Normalise comma-separated ``host[:port]`` or URL items to base URLs."""
+    peers = []
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        parts = urlsplit(item if "://" in item else f"http://{item}")
+        if not parts.hostname:
+            raise ValueError(f"Invalid peer: {item!r} (expected host[:port] or a URL)")
+        netloc = parts.netloc if parts.port else f"{parts.netloc}:{DEFAULT_MIRROR_PORT}"
+        peers.append(f"{parts.scheme}://{netloc}{parts.path.rstrip('/')}")
+    return peers
+
+
+class CacheMirror:
+    """Hash-indexed view of the asset store, refreshed on every index request."""
+
+    def __init__(self, store: AssetStore) -> None:
+        self.store = store
+        self._lock = threading.Lock()
+        self._hashes: dict[Path, tuple[tuple[int, int], str]] = {}
+        self._objects: dict[str, Path] = {}
+
+    def refresh(self) -> list[dict]:
+        latest: dict[str, AssetEntry] = {}
+        for entry in self.store.entries():
+            name = Path(entry.path).name
+            if name not in latest or entry.last_used > latest[name].last_used:
+                latest[name] = entry
+        with self._lock:
+            listing, objects = [], {}
+            for name, entry in sorted(latest.items()):
+                path = Path(entry.path)
+                sha = self._hash(path)
+                if sha is None:
+                    continue
+                objects[sha] = path
+                listing.append({
+                    "name": name, "sha256": sha, "size": path.stat().st_size,
+                    "tag": entry.tag, "url": entry.url,
+                })
+            self._objects = objects
+            return listing
+
+    def object_path(self, sha256: str) -> Path | None:
+        with self._lock:
+            return self._objects.get(sha256)
+
+    def _hash(self, path: Path) -> str | None:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        stamp = (st.st_size, st.st_mtime_ns)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        log.info("Hashing %s for the mirror index", path)
+        sha = hash_file(path)
+        self._hashes[path] = (stamp, sha)
+        return sha
+
+
+class _MirrorHandler(BaseHTTPRequestHandler):
+    server: MirrorServer
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self._serve(body=True)
+
+    def do_HEAD(self) -> None:
+        self._serve(body=False)
+
+    def log_message(self, format: str, *args) -> None:
+        log.debug("%s - %s", self.address_string(), format % args)
+
+    def _serve(self, body: bool) -> None:
+        if self.path == "/index.json":
+            data = json.dumps({"version": 1, "assets": self.server.mirror.refresh()}).encode()
+            self._headers(200, {"Content-Type": "application/json", "Content-Length": str(len(data))})
+            if body:
+                self.wfile.write(data)
+            return
+        match = _OBJECT_RE.match(self.path)
+        path = self.server.mirror.object_path(match.group(1)) if match else None
+        if path is None:
+            self._headers(404, {"Content-Length": "0"})
+            return
+        self._send_object(path, match.group(1), body)
+
+    def _send_object(self, path: Path, sha: str, body: bool) -> None:
+        try:
+            f = path.open("rb")
+        except OSError:
+            self._headers(404, {"Content-Length": "0"})
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            etag = f'"{sha}"'
+            headers = {"Accept-Ranges": "bytes", "ETag": etag, "Content-Type": "application/octet-stream"}
+            start, end, status = 0, size, 200
+            rng = self.headers.get("Range")
+            if_range = self.headers.get("If-Range")
+            if rng and (if_range is None or if_range == etag):
+                parsed = _parse_range(rng, size)
+                if parsed is None:
+                    headers["Content-Range"] = f"bytes */{size}"
+                    headers["Content-Length"] = "0"
+                    self._headers(416, headers)
+                    return
+                start, end = parsed
+                status = 206
+                headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+            headers["Content-Length"] = str(end - start)
+            self._headers(status, headers)
+            if body and end > start:
+                self.wfile.flush()
+                self.connection.sendfile(f, start, end - start)
+
+    def _headers(self, status: int, headers: dict[str, str]) -> None:
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """``(start, end)`` for a single ``bytes=`` range, or None when unsatisfiable."""
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size
+    else:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    if start >= end:
+        return None
+    return start, end
+
+
+class MirrorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], mirror: CacheMirror) -> None:
+        self.mirror = mirror
+        super().__init__(address, _MirrorHandler)
+
+
+def make_server(
+    host: str = "0.0.0.0", port: int = DEFAULT_MIRROR_PORT, store: AssetStore | None = None,
+) -> MirrorServer:
+    """Build a mirror server for *store*, hashing its assets up front."""
+    mirror = CacheMirror(store or AssetStore())
+    mirror.refresh()
+    return MirrorServer((host, port), mirror)
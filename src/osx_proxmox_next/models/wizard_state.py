@@ -40,6 +40,7 @@ class WizardState:
     download_running: bool = False
     download_phase: str = ""
     download_pct: int = 0
+    download_phases: dict[str, int] = field(default_factory=dict)  # phase -> pct, assets download in parallel
     download_errors: list[str] = field(default_factory=list)
     downloads_complete: bool = False
     # Config + Plan
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import dataclasses
+import hashlib
 from dataclasses import dataclass
 from pathlib import Path
 from shlex import quote as shquote
@@ -7,9 +9,11 @@ from shlex import quote as shquote
 from .assets import resolve_opencore_path, resolve_recovery_or_installer_path
 from .defaults import CpuInfo, detect_cpu_info
 from .domain import SUPPORTED_MACOS, VmConfig, PlanStep, EditChanges, validate_config
+from .executor import step_dependencies
 from .infrastructure import ProxmoxAdapter
 from .script_renderer import (
     _APPLE_OSK,
+    _OC_DISK_SIZE_MB,
     _build_oc_disk_script,
     _partprobe_retry_snippet,
 )
@@ -59,7 +63,8 @@ def _cpu_args(cpu: CpuInfo, override: str = "") -> str:
     return "-cpu host,kvm=on,vendor=GenuineIntel,+hypervisor,+invtsc,vmware-cpuid-freq=on"
 
 
-def build_plan(config: VmConfig) -> list[PlanStep]:
+def build_plan(config: VmConfig, optimize: bool = True) -> list[PlanStep]:
+    """The steps that create and start the VM; see :func:`optimize_plan` for *optimize*."""
     issues = validate_config(config)
     if issues:
         raise ValueError(f"Invalid VM config: {'; '.join(issues)}")
@@ -94,6 +99,11 @@ def build_plan(config: VmConfig) -> list[PlanStep]:
         *_disk_steps(ctx, macos_label),
         *_boot_steps(config, vmid),
     ]
+    # Every qm call on the VM takes its config lock, so they never overlap;
+    # the OpenCore build and recovery stamp only touch their image files
+    for step in steps:
+        if step.argv[0] == "qm" or step.key.endswith("-import"):
+            step.resources.append(f"vm:{vmid}")
 
     if meta["channel"] == "preview":
         steps.insert(
@@ -105,9 +115,11 @@ def build_plan(config: VmConfig) -> list[PlanStep]:
                     f"Notice: {meta['label']} uses preview assets. Verify OpenCore and recovery sources before production use.",
                 ],
                 risk="warn",
+                key="preview",
+                after=[],
             ),
         )
-    return steps
+    return optimize_plan(steps) if optimize else steps
 
 
 def _network_steps(config: VmConfig, vmid: str, cpu_flag: str) -> list[PlanStep]:
@@ -115,6 +127,10 @@ def _network_steps(config: VmConfig, vmid: str, cpu_flag: str) -> list[PlanStep]
     return [
         PlanStep(
             title="Create VM shell",
+            key="create",
+            after=[],
+            # Only this plan's VM: another VM on the VMID must make create fail
+            probe=_config_probe(vmid, f"^name: {config.name.replace('.', '[.]')}$"),
             argv=[
                 "qm", "create", vmid,
                 "--name", config.name,
@@ -132,6 +148,8 @@ def _network_steps(config: VmConfig, vmid: str, cpu_flag: str) -> list[PlanStep]
         ),
         PlanStep(
             title="Apply macOS hardware profile",
+            key="profile",
+            after=["create"],
             argv=[
                 "qm", "set", vmid,
                 "--args",
@@ -162,25 +180,36 @@ class _DiskBuildContext:
 
 def _opencore_steps(ctx: _DiskBuildContext) -> list[PlanStep]:
     """Build and import the OpenCore EFI disk."""
+    script = _build_oc_disk_script(
+        ctx.opencore_path, ctx.recovery_raw, ctx.oc_disk, ctx.config.macos,
+        ctx.is_amd, ctx.config.cores, ctx.config.verbose_boot,
+        apple_services=ctx.config.apple_services,
+        smbios_serial=ctx.config.smbios_serial,
+        smbios_uuid=ctx.config.smbios_uuid,
+        smbios_mlb=ctx.config.smbios_mlb,
+        smbios_rom=ctx.config.smbios_rom,
+        smbios_model=ctx.config.smbios_model,
+    )
+    # The checksum file is named after the script, so an image built with
+    # other settings (or edited since) fails the probe and is rebuilt
+    disk = shquote(str(ctx.oc_disk))
+    stamp = f"{ctx.oc_disk}.{hashlib.sha256(script.encode()).hexdigest()[:16]}.sha256"
     return [
         PlanStep(
             title="Build OpenCore boot disk",
+            key="opencore-build",
+            after=[],
+            probe=["sha256sum", "--status", "-c", stamp],
             argv=[
                 "bash", "-c",
-                _build_oc_disk_script(
-                    ctx.opencore_path, ctx.recovery_raw, ctx.oc_disk, ctx.config.macos,
-                    ctx.is_amd, ctx.config.cores, ctx.config.verbose_boot,
-                    apple_services=ctx.config.apple_services,
-                    smbios_serial=ctx.config.smbios_serial,
-                    smbios_uuid=ctx.config.smbios_uuid,
-                    smbios_mlb=ctx.config.smbios_mlb,
-                    smbios_rom=ctx.config.smbios_rom,
-                    smbios_model=ctx.config.smbios_model,
-                ),
+                f"rm -f {disk}.*.sha256; {script} && sha256sum {disk} > {shquote(stamp)}",
             ],
         ),
         PlanStep(
             title="Import and attach OpenCore disk",
+            key="opencore-import",
+            after=["create", "opencore-build"],
+            probe=_config_probe(ctx.vmid, f"^ide0: .*size={_pve_size(_OC_DISK_SIZE_MB)}(,|$)"),
             argv=[
                 "bash", "-c",
                 "if qm disk import --help >/dev/null 2>&1; then IMPORT_CMD='qm disk import'; else IMPORT_CMD='qm importdisk'; fi && "
@@ -208,9 +237,12 @@ def _recovery_steps(
     macos_label: str,
 ) -> list[PlanStep]:
     """Stamp and import the macOS recovery image."""
+    img = shquote(str(recovery_raw))
     return [
         PlanStep(
             title="Stamp recovery with Apple icon flavour",
+            key="recovery-stamp",
+            after=[],
             argv=[
                 "bash", "-c",
                 # Trap to clean up loop device and temp dir on failure
@@ -254,22 +286,49 @@ def _recovery_steps(
         ),
         PlanStep(
             title="Import and attach macOS recovery",
+            key="recovery-import",
+            after=["create", "recovery-stamp"],
+            # Only the imported volume: an empty CD drive or an ISO the user
+            # attached on ide2 is no recovery
+            probe=_config_probe(vmid, f"^ide2: {config.storage.replace('.', '[.]')}:.*media=disk"),
             argv=[
                 "bash", "-c",
                 "if qm disk import --help >/dev/null 2>&1; then IMPORT_CMD='qm disk import'; else IMPORT_CMD='qm importdisk'; fi && "
-                f'REF=$($IMPORT_CMD {shquote(vmid)} {shquote(str(recovery_raw))} {shquote(config.storage)} 2>&1 | '
+                # The image is sparse; qemu-img skips its holes and leaves them
+                # unallocated on thin storage, so show what the import really moves
+                f'echo "Recovery image: $(du -m --apparent-size {img} | cut -f1) MiB logical, '
+                f'$(du -m {img} | cut -f1) MiB allocated" && '
+                f'REF=$($IMPORT_CMD {shquote(vmid)} {img} {shquote(config.storage)} 2>&1 | '
                 "grep 'successfully imported' | grep -oP \"'\\K[^']+\") && "
-                f'qm set {shquote(vmid)} --ide2 "$REF",media=disk',
+                f'qm set {shquote(vmid)} --ide2 "$REF",media=disk && '
+                "{ qemu-img info \"$(pvesm path \"$REF\")\" 2>/dev/null | grep -E '^(virtual|disk) size' || true; }",
             ],
         ),
     ]
 
 
+def _config_probe(vmid: str, *patterns: str) -> list[str]:
+    """Probe that succeeds when every regex in *patterns* matches a line of the VM config."""
+    checks = " && ".join(f"grep -Eq {shquote(pattern)} <<<\"$CONF\"" for pattern in patterns)
+    return ["bash", "-c", f"CONF=$(qm config {shquote(vmid)}) && {checks}"]
+
+
+def _pve_size(mib: int) -> str:
+    """A disk size as ``qm config`` prints it: in the largest unit that divides it."""
+    for unit, factor in (("T", 1024 * 1024), ("G", 1024)):
+        if mib % factor == 0:
+            return f"{mib // factor}{unit}"
+    return f"{mib}M"
+
+
 def _disk_steps(ctx: _DiskBuildContext, macos_label: str) -> list[PlanStep]:
     """EFI/TPM disk, main disk, OpenCore build/import, and recovery import."""
     return [
         PlanStep(
             title="Attach EFI + TPM",
+            key="efi",
+            after=["create"],
+            probe=_config_probe(ctx.vmid, "^efidisk0: .*efitype=4m", "^tpmstate0: "),
             argv=[
                 "qm", "set", ctx.vmid,
                 "--efidisk0", f"{ctx.config.storage}:0,efitype=4m,pre-enrolled-keys=0",
@@ -278,6 +337,9 @@ def _disk_steps(ctx: _DiskBuildContext, macos_label: str) -> list[PlanStep]:
         ),
         PlanStep(
             title="Create main disk",
+            key="main-disk",
+            after=["create"],
+            probe=_config_probe(ctx.vmid, f"^virtio0: .*size={_pve_size(ctx.config.disk_gb * 1024)}(,|$)"),
             argv=["qm", "set", ctx.vmid, "--virtio0", f"{ctx.config.storage}:{ctx.config.disk_gb}"],
         ),
         *_opencore_steps(ctx),
@@ -291,11 +353,22 @@ def _boot_steps(config: VmConfig, vmid: str) -> list[PlanStep]:
         PlanStep(
             title="Set boot order",
             argv=["qm", "set", vmid, "--boot", "order=ide2;virtio0;ide0"],
+            key="boot-order",
+            after=["main-disk", "opencore-import", "recovery-import"],
         ),
         PlanStep(
             title="Start VM",
             argv=["qm", "start", vmid],
             risk="action",
+            # qm start fails on a running VM
+            probe=["bash", "-c", f"qm status {shquote(vmid)} | grep -q 'status: running'"],
+            # Only once the VM is fully configured
+            key="start",
+            after=[
+                "profile", "efi", "boot-order",
+                *(["smbios"] if not config.no_smbios else []),
+                *(["vmgenid", "static-mac"] if config.apple_services else []),
+            ],
         ),
     ]
 
@@ -316,6 +389,8 @@ def _smbios_steps(config: VmConfig, vmid: str) -> list[PlanStep]:
     return [
         PlanStep(
             title="Set SMBIOS identity",
+            key="smbios",
+            after=["create"],
             argv=["qm", "set", vmid, "--smbios1", smbios_value],
         ),
     ]
@@ -328,15 +403,79 @@ def _apple_services_steps(config: VmConfig, vmid: str) -> list[PlanStep]:
     return [
         PlanStep(
             title="Configure vmgenid for Apple services",
+            key="vmgenid",
+            after=["create"],
             argv=["qm", "set", vmid, "--vmgenid", config.vmgenid],
         ),
         PlanStep(
             title="Configure static MAC for Apple services",
+            key="static-mac",
+            after=["create"],
             argv=["qm", "set", vmid, "--net0", f"{config.net_model},bridge={config.bridge},macaddr={config.static_mac},firewall=0"],
         ),
     ]
 
 
+# ── Plan optimization ───────────────────────────────────────────────
+
+
+def optimize_plan(steps: list[PlanStep]) -> list[PlanStep]:
+    """Merge runs of adjacent ``qm set`` steps on one VM into single calls.
+
+    Each ``qm`` call forks Perl and takes the VM's config lock, which
+    costs up to a second on a busy node.  A step joins the one before it
+    when both are plain ``qm set`` calls on the same VMID with the same
+    risk and resources, neither has a probe, they set no option in
+    common, and the later one waits for nothing the earlier one doesn't.
+    The merged step keeps the first step's name, so ``after`` references
+    to any of its parts point at it, and lists the original titles in
+    ``parts``.
+    """
+    deps = step_dependencies(steps)
+    merged: list[PlanStep] = []
+    members: list[set[int]] = []  # plan indices behind each merged step
+    alias: dict[str, str] = {}
+    for idx, step in enumerate(steps):
+        if merged and _can_merge(merged[-1], step) and deps[idx] <= deps[min(members[-1])] | members[-1]:
+            head = merged[-1]
+            merged[-1] = dataclasses.replace(
+                head,
+                title=f"{head.title} + {step.title}",
+                argv=head.argv + step.argv[3:],
+                key=head.name,
+                parts=(head.parts or [head.title]) + [step.title],
+            )
+            members[-1].add(idx)
+            alias[step.name] = head.name
+            continue
+        after = None if step.after is None else list(dict.fromkeys(alias.get(n, n) for n in step.after))
+        merged.append(dataclasses.replace(step, after=after))
+        members.append({idx})
+    return merged
+
+
+def _qm_set_options(step: PlanStep) -> list[str] | None:
+    """The option names of a ``qm set VMID --opt value ...`` step, else None."""
+    argv = step.argv
+    if argv[:2] != ["qm", "set"] or len(argv) < 5 or len(argv) % 2 == 0:
+        return None
+    options = argv[3::2]
+    return options if all(opt.startswith("--") for opt in options) else None
+
+
+def _can_merge(head: PlanStep, step: PlanStep) -> bool:
+    head_options, options = _qm_set_options(head), _qm_set_options(step)
+    return (
+        head_options is not None and options is not None
+        and head.argv[2] == step.argv[2]
+        # A probe would speak for the whole merged call
+        and head.probe is None and step.probe is None
+        and head.risk == step.risk
+        and sorted(head.resources) == sorted(step.resources)
+        and not set(head_options) & set(options)
+    )
+
+
 # ── VM Destroy (defined before services import to break circular dep) ─
 
 
@@ -402,12 +541,14 @@ def build_edit_plan(
     changes: EditChanges,
     start_after: bool = False,
     current_net0: str | None = None,
+    optimize: bool = True,
 ) -> list[PlanStep]:
     """Generate a plan to modify an existing macOS VM.
 
     Stops the VM, applies each requested change via ``qm set``/``qm resize``,
     then optionally starts the VM again.  *start_after* is False by default
-    so the caller controls when the VM comes back up.
+    so the caller controls when the VM comes back up.  With *optimize*,
+    the ``qm set`` changes run as one call (:func:`optimize_plan`).
     """
     if not any([changes.name, changes.cores, changes.memory_mb, changes.bridge, changes.disk_gb_add]):
         return []
@@ -453,7 +594,7 @@ def build_edit_plan(
             argv=["qm", "start", vid],
             risk="action",
         ))
-    return steps
+    return optimize_plan(steps) if optimize else steps
 
 
 # ── VM Clone ────────────────────────────────────────────────────────
@@ -492,13 +633,15 @@ def build_clone_plan(
     macos: str = "sequoia",
     apple_services: bool = True,
     current_net0: str | None = None,
+    optimize: bool = True,
 ) -> list[PlanStep]:
     """Generate a plan to clone a macOS VM with a fresh SMBIOS identity.
 
     Clones via ``qm clone --full``, then injects a newly generated serial,
     UUID, MLB, ROM, and vmgenid so the clone is treated as a distinct machine
     by Apple and by QEMU.  Without this step, iCloud/iMessage silently share
-    the source VM's identity and Apple may ban both.
+    the source VM's identity and Apple may ban both.  With *optimize*,
+    the identity changes run as one ``qm set`` (:func:`optimize_plan`).
     """
     src = str(src_vmid)
     dst = str(dst_vmid)
@@ -546,7 +689,7 @@ def build_clone_plan(
             ],
         ))
 
-    return steps
+    return optimize_plan(steps) if optimize else steps
 
 
 from .services import VmInfo, fetch_vm_info  # noqa: E402
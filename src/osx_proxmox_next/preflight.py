@@ -9,6 +9,7 @@ import shutil
 
 from .defaults import detect_cpu_vendor
 from .infrastructure import ProxmoxAdapter
+from .refresh import RefreshReport, describe_report
 
 log = logging.getLogger(__name__)
 
@@ -42,7 +43,6 @@ def _is_root() -> bool:
 _PROXMOX_BINARIES = ("qm", "pvesm", "pvesh", "qemu-img")
 
 _BUILD_BINARIES: dict[str, str] = {
-    "dmg2img": "dmg2img",
     "sgdisk": "gdisk",
     "partprobe": "parted",
     "losetup": "mount",
@@ -107,6 +107,15 @@ def _check_initcall_blacklist(cmdline_path: Path | None = None) -> PreflightChec
     )
 
 
+def _check_asset_cache(report_path: Path | None = None) -> PreflightCheck:
+    """Report the last ``assets refresh`` — informational (stale images are downloaded on demand)."""
+    return PreflightCheck(
+        name="Asset cache",
+        ok=True,
+        details=describe_report(RefreshReport.load(report_path)),
+    )
+
+
 def run_preflight() -> list[PreflightCheck]:
     checks: list[PreflightCheck] = []
     for cmd in _PROXMOX_BINARIES:
@@ -136,6 +145,7 @@ def run_preflight() -> list[PreflightCheck]:
     checks.append(_check_ignore_msrs())
     checks.append(_check_iommu())
     checks.append(_check_initcall_blacklist())
+    checks.append(_check_asset_cache())
 
     vendor = detect_cpu_vendor()
     checks.append(
@@ -0,0 +1,417 @@
+"""Serve ``qm``, ``pvesm`` and ``pvesh`` calls from the Proxmox VE REST API.
+
+Every ``qm``, ``pvesm`` or ``pvesh`` call starts Perl and loads the PVE
+modules before doing any work.  :class:`ProxmoxApiAdapter` sends the same
+requests to ``pveproxy`` instead, authenticated with an API token, over
+keep-alive HTTPS connections from :class:`~osx_proxmox_next.http_pool.ConnectionPool`,
+so a lookup costs one round trip on an open connection.
+
+It is a drop-in :class:`~osx_proxmox_next.infrastructure.ProxmoxAdapter`:
+:meth:`~ProxmoxAdapter.run` recognises the command lines the tool runs
+(``qm create/set/config/status/list/clone/destroy/start/stop``,
+``pvesm status/path`` and ``pvesh get/create/set/delete``), makes the
+matching API call and prints the reply the way the command would, so
+parsers and probes work unchanged.  Anything else, and options only
+``root@pam`` itself may set (``--args``), still runs the command.  Code
+that wants the data itself calls :meth:`~ProxmoxApiAdapter.api` or one of
+the typed helpers, which return the decoded JSON.
+
+If the API cannot be reached at all, the adapter logs it once and runs
+the commands from then on.
+
+Enabled from the environment (see :meth:`ProxmoxApiAdapter.from_env`)::
+
+    pveum user token add root@pam osx-next --privsep 0
+    export OSX_NEXT_API_TOKEN='root@pam!osx-next=<secret>'
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import socket
+import ssl
+import time
+import urllib.error
+import urllib.request
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote, urlencode
+
+from .http_pool import ConnectionPool
+from .infrastructure import (
+    _EXIT_CODE_TIMEOUT,
+    _SUBPROCESS_TIMEOUT,
+    OUTPUT_TAIL_LINES,
+    CommandResult,
+    OutputCallback,
+    ProxmoxAdapter,
+)
+
+log = logging.getLogger(__name__)
+
+DEFAULT_URL = "https://127.0.0.1:8006"
+# Every node's pveproxy certificate is signed by the cluster CA
+PVE_ROOT_CA = Path("/etc/pve/pve-root-ca.pem")
+
+# Seconds one HTTP request may take; tasks are waited for up to the adapter's timeout
+_REQUEST_TIMEOUT = 30
+_TASK_POLL_MAX = 0.5
+# What qm and pvesm exit with when the API call behind them dies
+_EXIT_CODE_API_ERROR = 255
+# The API refuses these to anyone but root@pam, tokens included; qm runs as root
+_ROOT_ONLY_OPTIONS = frozenset({"args", "hookscript", "lock"})
+_OPTION = re.compile(r"--?([a-z][a-z0-9_-]*)")
+_VERBS = {"get": "GET", "create": "POST", "set": "PUT", "delete": "DELETE"}
+
+_Call = Callable[[], str]
+
+
+class ProxmoxApiError(RuntimeError):
+    """The API answered with an error (*status* is its HTTP status)."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class ProxmoxApiUnavailable(ProxmoxApiError):
+    """The API could not be reached, or TLS to it failed."""
+
+
+class _TaskTimeout(ProxmoxApiError):
+    pass
+
+
+class ProxmoxApiAdapter(ProxmoxAdapter):
+    """A :class:`ProxmoxAdapter` that answers from the REST API (see module docstring).
+
+    *token* is ``USER@REALM!TOKENID=SECRET``.  *node* defaults to this
+    host's short name, which is what Proxmox names the local node.  The
+    server certificate is checked against *ca_file*, by default the
+    cluster CA when it exists, else the system trust store.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        url: str = DEFAULT_URL,
+        node: str | None = None,
+        ca_file: str | None = None,
+        timeout: float = _SUBPROCESS_TIMEOUT,
+    ) -> None:
+        self.token = token
+        self.base = url.rstrip("/") + "/api2/json"
+        self.node = node or socket.gethostname().split(".")[0]
+        self.timeout = timeout
+        if ca_file is None and PVE_ROOT_CA.exists():
+            ca_file = str(PVE_ROOT_CA)
+        self.pool = ConnectionPool(ssl_context=ssl.create_default_context(cafile=ca_file))
+        # Set once the API could not be reached; run() then uses the commands
+        self.unavailable = False
+
+    @classmethod
+    def from_env(cls) -> ProxmoxApiAdapter | None:
+        """The adapter configured by ``OSX_NEXT_API_*``, or None when no token is set.
+
+        ``OSX_NEXT_API_TOKEN`` enables it; ``OSX_NEXT_API_URL``,
+        ``OSX_NEXT_API_NODE`` and ``OSX_NEXT_API_CA`` override the
+        defaults.  A malformed token or unreadable CA file is logged and
+        the commands are used instead.
+        """
+        token = os.environ.get("OSX_NEXT_API_TOKEN", "").strip()
+        if not token:
+            return None
+        if "!" not in token or "=" not in token:
+            log.warning("OSX_NEXT_API_TOKEN is not USER@REALM!TOKENID=SECRET; using qm/pvesm instead")
+            return None
+        try:
+            return cls(
+                token,
+                url=os.environ.get("OSX_NEXT_API_URL") or DEFAULT_URL,
+                node=os.environ.get("OSX_NEXT_API_NODE") or None,
+                ca_file=os.environ.get("OSX_NEXT_API_CA") or None,
+            )
+        except (OSError, ssl.SSLError) as exc:
+            log.warning("Cannot set up the Proxmox API client (%s); using qm/pvesm instead", exc)
+            return None
+
+    # ── Structured calls ──
+
+    def api(self, method: str, path: str, **params: Any) -> Any:
+        """Call *path* (e.g. ``/cluster/nextid``) and return the ``data`` of the reply.
+
+        Parameters set to None are left out and booleans are sent as 1/0.
+        Raises :class:`ProxmoxApiError` for error replies and
+        :class:`ProxmoxApiUnavailable` when the API cannot be reached.
+        """
+        query = urlencode({k: int(v) if isinstance(v, bool) else v for k, v in params.items() if v is not None})
+        url = self.base + path
+        body = None
+        if method in ("POST", "PUT"):
+            body = query.encode()
+        elif query:
+            url += "?" + query
+        req = urllib.request.Request(
+            url, data=body, method=method, headers={"Authorization": f"PVEAPIToken={self.token}"},
+        )
+        try:
+            with self.pool.urlopen(req, timeout=_REQUEST_TIMEOUT) as resp:
+                payload = resp.read()
+        except urllib.error.HTTPError as exc:
+            raise ProxmoxApiError(exc.code, _error_message(exc)) from exc
+        except urllib.error.URLError as exc:
+            raise ProxmoxApiUnavailable(0, f"Cannot reach the Proxmox API at {self.base}: {exc.reason}") from exc
+        try:
+            return json.loads(payload)["data"]
+        except (ValueError, KeyError, TypeError) as exc:
+            raise ProxmoxApiError(200, f"Unexpected reply from {method} {path}") from exc
+
+    def next_vmid(self) -> int:
+        return int(self.api("GET", "/cluster/nextid"))
+
+    def list_vms(self) -> list[dict]:
+        return self.api("GET", f"/nodes/{self.node}/qemu")
+
+    def vm_status(self, vmid: int | str) -> dict:
+        return self.api("GET", f"/nodes/{self.node}/qemu/{vmid}/status/current")
+
+    def vm_config(self, vmid: int | str) -> dict:
+        return self.api("GET", f"/nodes/{self.node}/qemu/{vmid}/config")
+
+    def storage_status(self, content: str | None = None) -> list[dict]:
+        return self.api("GET", f"/nodes/{self.node}/storage", content=content)
+
+    def storage_path(self, volume: str) -> str:
+        """The file or device behind *volume* (``storage:name``), like ``pvesm path``."""
+        storage, _, name = volume.partition(":")
+        try:
+            return self.api("GET", f"/nodes/{self.node}/storage/{_q(storage)}/content/{_q(volume)}")["path"]
+        except ProxmoxApiUnavailable:
+            raise
+        except ProxmoxApiError:
+            # The content API only knows existing volumes; pvesm path also
+            # names ISOs that are still to be uploaded
+            if not name.startswith("iso/"):
+                raise
+            base = self.api("GET", f"/storage/{_q(storage)}").get("path")
+            if not base:
+                raise
+            return f"{base}/template/{name}"
+
+    def create_vm(self, vmid: int | str, **options: Any) -> list[str]:
+        """Create VM *vmid*; returns the task log, like the other VM actions."""
+        return self._task("POST", f"/nodes/{self.node}/qemu", vmid=vmid, **options)
+
+    def set_vm(self, vmid: int | str, **options: Any) -> list[str]:
+        # The asynchronous config call, which may allocate disks
+        return self._task("POST", f"/nodes/{self.node}/qemu/{vmid}/config", **options)
+
+    def clone_vm(self, vmid: int | str, newid: int | str, **options: Any) -> list[str]:
+        return self._task("POST", f"/nodes/{self.node}/qemu/{vmid}/clone", newid=newid, **options)
+
+    def destroy_vm(self, vmid: int | str, **options: Any) -> list[str]:
+        return self._task("DELETE", f"/nodes/{self.node}/qemu/{vmid}", **options)
+
+    def start_vm(self, vmid: int | str, **options: Any) -> list[str]:
+        return self._task("POST", f"/nodes/{self.node}/qemu/{vmid}/status/start", **options)
+
+    def stop_vm(self, vmid: int | str, **options: Any) -> list[str]:
+        return self._task("POST", f"/nodes/{self.node}/qemu/{vmid}/status/stop", **options)
+
+    def wait_task(self, upid: str) -> list[str]:
+        """Wait for task *upid* to end and return its log.
+
+        A task that fails raises :class:`ProxmoxApiError` carrying its
+        log; one still running after the adapter's timeout is stopped,
+        as a timed-out command is killed.
+        """
+        node = upid.split(":")[1] if upid.startswith("UPID:") else self.node
+        path = f"/nodes/{_q(node)}/tasks/{_q(upid)}"
+        deadline = time.monotonic() + self.timeout
+        delay = 0.02
+        while True:
+            status = self.api("GET", f"{path}/status")
+            if status.get("status") == "stopped":
+                break
+            if time.monotonic() >= deadline:
+                self.api("DELETE", path)
+                raise _TaskTimeout(0, f"Task timed out after {self.timeout:g}s: {upid}")
+            time.sleep(delay)
+            delay = min(delay * 2, _TASK_POLL_MAX)
+        entries = self.api("GET", f"{path}/log", limit=OUTPUT_TAIL_LINES)
+        lines = [entry.get("t", "") for entry in entries or []]
+        exitstatus = status.get("exitstatus", "")
+        # "WARNINGS: n" is a task that succeeded with warnings
+        if exitstatus != "OK" and not exitstatus.startswith("WARNINGS"):
+            raise ProxmoxApiError(500, "\n".join(lines) or exitstatus)
+        return [line for line in lines if line != "TASK OK"]
+
+    def _task(self, method: str, path: str, **params: Any) -> list[str]:
+        upid = self.api(method, path, **params)
+        return self.wait_task(upid) if upid else []
+
+    # ── Command lines ──
+
+    def run(self, argv: list[str], on_output: OutputCallback | None = None) -> CommandResult:
+        """Answer *argv* from the API when it is a call the API covers, else run it."""
+        call = None if self.unavailable else self._route(argv)
+        if call is None:
+            return super().run(argv, on_output)
+        try:
+            output = call()
+        except ProxmoxApiUnavailable as exc:
+            log.warning("%s; using qm/pvesm instead", exc)
+            self.unavailable = True
+            return super().run(argv, on_output)
+        except _TaskTimeout as exc:
+            return CommandResult(ok=False, returncode=_EXIT_CODE_TIMEOUT, output=str(exc))
+        except ProxmoxApiError as exc:
+            return CommandResult(ok=False, returncode=_EXIT_CODE_API_ERROR, output=str(exc))
+        if on_output is not None:
+            for line in output.splitlines():
+                on_output(line)
+        return CommandResult(ok=True, returncode=0, output=output)
+
+    def _route(self, argv: list[str]) -> _Call | None:
+        """The API call standing in for *argv*, or None to run the command."""
+        if len(argv) < 2:
+            return None
+        parsed = _parse_args(argv[2:])
+        if parsed is None:
+            return None
+        args, opts = parsed
+        tool, command = argv[0], argv[1]
+        if tool == "qm":
+            return self._route_qm(command, args, opts)
+        if tool == "pvesm":
+            if command == "status" and not args and set(opts) <= {"content", "storage", "target", "enabled"}:
+                return lambda: _render_storage_status(self.api("GET", f"/nodes/{self.node}/storage", **opts))
+            if command == "path" and len(args) == 1 and not opts:
+                return lambda: self.storage_path(args[0])
+        if tool == "pvesh" and command in _VERBS and len(args) == 1 and args[0].startswith("/"):
+            output_format = opts.pop("output-format", "text")
+            return lambda: _render_pvesh(self.api(_VERBS[command], args[0], **opts), output_format)
+        return None
+
+    def _route_qm(self, command: str, args: list[str], opts: dict[str, str]) -> _Call | None:
+        if not all(arg.isdigit() for arg in args) or _ROOT_ONLY_OPTIONS & opts.keys():
+            return None
+        if command == "list" and not args and not opts:
+            return lambda: _render_vm_list(self.list_vms())
+        if len(args) == 1:
+            vmid = args[0]
+            if command == "status" and not opts:
+                return lambda: f"status: {self.vm_status(vmid)['status']}"
+            if command == "config" and not opts:
+                return lambda: _render_config(self.vm_config(vmid))
+            action = {
+                "create": self.create_vm, "set": self.set_vm, "destroy": self.destroy_vm,
+                "start": self.start_vm, "stop": self.stop_vm,
+            }.get(command)
+            if action is not None:
+                return lambda: "\n".join(action(vmid, **opts))
+        if command == "clone" and len(args) == 2:
+            return lambda: "\n".join(self.clone_vm(args[0], args[1], **opts))
+        return None
+
+
+def _q(segment: str) -> str:
+    return quote(segment, safe="")
+
+
+def _parse_args(tokens: list[str]) -> tuple[list[str], dict[str, str]] | None:
+    """Split CLI arguments into positionals and ``--name value`` options.
+
+    An option without a value is a flag (``--purge``) and becomes "1".
+    Returns None for anything the API path should not guess at, such as
+    an option given twice.
+    """
+    args: list[str] = []
+    opts: dict[str, str] = {}
+    i = 0
+    while i < len(tokens):
+        match = _OPTION.fullmatch(tokens[i])
+        if match is None:
+            if opts:  # positionals after options: not a form the tool uses
+                return None
+            args.append(tokens[i])
+            i += 1
+            continue
+        name = match.group(1)
+        if name in opts:
+            return None
+        if i + 1 < len(tokens) and _OPTION.fullmatch(tokens[i + 1]) is None:
+            opts[name] = tokens[i + 1]
+            i += 2
+        else:
+            opts[name] = "1"
+            i += 1
+    return args, opts
+
+
+def _error_message(exc: urllib.error.HTTPError) -> str:
+    # pveproxy puts the error in the status line; parameter errors also in the body
+    message = str(exc.reason or f"HTTP {exc.code}").strip()
+    try:
+        errors = json.loads(exc.read() or b"{}").get("errors") or {}
+    except (ValueError, AttributeError):
+        errors = {}
+    lines = [f"{exc.code} {message}"] + [f"{name}: {str(text).strip()}" for name, text in sorted(errors.items())]
+    return "\n".join(lines)
+
+
+def _render_config(config: dict) -> str:
+    """``qm config`` output: one ``key: value`` line per option, sorted."""
+    lines = []
+    for key in sorted(config):
+        if key == "digest":
+            continue
+        value = config[key]
+        if key == "description":
+            value = str(value).replace("\n", "%0A")
+        lines.append(f"{key}: {value}")
+    return "\n".join(lines)
+
+
+def _render_vm_list(vms: list[dict]) -> str:
+    """``qm list`` output, in its columns."""
+    lines = ["%10s %-20s %-10s %-10s %12s %-10s" % ("VMID", "NAME", "STATUS", "MEM(MB)", "BOOTDISK(GB)", "PID")]
+    for vm in sorted(vms, key=lambda vm: int(vm["vmid"])):
+        lines.append("%10s %-20s %-10s %-10s %12.2f %-10s" % (
+            vm["vmid"],
+            str(vm.get("name", ""))[:20],
+            vm.get("qmpstatus") or vm.get("status", ""),
+            int(vm.get("maxmem") or 0) // (1024 * 1024),
+            int(vm.get("maxdisk") or 0) / (1024 ** 3),
+            vm.get("pid") or 0,
+        ))
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def _render_storage_status(storages: list[dict]) -> str:
+    """``pvesm status`` output: sizes in KiB, status active, inactive or disabled."""
+    width = max([len("Name")] + [len(s["storage"]) for s in storages])
+    lines = [f"{'Name':<{width}} {'Type':>10} {'Status':>10} {'Total':>15} {'Used':>15} {'Available':>15} {'%':>8}"]
+    for s in sorted(storages, key=lambda s: s["storage"]):
+        if not s.get("enabled", 1):
+            status = "disabled"
+        else:
+            status = "active" if s.get("active") else "inactive"
+        total, used, avail = (int(s.get(k) or 0) // 1024 for k in ("total", "used", "avail"))
+        percent = 100 * used / total if total else 0.0
+        lines.append(
+            f"{s['storage']:<{width}} {s.get('type', ''):>10} {status:>10} "
+            f"{total:>15} {used:>15} {avail:>15} {percent:>7.2f}%"
+        )
+    return "\n".join(lines)
+
+
+def _render_pvesh(data: Any, output_format: str) -> str:
+    if output_format == "json-pretty":
+        return json.dumps(data, indent=4, sort_keys=True)
+    if output_format == "json" or isinstance(data, (dict, list)):
+        return json.dumps(data, sort_keys=True)
+    return "" if data is None else str(data)
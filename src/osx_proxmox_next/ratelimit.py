@@ -0,0 +1,194 @@
+"""Bandwidth cap for downloads, with optional time-of-day windows.
+
+A limit is written as comma-separated items.  A bare rate (``20M``) is the
+cap outside any window, and ``HH:MM-HH:MM=RATE`` sets the cap inside a
+local-time window, which may cross midnight.  Rates use the same suffixes
+as ``--cache-budget`` and mean bytes per second, and ``0`` means
+unlimited::
+
+    20M                        # always 20 MiB/s
+    08:00-18:00=5M,0           # 5 MiB/s during office hours, else unlimited
+    08:00-18:00=5M,22:00-06:00=0,20M
+
+Every transfer with the same limit draws from one shared token bucket, so
+OpenCore and recovery downloading in parallel (and every segment of a
+multi-connection download) stay under the cap together.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from .asset_store import parse_size
+
+log = logging.getLogger(__name__)
+
+# Burst allowance: a full bucket holds this many seconds of traffic
+_BURST_SECONDS = 0.25
+# The schedule is re-evaluated at most this often
+_SCHEDULE_RECHECK = 30.0
+# A bucket counts as throttling for this long after it last made a reader wait
+_THROTTLE_HOLD = 1.0
+
+_TIMES = r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})"
+_WINDOW_RE = re.compile(rf"^\s*{_TIMES}\s*=\s*(.+)$")
+_TIMES_RE = re.compile(rf"^\s*{_TIMES}\s*$")
+
+
+@dataclass(frozen=True)
+class RateWindow:
+    start: int  # minutes after local midnight
+    end: int
+    rate: int  # bytes/s, 0 = unlimited
+
+    def contains(self, minute: int) -> bool:
+        if self.start <= self.end:
+            return self.start <= minute < self.end
+        return minute >= self.start or minute < self.end
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    default: int = 0  # bytes/s outside every window, 0 = unlimited
+    windows: tuple[RateWindow, ...] = ()
+
+    def rate_at(self, minute: int) -> int:
+        """Cap in force *minute* minutes after local midnight; the first matching window wins."""
+        for window in self.windows:
+            if window.contains(minute):
+                return window.rate
+        return self.default
+
+    def current_rate(self) -> int:
+        now = datetime.now()
+        return self.rate_at(now.hour * 60 + now.minute)
+
+    @property
+    def unlimited(self) -> bool:
+        return not self.default and not any(w.rate for w in self.windows)
+
+
+def parse_rate(text: str) -> int:
+    """Parse ``"5M"``, ``"5M/s"`` or ``"800K"`` into bytes per second."""
+    value = text.strip()
+    if value.lower().endswith("/s"):
+        value = value[:-2]
+    return parse_size(value)
+
+
+def parse_rate_limit(text: str) -> RateLimit:
+    default = 0
+    windows: list[RateWindow] = []
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        match = _WINDOW_RE.match(item)
+        if not match:
+            default = parse_rate(item)
+            continue
+        *times, rate = match.groups()
+        start, end = _minutes(item, *times, expected="HH:MM-HH:MM=RATE")
+        windows.append(RateWindow(start, end, parse_rate(rate)))
+    return RateLimit(default, tuple(windows))
+
+
+def parse_window(text: str) -> RateWindow:
+    """Parse a bare ``HH:MM-HH:MM`` local-time window; its rate is 0."""
+    match = _TIMES_RE.match(text)
+    if not match:
+        raise ValueError(f"Invalid time window: {text!r} (expected HH:MM-HH:MM)")
+    return RateWindow(*_minutes(text, *match.groups(), expected="HH:MM-HH:MM"), 0)
+
+
+def _minutes(item: str, h1: str, m1: str, h2: str, m2: str, expected: str) -> tuple[int, int]:
+    start, end = int(h1) * 60 + int(m1), int(h2) * 60 + int(m2)
+    if int(h1) > 23 or int(h2) > 24 or int(m1) > 59 or int(m2) > 59 or end > 24 * 60:
+        raise ValueError(f"Invalid time window: {item!r} (expected {expected})")
+    return start, end
+
+
+def rate_limit_from_env() -> RateLimit | None:
+    """Limit from ``OSX_NEXT_LIMIT_RATE``, or None when unset or invalid."""
+    text = os.environ.get("OSX_NEXT_LIMIT_RATE", "").strip()
+    if not text:
+        return None
+    try:
+        return parse_rate_limit(text)
+    except ValueError as exc:
+        log.warning("Ignoring OSX_NEXT_LIMIT_RATE: %s", exc)
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket enforcing a :class:`RateLimit`.
+
+    :meth:`consume` books bytes against the bucket and sleeps off any debt
+    outside the lock, so concurrent readers share the rate fairly instead
+    of serialising on one another.
+    """
+
+    def __init__(self, limit: RateLimit) -> None:
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._rate = 0
+        self._checked = float("-inf")
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+        self._last_wait = float("-inf")
+
+    @property
+    def rate(self) -> int:
+        """Cap currently in force, in bytes/s (0 = unlimited)."""
+        with self._lock:
+            return self._refresh(time.monotonic())
+
+    @property
+    def throttling(self) -> bool:
+        """True while a reader is waiting, and for a second after."""
+        return time.monotonic() - self._last_wait < _THROTTLE_HOLD
+
+    def consume(self, nbytes: int) -> float:
+        """Account for *nbytes* just read; return the seconds slept."""
+        with self._lock:
+            now = time.monotonic()
+            rate = self._refresh(now)
+            if not rate:
+                return 0.0
+            capacity = max(rate * _BURST_SECONDS, 1.0)
+            self._tokens = min(capacity, self._tokens + (now - self._stamp) * rate) - nbytes
+            self._stamp = now
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+            if wait:
+                self._last_wait = now + wait
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def _refresh(self, now: float) -> int:
+        if now - self._checked >= _SCHEDULE_RECHECK:
+            rate = self.limit.current_rate()
+            if rate != self._rate:
+                # A new cap starts with an empty bucket and no debt
+                self._tokens = 0.0
+                self._stamp = now
+            self._rate = rate
+            self._checked = now
+        return self._rate
+
+
+_buckets: dict[RateLimit, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(limit: RateLimit | None) -> TokenBucket | None:
+    """The process-wide bucket for *limit*, or None when there is no cap."""
+    if limit is None or limit.unlimited:
+        return None
+    with _buckets_lock:
+        bucket = _buckets.get(limit)
+        if bucket is None:
+            bucket = _buckets[limit] = TokenBucket(limit)
+        return bucket
@@ -0,0 +1,232 @@
+"""Keep the asset cache warm for every supported macOS release.
+
+``osx-next-cli assets refresh`` asks GitHub and Apple which OpenCore and
+recovery builds they currently serve, compares them with the images in the
+asset store, and downloads whatever is missing or out of date, so the
+wizard and ``apply`` find everything cached.  The checks are cheap: release
+metadata goes through the metadata cache, and a recovery build is
+identified by its chunklist digest, a few kilobytes.  Downloads can be held
+to an off-peak window, outside of which stale images are only reported.
+
+Each run is saved as a :class:`RefreshReport` in
+:func:`~osx_proxmox_next.defaults.cache_dir`, which ``assets status`` and
+preflight read back without touching the network.
+"""
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import time
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from .asset_store import AssetEntry, AssetStore
+from .defaults import cache_dir
+from .domain import SUPPORTED_MACOS
+from .downloader import (
+    DownloadError,
+    DownloadOptions,
+    ProgressCallback,
+    UpstreamBuild,
+    download_opencore,
+    download_recovery,
+    opencore_upstream,
+    recovery_upstream,
+)
+from .ratelimit import RateWindow
+
+log = logging.getLogger(__name__)
+
+REPORT_NAME = "refresh.json"
+
+CURRENT = "current"
+STALE = "stale"
+MISSING = "missing"
+UNKNOWN = "unknown"
+
+
+@dataclass
+class AssetStatus:
+    macos: str
+    kind: str  # "opencore" | "recovery"
+    state: str  # CURRENT | STALE | MISSING | UNKNOWN
+    name: str = ""
+    cached: str = ""  # tag (OpenCore) or chunklist digest (recovery) on disk
+    upstream: str = ""  # the same for the build upstream serves now
+    detail: str = ""
+
+    @property
+    def label(self) -> str:
+        return f"{self.macos} {self.kind}"
+
+
+@dataclass
+class RefreshReport:
+    checked_at: float = 0.0
+    # Last run that left every image current; 0 = never
+    refreshed_at: float = 0.0
+    assets: list[AssetStatus] = field(default_factory=list)
+
+    @property
+    def up_to_date(self) -> bool:
+        return bool(self.assets) and all(a.state == CURRENT for a in self.assets)
+
+    @property
+    def outdated(self) -> list[AssetStatus]:
+        return [a for a in self.assets if a.state != CURRENT]
+
+    def save(self, path: Path | None = None) -> None:
+        path = path or cache_dir() / REPORT_NAME
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps({"version": 1, **asdict(self)}, indent=1), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as exc:
+            log.warning("Cannot save refresh report %s: %s", path, exc)
+
+    @classmethod
+    def load(cls, path: Path | None = None) -> RefreshReport | None:
+        path = path or cache_dir() / REPORT_NAME
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return cls(
+                checked_at=float(data.get("checked_at", 0)),
+                refreshed_at=float(data.get("refreshed_at", 0)),
+                assets=[AssetStatus(**raw) for raw in data.get("assets", [])],
+            )
+        except (OSError, ValueError, TypeError, AttributeError):
+            return None
+
+
+def check_assets(
+    dest_dir: Path,
+    releases: Iterable[str] = SUPPORTED_MACOS,
+    options: DownloadOptions | None = None,
+) -> list[AssetStatus]:
+    """Compare the cached images in *dest_dir* with what upstream serves now."""
+    opts = options or DownloadOptions()
+    store = AssetStore(budget=opts.cache_budget)
+    cached = {Path(entry.path): entry for entry in store.entries()}
+    statuses: list[AssetStatus] = []
+    for macos in releases:
+        for kind in ("opencore", "recovery"):
+            try:
+                if kind == "opencore":
+                    build = opencore_upstream(macos, offline=opts.offline)
+                else:
+                    if opts.offline:
+                        raise DownloadError("Offline mode: cannot ask Apple for the current recovery build.")
+                    build = recovery_upstream(macos)
+            except DownloadError as exc:
+                statuses.append(AssetStatus(macos, kind, UNKNOWN, detail=str(exc)))
+                continue
+            statuses.append(_compare(macos, kind, build, dest_dir / build.name, cached.get(dest_dir / build.name)))
+    return statuses
+
+
+def _compare(macos: str, kind: str, build: UpstreamBuild, path: Path, entry: AssetEntry | None) -> AssetStatus:
+    status = AssetStatus(macos, kind, CURRENT, name=build.name, upstream=build.tag)
+    if entry is None:
+        if path.exists():
+            # Placed by hand: the downloader uses it as is, so leave it alone
+            status.state, status.detail = UNKNOWN, "not downloaded by osx-next; left as is"
+        else:
+            status.state = MISSING
+        return status
+    status.cached = entry.tag
+    # OpenCore images are never edited, so their size is a second check that
+    # catches an asset re-uploaded under the same release tag
+    resized = kind == "opencore" and build.size and entry.size != build.size
+    if entry.tag != build.tag or entry.url != build.url or resized:
+        status.state = STALE
+    return status
+
+
+def refresh_assets(
+    dest_dir: Path,
+    releases: Iterable[str] = SUPPORTED_MACOS,
+    options: DownloadOptions | None = None,
+    window: RateWindow | None = None,
+    check_only: bool = False,
+    on_progress: ProgressCallback = None,
+    report_path: Path | None = None,
+) -> RefreshReport:
+    """Check every image and download the missing or stale ones.
+
+    Downloads only start inside *window* (local time) when one is given.
+    The report is saved for ``assets status`` and preflight and returned.
+    """
+    opts = options or DownloadOptions()
+    previous = RefreshReport.load(report_path)
+    report = RefreshReport(checked_at=time.time(), refreshed_at=previous.refreshed_at if previous else 0.0)
+    report.assets = check_assets(dest_dir, releases, opts)
+
+    pending = [a for a in report.assets if a.state in (STALE, MISSING)]
+    if pending and not check_only:
+        now = datetime.now()
+        if window is not None and not window.contains(now.hour * 60 + now.minute):
+            for status in pending:
+                status.detail = f"waiting for the {_format_window(window)} download window"
+        else:
+            # A stale image must come from upstream; a missing one may come from a peer
+            refresh = dataclasses.replace(opts, refresh=True)
+            # Releases can share one file (the OpenCore ISO); fetch it once for all of them
+            groups: dict[tuple[str, str], list[AssetStatus]] = {}
+            for status in pending:
+                groups.setdefault((status.kind, status.name), []).append(status)
+            for group in groups.values():
+                stale = any(status.state == STALE for status in group)
+                _download(group, dest_dir, refresh if stale else opts, on_progress)
+
+    if report.up_to_date:
+        report.refreshed_at = report.checked_at
+    report.save(report_path)
+    return report
+
+
+def _download(
+    group: list[AssetStatus], dest_dir: Path, options: DownloadOptions, on_progress: ProgressCallback,
+) -> None:
+    """Download the file behind *group*, statuses of one name, and update them all."""
+    first = group[0]
+    fetch = download_opencore if first.kind == "opencore" else download_recovery
+    log.info("Refreshing %s (%s)", first.name, ", ".join(status.label for status in group))
+    try:
+        fetch(first.macos, dest_dir, on_progress=on_progress, options=options)
+    except DownloadError as exc:
+        log.warning("Refreshing %s failed: %s", first.name, exc)
+        for status in group:
+            status.detail = f"download failed: {exc}"
+        return
+    for status in group:
+        status.state, status.cached, status.detail = CURRENT, status.upstream, "downloaded"
+
+
+def describe_report(report: RefreshReport | None, now: float | None = None) -> str:
+    """One-line summary for preflight and ``assets status``."""
+    if report is None or not report.assets:
+        return "Never refreshed; run: osx-next-cli assets refresh"
+    now = time.time() if now is None else now
+    checked = f"checked {_format_age(now - report.checked_at)} ago"
+    if report.up_to_date:
+        return f"All {len(report.assets)} images current ({checked})"
+    outdated = ", ".join(f"{a.label} {a.state}" for a in report.outdated)
+    return f"{outdated} ({checked}); run: osx-next-cli assets refresh"
+
+
+def _format_age(seconds: float) -> str:
+    minutes = max(int(seconds // 60), 0)
+    if minutes < 60:
+        return f"{minutes}m"
+    if minutes < 48 * 60:
+        return f"{minutes // 60}h"
+    return f"{minutes // (24 * 60)}d"
+
+
+def _format_window(window: RateWindow) -> str:
+    return f"{window.start // 60:02d}:{window.start % 60:02d}-{window.end // 60:02d}:{window.end % 60:02d}"
@@ -2,9 +2,9 @@ from . import detection_service
 from .detection_service import detect_storage_targets, detect_next_vmid, list_macos_vms, VmInfo, fetch_vm_info
 from .download_service import run_download_worker, check_assets
 from .preflight_service import run_preflight_worker
-from .install_service import run_dry_apply, run_live_install
-from .destroy_service import run_destroy_worker
-from .edit_service import run_edit_worker
+from .install_service import run_dry_apply, run_live_install, run_live_install_async
+from .destroy_service import run_destroy_async, run_destroy_worker
+from .edit_service import run_edit_async, run_edit_worker
 from .proxmox_service import get_proxmox_adapter
 
 __all__ = [
@@ -19,7 +19,10 @@ __all__ = [
     "run_preflight_worker",
     "run_dry_apply",
     "run_live_install",
+    "run_live_install_async",
     "run_destroy_worker",
+    "run_destroy_async",
     "run_edit_worker",
+    "run_edit_async",
     "get_proxmox_adapter",
 ]
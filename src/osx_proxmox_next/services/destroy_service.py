@@ -1,16 +1,18 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 from collections.abc import Callable
 
-from ..executor import ApplyResult, StepResult, apply_plan
+from ..executor import ApplyResult, StepResult, apply_plan, apply_plan_async
 from ..domain import PlanStep
+from ..infrastructure import AsyncProxmoxAdapter
 from ..planner import build_destroy_plan
 from ..rollback import RollbackSnapshot, create_snapshot
 
 log = logging.getLogger(__name__)
 
-__all__ = ["run_destroy_worker"]
+__all__ = ["run_destroy_async", "run_destroy_worker"]
 
 
 def run_destroy_worker(
@@ -27,3 +29,16 @@ def run_destroy_worker(
     steps = build_destroy_plan(vmid, purge=purge)
     result = apply_plan(steps, execute=True, on_step=on_step)
     return result, snapshot
+
+
+async def run_destroy_async(
+    vmid: int,
+    purge: bool = False,
+    on_step: Callable[[int, int, PlanStep, StepResult | None], None] | None = None,
+    adapter: AsyncProxmoxAdapter | None = None,
+) -> tuple[ApplyResult, RollbackSnapshot | None]:
+    """:func:`run_destroy_worker` as a coroutine; *on_step* runs on the event loop."""
+    snapshot = await asyncio.to_thread(create_snapshot, vmid)
+    steps = build_destroy_plan(vmid, purge=purge)
+    result = await apply_plan_async(steps, execute=True, adapter=adapter, on_step=on_step)
+    return result, snapshot
@@ -8,6 +8,7 @@ from dataclasses import dataclass
 from ..defaults import DEFAULT_STORAGE
 from ..domain import DEFAULT_VMID, MIN_VMID, MAX_VMID
 from ..infrastructure import ProxmoxAdapter
+from ..proxmox_api import ProxmoxApiAdapter, ProxmoxApiError
 from .proxmox_service import get_proxmox_adapter
 
 log = logging.getLogger(__name__)
@@ -50,20 +51,34 @@ def fetch_vm_info(vmid: int, adapter: ProxmoxAdapter | None = None) -> VmInfo |
 def detect_storage_targets(adapter: ProxmoxAdapter | None = None) -> list[str]:
     """Return active storage targets that support disk images.
 
+    A :class:`ProxmoxApiAdapter` reads the storage list from the API.
     Falls back to ``[DEFAULT_STORAGE, "local"]`` when pvesm is unavailable.
     """
     pve = adapter or get_proxmox_adapter()
+    if isinstance(pve, ProxmoxApiAdapter) and not pve.unavailable:
+        try:
+            storages = pve.storage_status(content="images")
+        except ProxmoxApiError as exc:
+            log.debug("Failed to detect storage targets via the API: %s", exc)
+        else:
+            return _storage_targets([s["storage"] for s in storages if s.get("active")])
     res = pve.pvesm("status", "-content", "images")
     if not res.ok:
         log.debug("Failed to detect storage targets: %s", res.output)
         return [DEFAULT_STORAGE, "local"]
-    targets: list[str] = []
+    active: list[str] = []
     for line in res.output.splitlines()[1:]:
         parts = line.split()
         if len(parts) >= 3 and parts[2] == "active":
-            name = parts[0]
-            if name not in targets:
-                targets.append(name)
+            active.append(parts[0])
+    return _storage_targets(active)
+
+
+def _storage_targets(active: list[str]) -> list[str]:
+    targets: list[str] = []
+    for name in active:
+        if name not in targets:
+            targets.append(name)
     if DEFAULT_STORAGE not in targets:
         targets.insert(0, DEFAULT_STORAGE)
     return targets[:5]
@@ -72,10 +87,18 @@ def detect_storage_targets(adapter: ProxmoxAdapter | None = None) -> list[str]:
 def detect_next_vmid(adapter: ProxmoxAdapter | None = None) -> int:
     """Return the next available VMID from the Proxmox cluster.
 
-    Tries ``pvesh get /cluster/nextid`` first, then falls back to
+    Asks the API directly when *adapter* is a :class:`ProxmoxApiAdapter`,
+    then tries ``pvesh get /cluster/nextid``, then falls back to
     ``qm list`` + max+1.  Returns ``DEFAULT_VMID`` when both fail.
     """
     pve = adapter or get_proxmox_adapter()
+    if isinstance(pve, ProxmoxApiAdapter) and not pve.unavailable:
+        try:
+            vmid = pve.next_vmid()
+            if MIN_VMID <= vmid <= MAX_VMID:
+                return vmid
+        except (ProxmoxApiError, ValueError) as exc:
+            log.debug("Failed to get next VMID via the API: %s", exc)
     res = pve.pvesh("get", "/cluster/nextid")
     if res.ok:
         output = res.output.strip()
@@ -2,12 +2,13 @@ from __future__ import annotations
 
 import logging
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from ..assets import AssetCheck, required_assets
 from ..defaults import DEFAULT_ISO_DIR
 from ..domain import VmConfig
-from ..downloader import DownloadError, DownloadProgress, download_opencore, download_recovery
+from ..downloader import DownloadError, DownloadOptions, DownloadProgress, download_opencore, download_recovery
 
 log = logging.getLogger(__name__)
 
@@ -18,34 +19,54 @@ def run_download_worker(
     config: VmConfig,
     missing: list[AssetCheck],
     on_progress: Callable[[str, int], None],
+    options: DownloadOptions | None = None,
 ) -> list[str]:
-    """Download missing assets and return a list of error strings.
+    """Download missing assets concurrently and return a list of error strings.
 
-    *on_progress(phase, pct)* is called on the background thread — callers
-    that need to update UI must dispatch to the main thread themselves.
+    OpenCore and recovery run on separate threads, each reporting under its
+    own phase, so the recovery fetch (and its DMG conversion) no longer
+    queues behind the OpenCore download.  Errors keep the order of *missing*.
+
+    *on_progress(phase, pct)* is called on the worker threads, only when a
+    phase's percentage changes — callers that need to update UI must
+    dispatch to the main thread themselves.
     """
     dest_dir = Path(config.iso_dir or DEFAULT_ISO_DIR)
-    errors: list[str] = []
+    # The downloader already coalesces events; this drops the ones that
+    # would not move a percentage display
+    last_pct: dict[str, int] = {}
 
     def _progress_cb(p: DownloadProgress) -> None:
         if p.total > 0:
             pct = int(p.downloaded * 100 / p.total)
-            on_progress(p.phase, pct)
+            if last_pct.get(p.phase) != pct:
+                last_pct[p.phase] = pct
+                on_progress(p.phase, pct)
 
+    jobs: list[tuple[str, Callable[..., Path]]] = []
     for asset in missing:
         if not asset.downloadable:
             continue
         if "OpenCore" in asset.name:
-            try:
-                download_opencore(config.macos, dest_dir, on_progress=_progress_cb)
-            except DownloadError as exc:
-                errors.append(f"OpenCore: {exc}")
+            jobs.append(("OpenCore", download_opencore))
         elif "recovery" in asset.name.lower() or "installer" in asset.name.lower():  # pragma: no branch
-            try:
-                download_recovery(config.macos, dest_dir, on_progress=_progress_cb)
-            except DownloadError as exc:
-                errors.append(f"Recovery: {exc}")
+            jobs.append(("Recovery", download_recovery))
+    if not jobs:
+        return []
 
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = [
+            (label, pool.submit(fn, config.macos, dest_dir, on_progress=_progress_cb, options=options))
+            for label, fn in jobs
+        ]
+
+    errors: list[str] = []
+    for label, future in futures:
+        try:
+            future.result()
+        # OSError: the image store or ISO directory failed, not the transfer
+        except (DownloadError, OSError) as exc:
+            errors.append(f"{label}: {exc}")
     return errors
 
 
@@ -3,12 +3,13 @@ from __future__ import annotations
 import logging
 from collections.abc import Callable
 
-from ..executor import ApplyResult, StepResult, apply_plan
+from ..executor import ApplyResult, StepResult, apply_plan, apply_plan_async
 from ..domain import EditChanges, PlanStep
+from ..infrastructure import AsyncProxmoxAdapter
 
 log = logging.getLogger(__name__)
 
-__all__ = ["run_edit_worker"]
+__all__ = ["run_edit_async", "run_edit_worker"]
 
 
 def run_edit_worker(
@@ -28,3 +29,17 @@ def run_edit_worker(
     from ..planner import build_edit_plan  # lazy — avoids planner ↔ services circular import
     steps = build_edit_plan(vmid, changes, start_after=start_after, current_net0=current_net0)
     return apply_plan(steps, execute=True, on_step=on_step)
+
+
+async def run_edit_async(
+    vmid: int,
+    changes: EditChanges,
+    start_after: bool = False,
+    on_step: Callable[[int, int, PlanStep, StepResult | None], None] | None = None,
+    current_net0: str | None = None,
+    adapter: AsyncProxmoxAdapter | None = None,
+) -> ApplyResult:
+    """:func:`run_edit_worker` as a coroutine; *on_step* runs on the event loop."""
+    from ..planner import build_edit_plan  # lazy — avoids planner ↔ services circular import
+    steps = build_edit_plan(vmid, changes, start_after=start_after, current_net0=current_net0)
+    return await apply_plan_async(steps, execute=True, adapter=adapter, on_step=on_step)
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 from collections.abc import Callable
 
-from ..executor import ApplyResult, StepResult, apply_plan
+from ..executor import ApplyResult, StepResult, apply_plan, apply_plan_async
 from ..domain import PlanStep
+from ..infrastructure import AsyncProxmoxAdapter
 from ..rollback import RollbackSnapshot, create_snapshot
 
 log = logging.getLogger(__name__)
 
-__all__ = ["run_dry_apply", "run_live_install"]
+__all__ = ["run_dry_apply", "run_live_install", "run_live_install_async"]
 
 
 def run_dry_apply(
@@ -27,12 +29,32 @@ def run_live_install(
     vmid: int,
     steps: list[PlanStep],
     on_step: Callable[[int, int, PlanStep, StepResult | None], None] | None = None,
+    on_output: Callable[[int, PlanStep, str], None] | None = None,
+    resume: bool = False,
 ) -> tuple[ApplyResult, RollbackSnapshot | None]:
     """Create a rollback snapshot then execute the live install plan.
 
     Returns (ApplyResult, snapshot).
     *on_step* is called on the background thread after each step.
+    *on_output* receives each line of step output as it is printed.
+    With *resume*, steps a failed run of the same plan completed are skipped.
     """
     snapshot = create_snapshot(vmid)
-    result = apply_plan(steps, execute=True, on_step=on_step)
+    result = apply_plan(steps, execute=True, on_step=on_step, on_output=on_output, resume=resume)
+    return result, snapshot
+
+
+async def run_live_install_async(
+    vmid: int,
+    steps: list[PlanStep],
+    on_step: Callable[[int, int, PlanStep, StepResult | None], None] | None = None,
+    on_output: Callable[[int, PlanStep, str], None] | None = None,
+    adapter: AsyncProxmoxAdapter | None = None,
+    resume: bool = False,
+) -> tuple[ApplyResult, RollbackSnapshot | None]:
+    """:func:`run_live_install` as a coroutine; callbacks run on the event loop."""
+    snapshot = await asyncio.to_thread(create_snapshot, vmid)
+    result = await apply_plan_async(
+        steps, execute=True, adapter=adapter, on_step=on_step, on_output=on_output, resume=resume,
+    )
     return result, snapshot
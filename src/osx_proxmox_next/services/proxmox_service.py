@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from ..infrastructure import ProxmoxAdapter
+from ..proxmox_api import ProxmoxApiAdapter
 
 __all__ = ["get_proxmox_adapter"]
 
@@ -8,8 +9,12 @@ _pve: ProxmoxAdapter | None = None
 
 
 def get_proxmox_adapter() -> ProxmoxAdapter:
-    """Lazy singleton ProxmoxAdapter — avoids import-time side effects."""
+    """Lazy singleton ProxmoxAdapter — avoids import-time side effects.
+
+    With ``OSX_NEXT_API_TOKEN`` set this is a :class:`ProxmoxApiAdapter`,
+    which answers qm/pvesm/pvesh calls from the REST API.
+    """
     global _pve  # noqa: PLW0603
     if _pve is None:
-        _pve = ProxmoxAdapter()
+        _pve = ProxmoxApiAdapter.from_env() or ProxmoxAdapter()
     return _pve
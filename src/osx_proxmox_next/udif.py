@@ -0,0 +1,394 @@
+"""Built-in UDIF (``.dmg``) to raw disk image converter.
+
+Replaces the external ``dmg2img`` tool for recovery images.  A UDIF image
+ends with a 512-byte ``koly`` trailer pointing at an XML property list.
+The plist's ``blkx`` entries each hold a ``mish`` table mapping runs of
+output sectors to compressed byte ranges of the data fork.  Every run
+decompresses independently, so runs are spread over a process pool and
+written straight to their final offset in the output.  Zero-fill runs are
+never written, and neither are zero-filled stretches inside decoded runs
+(free space in the recovery volume), so the output keeps them as holes
+and :func:`disk_usage` reports far fewer allocated bytes than its size.
+
+:class:`StreamConverter` does the same while the DMG is still arriving:
+bytes are fed in file order and each run is decoded as soon as its
+compressed range is complete, so the DMG never has to exist on disk.
+
+Supported run types: zero-fill, raw, ADC, zlib, bzip2 and LZMA.  LZFSE
+runs are rejected with :class:`UdifError`.
+"""
+from __future__ import annotations
+
+import bz2
+import lzma
+import multiprocessing
+import os
+import plistlib
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+SECTOR_SIZE = 512
+KOLY_SIZE = 512
+
+_KOLY = struct.Struct(">4sIIIQQQQQII16sII128sQQ120sII128sIQ12x")
+_MISH = struct.Struct(">4sIQQQII24sII128sI")
+_MISH_RUN = struct.Struct(">IIQQQQ")
+
+BLOCK_ZERO = 0x00000000
+BLOCK_RAW = 0x00000001
+BLOCK_IGNORE = 0x00000002
+BLOCK_ADC = 0x80000004
+BLOCK_ZLIB = 0x80000005
+BLOCK_BZIP2 = 0x80000006
+BLOCK_LZFSE = 0x80000007
+BLOCK_LZMA = 0x80000008
+BLOCK_COMMENT = 0x7FFFFFFE
+BLOCK_TERMINATOR = 0xFFFFFFFF
+
+_HOLE_TYPES = frozenset({BLOCK_ZERO, BLOCK_IGNORE})
+_SKIP_TYPES = frozenset({BLOCK_COMMENT, BLOCK_TERMINATOR})
+
+# Runs are grouped into pool tasks of roughly this much compressed input
+_BATCH_BYTES = 16 * 1024 * 1024
+# Decoded data is scanned for zeros in aligned pieces of this size, the
+# usual file system block size, so every skipped piece can become a hole
+_SPARSE_GRANULE = 4096
+
+
+class UdifError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Koly:
+    data_fork_offset: int
+    data_fork_length: int
+    xml_offset: int
+    xml_length: int
+    sector_count: int
+
+
+@dataclass(frozen=True)
+class Block:
+    """One run of output sectors and where its compressed bytes live in the DMG."""
+    kind: int
+    out_offset: int
+    out_length: int
+    in_offset: int  # absolute offset in the .dmg file
+    in_length: int
+
+    @property
+    def is_hole(self) -> bool:
+        return self.kind in _HOLE_TYPES
+
+
+def parse_koly(trailer: bytes) -> Koly:
+    """Parse the 512-byte ``koly`` trailer at the very end of a DMG."""
+    if len(trailer) < KOLY_SIZE:
+        raise UdifError("File is too small to be a UDIF image.")
+    fields = _KOLY.unpack(trailer[-KOLY_SIZE:])
+    signature, _version, header_size = fields[0], fields[1], fields[2]
+    if signature != b"koly" or header_size != KOLY_SIZE:
+        raise UdifError("Missing koly trailer: not a UDIF disk image.")
+    data_fork_offset, data_fork_length = fields[5], fields[6]
+    xml_offset, xml_length = fields[15], fields[16]
+    sector_count = fields[22]
+    if not xml_length:
+        raise UdifError("UDIF image has no XML block map (legacy resource-fork DMGs are not supported).")
+    return Koly(data_fork_offset, data_fork_length, xml_offset, xml_length, sector_count)
+
+
+def parse_block_map(xml: bytes, koly: Koly) -> tuple[int, list[Block]]:
+    """Return ``(raw image size, blocks)`` from the plist the koly trailer points at."""
+    try:
+        plist = plistlib.loads(xml)
+        entries = plist["resource-fork"]["blkx"]
+    except (plistlib.InvalidFileException, KeyError, TypeError, ValueError) as exc:
+        raise UdifError(f"Unreadable UDIF block map: {exc}") from exc
+
+    blocks: list[Block] = []
+    for entry in entries:
+        blocks.extend(_parse_mish(entry["Data"], koly.data_fork_offset))
+    blocks.sort(key=lambda b: b.out_offset)
+    end = max((b.out_offset + b.out_length for b in blocks), default=0)
+    return max(end, koly.sector_count * SECTOR_SIZE), blocks
+
+
+def _parse_mish(data: bytes, data_fork_offset: int) -> list[Block]:
+    if len(data) < _MISH.size:
+        raise UdifError("Truncated mish table.")
+    fields = _MISH.unpack_from(data)
+    signature, first_sector, data_offset, run_count = fields[0], fields[2], fields[4], fields[11]
+    if signature != b"mish":
+        raise UdifError(f"Bad mish signature {signature!r}.")
+    if len(data) < _MISH.size + run_count * _MISH_RUN.size:
+        raise UdifError("Truncated mish run table.")
+
+    blocks: list[Block] = []
+    for idx in range(run_count):
+        kind, _comment, sector, sectors, in_offset, in_length = _MISH_RUN.unpack_from(
+            data, _MISH.size + idx * _MISH_RUN.size,
+        )
+        if kind in _SKIP_TYPES or not sectors:
+            continue
+        blocks.append(Block(
+            kind=kind,
+            out_offset=(first_sector + sector) * SECTOR_SIZE,
+            out_length=sectors * SECTOR_SIZE,
+            in_offset=data_fork_offset + data_offset + in_offset,
+            in_length=in_length,
+        ))
+    return blocks
+
+
+def decompress_block(block: Block, data: bytes) -> bytes:
+    """Expand the compressed bytes of *block* to exactly ``block.out_length`` bytes."""
+    kind = block.kind
+    if kind == BLOCK_RAW:
+        out = data
+    elif kind == BLOCK_ZLIB:
+        out = zlib.decompress(data)
+    elif kind == BLOCK_BZIP2:
+        out = bz2.decompress(data)
+    elif kind == BLOCK_LZMA:
+        out = lzma.decompress(data)
+    elif kind == BLOCK_ADC:
+        out = adc_decompress(data, block.out_length)
+    elif kind in _HOLE_TYPES:
+        return bytes(block.out_length)
+    elif kind == BLOCK_LZFSE:
+        raise UdifError("LZFSE-compressed UDIF images are not supported.")
+    else:
+        raise UdifError(f"Unknown UDIF block type 0x{kind:08x}.")
+    if len(out) < block.out_length:
+        raise UdifError(
+            f"Block at {block.out_offset} expanded to {len(out)} bytes, expected {block.out_length}."
+        )
+    return out[:block.out_length]
+
+
+def adc_decompress(data: bytes, out_length: int) -> bytes:
+    """Apple Data Compression: literal runs plus short back-references."""
+    out = bytearray()
+    i = 0
+    n = len(data)
+    while i < n and len(out) < out_length:
+        op = data[i]
+        if op & 0x80:
+            count = (op & 0x7F) + 1
+            out += data[i + 1:i + 1 + count]
+            i += 1 + count
+            continue
+        if op & 0x40:
+            if i + 2 >= n:
+                raise UdifError("Truncated ADC back-reference.")
+            count = (op & 0x3F) + 4
+            distance = (data[i + 1] << 8 | data[i + 2]) + 1
+            i += 3
+        else:
+            if i + 1 >= n:
+                raise UdifError("Truncated ADC back-reference.")
+            count = ((op >> 2) & 0x0F) + 3
+            distance = ((op & 0x03) << 8 | data[i + 1]) + 1
+            i += 2
+        start = len(out) - distance
+        if start < 0:
+            raise UdifError("ADC back-reference before start of block.")
+        # Byte by byte: the source may overlap what is being written
+        for k in range(count):
+            out.append(out[start + k])
+    return bytes(out)
+
+
+def read_block_map(dmg: Path) -> tuple[int, list[Block]]:
+    with dmg.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() < KOLY_SIZE:
+            raise UdifError("File is too small to be a UDIF image.")
+        f.seek(-KOLY_SIZE, os.SEEK_END)
+        koly = parse_koly(f.read(KOLY_SIZE))
+        f.seek(koly.xml_offset)
+        return parse_block_map(f.read(koly.xml_length), koly)
+
+
+def convert_udif(dmg: Path, dest: Path, workers: int | None = None) -> None:
+    """Convert the UDIF image *dmg* into the raw disk image *dest*.
+
+    *workers* defaults to the CPU count.  With one worker (or a single
+    batch of runs) everything stays in-process.
+    """
+    size, blocks = read_block_map(dmg)
+    with dest.open("wb") as f:
+        f.truncate(size)
+
+    batches = _batch([b for b in blocks if not b.is_hole])
+    workers = max(1, min(workers or os.cpu_count() or 1, len(batches)))
+    if workers == 1:
+        for batch in batches:
+            _convert_batch(str(dmg), str(dest), batch)
+        return
+
+    # forkserver: the caller is usually a download thread, and forking a
+    # threaded process is unsafe
+    ctx = multiprocessing.get_context("forkserver")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        for future in [pool.submit(_convert_batch, str(dmg), str(dest), batch) for batch in batches]:
+            future.result()
+
+
+def _batch(blocks: list[Block]) -> list[list[Block]]:
+    batches: list[list[Block]] = []
+    current: list[Block] = []
+    pending = 0
+    for block in blocks:
+        current.append(block)
+        pending += block.in_length
+        if pending >= _BATCH_BYTES:
+            batches.append(current)
+            current, pending = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _convert_batch(dmg: str, dest: str, blocks: list[Block]) -> None:
+    src_fd = os.open(dmg, os.O_RDONLY)
+    dst_fd = os.open(dest, os.O_WRONLY)
+    try:
+        for block in blocks:
+            data = os.pread(src_fd, block.in_length, block.in_offset)
+            if len(data) != block.in_length:
+                raise UdifError(f"DMG is truncated at offset {block.in_offset}.")
+            _write_block(dst_fd, block, data)
+    finally:
+        os.close(src_fd)
+        os.close(dst_fd)
+
+
+def _write_block(fd: int, block: Block, data: bytes) -> None:
+    try:
+        out = decompress_block(block, data)
+    # bz2 reports a truncated stream as a plain ValueError
+    except (zlib.error, OSError, lzma.LZMAError, ValueError, EOFError) as exc:
+        raise UdifError(f"Corrupt block at output offset {block.out_offset}: {exc}") from exc
+    write_sparse(fd, out, block.out_offset)
+
+
+def write_sparse(fd: int, data: bytes, offset: int) -> None:
+    """Write *data* at *offset*, skipping granules that are all zero.
+
+    Skipped ranges must already read back as zeros, as they do in a file
+    just created by truncating it to size.
+    """
+    view = memoryview(data)
+    end = offset + len(data)
+    pos = offset
+    start = None  # output offset of the pending non-zero span
+    while pos < end:
+        nxt = min((pos // _SPARSE_GRANULE + 1) * _SPARSE_GRANULE, end)
+        lo, hi = pos - offset, nxt - offset
+        if data.count(0, lo, hi) == hi - lo:
+            if start is not None:
+                os.pwrite(fd, view[start - offset:lo], start)
+                start = None
+        elif start is None:
+            start = pos
+        pos = nxt
+    if start is not None:
+        os.pwrite(fd, view[start - offset:], start)
+
+
+def disk_usage(path: Path) -> tuple[int, int]:
+    """``(size, allocated)`` of *path* in bytes; holes are not allocated."""
+    st = path.stat()
+    return st.st_size, st.st_blocks * 512
+
+
+class StreamConverter:
+    """Decode UDIF runs while the DMG is still downloading.
+
+    Bytes of the DMG are passed to :meth:`feed` in file order, starting at
+    offset 0; :meth:`skip_to` jumps over ranges that hold none of *blocks*,
+    so a delta refresh can feed only the chunks it fetched.  A run goes to
+    a decoder thread (zlib, bz2 and lzma release the GIL) as soon as its
+    compressed range is complete, and only the bytes of the run still being
+    received are kept in memory.  The number
+    of runs queued for decoding is bounded, so a slow disk or CPU applies
+    back-pressure to the download instead of growing the buffer.
+    """
+
+    def __init__(
+        self, blocks: list[Block], dest: Path, size: int, workers: int | None = None, truncate: bool = True,
+    ) -> None:
+        self._blocks = sorted((b for b in blocks if not b.is_hole), key=lambda b: b.in_offset)
+        self._next = 0
+        self._buf = bytearray()
+        self._buf_start = 0
+        self._pos = 0
+        # truncate=False keeps what the caller already wrote to *dest*
+        # outside these runs; the file must already be *size* bytes
+        if truncate:
+            with dest.open("wb") as f:
+                f.truncate(size)
+        self._fd = os.open(dest, os.O_WRONLY)
+        self._workers = max(1, workers or os.cpu_count() or 1)
+        self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="udif")
+        self._inflight: deque[Future] = deque()
+
+    def __enter__(self) -> StreamConverter:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def position(self) -> int:
+        """DMG offset of the next byte :meth:`feed` expects."""
+        return self._pos
+
+    def feed(self, data: bytes) -> None:
+        self._buf += data
+        self._pos += len(data)
+        blocks = self._blocks
+        while self._next < len(blocks):
+            block = blocks[self._next]
+            if block.in_offset + block.in_length > self._pos:
+                break
+            start = block.in_offset - self._buf_start
+            self._submit(block, bytes(self._buf[start:start + block.in_length]))
+            self._next += 1
+        keep = min(blocks[self._next].in_offset if self._next < len(blocks) else self._pos, self._pos)
+        if keep > self._buf_start:
+            del self._buf[:keep - self._buf_start]
+            self._buf_start = keep
+
+    def skip_to(self, offset: int) -> None:
+        """Continue at DMG *offset*, when the bytes before it hold no pending run."""
+        if self._next < len(self._blocks) and self._blocks[self._next].in_offset < offset:
+            raise UdifError(f"Cannot skip to {offset}: the run at {self._blocks[self._next].in_offset} is pending.")
+        self._buf.clear()
+        self._buf_start = self._pos = offset
+
+    def finish(self) -> None:
+        """Wait for every run to be written; fail if the DMG ended early."""
+        if self._next < len(self._blocks):
+            missing = self._blocks[self._next]
+            raise UdifError(f"DMG ended at byte {self._pos}, before the run at offset {missing.in_offset}.")
+        while self._inflight:
+            self._inflight.popleft().result()
+
+    def close(self) -> None:
+        for future in self._inflight:
+            future.cancel()
+        self._pool.shutdown(wait=True)
+        self._inflight.clear()
+        os.close(self._fd)
+
+    def _submit(self, block: Block, data: bytes) -> None:
+        while len(self._inflight) >= 2 * self._workers:
+            self._inflight.popleft().result()
+        self._inflight.append(self._pool.submit(_write_block, self._fd, block, data))
@@ -3,12 +3,33 @@
 Each test that calls asyncio.run() creates and destroys an event loop.
 Textual's cleanup can race with loop teardown, causing 'Event loop is closed'
 in subsequent tests. This fixture ensures each test gets a clean loop policy.
+
+Tool state (asset index, caches) is redirected to a per-test directory so
+tests never read or write the real user cache.
+
+``make_udif`` builds small synthetic DMG images for the converter tests.
 """
 
 import asyncio
+import bz2
+import lzma
+import plistlib
+import struct
+import zlib
 
 import pytest
 
+from osx_proxmox_next.udif import (
+    BLOCK_ADC,
+    BLOCK_BZIP2,
+    BLOCK_IGNORE,
+    BLOCK_LZMA,
+    BLOCK_RAW,
+    BLOCK_TERMINATOR,
+    BLOCK_ZERO,
+    BLOCK_ZLIB,
+)
+
 
 @pytest.fixture(autouse=True)
 def _reset_event_loop_policy():
@@ -25,3 +46,76 @@ def _reset_event_loop_policy():
             asyncio.set_event_loop(asyncio.new_event_loop())
     except RuntimeError:
         asyncio.set_event_loop(asyncio.new_event_loop())
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache_dir(tmp_path_factory, monkeypatch):
+    """Point OSX_NEXT_CACHE_DIR at a fresh temporary directory."""
+    monkeypatch.setenv("OSX_NEXT_CACHE_DIR", str(tmp_path_factory.mktemp("cache")))
+
+
+@pytest.fixture
+def make_udif():
+    """Return a builder: ``make_udif([(kind, plain), ...]) -> (dmg, raw image)``."""
+    return _build_udif
+
+
+def _adc_literals(data: bytes) -> bytes:
+    out = bytearray()
+    for i in range(0, len(data), 128):
+        piece = data[i:i + 128]
+        out.append(0x80 | (len(piece) - 1))
+        out += piece
+    return bytes(out)
+
+
+def _build_udif(runs: list[tuple[int, bytes]], split_every: int = 0) -> tuple[bytes, bytes]:
+    """Build a UDIF image from ``(kind, plain data)`` runs.
+
+    Returns ``(dmg bytes, expected raw image)``.  With *split_every* the runs
+    are spread over several ``blkx`` entries, like real images' partitions.
+    """
+    data_fork = bytearray()
+    expected = bytearray()
+    tables: list[list[tuple[int, int, int, int, int]]] = [[]]
+    first_sectors = [0]
+    sector = 0
+    for idx, (kind, plain) in enumerate(runs):
+        if split_every and idx and idx % split_every == 0:
+            tables.append([])
+            first_sectors.append(sector)
+        assert len(plain) % 512 == 0
+        if kind in (BLOCK_ZERO, BLOCK_IGNORE):
+            packed = b""
+        elif kind == BLOCK_ADC:
+            packed = _adc_literals(plain)
+        else:
+            packed = {BLOCK_RAW: bytes, BLOCK_ZLIB: zlib.compress, BLOCK_BZIP2: bz2.compress, BLOCK_LZMA: lzma.compress}[kind](plain)
+        rel_sector = sector - first_sectors[-1]
+        tables[-1].append((kind, rel_sector, len(plain) // 512, len(data_fork), len(packed)))
+        data_fork += packed
+        expected += plain if kind not in (BLOCK_ZERO, BLOCK_IGNORE) else bytes(len(plain))
+        sector += len(plain) // 512
+
+    blkx = []
+    for first, table in zip(first_sectors, tables):
+        # Terminator run, like real images
+        table = table + [(BLOCK_TERMINATOR, sector - first, 0, len(data_fork), 0)]
+        mish = struct.pack(
+            ">4sIQQQII24sII128sI", b"mish", 1, first, sector - first, 0, 0, 0,
+            b"", 2, 32, b"", len(table),
+        )
+        for kind, rel, count, offset, length in table:
+            mish += struct.pack(">IIQQQQ", kind, 0, rel, count, offset, length)
+        blkx.append({"Attributes": "0x0050", "Data": mish, "Name": f"part {first}"})
+    xml = plistlib.dumps({"resource-fork": {"blkx": blkx}})
+
+    xml_offset = len(data_fork)
+    koly = struct.pack(
+        ">4sIIIQQQQQII16sII128sQQ120sII128sIQ12x",
+        b"koly", 4, 512, 1, 0, 0, len(data_fork), 0, 0, 1, 1, b"",
+        2, 32, b"", xml_offset, len(xml), b"", 2, 32, b"", 1, sector,
+    )
+    return bytes(data_fork) + xml + koly, bytes(expected)
+
+
@@ -188,7 +188,7 @@ def test_edit_apply_success(monkeypatch) -> None:
         lambda vmid: RollbackSnapshot(vmid=vmid, path=Path("/tmp/snap.conf")),
     )
 
-    def fake_apply_plan(steps, execute=False, on_step=None, adapter=None):
+    def fake_apply_plan(steps, execute=False, on_step=None, adapter=None, **kw):
         for idx, step in enumerate(steps, start=1):
             if on_step:
                 on_step(idx, len(steps), step, None)
@@ -236,7 +236,7 @@ def test_edit_apply_failure(monkeypatch) -> None:
     monkeypatch.setattr(
         edit_service,
         "apply_plan",
-        lambda steps, execute=False, on_step=None, adapter=None: ApplyResult(
+        lambda steps, execute=False, on_step=None, adapter=None, **kw: ApplyResult(
             ok=False, results=[], log_path=Path("/tmp/fail.log")
         ),
     )
@@ -4,7 +4,7 @@ import time
 from pathlib import Path
 from unittest.mock import patch
 
-from textual.widgets import Button, Checkbox, Input, Static
+from textual.widgets import Button, Checkbox, Input, ProgressBar, Static
 
 from osx_proxmox_next import app as app_module
 from osx_proxmox_next.app import NextApp, WizardState
@@ -867,14 +867,14 @@ def test_download_worker_success(monkeypatch) -> None:
 
     download_calls = {"opencore": 0, "recovery": 0}
 
-    def fake_download_opencore(macos, dest, on_progress=None):
+    def fake_download_opencore(macos, dest, on_progress=None, options=None):
         download_calls["opencore"] += 1
         if on_progress:
             on_progress(DownloadProgress(downloaded=500, total=1000, phase="opencore"))
             on_progress(DownloadProgress(downloaded=800, total=0, phase="opencore"))
         return dest / f"opencore-{macos}.iso"
 
-    def fake_download_recovery(macos, dest, on_progress=None):
+    def fake_download_recovery(macos, dest, on_progress=None, options=None):
         download_calls["recovery"] += 1
         if on_progress:
             on_progress(DownloadProgress(downloaded=1000, total=1000, phase="recovery"))
@@ -1011,6 +1011,23 @@ def test_update_download_progress() -> None:
     asyncio.run(_run())
 
 
+def test_update_download_progress_tracks_parallel_phases() -> None:
+    async def _run() -> None:
+        app = NextApp()
+        async with app.run_test(size=(120, 50)) as pilot:
+            await pilot.pause()
+            app.query_one("#download_progress").remove_class("hidden")
+            app._update_download_progress("opencore", 100)
+            app._update_download_progress("recovery", 40)
+            await pilot.pause()
+            status = str(app.query_one("#download_status", Static).content)
+            assert "Finalizing opencore" in status
+            assert "recovery... 40%" in status
+            assert app.query_one("#download_progress", ProgressBar).progress == 70
+
+    asyncio.run(_run())
+
+
 def test_finish_download_success() -> None:
     async def _run() -> None:
         app = NextApp()
@@ -1065,7 +1082,7 @@ def test_dry_run_success(monkeypatch) -> None:
     monkeypatch.setattr(app_module, "required_assets", lambda cfg: [])
     monkeypatch.setattr(app_module, "validate_config", lambda cfg: [])
 
-    def fake_apply_plan(steps, execute=False, on_step=None, adapter=None):
+    def fake_apply_plan(steps, execute=False, on_step=None, adapter=None, **kw):
         for idx, step in enumerate(steps, start=1):
             if on_step:
                 on_step(idx, len(steps), step, None)
@@ -1098,7 +1115,7 @@ def test_dry_run_failure(monkeypatch) -> None:
     monkeypatch.setattr(app_module, "required_assets", lambda cfg: [])
     monkeypatch.setattr(app_module, "validate_config", lambda cfg: [])
 
-    def fake_apply_plan(steps, execute=False, on_step=None, adapter=None):
+    def fake_apply_plan(steps, execute=False, on_step=None, adapter=None, **kw):
         return ApplyResult(ok=False, results=[], log_path=Path("/tmp/dry-fail.log"))
 
     monkeypatch.setattr(install_service, "apply_plan", fake_apply_plan)
@@ -1243,7 +1260,7 @@ def test_live_install_success(monkeypatch) -> None:
         lambda: [PreflightCheck("qm", True, "ok"), PreflightCheck("root", True, "ok")],
     )
 
-    def fake_apply_plan(steps, execute=False, on_step=None, adapter=None):
+    def fake_apply_plan(steps, execute=False, on_step=None, adapter=None, **kw):
         for idx, step in enumerate(steps, start=1):
             if on_step:
                 on_step(idx, len(steps), step, None)
@@ -1296,7 +1313,7 @@ def test_live_install_failure(monkeypatch) -> None:
         preflight_service, "run_preflight",
         lambda: [PreflightCheck("qm", True, "ok"), PreflightCheck("root", True, "ok")],
     )
-    monkeypatch.setattr(install_service, "apply_plan", lambda steps, execute=False, on_step=None, adapter=None: ApplyResult(ok=False, results=[], log_path=Path("/tmp/fail.log")))
+    monkeypatch.setattr(install_service, "apply_plan", lambda steps, execute=False, on_step=None, adapter=None, **kw: ApplyResult(ok=False, results=[], log_path=Path("/tmp/fail.log")))
     monkeypatch.setattr(install_service, "create_snapshot", lambda vmid: RollbackSnapshot(vmid=vmid, path=Path("/tmp/snap.conf")))
 
     async def _run() -> None:
@@ -1783,7 +1800,7 @@ def test_download_worker_skips_non_downloadable(monkeypatch) -> None:
 
     download_calls = {"opencore": 0}
 
-    def fake_download_opencore(macos, dest, on_progress=None):
+    def fake_download_opencore(macos, dest, on_progress=None, options=None):
         download_calls["opencore"] += 1
         return dest / f"opencore-{macos}.iso"
 
@@ -2214,7 +2231,7 @@ def test_manage_destroy_success(monkeypatch) -> None:
         lambda vmid: RollbackSnapshot(vmid=vmid, path=Path("/tmp/snap.conf")),
     )
 
-    def fake_apply_plan(steps, execute=False, on_step=None, adapter=None):
+    def fake_apply_plan(steps, execute=False, on_step=None, adapter=None, **kw):
         for idx, step in enumerate(steps, start=1):
             if on_step:
                 on_step(idx, len(steps), step, None)
@@ -2257,7 +2274,7 @@ def test_manage_destroy_failure(monkeypatch) -> None:
     )
     monkeypatch.setattr(
         destroy_service, "apply_plan",
-        lambda steps, execute=False, on_step=None, adapter=None: ApplyResult(
+        lambda steps, execute=False, on_step=None, adapter=None, **kw: ApplyResult(
             ok=False, results=[], log_path=Path("/tmp/fail.log")
         ),
     )
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import hashlib
+import os
+
+import pytest
+
+from osx_proxmox_next.asset_store import STORE_DIRNAME, AssetStore, parse_size
+
+
+def _place(path, data: bytes):
+    path.write_bytes(data)
+    return path
+
+
+class TestAdd:
+    def test_links_object_and_records_metadata(self, tmp_path):
+        store = AssetStore()
+        placed = _place(tmp_path / "opencore-sequoia.iso", b"oc-image")
+
+        entry = store.add(placed, url="https://example.com/oc.iso", tag="v1", validator='"e1"')
+
+        assert entry.sha256 == hashlib.sha256(b"oc-image").hexdigest()
+        assert entry.object_path == tmp_path / STORE_DIRNAME / entry.sha256
+        assert entry.object_path.samefile(placed)
+        assert store.entry(placed) == entry
+
+    def test_identical_content_shares_one_object(self, tmp_path):
+        store = AssetStore()
+        a = store.add(_place(tmp_path / "a.iso", b"same"), url="u1")
+        b = store.add(_place(tmp_path / "b.iso", b"same"), url="u2")
+
+        assert a.object_path == b.object_path
+        assert (tmp_path / "a.iso").samefile(tmp_path / "b.iso")
+
+    def test_replacing_content_drops_old_object(self, tmp_path):
+        store = AssetStore()
+        placed = _place(tmp_path / "a.iso", b"v1")
+        old = store.add(placed, url="u")
+        placed.unlink()
+        _place(placed, b"v2")
+        store.add(placed, url="u")
+
+        assert not old.object_path.exists()
+
+
+class TestReuse:
+    def test_intact_asset_is_reused(self, tmp_path):
+        store = AssetStore()
+        placed = _place(tmp_path / "a.iso", b"data")
+        store.add(placed, url="u")
+        assert store.reuse(placed)
+
+    def test_untracked_file_is_accepted(self, tmp_path):
+        assert AssetStore().reuse(_place(tmp_path / "manual.iso", b"x"))
+
+    def test_missing_untracked_file(self, tmp_path):
+        assert not AssetStore().reuse(tmp_path / "missing.iso")
+
+    def test_truncated_asset_is_dropped(self, tmp_path):
+        store = AssetStore()
+        placed = _place(tmp_path / "a.iso", b"0123456789")
+        entry = store.add(placed, url="u")
+        with open(placed, "r+b") as f:
+            f.truncate(4)
+
+        assert not store.reuse(placed)
+        assert not placed.exists()
+        assert not entry.object_path.exists()
+        assert store.entry(placed) is None
+
+    def test_deleted_placement_is_restored_from_object(self, tmp_path):
+        store = AssetStore()
+        placed = _place(tmp_path / "a.iso", b"data")
+        store.add(placed, url="u")
+        placed.unlink()
+
+        assert store.reuse(placed)
+        assert placed.read_bytes() == b"data"
+
+    def test_reuse_refreshes_last_used(self, tmp_path, monkeypatch):
+        store = AssetStore()
+        placed = _place(tmp_path / "a.iso", b"data")
+        monkeypatch.setattr("osx_proxmox_next.asset_store.time.time", lambda: 100.0)
+        store.add(placed, url="u")
+        monkeypatch.setattr("osx_proxmox_next.asset_store.time.time", lambda: 200.0)
+        store.reuse(placed)
+        assert store.entry(placed).last_used == 200.0
+
+
+class TestEviction:
+    def test_least_recently_used_evicted_over_budget(self, tmp_path, monkeypatch):
+        clock = iter([1.0, 2.0, 3.0, 4.0])
+        monkeypatch.setattr("osx_proxmox_next.asset_store.time.time", lambda: next(clock))
+        store = AssetStore(budget=25)
+        old = _place(tmp_path / "old.img", b"o" * 10)
+        mid = _place(tmp_path / "mid.img", b"m" * 10)
+        store.add(old, url="u")
+        store.add(mid, url="u")
+        store.reuse(old)  # old is now more recent than mid
+
+        store.add(_place(tmp_path / "new.img", b"n" * 10), url="u")
+
+        assert not mid.exists()
+        assert store.entry(mid) is None
+        assert old.exists() and (tmp_path / "new.img").exists()
+
+    def test_new_asset_is_never_evicted(self, tmp_path):
+        store = AssetStore(budget=5)
+        placed = _place(tmp_path / "big.img", b"x" * 10)
+        store.add(placed, url="u")
+        assert placed.exists()
+
+    def test_replaced_placement_survives_eviction(self, tmp_path):
+        store = AssetStore(budget=15)
+        placed = _place(tmp_path / "a.img", b"a" * 10)
+        store.add(placed, url="u")
+        # The user swaps in their own file under the same name
+        os.unlink(placed)
+        _place(placed, b"mine" * 3)
+
+        store.add(_place(tmp_path / "b.img", b"b" * 10), url="u")
+
+        assert placed.read_bytes() == b"mine" * 3
+
+    def test_zero_budget_keeps_everything(self, tmp_path):
+        store = AssetStore(budget=0)
+        for i in range(3):
+            store.add(_place(tmp_path / f"{i}.img", bytes([i]) * 10), url="u")
+        assert all((tmp_path / f"{i}.img").exists() for i in range(3))
+
+
+class TestFind:
+    def test_find_by_name(self, tmp_path):
+        store = AssetStore()
+        placed = _place(tmp_path / "sonoma-recovery.img", b"r")
+        store.add(placed, url="u")
+        assert store.find("sonoma-recovery.img") == placed
+        assert store.find("sequoia-recovery.img") is None
+
+    def test_find_within_roots_prefers_earlier_root(self, tmp_path):
+        store = AssetStore()
+        first, second, outside = tmp_path / "a", tmp_path / "b", tmp_path / "c"
+        for d in (first, second, outside):
+            d.mkdir()
+        store.add(_place(first / "sonoma-recovery.img", b"r"), url="u")
+        store.add(_place(second / "sonoma-recovery.img", b"r"), url="u")
+        store.add(_place(outside / "sonoma-recovery.img", b"r"), url="u")
+        assert store.find("sonoma-recovery.img") == outside / "sonoma-recovery.img"
+        assert store.find("sonoma-recovery.img", roots=[first, second]) == first / "sonoma-recovery.img"
+        assert store.find("sonoma-recovery.img", roots=[tmp_path]) is None
+
+    def test_find_skips_truncated(self, tmp_path):
+        store = AssetStore()
+        placed = _place(tmp_path / "sonoma-recovery.img", b"recovery")
+        store.add(placed, url="u")
+        placed.write_bytes(b"r")
+        assert store.find("sonoma-recovery.img") is None
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("1024", 1024),
+    ("512M", 512 * 1024 ** 2),
+    ("20G", 20 * 1024 ** 3),
+    ("1.5GiB", int(1.5 * 1024 ** 3)),
+    ("0", 0),
+])
+def test_parse_size(text, expected):
+    assert parse_size(text) == expected
+
+
+def test_parse_size_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_size("lots")
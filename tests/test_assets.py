@@ -335,3 +335,32 @@ def test_resolve_recovery_finds_dmg(tmp_path, monkeypatch):
     cfg = _cfg("sequoia")
     result = resolve_recovery_or_installer_path(cfg)
     assert result == Path("/var/lib/vz/template/iso/sequoia-recovery.dmg")
+
+
+def test_resolve_prefers_asset_store_without_scanning(tmp_path, monkeypatch):
+    from osx_proxmox_next.asset_store import AssetStore
+
+    recovery = tmp_path / "sonoma-recovery.img"
+    recovery.write_bytes(b"recovery")
+    AssetStore().add(recovery, url="https://example.com/BaseSystem.dmg")
+
+    def no_scan(*a, **kw):
+        raise AssertionError("directory scan should not run")
+
+    monkeypatch.setattr(assets_module, "_find_iso", no_scan)
+    assert resolve_recovery_or_installer_path(_cfg("sonoma"), extra_dirs=[tmp_path]) == recovery
+
+
+def test_resolve_ignores_asset_store_copies_outside_iso_dirs(tmp_path):
+    from osx_proxmox_next.asset_store import AssetStore
+
+    configured, elsewhere = tmp_path / "iso", tmp_path / "other-storage"
+    configured.mkdir()
+    elsewhere.mkdir()
+    (configured / "sonoma-recovery.img").write_bytes(b"recovery")
+    stored = elsewhere / "sonoma-recovery.img"
+    stored.write_bytes(b"recovery")
+    AssetStore().add(stored, url="https://example.com/BaseSystem.dmg")
+
+    result = resolve_recovery_or_installer_path(_cfg("sonoma"), extra_dirs=[configured])
+    assert result == configured / "sonoma-recovery.img"
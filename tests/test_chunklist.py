@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import hashlib
+import struct
+
+import pytest
+
+from osx_proxmox_next.chunklist import (
+    ChunklistError,
+    ChunkStreamVerifier,
+    parse_chunklist,
+)
+
+
+def _build(payload: bytes, chunk_size: int) -> bytes:
+    pieces = [payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)]
+    entries = b"".join(struct.pack("<I32s", len(p), hashlib.sha256(p).digest()) for p in pieces)
+    header = struct.pack("<4sIBBBxQQQ", b"CNKL", 0x24, 1, 1, 2, len(pieces), 0x24, 0x24 + len(entries))
+    return header + entries + b"\0" * 256
+
+
+PAYLOAD = bytes(range(256)) * 2
+
+
+class TestParseChunklist:
+    def test_offsets_and_total(self):
+        cl = parse_chunklist(_build(PAYLOAD, 100))
+        assert [c.offset for c in cl.chunks] == [0, 100, 200, 300, 400, 500]
+        assert cl.chunks[-1].size == 12
+        assert cl.total == len(PAYLOAD)
+
+    def test_digest_identifies_file(self):
+        raw = _build(PAYLOAD, 100)
+        assert parse_chunklist(raw).digest == hashlib.sha256(raw).hexdigest()
+
+    def test_bad_magic(self):
+        raw = b"XXXX" + _build(PAYLOAD, 100)[4:]
+        with pytest.raises(ChunklistError, match="magic"):
+            parse_chunklist(raw)
+
+    def test_truncated_table(self):
+        with pytest.raises(ChunklistError, match="truncated"):
+            parse_chunklist(_build(PAYLOAD, 100)[:0x24 + 40])
+
+    def test_too_short(self):
+        with pytest.raises(ChunklistError, match="too short"):
+            parse_chunklist(b"CNKL")
+
+    def test_unsupported_method(self):
+        raw = bytearray(_build(PAYLOAD, 100))
+        raw[9] = 2
+        with pytest.raises(ChunklistError, match="Unsupported"):
+            parse_chunklist(bytes(raw))
+
+    def test_boundaries(self):
+        cl = parse_chunklist(_build(PAYLOAD, 100))
+        assert cl.index_at(0) == 0
+        assert cl.index_at(199) == 1
+        assert cl.boundary_at_or_after(101) == 200
+        assert cl.boundary_at_or_after(200) == 200
+        assert cl.boundary_at_or_after(501) == len(PAYLOAD)
+
+
+class TestVerifyFile:
+    def test_reports_bad_chunks(self, tmp_path):
+        cl = parse_chunklist(_build(PAYLOAD, 100))
+        data = bytearray(PAYLOAD)
+        data[150] ^= 1
+        data[510] ^= 1
+        path = tmp_path / "img"
+        path.write_bytes(bytes(data))
+        assert cl.verify_file(path) == [1, 5]
+        assert cl.verify_file(path, skip={1}) == [5]
+
+    def test_short_file(self, tmp_path):
+        cl = parse_chunklist(_build(PAYLOAD, 100))
+        path = tmp_path / "img"
+        path.write_bytes(PAYLOAD[:250])
+        assert cl.verify_file(path) == [2, 3, 4, 5]
+
+
+class TestChunkStreamVerifier:
+    def test_from_start_in_odd_pieces(self):
+        cl = parse_chunklist(_build(PAYLOAD, 100))
+        verifier = ChunkStreamVerifier(cl, 0)
+        results = []
+        for i in range(0, len(PAYLOAD), 37):
+            results += verifier.feed(PAYLOAD[i:i + 37])
+        assert results == [(i, True) for i in range(6)]
+
+    def test_mid_chunk_start_skips_partial_chunk(self):
+        cl = parse_chunklist(_build(PAYLOAD, 100))
+        verifier = ChunkStreamVerifier(cl, 150)
+        assert verifier.feed(PAYLOAD[150:]) == [(2, True), (3, True), (4, True), (5, True)]
+
+    def test_detects_corruption(self):
+        cl = parse_chunklist(_build(PAYLOAD, 100))
+        data = bytearray(PAYLOAD[:200])
+        data[120] ^= 1
+        assert ChunkStreamVerifier(cl, 0).feed(bytes(data)) == [(0, True), (1, False)]
+
+    def test_incomplete_chunk_not_reported(self):
+        cl = parse_chunklist(_build(PAYLOAD, 100))
+        assert ChunkStreamVerifier(cl, 0).feed(PAYLOAD[:150]) == [(0, True)]
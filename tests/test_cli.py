@@ -229,7 +229,7 @@ def test_cli_apply_success(monkeypatch, tmp_path):
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
     )
     rc = run_cli([
         "apply",
@@ -260,7 +260,7 @@ def test_cli_apply_failure(monkeypatch, tmp_path):
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=False, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=False, results=[], log_path=tmp_path / "log.txt"),
     )
     rc = run_cli([
         "apply",
@@ -276,6 +276,40 @@ def test_cli_apply_failure(monkeypatch, tmp_path):
     assert rc == 4
 
 
+def test_cli_apply_execute_prints_live_output(monkeypatch, tmp_path, capsys):
+    from osx_proxmox_next.assets import AssetCheck
+    from osx_proxmox_next.executor import ApplyResult, StepResult
+    from osx_proxmox_next.rollback import RollbackSnapshot
+
+    monkeypatch.setattr(
+        cli_module, "required_assets",
+        lambda cfg: [AssetCheck("OC", Path("/tmp/oc.iso"), True, "")],
+    )
+    monkeypatch.setattr(
+        cli_module, "create_snapshot",
+        lambda vmid: RollbackSnapshot(vmid=vmid, path=tmp_path / "snap.conf"),
+    )
+
+    def fake_apply(steps, execute=False, jobs=1, on_step=None, on_output=None, resume=False):
+        step = steps[0]
+        on_step(1, 2, step, None)
+        on_output(1, step, "creating VM")
+        on_step(1, 2, step, StepResult(step.title, step.command, False, 255, "creating VM"))
+        return ApplyResult(ok=False, results=[], log_path=tmp_path / "log.txt", failed=step.title, skipped=["Start VM"])
+
+    monkeypatch.setattr(cli_module, "apply_plan", fake_apply)
+    rc = run_cli([
+        "apply", "--execute", "--jobs", "2",
+        "--vmid", "900", "--name", "macos-sequoia", "--macos", "sequoia",
+        "--cores", "8", "--memory", "16384", "--disk", "128",
+        "--bridge", "vmbr0", "--storage", "local-lvm",
+    ])
+    assert rc == 4
+    out = capsys.readouterr().out
+    assert "[01/02] Create VM shell\n  [01] creating VM\n[01/02] FAILED (rc=255): Create VM shell" in out
+    assert "Failed step: Create VM shell\nNot started: Start VM" in out
+
+
 def test_config_from_args_smbios():
     from osx_proxmox_next.cli import build_parser, _config_from_args
     parser = build_parser()
@@ -349,6 +383,30 @@ def test_cli_progress_with_total(capsys):
     assert "1.0" in out
 
 
+def test_format_progress_with_rate_and_eta():
+    from osx_proxmox_next.cli import _format_progress
+    from osx_proxmox_next.downloader import DownloadProgress
+    p = DownloadProgress(downloaded=1048576, total=4194304, phase="recovery", rate=2 * 1048576, eta=95)
+    assert _format_progress(p) == "[recovery] 1.0/4.0 MB (25%) 2.0 MB/s ETA 1m35s"
+
+
+def test_format_progress_shows_cap_when_throttled():
+    from osx_proxmox_next.cli import _format_progress
+    from osx_proxmox_next.downloader import DownloadProgress
+    p = DownloadProgress(downloaded=0, total=0, phase="opencore", rate=1048576, limit=1048576, throttled=True)
+    assert _format_progress(p) == "[opencore] 0.0 MB 1.0 MB/s (capped 1.0 MB/s)"
+    p.throttled = False
+    assert "capped" not in _format_progress(p)
+
+
+def test_format_eta():
+    from osx_proxmox_next.cli import _format_eta
+    assert _format_eta(0.2) == "0s"
+    assert _format_eta(59) == "59s"
+    assert _format_eta(61) == "1m01s"
+    assert _format_eta(3725) == "1h02m"
+
+
 def test_cli_progress_without_total(capsys):
     from osx_proxmox_next.cli import _cli_progress
     from osx_proxmox_next.downloader import DownloadProgress
@@ -372,7 +430,7 @@ def test_auto_download_missing_opencore(monkeypatch, tmp_path):
     )
     monkeypatch.setattr(
         _cli_mod, "run_download_worker",
-        lambda cfg, missing, on_progress: (downloaded.append("oc"), []),
+        lambda cfg, missing, on_progress, options=None: (downloaded.append("oc"), []),
     )
 
     from osx_proxmox_next.domain import VmConfig
@@ -395,7 +453,7 @@ def test_auto_download_missing_recovery(monkeypatch, tmp_path):
     )
     monkeypatch.setattr(
         _cli_mod, "run_download_worker",
-        lambda cfg, missing, on_progress: (downloaded.append("rec"), []),
+        lambda cfg, missing, on_progress, options=None: (downloaded.append("rec"), []),
     )
 
     from osx_proxmox_next.domain import VmConfig
@@ -416,7 +474,7 @@ def test_auto_download_missing_opencore_error(monkeypatch, tmp_path):
     )
     monkeypatch.setattr(
         _cli_mod, "run_download_worker",
-        lambda cfg, missing, on_progress: ["OpenCore: network error"],
+        lambda cfg, missing, on_progress, options=None: ["OpenCore: network error"],
     )
 
     from osx_proxmox_next.domain import VmConfig
@@ -436,7 +494,7 @@ def test_auto_download_missing_recovery_error(monkeypatch, tmp_path):
     )
     monkeypatch.setattr(
         _cli_mod, "run_download_worker",
-        lambda cfg, missing, on_progress: ["Recovery: network error"],
+        lambda cfg, missing, on_progress, options=None: ["Recovery: network error"],
     )
 
     from osx_proxmox_next.domain import VmConfig
@@ -458,7 +516,7 @@ def test_auto_download_missing_unknown_asset_type(monkeypatch, tmp_path):
     )
     monkeypatch.setattr(
         _cli_mod, "run_download_worker",
-        lambda cfg, missing, on_progress: (called.append(True), []),
+        lambda cfg, missing, on_progress, options=None: (called.append(True), []),
     )
 
     from osx_proxmox_next.domain import VmConfig
@@ -485,11 +543,11 @@ def test_auto_download_missing_nothing_downloadable(monkeypatch, tmp_path):
 def test_cli_download_success(monkeypatch, tmp_path):
     monkeypatch.setattr(
         cli_module, "download_opencore",
-        lambda macos, dest, on_progress=None: tmp_path / f"opencore-{macos}.iso",
+        lambda macos, dest, on_progress=None, options=None: tmp_path / f"opencore-{macos}.iso",
     )
     monkeypatch.setattr(
         cli_module, "download_recovery",
-        lambda macos, dest, on_progress=None: tmp_path / f"{macos}-recovery.img",
+        lambda macos, dest, on_progress=None, options=None: tmp_path / f"{macos}-recovery.img",
     )
     rc = run_cli(["download", "--macos", "sequoia", "--dest", str(tmp_path)])
     assert rc == 0
@@ -498,7 +556,7 @@ def test_cli_download_success(monkeypatch, tmp_path):
 def test_cli_download_opencore_only(monkeypatch, tmp_path):
     monkeypatch.setattr(
         cli_module, "download_opencore",
-        lambda macos, dest, on_progress=None: tmp_path / f"opencore-{macos}.iso",
+        lambda macos, dest, on_progress=None, options=None: tmp_path / f"opencore-{macos}.iso",
     )
     rc = run_cli(["download", "--macos", "sequoia", "--dest", str(tmp_path), "--opencore-only"])
     assert rc == 0
@@ -507,7 +565,7 @@ def test_cli_download_opencore_only(monkeypatch, tmp_path):
 def test_cli_download_recovery_only(monkeypatch, tmp_path):
     monkeypatch.setattr(
         cli_module, "download_recovery",
-        lambda macos, dest, on_progress=None: tmp_path / f"{macos}-recovery.img",
+        lambda macos, dest, on_progress=None, options=None: tmp_path / f"{macos}-recovery.img",
     )
     rc = run_cli(["download", "--macos", "sequoia", "--dest", str(tmp_path), "--recovery-only"])
     assert rc == 0
@@ -517,11 +575,11 @@ def test_cli_download_failure(monkeypatch, tmp_path):
     from osx_proxmox_next.downloader import DownloadError
     monkeypatch.setattr(
         cli_module, "download_opencore",
-        lambda macos, dest, on_progress=None: (_ for _ in ()).throw(DownloadError("fail")),
+        lambda macos, dest, on_progress=None, options=None: (_ for _ in ()).throw(DownloadError("fail")),
     )
     monkeypatch.setattr(
         cli_module, "download_recovery",
-        lambda macos, dest, on_progress=None: (_ for _ in ()).throw(DownloadError("fail")),
+        lambda macos, dest, on_progress=None, options=None: (_ for _ in ()).throw(DownloadError("fail")),
     )
     rc = run_cli(["download", "--macos", "sequoia", "--dest", str(tmp_path)])
     assert rc == 5
@@ -558,11 +616,11 @@ def test_cli_download_both_exclusive_flags(monkeypatch, tmp_path):
     rec_called = []
     monkeypatch.setattr(
         cli_module, "download_opencore",
-        lambda macos, dest, on_progress=None: oc_called.append(1),
+        lambda macos, dest, on_progress=None, options=None: oc_called.append(1),
     )
     monkeypatch.setattr(
         cli_module, "download_recovery",
-        lambda macos, dest, on_progress=None: rec_called.append(1),
+        lambda macos, dest, on_progress=None, options=None: rec_called.append(1),
     )
     rc = run_cli(["download", "--macos", "sequoia", "--dest", str(tmp_path),
                   "--opencore-only", "--recovery-only"])
@@ -585,14 +643,14 @@ def test_cli_auto_download_on_missing(monkeypatch, tmp_path):
         return [AssetCheck("OC", Path("/tmp/oc.iso"), True, "")]
 
     monkeypatch.setattr(cli_module, "required_assets", fake_required_assets)
-    monkeypatch.setattr(cli_module, "_auto_download_missing", lambda cfg, dest: None)
+    monkeypatch.setattr(cli_module, "_auto_download_missing", lambda cfg, dest, options=None: None)
     monkeypatch.setattr(
         cli_module, "create_snapshot",
         lambda vmid: RollbackSnapshot(vmid=vmid, path=tmp_path / "snap.conf"),
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
     )
     rc = run_cli([
         "apply",
@@ -608,6 +666,28 @@ def test_cli_auto_download_on_missing(monkeypatch, tmp_path):
     assert rc == 0
 
 
+def test_cli_plan_auto_download_honours_limit_rate(monkeypatch, tmp_path):
+    from osx_proxmox_next.assets import AssetCheck
+
+    monkeypatch.setattr(
+        cli_module, "required_assets",
+        lambda cfg: [AssetCheck("OC", Path("/tmp/oc.iso"), False, "missing", downloadable=True)],
+    )
+    seen = []
+    monkeypatch.setattr(
+        cli_module, "_auto_download_missing",
+        lambda cfg, dest, options=None: seen.append(options),
+    )
+    args = [
+        "plan", "--vmid", "900", "--name", "macos-sequoia", "--macos", "sequoia",
+        "--cores", "8", "--memory", "16384", "--disk", "128",
+        "--bridge", "vmbr0", "--storage", "local-lvm", "--iso-dir", str(tmp_path),
+    ]
+    assert run_cli(args + ["--limit-rate", "10M"]) == 3
+    assert seen[0].rate_limit.default == 10 * 1048576
+    assert run_cli(args + ["--limit-rate", "nope"]) == 2
+
+
 # ── Status Tests ────────────────────────────────────────────────────
 
 
@@ -714,7 +794,7 @@ def test_cli_uninstall_execute_success(monkeypatch, tmp_path):
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
     )
     rc = run_cli(["uninstall", "--vmid", "106", "--execute"])
     assert rc == 0
@@ -735,7 +815,7 @@ def test_cli_uninstall_execute_failure(monkeypatch, tmp_path):
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=False, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=False, results=[], log_path=tmp_path / "log.txt"),
     )
     rc = run_cli(["uninstall", "--vmid", "106", "--execute"])
     assert rc == 6
@@ -748,7 +828,7 @@ def test_cli_uninstall_execute_with_purge(monkeypatch, tmp_path):
 
     captured_steps = []
 
-    def fake_apply(steps, execute=False):
+    def fake_apply(steps, execute=False, **kw):
         captured_steps.extend(steps)
         return ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt")
 
@@ -781,7 +861,7 @@ def test_cli_uninstall_vm_info_displayed(monkeypatch, tmp_path, capsys):
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
     )
     run_cli(["uninstall", "--vmid", "106", "--execute"])
     captured = capsys.readouterr()
@@ -845,7 +925,7 @@ def test_cli_edit_execute_success(monkeypatch, tmp_path) -> None:
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
     )
     rc = run_cli(["edit", "--vmid", "900", "--cores", "4", "--execute"])
     assert rc == 0
@@ -866,7 +946,7 @@ def test_cli_edit_execute_failure(monkeypatch, tmp_path) -> None:
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=False, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=False, results=[], log_path=tmp_path / "log.txt"),
     )
     rc = run_cli(["edit", "--vmid", "900", "--memory", "8192", "--execute"])
     assert rc == 7
@@ -988,7 +1068,7 @@ def test_cli_clone_execute_success(monkeypatch, tmp_path, capsys) -> None:
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
     )
     rc = run_cli(["clone", "--source-vmid", "900", "--new-vmid", "901", "--execute"])
     assert rc == 0
@@ -1007,7 +1087,7 @@ def test_cli_clone_execute_failure(monkeypatch, tmp_path) -> None:
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=False, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=False, results=[], log_path=tmp_path / "log.txt"),
     )
     rc = run_cli(["clone", "--source-vmid", "900", "--new-vmid", "901", "--execute"])
     assert rc == 8
@@ -1019,7 +1099,7 @@ def test_cli_clone_preserves_bridge_from_source(monkeypatch, tmp_path, capsys) -
 
     captured_steps = []
 
-    def fake_apply(steps, execute=False):
+    def fake_apply(steps, execute=False, **kw):
         captured_steps.extend(steps)
         return ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt")
 
@@ -1108,7 +1188,7 @@ def test_cli_clone_execute_success_prints_apple_services(monkeypatch, tmp_path,
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
     )
     rc = run_cli(["clone", "--source-vmid", "900", "--new-vmid", "901", "--execute"])
     assert rc == 0
@@ -1126,9 +1206,333 @@ def test_cli_clone_execute_no_apple_services_no_message(monkeypatch, tmp_path, c
     )
     monkeypatch.setattr(
         cli_module, "apply_plan",
-        lambda steps, execute=False: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
+        lambda steps, execute=False, **kw: ApplyResult(ok=True, results=[], log_path=tmp_path / "log.txt"),
     )
     rc = run_cli(["clone", "--source-vmid", "900", "--new-vmid", "901", "--execute", "--no-apple-services"])
     assert rc == 0
     out = capsys.readouterr().out
     assert "Apple services" not in out
+
+
+def test_cli_download_offline_flag(monkeypatch, tmp_path):
+    seen = []
+    monkeypatch.setattr(
+        cli_module, "download_opencore",
+        lambda macos, dest, on_progress=None, options=None: seen.append(options.offline) or dest,
+    )
+    rc = run_cli(["download", "--macos", "sequoia", "--dest", str(tmp_path), "--opencore-only", "--offline"])
+    assert rc == 0
+    assert seen == [True]
+
+
+def test_cli_download_no_pipeline_flag(monkeypatch, tmp_path):
+    seen = []
+    monkeypatch.setattr(
+        cli_module, "download_recovery",
+        lambda macos, dest, on_progress=None, options=None: seen.append(options.pipeline) or dest,
+    )
+    run_cli(["download", "--macos", "sequoia", "--dest", str(tmp_path), "--recovery-only"])
+    run_cli(["download", "--macos", "sequoia", "--dest", str(tmp_path), "--recovery-only", "--no-pipeline"])
+    assert seen == [True, False]
+
+
+def test_cli_download_limit_rate_flag(monkeypatch, tmp_path):
+    from osx_proxmox_next.ratelimit import RateLimit, RateWindow
+    seen = []
+    monkeypatch.setattr(
+        cli_module, "download_opencore",
+        lambda macos, dest, on_progress=None, options=None: seen.append(options.rate_limit) or dest,
+    )
+    rc = run_cli([
+        "download", "--macos", "sequoia", "--dest", str(tmp_path), "--opencore-only",
+        "--limit-rate", "08:00-18:00=5M,20M",
+    ])
+    assert rc == 0
+    assert seen == [RateLimit(default=20 * 1048576, windows=(RateWindow(480, 1080, 5 * 1048576),))]
+
+
+def test_cli_download_invalid_limit_rate(tmp_path, capsys):
+    rc = run_cli(["download", "--macos", "sequoia", "--dest", str(tmp_path), "--limit-rate", "fast"])
+    assert rc == 2
+    assert "--limit-rate" in capsys.readouterr().out
+
+
+def test_cli_download_peer_flag(monkeypatch, tmp_path, capsys):
+    seen = []
+    monkeypatch.setattr(
+        cli_module, "download_opencore",
+        lambda macos, dest, on_progress=None, options=None: seen.append(options.peers) or dest,
+    )
+    base = ["download", "--macos", "sequoia", "--dest", str(tmp_path), "--opencore-only"]
+    assert run_cli(base + ["--peer", "node2", "--peer", "10.0.0.5:9000"]) == 0
+    assert seen == [["http://node2:8470", "http://10.0.0.5:9000"]]
+    assert run_cli(base + ["--peer", "http://"]) == 2
+    assert "--peer" in capsys.readouterr().out
+
+
+def test_cli_serve_cache(monkeypatch, capsys):
+    calls = []
+
+    class FakeServer:
+        server_address = ("127.0.0.1", 8470)
+
+        class mirror:
+            @staticmethod
+            def refresh():
+                return [{"name": "opencore-sequoia.iso"}]
+
+        def serve_forever(self):
+            raise KeyboardInterrupt
+
+        def server_close(self):
+            calls.append("closed")
+
+    monkeypatch.setattr(cli_module, "make_server", lambda host, port: calls.append((host, port)) or FakeServer())
+    assert run_cli(["serve-cache", "--bind", "127.0.0.1"]) == 0
+    assert calls == [("127.0.0.1", 8470), "closed"]
+    assert "Serving 1 cached image(s) on http://127.0.0.1:8470/" in capsys.readouterr().out
+
+
+def test_cli_serve_cache_bind_error(monkeypatch, capsys):
+    def fail(host, port):
+        raise OSError("address in use")
+
+    monkeypatch.setattr(cli_module, "make_server", fail)
+    assert run_cli(["serve-cache", "--port", "80"]) == 2
+    assert "address in use" in capsys.readouterr().out
+
+
+def test_cli_assets_refresh(monkeypatch, tmp_path, capsys):
+    from osx_proxmox_next.refresh import CURRENT, STALE, AssetStatus, RefreshReport
+
+    calls = []
+
+    def fake_refresh(dest_dir, releases, options=None, window=None, check_only=False, on_progress=None):
+        calls.append((dest_dir, releases, window, check_only, options.rate_limit))
+        report = RefreshReport(checked_at=0.0, assets=[
+            AssetStatus("sonoma", "opencore", CURRENT),
+            AssetStatus("sonoma", "recovery", STALE, detail="waiting for the 01:00-05:00 download window"),
+        ])
+        report.save()
+        return report
+
+    monkeypatch.setattr(cli_module, "refresh_assets", fake_refresh)
+    argv = ["assets", "refresh", "--dest", str(tmp_path), "--macos", "sonoma", "--window", "01:00-05:00",
+            "--limit-rate", "5M"]
+    assert run_cli(argv) == 1
+    (dest, releases, window, check_only, rate_limit), = calls
+    assert (dest, releases, check_only) == (tmp_path, ["sonoma"], False)
+    assert (window.start, window.end) == (60, 300)
+    assert rate_limit.default == 5 * 1024 * 1024
+    out = capsys.readouterr().out
+    assert "CURRENT  sonoma opencore" in out
+    assert "STALE    sonoma recovery (waiting for the 01:00-05:00 download window)" in out
+
+    assert run_cli(["assets", "status"]) == 1
+    assert "sonoma recovery stale" in capsys.readouterr().out
+
+
+def test_cli_assets_refresh_interval_loops(monkeypatch, tmp_path):
+    from osx_proxmox_next.refresh import CURRENT, AssetStatus, RefreshReport
+
+    runs, sleeps = [], []
+    monkeypatch.setattr(cli_module, "refresh_assets", lambda *a, **kw: runs.append(1) or RefreshReport(
+        assets=[AssetStatus("sonoma", "opencore", CURRENT)],
+    ))
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 2:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(cli_module.time, "sleep", fake_sleep)
+    assert run_cli(["assets", "refresh", "--dest", str(tmp_path), "--interval", "360"]) == 0
+    assert len(runs) == 2
+    assert sleeps == [360 * 60, 360 * 60]
+
+
+def test_cli_assets_refresh_interrupted_mid_download(monkeypatch, tmp_path, capsys):
+    from osx_proxmox_next.downloader import DownloadProgress
+
+    def interrupted(*args, on_progress=None, **kwargs):
+        on_progress(DownloadProgress(downloaded=1024, total=4096, phase="recovery"))
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(cli_module, "refresh_assets", interrupted)
+    assert run_cli(["assets", "refresh", "--dest", str(tmp_path), "--interval", "360"]) == 0
+    assert capsys.readouterr().out.endswith("\n")
+
+
+def test_cli_assets_refresh_rejects_bad_window(tmp_path, capsys):
+    assert run_cli(["assets", "refresh", "--dest", str(tmp_path), "--window", "late"]) == 2
+    assert "Invalid time window" in capsys.readouterr().out
+
+
+def test_cli_assets_status_never_refreshed(capsys):
+    assert run_cli(["assets", "status"]) == 1
+    assert "Never refreshed" in capsys.readouterr().out
+
+
+def test_cli_download_runs_both_assets_in_parallel(monkeypatch, tmp_path, capsys):
+    import threading
+    from osx_proxmox_next.downloader import DownloadError
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_opencore(macos, dest, on_progress=None, options=None):
+        barrier.wait()
+        raise DownloadError("no release")
+
+    def fake_recovery(macos, dest, on_progress=None, options=None):
+        barrier.wait()
+        return dest / f"{macos}-recovery.img"
+
+    monkeypatch.setattr(cli_module, "download_opencore", fake_opencore)
+    monkeypatch.setattr(cli_module, "download_recovery", fake_recovery)
+
+    rc = run_cli(["download", "--macos", "sequoia", "--dest", str(tmp_path)])
+    out = capsys.readouterr().out
+    assert rc == 5
+    assert "OpenCore download failed: no release" in out
+    assert f"Downloaded: {tmp_path / 'sequoia-recovery.img'}" in out
+
+
+def test_cli_download_reports_os_errors(monkeypatch, tmp_path, capsys):
+    def full_disk(macos, dest, on_progress=None, options=None):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(cli_module, "download_opencore", full_disk)
+    monkeypatch.setattr(cli_module, "download_recovery", lambda macos, dest, on_progress=None, options=None: dest)
+
+    assert run_cli(["download", "--macos", "sequoia", "--dest", str(tmp_path)]) == 5
+    assert "OpenCore download failed: [Errno 28] No space left on device" in capsys.readouterr().out
+
+
+def test_progress_line_shows_every_phase(capsys):
+    from osx_proxmox_next.cli import _ProgressLine
+    from osx_proxmox_next.downloader import DownloadProgress
+
+    line = _ProgressLine()
+    line(DownloadProgress(downloaded=1048576, total=2097152, phase="opencore"))
+    line(DownloadProgress(downloaded=0, total=4194304, phase="recovery"))
+    last = capsys.readouterr().out.rsplit("\r", 1)[-1]
+    assert "[opencore]" in last and "(50%)" in last
+    assert "[recovery]" in last and "(0%)" in last
+
+
+def test_cli_fleet_apply_prints_status_table(monkeypatch, tmp_path, capsys):
+    import json
+    from osx_proxmox_next import fleet as fleet_module
+    from osx_proxmox_next.assets import AssetCheck
+
+    monkeypatch.setattr(fleet_module, "required_assets", lambda cfg: [
+        AssetCheck("Recovery image", Path("/tmp/rec.img"), cfg.vmid != 911, ""),
+    ])
+    manifest = tmp_path / "fleet.json"
+    manifest.write_text(json.dumps({
+        "defaults": {"macos": "sequoia", "cores": 4, "memory": 8192, "disk": 128,
+                     "bridge": "vmbr0", "storage": "local-lvm", "net_model": "vmxnet3"},
+        "vm": [{"vmid": 910, "name": "build-01"}, {"vmid": 911, "name": "build-02"}],
+    }))
+    rc = run_cli(["fleet", "apply", str(manifest), "--no-download"])
+    assert rc == 4
+    lines = capsys.readouterr().out.splitlines()
+    table = lines[lines.index("") + 1:]
+    assert table[0].split() == ["VMID", "NAME", "STATUS", "DETAIL", "LOG"]
+    assert table[1].split()[:3] == ["910", "build-01", "OK"]
+    assert table[1].endswith(".log")
+    assert table[2].split() == ["911", "build-02", "NOT", "RUN", "missing", "Recovery", "image", "-"]
+    assert table[-1] == "1/2 VMs OK, 1 not OK"
+
+
+def test_cli_fleet_apply_bad_manifest(tmp_path, capsys):
+    manifest = tmp_path / "fleet.json"
+    manifest.write_text('{"vm": [{"vmid": 1, "name": "x"}]}')
+    assert run_cli(["fleet", "apply", str(manifest)]) == 2
+    out = capsys.readouterr().out
+    assert "ERROR: vm #1 (x): missing" in out
+
+
+def test_cli_apply_execute_prints_timings(monkeypatch, tmp_path, capsys):
+    from osx_proxmox_next.assets import AssetCheck
+    from osx_proxmox_next.executor import ApplyResult, StepResult
+    from osx_proxmox_next.rollback import RollbackSnapshot
+
+    monkeypatch.setattr(cli_module, "required_assets", lambda cfg: [AssetCheck("OC", Path("/tmp/oc.iso"), True, "")])
+    monkeypatch.setattr(cli_module, "create_snapshot", lambda vmid: RollbackSnapshot(vmid=vmid, path=tmp_path / "s"))
+    results = [
+        StepResult("Create VM shell", "qm create", True, 0, "", started=100.0, finished=100.5, cpu_seconds=0.2),
+        StepResult("Import and attach macOS recovery", "bash", True, 0, "", started=100.5, finished=160.5,
+                   cpu_seconds=12.0, max_rss_kb=51200, write_bytes=3 * 1024 * 1024 * 1024),
+    ]
+    monkeypatch.setattr(cli_module, "apply_plan", lambda steps, execute=False, **kw: ApplyResult(
+        ok=True, results=results, log_path=tmp_path / "a.log", json_log_path=tmp_path / "a.jsonl",
+    ))
+    assert run_cli([
+        "apply", "--execute", "--vmid", "900", "--name", "macos-sequoia", "--macos", "sequoia",
+        "--cores", "8", "--memory", "16384", "--disk", "128", "--bridge", "vmbr0", "--storage", "local-lvm",
+    ]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    start = next(i for i, line in enumerate(lines) if line.startswith("Step "))
+    # Slowest step first
+    assert lines[start + 1].startswith("Import and attach macOS recovery")
+    assert lines[start + 1].split()[-8:] == ["60.0s", "12.0s", "50", "MB", "0", "MB", "3072", "MB"]
+    assert lines[start + 2].startswith("Create VM shell")
+    assert lines[start + 3].split()[:3] == ["Total", "60.5s", "12.2s"]
+    assert lines[start + 4] == f"Timings: {tmp_path / 'a.jsonl'}"
+
+
+def test_cli_apply_resume_runs_the_journaled_plan(monkeypatch, tmp_path, capsys):
+    from osx_proxmox_next.assets import AssetCheck
+    from osx_proxmox_next.domain import PlanStep
+    from osx_proxmox_next.executor import ApplyResult, StepResult
+    from osx_proxmox_next.journal import open_journal
+    from osx_proxmox_next.rollback import RollbackSnapshot
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cli_module, "required_assets", lambda cfg: [AssetCheck("OC", Path("/tmp/oc.iso"), True, "")])
+    monkeypatch.setattr(cli_module, "create_snapshot", lambda vmid: RollbackSnapshot(vmid=vmid, path=tmp_path / "s"))
+    args = [
+        "apply", "--execute", "--resume", "--vmid", "900", "--name", "macos-sequoia", "--macos", "sequoia",
+        "--cores", "8", "--memory", "16384", "--disk", "128", "--bridge", "vmbr0", "--storage", "local-lvm",
+    ]
+    assert run_cli(args) == 2
+    assert "No failed apply of VM 900 to resume" in capsys.readouterr().out
+
+    steps = [
+        PlanStep("Create VM shell", ["qm", "create", "900"], resources=["vm:900"]),
+        PlanStep("Start VM", ["qm", "start", "900"], resources=["vm:900"]),
+    ]
+    journal = open_journal(steps)
+    journal.record(0, 1.0)
+    calls = []
+
+    def fake_apply(steps, execute=False, on_step=None, resume=False, **kw):
+        calls.append(([step.title for step in steps], resume))
+        on_step(1, 2, steps[0], StepResult(steps[0].title, steps[0].command, True, 0, "", already_done=True))
+        return ApplyResult(ok=True, results=[], log_path=tmp_path / "a.log")
+
+    monkeypatch.setattr(cli_module, "apply_plan", fake_apply)
+    assert run_cli(args) == 0
+    assert calls == [(["Create VM shell", "Start VM"], True)]
+    out = capsys.readouterr().out
+    assert f"Resuming {journal.path}: 1 of 2 steps done" in out
+    assert "[01/02] Already done, skipped: Create VM shell" in out
+
+
+def test_cli_edit_lists_merged_changes(capsys) -> None:
+    assert run_cli(["edit", "--vmid", "900", "--name", "my-vm", "--memory", "8192"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    start = lines.index("02. Rename VM to my-vm")
+    assert lines[start + 1:start + 3] == ["    + Set memory to 8192 MB", "    qm set 900 --name my-vm --memory 8192"]
+
+    assert run_cli(["edit", "--vmid", "900", "--name", "my-vm", "--memory", "8192", "--no-optimize"]) == 0
+    out = capsys.readouterr().out
+    assert "03. Set memory to 8192 MB\n    qm set 900 --memory 8192" in out
+
+
+def test_cli_apply_prints_each_merged_change(capsys) -> None:
+    from osx_proxmox_next.domain import PlanStep
+    step = PlanStep("A + B", ["qm", "set", "900", "--a", "1", "--b", "2"], parts=["A", "B"])
+    cli_module._print_step(2, 5, step, None)
+    assert capsys.readouterr().out == "[02/05] A\n        + B\n"
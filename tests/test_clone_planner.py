@@ -60,11 +60,23 @@ def test_parse_net0_no_net0_line():
 
 
 def test_build_clone_plan_step_count_with_apple_services():
-    steps = build_clone_plan(900, 901, apple_services=True)
+    steps = build_clone_plan(900, 901, apple_services=True, optimize=False)
     # clone + smbios + vmgenid + mac = 4 steps
     assert len(steps) == 4
 
 
+def test_build_clone_plan_merges_identity_changes():
+    steps = build_clone_plan(900, 901, apple_services=True)
+    assert len(steps) == 2
+    assert steps[1].argv[:3] == ["qm", "set", "901"]
+    assert steps[1].argv[3::2] == ["--smbios1", "--vmgenid", "--net0"]
+    assert steps[1].parts == [
+        "Inject fresh SMBIOS identity",
+        "Regenerate vmgenid (Apple services isolation)",
+        "Assign fresh static MAC (Apple services isolation)",
+    ]
+
+
 def test_build_clone_plan_step_count_without_apple_services():
     steps = build_clone_plan(900, 901, apple_services=False)
     # clone + smbios = 2 steps
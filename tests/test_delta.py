@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import hashlib
+
+from osx_proxmox_next.chunklist import Chunk, Chunklist
+from osx_proxmox_next.delta import (
+    copy_unchanged,
+    load_block_map,
+    map_path,
+    plan_delta,
+    prune_block_maps,
+    save_block_map,
+)
+from osx_proxmox_next.udif import BLOCK_RAW, BLOCK_ZERO, BLOCK_ZLIB, Block
+
+
+def _chunklist(payload: bytes, size: int = 100, digest: str = "d1") -> Chunklist:
+    chunks = tuple(
+        Chunk(offset=off, size=len(payload[off:off + size]), sha256=hashlib.sha256(payload[off:off + size]).digest())
+        for off in range(0, len(payload), size)
+    )
+    return Chunklist(chunks=chunks, digest=digest)
+
+
+# Three 512-byte runs; their compressed bytes sit in chunks 0, 1-2 and 3
+BLOCKS = [
+    Block(BLOCK_ZLIB, 0, 512, 0, 100),
+    Block(BLOCK_ZLIB, 512, 512, 100, 150),
+    Block(BLOCK_ZERO, 1024, 512, 250, 0),
+    Block(BLOCK_RAW, 1536, 512, 300, 100),
+]
+IMAGE = b"a" * 512 + b"b" * 512 + bytes(512) + b"c" * 512
+
+
+def _recorded(tmp_path):
+    image = tmp_path / "old.img"
+    image.write_bytes(IMAGE)
+    save_block_map(image, _chunklist(b"0" * 100 + b"1" * 100 + b"2" * 100 + b"3" * 100), BLOCKS)
+    return image, load_block_map("d1")
+
+
+def test_save_and_load_round_trip(tmp_path):
+    _, old = _recorded(tmp_path)
+    assert len(old.chunks) == 4
+    assert old.blocks[(BLOCK_ZLIB, 100, 150, 512)] == (512, hashlib.sha256(b"b" * 512).digest())
+    # Holes decode to zeros whatever the build; nothing to record
+    assert (BLOCK_ZERO, 250, 0, 512) not in old.blocks
+    assert load_block_map("missing") is None
+
+
+def test_plan_reuses_runs_in_unchanged_chunks(tmp_path):
+    _, old = _recorded(tmp_path)
+    new = _chunklist(b"0" * 100 + b"1" * 100 + b"X" * 100 + b"3" * 100, digest="d2")
+    plan = plan_delta(old, new, BLOCKS)
+    assert [block.in_offset for block, _, _ in plan.reuse] == [0, 300]
+    assert [block.in_offset for block in plan.fetch] == [100]
+    assert plan.reused_bytes == 1024
+
+
+def test_plan_fetches_moved_runs(tmp_path):
+    _, old = _recorded(tmp_path)
+    same = _chunklist(b"0" * 100 + b"1" * 100 + b"2" * 100 + b"3" * 100, digest="d2")
+    moved = [Block(BLOCK_ZLIB, 0, 512, 0, 90)] + BLOCKS[1:]
+    assert [block.in_offset for block in plan_delta(old, same, moved).fetch] == [0]
+
+
+def test_copy_skips_runs_edited_since(tmp_path):
+    image, old = _recorded(tmp_path)
+    with image.open("r+b") as f:
+        f.seek(1600)
+        f.write(b"stamp")
+    dest = tmp_path / "new.img"
+    dest.write_bytes(bytes(len(IMAGE)))
+    plan = plan_delta(old, _chunklist(b"0" * 100 + b"1" * 100 + b"2" * 100 + b"3" * 100, digest="d2"), BLOCKS)
+
+    failed = copy_unchanged(image, dest, plan.reuse)
+    assert [block.out_offset for block in failed] == [1536]
+    assert dest.read_bytes()[:1024] == IMAGE[:1024]
+    assert dest.read_bytes()[1536:] == bytes(512)
+
+
+def test_prune_keeps_listed_builds(tmp_path):
+    _recorded(tmp_path)
+    prune_block_maps({"d1"})
+    assert map_path("d1").exists()
+    prune_block_maps(set())
+    assert not map_path("d1").exists()
@@ -52,7 +52,7 @@ def test_run_download_worker_empty_missing_returns_no_errors(monkeypatch) -> Non
 def test_run_download_worker_opencore_calls_download_opencore(monkeypatch) -> None:
     called = []
 
-    def fake_download_opencore(macos, dest_dir, on_progress=None):
+    def fake_download_opencore(macos, dest_dir, on_progress=None, options=None):
         called.append(("opencore", macos))
 
     monkeypatch.setattr(
@@ -69,7 +69,7 @@ def test_run_download_worker_opencore_calls_download_opencore(monkeypatch) -> No
 def test_run_download_worker_recovery_calls_download_recovery(monkeypatch) -> None:
     called = []
 
-    def fake_download_recovery(macos, dest_dir, on_progress=None):
+    def fake_download_recovery(macos, dest_dir, on_progress=None, options=None):
         called.append(("recovery", macos))
 
     monkeypatch.setattr(
@@ -86,7 +86,7 @@ def test_run_download_worker_recovery_calls_download_recovery(monkeypatch) -> No
 def test_run_download_worker_installer_calls_download_recovery(monkeypatch) -> None:
     called = []
 
-    def fake_download_recovery(macos, dest_dir, on_progress=None):
+    def fake_download_recovery(macos, dest_dir, on_progress=None, options=None):
         called.append("recovery")
 
     monkeypatch.setattr(
@@ -108,7 +108,7 @@ def test_run_download_worker_installer_calls_download_recovery(monkeypatch) -> N
 def test_run_download_worker_opencore_download_error_returns_error_string(
     monkeypatch,
 ) -> None:
-    def bad_download_opencore(macos, dest_dir, on_progress=None):
+    def bad_download_opencore(macos, dest_dir, on_progress=None, options=None):
         raise DownloadError("network timeout")
 
     monkeypatch.setattr(
@@ -126,7 +126,7 @@ def test_run_download_worker_opencore_download_error_returns_error_string(
 def test_run_download_worker_recovery_download_error_returns_error_string(
     monkeypatch,
 ) -> None:
-    def bad_download_recovery(macos, dest_dir, on_progress=None):
+    def bad_download_recovery(macos, dest_dir, on_progress=None, options=None):
         raise DownloadError("server unreachable")
 
     monkeypatch.setattr(
@@ -141,8 +141,22 @@ def test_run_download_worker_recovery_download_error_returns_error_string(
     assert "server unreachable" in errors[0]
 
 
+def test_run_download_worker_reports_os_errors(monkeypatch) -> None:
+    def full_disk(macos, dest_dir, on_progress=None, options=None):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(
+        "osx_proxmox_next.services.download_service.download_recovery",
+        full_disk,
+    )
+    errors = run_download_worker(
+        _make_config(), [_asset("recovery image")], _noop_progress
+    )
+    assert errors == ["Recovery: [Errno 28] No space left on device"]
+
+
 def test_run_download_worker_does_not_raise_on_download_error(monkeypatch) -> None:
-    def bad_download_opencore(macos, dest_dir, on_progress=None):
+    def bad_download_opencore(macos, dest_dir, on_progress=None, options=None):
         raise DownloadError("fail")
 
     monkeypatch.setattr(
@@ -164,7 +178,7 @@ def test_run_download_worker_does_not_raise_on_download_error(monkeypatch) -> No
 def test_run_download_worker_skips_non_downloadable_assets(monkeypatch) -> None:
     called = []
 
-    def fake_opencore(macos, dest_dir, on_progress=None):
+    def fake_opencore(macos, dest_dir, on_progress=None, options=None):
         called.append("opencore")
 
     monkeypatch.setattr(
@@ -186,7 +200,7 @@ def test_run_download_worker_skips_non_downloadable_assets(monkeypatch) -> None:
 def test_run_download_worker_progress_callback_called(monkeypatch) -> None:
     progress_calls = []
 
-    def fake_download_opencore(macos, dest_dir, on_progress=None):
+    def fake_download_opencore(macos, dest_dir, on_progress=None, options=None):
         from osx_proxmox_next.downloader import DownloadProgress
         if on_progress:
             on_progress(DownloadProgress(phase="opencore", downloaded=50, total=100))
@@ -206,10 +220,26 @@ def test_run_download_worker_progress_callback_called(monkeypatch) -> None:
     assert progress_calls[0][1] == 50
 
 
+def test_run_download_worker_drops_repeated_percentages(monkeypatch) -> None:
+    from osx_proxmox_next.downloader import DownloadProgress
+
+    def fake_download_opencore(macos, dest_dir, on_progress=None, options=None):
+        for downloaded in (10, 11, 12, 25, 26, 100):
+            on_progress(DownloadProgress(phase="opencore", downloaded=downloaded, total=1000))
+
+    monkeypatch.setattr(
+        "osx_proxmox_next.services.download_service.download_opencore",
+        fake_download_opencore,
+    )
+    calls = []
+    run_download_worker(_make_config(), [_asset("OpenCore image")], lambda phase, pct: calls.append(pct))
+    assert calls == [1, 2, 10]
+
+
 def test_run_download_worker_uses_config_iso_dir(monkeypatch) -> None:
     seen_dirs = []
 
-    def fake_download_opencore(macos, dest_dir, on_progress=None):
+    def fake_download_opencore(macos, dest_dir, on_progress=None, options=None):
         seen_dirs.append(dest_dir)
 
     monkeypatch.setattr(
@@ -219,3 +249,47 @@ def test_run_download_worker_uses_config_iso_dir(monkeypatch) -> None:
     cfg = _make_config(iso_dir="/custom/iso/path")
     run_download_worker(cfg, [_asset("OpenCore image")], _noop_progress)
     assert seen_dirs[0] == Path("/custom/iso/path")
+
+
+# ---------------------------------------------------------------------------
+# OpenCore and recovery download in parallel
+# ---------------------------------------------------------------------------
+
+
+def test_run_download_worker_downloads_in_parallel(monkeypatch) -> None:
+    import threading
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_download(macos, dest_dir, on_progress=None, options=None):
+        barrier.wait()  # only passes when both downloads are running at once
+
+    monkeypatch.setattr("osx_proxmox_next.services.download_service.download_opencore", fake_download)
+    monkeypatch.setattr("osx_proxmox_next.services.download_service.download_recovery", fake_download)
+
+    errors = run_download_worker(
+        _make_config(), [_asset("OpenCore image"), _asset("Recovery image")], _noop_progress
+    )
+    assert errors == []
+
+
+def test_run_download_worker_errors_keep_asset_order(monkeypatch) -> None:
+    import threading
+
+    recovery_failed = threading.Event()
+
+    def slow_opencore(macos, dest_dir, on_progress=None, options=None):
+        recovery_failed.wait(5)
+        raise DownloadError("oc down")
+
+    def fast_recovery(macos, dest_dir, on_progress=None, options=None):
+        recovery_failed.set()
+        raise DownloadError("apple down")
+
+    monkeypatch.setattr("osx_proxmox_next.services.download_service.download_opencore", slow_opencore)
+    monkeypatch.setattr("osx_proxmox_next.services.download_service.download_recovery", fast_recovery)
+
+    errors = run_download_worker(
+        _make_config(), [_asset("OpenCore image"), _asset("Recovery image")], _noop_progress
+    )
+    assert errors == ["OpenCore: oc down", "Recovery: apple down"]
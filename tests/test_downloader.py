@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import errno
+import hashlib
 import io
 import json
+import os
+import struct
 import subprocess as real_subprocess
 import urllib.error
 from pathlib import Path
@@ -10,12 +14,16 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 import osx_proxmox_next.downloader as dl_module
+from osx_proxmox_next.chunklist import parse_chunklist
 from osx_proxmox_next.downloader import (
     DownloadError,
+    DownloadOptions,
     DownloadProgress,
+    UpstreamBuild,
     download_opencore,
     download_recovery,
     _build_recovery_image,
+    _stream_recovery_image,
     _download_file,
     _download_file_with_token,
     _fetch_github_releases,
@@ -25,10 +33,30 @@ from osx_proxmox_next.downloader import (
 )
 
 
+def _serve_chunks(resp, chunks: list[bytes]) -> None:
+    """Make *resp* hand out *chunks* in order through both read() and readinto()."""
+    queue = [c for c in chunks if c]
+
+    def read(size=-1):
+        return queue.pop(0) if queue else b""
+
+    def readinto(buf):
+        if not queue:
+            return 0
+        data, queue[0] = queue[0][:len(buf)], queue[0][len(buf):]
+        if not queue[0]:
+            queue.pop(0)
+        buf[:len(data)] = data
+        return len(data)
+
+    resp.read = MagicMock(side_effect=read)
+    resp.readinto = MagicMock(side_effect=readinto)
+
+
 def _make_response(data: bytes, content_length: int | None = None):
     """Create a fake HTTP response object."""
     resp = MagicMock()
-    resp.read = MagicMock(side_effect=[data, b""])
+    _serve_chunks(resp, [data])
     resp.headers = {"Content-Length": str(content_length) if content_length else "0"}
     resp.__enter__ = MagicMock(return_value=resp)
     resp.__exit__ = MagicMock(return_value=False)
@@ -38,13 +66,94 @@ def _make_response(data: bytes, content_length: int | None = None):
 def _make_chunked_response(chunks: list[bytes], content_length: int | None = None):
     """Create a fake HTTP response that returns data in chunks."""
     resp = MagicMock()
-    resp.read = MagicMock(side_effect=chunks + [b""])
+    _serve_chunks(resp, chunks)
     resp.headers = {"Content-Length": str(content_length) if content_length else "0"}
     resp.__enter__ = MagicMock(return_value=resp)
     resp.__exit__ = MagicMock(return_value=False)
     return resp
 
 
+def _make_chunklist(payload: bytes, chunk_size: int = 64) -> bytes:
+    """Build an Apple-format chunklist describing *payload*."""
+    entries = b"".join(
+        struct.pack("<I32s", len(piece), hashlib.sha256(piece).digest())
+        for piece in (payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size))
+    )
+    count = len(entries) // 36
+    header = struct.pack("<4sIBBBxQQQ", b"CNKL", 0x24, 1, 1, 2, count, 0x24, 0x24 + len(entries))
+    return header + entries + b"\0" * 256
+
+
+def _fake_token_download(url, token, dest, on_progress, phase, connections=1, chunklist=None, limiter=None):
+    """Stand-in for _download_file_with_token that writes a valid chunklist."""
+    if dest.name.endswith(".chunklist"):
+        dest.write_bytes(_make_chunklist(b"basesystem"))
+
+
+class _RangeResponse(io.BytesIO):
+    """Fake HTTP response backed by bytes, honouring status and headers."""
+
+    def __init__(self, data: bytes, status: int, headers: dict[str, str], fail_after: int | None = None):
+        super().__init__(data)
+        self.status = status
+        self.headers = headers
+        self._fail_after = fail_after
+
+    def read(self, size=-1):
+        if self._fail_after is not None and self.tell() >= self._fail_after:
+            raise ConnectionResetError("connection reset by peer")
+        if self._fail_after is not None and size > 0:
+            size = min(size, self._fail_after - self.tell())
+        return super().read(size)
+
+    def readinto(self, buf):
+        data = self.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+
+class _FakeRangeServer:
+    """urlopen replacement serving *payload* with optional Range support."""
+
+    def __init__(self, payload: bytes, accept_ranges: bool = True, etag: str = ""):
+        self.payload = payload
+        self.accept_ranges = accept_ranges
+        self.etag = etag
+        self.ranges: list[str] = []
+        self.if_range: list[str | None] = []
+        self.fail_once: dict[int, int] = {}  # range start -> bytes served before reset
+
+    def __call__(self, req, timeout=None):
+        headers = {"Content-Length": str(len(self.payload))}
+        if self.accept_ranges:
+            headers["Accept-Ranges"] = "bytes"
+        if self.etag:
+            headers["ETag"] = self.etag
+        rng = req.get_header("Range")
+        if_range = req.get_header("If-range")
+        self.if_range.append(if_range)
+        stale = if_range is not None and if_range != self.etag
+        if rng is None or not self.accept_ranges or stale:
+            fail_after = self.fail_once.pop(0, None)
+            return _RangeResponse(self.payload, 200, headers, fail_after=fail_after)
+        self.ranges.append(rng)
+        first, last = rng.removeprefix("bytes=").split("-")
+        start = int(first)
+        end = int(last) + 1 if last else len(self.payload)
+        body = self.payload[start:end]
+        headers["Content-Length"] = str(len(body))
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(self.payload)}"
+        fail_after = self.fail_once.pop(start, None)
+        return _RangeResponse(body, 206, headers, fail_after=fail_after)
+
+
+def _write_resume(part: Path, url: str, validator: str, total: int, done: list[list[int]], data: bytes) -> None:
+    part.write_bytes(data)
+    (part.parent / (part.name + ".json")).write_text(json.dumps(
+        {"url": url, "validator": validator, "total": total, "done": done}
+    ))
+
+
 class TestDownloadOpencore:
     def test_success(self, tmp_path, monkeypatch):
         release = {
@@ -56,11 +165,11 @@ class TestDownloadOpencore:
                 }
             ],
         }
-        monkeypatch.setattr(dl_module, "_fetch_github_releases", lambda v: [release])
+        monkeypatch.setattr(dl_module, "_fetch_github_releases", lambda v, offline=False: [release])
 
         file_data = b"fake-iso-content-" * 100
         file_resp = _make_chunked_response([file_data], len(file_data))
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: file_resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: file_resp)
         monkeypatch.setattr(dl_module, "__version__", "0.3.0")
         monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
 
@@ -81,11 +190,11 @@ class TestDownloadOpencore:
             ],
         }
         monkeypatch.setattr(dl_module, "_fetch_github_releases",
-                            lambda v: [version_release, assets_release])
+                            lambda v, offline=False: [version_release, assets_release])
 
         file_data = b"iso-data"
         file_resp = _make_chunked_response([file_data], len(file_data))
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: file_resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: file_resp)
         monkeypatch.setattr(dl_module, "__version__", "0.11.1")
         monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
 
@@ -102,7 +211,7 @@ class TestDownloadOpencore:
             ]},
         ]
 
-        monkeypatch.setattr(dl_module, "_fetch_github_releases", lambda v: releases)
+        monkeypatch.setattr(dl_module, "_fetch_github_releases", lambda v, offline=False: releases)
         monkeypatch.setattr(dl_module, "__version__", "0.3.0")
 
         with pytest.raises(DownloadError, match="No OpenCore asset found"):
@@ -119,11 +228,11 @@ class TestDownloadOpencore:
                 }
             ],
         }
-        monkeypatch.setattr(dl_module, "_fetch_github_releases", lambda v: [release])
+        monkeypatch.setattr(dl_module, "_fetch_github_releases", lambda v, offline=False: [release])
 
         file_data = b"universal-oc"
         file_resp = _make_chunked_response([file_data], len(file_data))
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: file_resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: file_resp)
         monkeypatch.setattr(dl_module, "__version__", "0.3.0")
 
         result = download_opencore("tahoe", tmp_path)
@@ -145,6 +254,111 @@ class TestDownloadOpencore:
         result = download_opencore("sequoia", tmp_path)
         assert result == existing
 
+    def test_offline_refuses_to_download(self, tmp_path, monkeypatch):
+        release = {"tag_name": "v0.3.0", "assets": [{
+            "name": "opencore-sequoia.iso",
+            "browser_download_url": "https://example.com/opencore-sequoia.iso",
+        }]}
+        monkeypatch.setattr(dl_module, "_fetch_github_releases", lambda v, offline=False: [release])
+
+        with pytest.raises(DownloadError, match="Offline mode"):
+            download_opencore("sequoia", tmp_path, options=DownloadOptions(offline=True))
+
+    def test_offline_reuses_local_image(self, tmp_path):
+        existing = tmp_path / "opencore-sequoia.iso"
+        existing.write_text("already here")
+        assert download_opencore("sequoia", tmp_path, options=DownloadOptions(offline=True)) == existing
+
+    def test_download_is_recorded_in_asset_store(self, tmp_path, monkeypatch):
+        release = {"tag_name": "v0.3.0", "assets": [{
+            "name": "opencore-sequoia.iso",
+            "browser_download_url": "https://example.com/opencore-sequoia.iso",
+        }]}
+        monkeypatch.setattr(dl_module, "_fetch_github_releases", lambda v, offline=False: [release])
+        monkeypatch.setattr(dl_module.http_pool, "urlopen",
+                            _FakeRangeServer(b"oc" * 50, etag='"oc1"'))
+
+        result = download_opencore("sequoia", tmp_path)
+
+        entry = dl_module.AssetStore().entry(result)
+        assert entry.url == "https://example.com/opencore-sequoia.iso"
+        assert entry.tag == "v0.3.0"
+        assert entry.validator == '"oc1"'
+        assert entry.size == 100
+        assert entry.object_path.samefile(result)
+
+    def test_truncated_cached_image_is_downloaded_again(self, tmp_path, monkeypatch):
+        release = {"tag_name": "v0.3.0", "assets": [{
+            "name": "opencore-sequoia.iso",
+            "browser_download_url": "https://example.com/opencore-sequoia.iso",
+        }]}
+        monkeypatch.setattr(dl_module, "_fetch_github_releases", lambda v, offline=False: [release])
+        server = _FakeRangeServer(b"oc" * 50, etag='"oc1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        result = download_opencore("sequoia", tmp_path)
+        with open(result, "r+b") as f:
+            f.truncate(10)
+
+        assert download_opencore("sequoia", tmp_path) == result
+        assert result.read_bytes() == b"oc" * 50
+        assert len(server.if_range) == 2
+
+
+    def test_refresh_replaces_cached_image(self, tmp_path, monkeypatch):
+        release = {"tag_name": "v0.4.0", "assets": [{
+            "name": "opencore-sequoia.iso",
+            "browser_download_url": "https://example.com/opencore-sequoia.iso",
+        }]}
+        monkeypatch.setattr(dl_module, "_fetch_github_releases", lambda v, offline=False: [release])
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", _FakeRangeServer(b"new" * 10, etag='"oc2"'))
+        old = tmp_path / "opencore-sequoia.iso"
+        old.write_bytes(b"old")
+        dl_module.AssetStore().add(old, url="https://example.com/old.iso", tag="v0.3.0")
+
+        result = download_opencore("sequoia", tmp_path, options=DownloadOptions(refresh=True))
+        assert result.read_bytes() == b"new" * 10
+        assert dl_module.AssetStore().entry(result).tag == "v0.4.0"
+
+
+class TestUpstreamBuilds:
+    def test_opencore_upstream(self, monkeypatch):
+        releases = [
+            {"tag_name": "v0.3.0", "assets": [{"name": "other.zip", "browser_download_url": "https://x/o"}]},
+            {"tag_name": "assets", "assets": [{
+                "name": "opencore-osx-proxmox-vm.iso", "browser_download_url": "https://x/oc.iso", "size": 42,
+            }]},
+        ]
+        monkeypatch.setattr(dl_module, "_fetch_github_releases", lambda v, offline=False: releases)
+        assert dl_module.opencore_upstream("tahoe") == UpstreamBuild(
+            "opencore-osx-proxmox-vm.iso", "https://x/oc.iso", "assets", 42,
+        )
+
+    def test_recovery_upstream_reads_only_the_chunklist(self, monkeypatch):
+        dmg_data = b"basesystem-dmg-content"
+        chunklist_data = _make_chunklist(dmg_data, chunk_size=8)
+        monkeypatch.setattr(dl_module, "_get_recovery_session", lambda: "session=ABC")
+        monkeypatch.setattr(dl_module, "_get_recovery_image_info", lambda s, b, o: {
+            "AU": "https://oscdn.apple.com/BaseSystem.dmg", "AT": "T1",
+            "CU": "https://oscdn.apple.com/BaseSystem.chunklist", "CT": "T2",
+        })
+        urls = []
+
+        def fake_urlopen(req, timeout=None):
+            urls.append(req.full_url)
+            return _make_chunked_response([chunklist_data], len(chunklist_data))
+
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
+        build = dl_module.recovery_upstream("sonoma")
+        assert urls == ["https://oscdn.apple.com/BaseSystem.chunklist"]
+        assert build.name == "sonoma-recovery.img"
+        assert build.tag == parse_chunklist(chunklist_data).digest
+        assert build.size == len(dmg_data)
+
+    def test_recovery_upstream_unknown_macos(self):
+        with pytest.raises(DownloadError, match="No recovery board ID"):
+            dl_module.recovery_upstream("unknown_os")
+
 
 class TestDownloadRecovery:
     def test_tahoe_uses_osrecovery_with_latest(self, tmp_path, monkeypatch):
@@ -169,18 +383,15 @@ class TestDownloadRecovery:
 
         dmg_data = b"basesystem-dmg-content"
         dmg_resp = _make_chunked_response([dmg_data], len(dmg_data))
-        chunklist_data = b"chunklist-content"
+        chunklist_data = _make_chunklist(dmg_data, chunk_size=8)
         chunklist_resp = _make_chunked_response([chunklist_data], len(chunklist_data))
 
-        call_count = [0]
-
         def fake_urlopen(req, timeout=None):
-            call_count[0] += 1
-            if call_count[0] == 1:
-                return dmg_resp
-            return chunklist_resp
+            if req.full_url.endswith(".chunklist"):
+                return chunklist_resp
+            return dmg_resp
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fake_urlopen)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
         monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
 
         def fake_build(dmg_path, chunklist_path, dest):
@@ -188,7 +399,7 @@ class TestDownloadRecovery:
 
         monkeypatch.setattr(dl_module, "_build_recovery_image", fake_build)
 
-        result = download_recovery("tahoe", tmp_path)
+        result = download_recovery("tahoe", tmp_path, options=DownloadOptions(pipeline=False))
         assert result == tmp_path / "tahoe-recovery.img"
         assert result.exists()
         assert captured_os_type[0] == "latest"
@@ -216,7 +427,7 @@ class TestDownloadRecovery:
 
         dmg_data = b"basesystem-dmg-content"
         dmg_resp = _make_chunked_response([dmg_data], len(dmg_data))
-        chunklist_data = b"chunklist-content"
+        chunklist_data = _make_chunklist(dmg_data, chunk_size=8)
         chunklist_resp = _make_chunked_response([chunklist_data], len(chunklist_data))
 
         call_count = [0]
@@ -228,10 +439,10 @@ class TestDownloadRecovery:
             if call_count[0] == 2:
                 return image_info_resp
             if call_count[0] == 3:
-                return dmg_resp
-            return chunklist_resp
+                return chunklist_resp
+            return dmg_resp
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fake_urlopen)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
         monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
 
         def fake_build_recovery_image(dmg_path, chunklist_path, dest):
@@ -241,7 +452,7 @@ class TestDownloadRecovery:
 
         monkeypatch.setattr(dl_module, "_build_recovery_image", fake_build_recovery_image)
 
-        result = download_recovery("sonoma", tmp_path)
+        result = download_recovery("sonoma", tmp_path, options=DownloadOptions(pipeline=False))
         assert result == tmp_path / "sonoma-recovery.img"
         assert result.exists()
         # Intermediate files should be cleaned up
@@ -259,7 +470,7 @@ class TestDownloadFile:
             call_count[0] += 1
             raise ConnectionError("network failure")
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fake_urlopen)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
 
         dest = tmp_path / "test.iso"
         with pytest.raises(DownloadError, match="Download failed after"):
@@ -275,7 +486,7 @@ class TestDownloadFile:
         original_do_download = dl_module._do_download
         call_count = [0]
 
-        def failing_do_download(url, dest, on_progress, phase, extra_headers=None):
+        def failing_do_download(url, dest, on_progress, phase, extra_headers=None, **kwargs):
             call_count[0] += 1
             # Write partial data then fail
             dest.write_bytes(b"partial data")
@@ -304,7 +515,7 @@ class TestDownloadFile:
                 raise ConnectionError("transient error")
             return file_resp
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fake_urlopen)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
 
         dest = tmp_path / "retry-test.iso"
         _download_file("https://example.com/file.iso", dest, None, "opencore")
@@ -319,7 +530,7 @@ class TestDownloadFile:
         total = len(chunk1) + len(chunk2)
         file_resp = _make_chunked_response([chunk1, chunk2], total)
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: file_resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: file_resp)
 
         progress_calls: list[DownloadProgress] = []
 
@@ -337,24 +548,684 @@ class TestDownloadFile:
         assert progress_calls[1].total == total
 
 
+class TestProgressMeter:
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(dl_module.time, "monotonic", lambda: now[0])
+        return now
+
+    def test_reads_within_one_percent_are_coalesced(self, clock):
+        calls: list[DownloadProgress] = []
+        meter = dl_module._ProgressMeter(calls.append, "recovery", total=100_000)
+        for downloaded in range(100, 1000, 100):
+            clock[0] += 0.01
+            meter.update(downloaded)
+        # Only the first event: all reads stay under 1% and 0.5 s
+        assert [c.downloaded for c in calls] == [100]
+
+    def test_percent_step_emits_after_min_gap(self, clock):
+        calls: list[DownloadProgress] = []
+        meter = dl_module._ProgressMeter(calls.append, "recovery", total=1000)
+        meter.update(1)
+        meter.update(20)  # 2%, but no time has passed
+        clock[0] += dl_module._PROGRESS_MIN_GAP + 0.01
+        meter.update(30)
+        assert [c.downloaded for c in calls] == [1, 30]
+
+    def test_interval_emits_without_percent_change(self, clock):
+        calls: list[DownloadProgress] = []
+        meter = dl_module._ProgressMeter(calls.append, "opencore", total=0)
+        meter.update(10)
+        clock[0] += dl_module._PROGRESS_INTERVAL
+        meter.update(20)
+        assert [c.downloaded for c in calls] == [10, 20]
+
+    def test_completion_always_emitted(self, clock):
+        calls: list[DownloadProgress] = []
+        meter = dl_module._ProgressMeter(calls.append, "recovery", total=1000)
+        meter.update(1)
+        meter.update(1000)
+        assert calls[-1].downloaded == 1000
+
+    def test_rate_average_and_eta(self, clock):
+        calls: list[DownloadProgress] = []
+        meter = dl_module._ProgressMeter(calls.append, "recovery", total=10_000, start=1000)
+        meter.update(1000)
+        clock[0] += 1.0
+        meter.update(2000)  # 1000 B/s
+        clock[0] += 1.0
+        meter.update(4000)  # 2000 B/s
+        last = calls[-1]
+        assert last.rate == pytest.approx(0.3 * 2000 + 0.7 * 1000)
+        assert last.avg_rate == pytest.approx(1500)
+        assert last.eta == pytest.approx(6000 / last.rate)
+
+    def test_flush_reports_unemitted_tail(self, clock):
+        calls: list[DownloadProgress] = []
+        meter = dl_module._ProgressMeter(calls.append, "recovery", total=0)
+        meter.update(5)
+        meter.update(7)
+        meter.flush(7)
+        meter.flush(7)
+        assert [c.downloaded for c in calls] == [5, 7]
+
+    def test_large_download_emits_bounded_events(self, tmp_path, monkeypatch):
+        payload = b"z" * (1024 * 1024)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", _FakeRangeServer(payload))
+        monkeypatch.setattr(dl_module, "_CHUNK_SIZE", 256)
+        calls: list[DownloadProgress] = []
+        _download_file("https://example.com/big.iso", tmp_path / "big.iso", calls.append, "opencore")
+        # 4096 reads, but at most one event per percent plus first/last
+        assert len(calls) <= 102
+        assert calls[-1].downloaded == len(payload)
+
+
+class _RecordingLimiter:
+    """TokenBucket stand-in that records consumed bytes and never sleeps."""
+
+    rate = 5000
+    throttling = True
+
+    def __init__(self) -> None:
+        self.consumed: list[int] = []
+
+    def consume(self, nbytes: int) -> float:
+        self.consumed.append(nbytes)
+        return 0.0
+
+
+class TestBandwidthLimit:
+    def test_single_stream_draws_from_limiter(self, tmp_path, monkeypatch):
+        payload = b"q" * 1000
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", _FakeRangeServer(payload))
+        limiter = _RecordingLimiter()
+        calls: list[DownloadProgress] = []
+        _download_file(
+            "https://example.com/a.iso", tmp_path / "a.iso", calls.append, "opencore", limiter=limiter,
+        )
+        assert sum(limiter.consumed) == len(payload)
+        assert calls[-1].limit == 5000
+        assert calls[-1].throttled
+
+    def test_segments_share_limiter(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(dl_module, "_MIN_SEGMENT_SIZE", 64)
+        monkeypatch.setattr(dl_module, "_CHUNK_SIZE", 16)
+        payload = bytes(range(256)) * 4
+        server = _FakeRangeServer(payload)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+        limiter = _RecordingLimiter()
+        _download_file(
+            "https://example.com/big.iso", tmp_path / "big.iso", None, "opencore",
+            connections=4, limiter=limiter,
+        )
+        assert server.ranges
+        assert sum(limiter.consumed) == len(payload)
+
+    def test_unlimited_progress_reports_no_cap(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", _FakeRangeServer(b"q" * 100))
+        calls: list[DownloadProgress] = []
+        _download_file("https://example.com/a.iso", tmp_path / "a.iso", calls.append, "opencore")
+        assert calls[-1].limit == 0
+        assert not calls[-1].throttled
+
+    def test_options_limit_reaches_every_transfer(self, tmp_path, monkeypatch):
+        from osx_proxmox_next.ratelimit import RateLimit, shared_bucket
+
+        monkeypatch.setattr(dl_module, "_get_recovery_session", lambda: "session=ABC")
+        monkeypatch.setattr(dl_module, "_get_recovery_image_info", lambda *a, **k: {
+            "AU": "https://oscdn.apple.com/BaseSystem.dmg", "AT": "T1",
+            "CU": "https://oscdn.apple.com/BaseSystem.chunklist", "CT": "T2",
+        })
+        seen = []
+
+        def fake_dl(url, token, dest, on_progress, phase, connections=1, chunklist=None, limiter=None):
+            seen.append(limiter)
+            _fake_token_download(url, token, dest, on_progress, phase)
+
+        monkeypatch.setattr(dl_module, "_download_file_with_token", fake_dl)
+        monkeypatch.setattr(dl_module, "_build_recovery_image", lambda dmg, cl, dest: dest.write_bytes(b"img"))
+
+        limit = RateLimit(default=7 * 1024 * 1024)
+        download_recovery("sequoia", tmp_path, options=DownloadOptions(pipeline=False, rate_limit=limit))
+        assert len(seen) == 2
+        assert all(limiter is shared_bucket(limit) for limiter in seen)
+
+
+class TestAdaptiveReader:
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        now = [0.0]
+        monkeypatch.setattr(dl_module.time, "monotonic", lambda: now[0])
+        return now
+
+    def test_fast_full_reads_grow_to_ceiling(self, clock):
+        reader = dl_module._AdaptiveReader(io.BytesIO(b"x" * (8 * 1024 * 1024)))
+        sizes = []
+        for _ in range(8):
+            sizes.append(len(reader.read()))
+        assert sizes[:3] == [65536, 131072, 262144]
+        assert max(sizes) == dl_module._MAX_CHUNK_SIZE
+
+    def test_slow_reads_shrink_to_floor(self, clock):
+        class Slow(io.BytesIO):
+            def readinto(self, buf):
+                clock[0] += 1.0
+                return super().readinto(buf)
+
+        reader = dl_module._AdaptiveReader(Slow(b"x" * (1024 * 1024)))
+        for _ in range(5):
+            reader.read()
+        assert reader.size == dl_module._MIN_CHUNK_SIZE
+
+    def test_reuses_one_buffer(self, clock):
+        reader = dl_module._AdaptiveReader(io.BytesIO(b"ab" * 100))
+        first = reader.read(10)
+        assert bytes(first) == b"ababababab"
+        second = reader.read(10)
+        assert second.obj is first.obj
+
+    def test_limit_caps_read(self, clock):
+        reader = dl_module._AdaptiveReader(io.BytesIO(b"z" * 1000))
+        assert len(reader.read(7)) == 7
+
+
+class TestPreallocate:
+    def test_file_reserved_before_data(self, tmp_path, monkeypatch):
+        seen = []
+        real = dl_module._preallocate
+
+        def spy(f, size):
+            real(f, size)
+            seen.append(os.fstat(f.fileno()).st_size)
+
+        monkeypatch.setattr(dl_module, "_preallocate", spy)
+        payload = b"p" * 5000
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", _FakeRangeServer(payload))
+        dest = tmp_path / "a.iso"
+        _download_file("https://example.com/a.iso", dest, None, "opencore")
+        assert seen == [len(payload)]
+        assert dest.read_bytes() == payload
+
+    def test_disk_full_fails_before_transfer(self, tmp_path, monkeypatch):
+        def full(fd, offset, size):
+            raise OSError(errno.ENOSPC, "No space left on device")
+
+        monkeypatch.setattr(dl_module.os, "posix_fallocate", full, raising=False)
+        resp = _make_chunked_response([b"d" * 100], 100)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: resp)
+        dest = tmp_path / "a.iso"
+        with pytest.raises(DownloadError, match="Not enough free space for a.iso.part"):
+            _download_file("https://example.com/a.iso", dest, None, "opencore")
+        resp.readinto.assert_not_called()
+        assert not (tmp_path / "a.iso.part").exists()
+
+    def test_unsupported_filesystem_falls_back_to_truncate(self, tmp_path, monkeypatch):
+        def unsupported(fd, offset, size):
+            raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+        monkeypatch.setattr(dl_module.os, "posix_fallocate", unsupported, raising=False)
+        path = tmp_path / "f"
+        with open(path, "wb") as f:
+            dl_module._preallocate(f, 4096)
+        assert path.stat().st_size == 4096
+
+
+class TestSegmentedDownload:
+    @pytest.fixture(autouse=True)
+    def _small_segments(self, monkeypatch):
+        monkeypatch.setattr(dl_module, "_MIN_SEGMENT_SIZE", 64)
+        monkeypatch.setattr(dl_module, "_CHUNK_SIZE", 16)
+        monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
+
+    def test_splits_into_ranges(self, tmp_path, monkeypatch):
+        payload = bytes(range(256)) * 4
+        server = _FakeRangeServer(payload)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "big.iso"
+        _download_file("https://example.com/big.iso", dest, None, "opencore", connections=4)
+
+        assert dest.read_bytes() == payload
+        assert server.ranges  # segments 1..n were fetched with Range requests
+        assert all(r.startswith("bytes=") for r in server.ranges)
+
+    def test_single_connection_skips_ranges(self, tmp_path, monkeypatch):
+        payload = b"x" * 1024
+        server = _FakeRangeServer(payload)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "big.iso"
+        _download_file("https://example.com/big.iso", dest, None, "opencore", connections=1)
+
+        assert dest.read_bytes() == payload
+        assert server.ranges == []
+
+    def test_no_accept_ranges_falls_back_to_single_stream(self, tmp_path, monkeypatch):
+        payload = b"y" * 1024
+        server = _FakeRangeServer(payload, accept_ranges=False)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "big.iso"
+        _download_file("https://example.com/big.iso", dest, None, "opencore", connections=4)
+
+        assert dest.read_bytes() == payload
+        assert server.ranges == []
+
+    def test_small_file_not_segmented(self, tmp_path, monkeypatch):
+        payload = b"z" * 100  # < 2 * _MIN_SEGMENT_SIZE
+        server = _FakeRangeServer(payload)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "small.iso"
+        _download_file("https://example.com/small.iso", dest, None, "opencore", connections=4)
+
+        assert dest.read_bytes() == payload
+        assert server.ranges == []
+
+    def test_reset_segment_resumes_from_offset(self, tmp_path, monkeypatch):
+        payload = bytes(range(256)) * 2
+        server = _FakeRangeServer(payload)
+        # Segment starting at 256 drops after 40 bytes, then reconnects
+        server.fail_once[256] = 40
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "flaky.iso"
+        _download_file("https://example.com/flaky.iso", dest, None, "recovery", connections=2)
+
+        assert dest.read_bytes() == payload
+        assert any(r.startswith("bytes=296-") for r in server.ranges)
+
+    def test_idle_connection_steals_work(self, tmp_path):
+        payload = b"s" * 512
+        seg = dl_module._SegmentedDownload(
+            "https://example.com/x", {}, tmp_path / "x", len(payload), None, "recovery", 2,
+        )
+        seg._segments = [dl_module._Segment(0, 512, 0), dl_module._Segment(512, 512, 512)]
+
+        stolen = seg._next_segment()
+
+        assert stolen is not None
+        assert (stolen.start, stolen.end) == (256, 512)
+        assert seg._segments[0].end == 256
+
+    def test_steal_returns_none_when_nothing_worth_splitting(self, tmp_path):
+        seg = dl_module._SegmentedDownload(
+            "https://example.com/x", {}, tmp_path / "x", 256, None, "recovery", 2,
+        )
+        seg._segments = [dl_module._Segment(0, 128, 100), dl_module._Segment(128, 256, 250)]
+        assert seg._next_segment() is None
+
+    def test_range_ignored_raises_after_retries(self, tmp_path, monkeypatch):
+        payload = b"r" * 512
+
+        def fake_urlopen(req, timeout=None):
+            headers = {"Content-Length": str(len(payload)), "Accept-Ranges": "bytes"}
+            return _RangeResponse(payload, 200, headers)
+
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
+
+        dest = tmp_path / "liar.iso"
+        with pytest.raises(DownloadError, match="server ignored Range request"):
+            _download_file("https://example.com/liar.iso", dest, None, "opencore", connections=2)
+        assert not (tmp_path / "liar.iso.part").exists()
+
+    def test_progress_is_aggregated(self, tmp_path, monkeypatch):
+        payload = b"p" * 512
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", _FakeRangeServer(payload))
+
+        calls: list[DownloadProgress] = []
+        dest = tmp_path / "agg.iso"
+        _download_file("https://example.com/agg.iso", dest, calls.append, "recovery", connections=4)
+
+        assert calls[-1].downloaded == len(payload)
+        assert all(c.total == len(payload) for c in calls)
+        assert [c.downloaded for c in calls] == sorted(c.downloaded for c in calls)
+
+    def test_download_recovery_passes_connections(self, tmp_path, monkeypatch):
+        captured = {}
+        monkeypatch.setattr(dl_module, "_get_recovery_session", lambda: "session=X")
+        monkeypatch.setattr(dl_module, "_get_recovery_image_info", lambda s, b, o="default": {
+            "AU": "https://oscdn.apple.com/img", "AT": "T",
+            "CU": "https://oscdn.apple.com/cl", "CT": "T",
+        })
+
+        def fake_dl(url, token, dest, on_progress, phase, connections=1, chunklist=None, limiter=None):
+            captured.setdefault(url, connections)
+            _fake_token_download(url, token, dest, on_progress, phase)
+
+        monkeypatch.setattr(dl_module, "_download_file_with_token", fake_dl)
+        monkeypatch.setattr(dl_module, "_build_recovery_image",
+                            lambda dmg, cl, dest: dest.write_bytes(b"img"))
+
+        download_recovery("sonoma", tmp_path, options=DownloadOptions(connections=6, pipeline=False))
+        assert captured["https://oscdn.apple.com/img"] == 6
+        assert captured["https://oscdn.apple.com/cl"] == 1
+
+
+class TestResumableDownload:
+    URL = "https://example.com/big.iso"
+
+    @pytest.fixture(autouse=True)
+    def _fast(self, monkeypatch):
+        monkeypatch.setattr(dl_module, "_MIN_SEGMENT_SIZE", 64)
+        monkeypatch.setattr(dl_module, "_CHUNK_SIZE", 16)
+        monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
+
+    def test_retry_continues_with_range(self, tmp_path, monkeypatch):
+        payload = bytes(range(200))
+        server = _FakeRangeServer(payload, etag='"v1"')
+        server.fail_once[0] = 120
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "big.iso"
+        _download_file(self.URL, dest, None, "opencore")
+
+        assert dest.read_bytes() == payload
+        assert server.ranges == ["bytes=120-"]
+        assert server.if_range[-1] == '"v1"'
+        assert not (tmp_path / "big.iso.part.json").exists()
+
+    def test_failed_resumable_download_keeps_part_and_sidecar(self, tmp_path, monkeypatch):
+        payload = bytes(range(200))
+
+        def broken(req, timeout=None):
+            headers = {"Content-Length": "200", "Accept-Ranges": "bytes", "ETag": '"v1"'}
+            start = int((req.get_header("Range") or "bytes=0-").removeprefix("bytes=").rstrip("-"))
+            if start:
+                headers["Content-Range"] = f"bytes {start}-199/200"
+                return _RangeResponse(payload[start:], 206, headers, fail_after=16)
+            return _RangeResponse(payload, 200, headers, fail_after=48)
+
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", broken)
+
+        dest = tmp_path / "big.iso"
+        with pytest.raises(DownloadError, match="Download failed after"):
+            _download_file(self.URL, dest, None, "opencore")
+
+        part = tmp_path / "big.iso.part"
+        sidecar = json.loads((tmp_path / "big.iso.part.json").read_text())
+        assert part.exists()
+        assert sidecar["url"] == self.URL
+        assert sidecar["validator"] == '"v1"'
+        assert sidecar["done"] == [[0, 80]]
+
+    def test_next_invocation_resumes_from_sidecar(self, tmp_path, monkeypatch):
+        payload = bytes(range(200))
+        server = _FakeRangeServer(payload, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+        _write_resume(tmp_path / "big.iso.part", self.URL, '"v1"', 200, [[0, 150]], payload[:150])
+
+        progress: list[DownloadProgress] = []
+        _download_file(self.URL, tmp_path / "big.iso", progress.append, "opencore")
+
+        assert (tmp_path / "big.iso").read_bytes() == payload
+        assert server.ranges == ["bytes=150-"]
+        assert progress[0].downloaded > 150
+        assert progress[-1].downloaded == 200
+
+    def test_resume_from_byte_zero_keeps_later_ranges(self, tmp_path, monkeypatch):
+        # Segment 0 failed in an earlier run, later ones finished; every retry breaks too
+        payload = bytes(range(200))
+        server = _FakeRangeServer(payload, etag='"v1"')
+        server.fail_once.update({0: 16, 16: 16, 32: 16})
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+        part = tmp_path / "big.iso.part"
+        _write_resume(part, self.URL, '"v1"', 200, [[100, 200]], b"\x00" * 100 + payload[100:])
+
+        with pytest.raises(DownloadError, match="Download failed after"):
+            _download_file(self.URL, tmp_path / "big.iso", None, "opencore")
+
+        assert server.ranges == ["bytes=0-", "bytes=16-", "bytes=32-"]
+        assert json.loads((tmp_path / "big.iso.part.json").read_text())["done"] == [[0, 48], [100, 200]]
+        assert part.read_bytes()[100:] == payload[100:]
+
+    def test_changed_validator_restarts_clean(self, tmp_path, monkeypatch):
+        payload = bytes(range(200))
+        server = _FakeRangeServer(payload, etag='"v2"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+        _write_resume(tmp_path / "big.iso.part", self.URL, '"v1"', 200, [[0, 150]], b"\xff" * 150)
+
+        _download_file(self.URL, tmp_path / "big.iso", None, "opencore")
+
+        assert (tmp_path / "big.iso").read_bytes() == payload
+        assert server.ranges == []
+
+    def test_server_ignoring_ranges_restarts_clean(self, tmp_path, monkeypatch):
+        payload = bytes(range(200))
+        server = _FakeRangeServer(payload, accept_ranges=False, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+        _write_resume(tmp_path / "big.iso.part", self.URL, '"v1"', 200, [[0, 150]], b"\xff" * 150)
+
+        _download_file(self.URL, tmp_path / "big.iso", None, "opencore")
+
+        assert (tmp_path / "big.iso").read_bytes() == payload
+        assert not (tmp_path / "big.iso.part.json").exists()
+
+    def test_sidecar_for_other_url_ignored(self, tmp_path, monkeypatch):
+        payload = bytes(range(200))
+        server = _FakeRangeServer(payload, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+        _write_resume(tmp_path / "big.iso.part", "https://other/x", '"v1"', 200, [[0, 150]], b"\xff" * 150)
+
+        _download_file(self.URL, tmp_path / "big.iso", None, "opencore")
+
+        assert (tmp_path / "big.iso").read_bytes() == payload
+        assert server.if_range == [None]
+
+    def test_corrupt_sidecar_ignored(self, tmp_path, monkeypatch):
+        payload = bytes(range(200))
+        server = _FakeRangeServer(payload, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+        (tmp_path / "big.iso.part").write_bytes(b"junk")
+        (tmp_path / "big.iso.part.json").write_text("{not json")
+
+        _download_file(self.URL, tmp_path / "big.iso", None, "opencore")
+
+        assert (tmp_path / "big.iso").read_bytes() == payload
+
+    def test_weak_etag_falls_back_to_last_modified(self):
+        headers = {"ETag": 'W/"abc"', "Last-Modified": "Tue, 01 Sep 2026 00:00:00 GMT"}
+        assert dl_module._response_validator(headers) == "Tue, 01 Sep 2026 00:00:00 GMT"
+        assert dl_module._response_validator({"ETag": '"strong"'}) == '"strong"'
+        assert dl_module._response_validator({}) == ""
+
+    def test_no_validator_not_resumable(self, tmp_path, monkeypatch):
+        payload = bytes(range(200))
+        server = _FakeRangeServer(payload)  # Accept-Ranges but no ETag
+        server.fail_once[0] = 50
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        _download_file(self.URL, tmp_path / "big.iso", None, "opencore")
+
+        assert (tmp_path / "big.iso").read_bytes() == payload
+        assert server.ranges == []
+
+    def test_segmented_resume_fetches_only_gaps(self, tmp_path, monkeypatch):
+        payload = bytes(range(256)) * 2
+        server = _FakeRangeServer(payload, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+        on_disk = bytearray(b"\x00" * 512)
+        on_disk[0:100] = payload[0:100]
+        on_disk[300:400] = payload[300:400]
+        _write_resume(tmp_path / "big.iso.part", self.URL, '"v1"', 512, [[0, 100], [300, 400]], bytes(on_disk))
+
+        _download_file(self.URL, tmp_path / "big.iso", None, "recovery", connections=4)
+
+        assert (tmp_path / "big.iso").read_bytes() == payload
+        assert server.ranges[0] == "bytes=100-"
+        for rng in server.ranges[1:]:
+            first = int(rng.removeprefix("bytes=").split("-")[0])
+            assert not (0 <= first < 100 or 300 <= first < 400)
+
+    def test_short_body_is_retried(self, tmp_path, monkeypatch):
+        payload = b"q" * 64
+        calls = [0]
+
+        def fake_urlopen(req, timeout=None):
+            calls[0] += 1
+            body = payload[:10] if calls[0] == 1 else payload
+            return _RangeResponse(body, 200, {"Content-Length": "64"})
+
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
+
+        _download_file(self.URL, tmp_path / "short.iso", None, "opencore")
+        assert (tmp_path / "short.iso").read_bytes() == payload
+        assert calls[0] == 2
+
+    def test_missing_ranges(self):
+        state = dl_module._ResumeState("u", "v", 100, [[10, 20], [50, 60]])
+        assert state.missing() == [(0, 10), (20, 50), (60, 100)]
+        assert state.first_missing() == 0
+        assert dl_module._merge_ranges([[5, 10], [0, 5], [20, 20], [8, 12]]) == [[0, 12]]
+
+
+class _CorruptingServer(_FakeRangeServer):
+    """Range server that flips the byte at each offset in *corrupt* for N responses."""
+
+    def __init__(self, payload: bytes, corrupt: dict[int, int], **kwargs):
+        super().__init__(payload, **kwargs)
+        self.corrupt = corrupt
+
+    def __call__(self, req, timeout=None):
+        resp = super().__call__(req, timeout)
+        start = int((req.get_header("Range") or "bytes=0-").removeprefix("bytes=").split("-")[0])
+        if resp.status == 200:
+            start = 0
+        body = bytearray(resp.getvalue())
+        for offset, times in list(self.corrupt.items()):
+            if times and start <= offset < start + len(body):
+                body[offset - start] ^= 0xFF
+                self.corrupt[offset] = times - 1
+        return _RangeResponse(bytes(body), resp.status, resp.headers, fail_after=resp._fail_after)
+
+
+class TestChunklistVerification:
+    URL = "https://example.com/BaseSystem.dmg"
+
+    @pytest.fixture(autouse=True)
+    def _fast(self, monkeypatch):
+        monkeypatch.setattr(dl_module, "_MIN_SEGMENT_SIZE", 64)
+        monkeypatch.setattr(dl_module, "_CHUNK_SIZE", 16)
+        monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
+
+    @staticmethod
+    def _chunklist(payload: bytes, chunk_size: int = 32):
+        return parse_chunklist(_make_chunklist(payload, chunk_size))
+
+    def test_clean_download_needs_no_refetch(self, tmp_path, monkeypatch):
+        payload = bytes(range(256))
+        server = _FakeRangeServer(payload, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "BaseSystem.dmg"
+        _download_file(self.URL, dest, None, "recovery", chunklist=self._chunklist(payload))
+
+        assert dest.read_bytes() == payload
+        assert server.ranges == []
+
+    def test_corrupt_chunk_is_refetched_alone(self, tmp_path, monkeypatch):
+        payload = bytes(range(256))
+        server = _CorruptingServer(payload, {100: 1}, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "BaseSystem.dmg"
+        _download_file(self.URL, dest, None, "recovery", chunklist=self._chunklist(payload))
+
+        assert dest.read_bytes() == payload
+        assert server.ranges == ["bytes=96-127"]
+
+    def test_segmented_download_verifies_every_chunk(self, tmp_path, monkeypatch):
+        payload = bytes(range(256)) * 4
+        server = _CorruptingServer(payload, {700: 1}, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "BaseSystem.dmg"
+        _download_file(
+            self.URL, dest, None, "recovery", connections=4, chunklist=self._chunklist(payload),
+        )
+
+        assert dest.read_bytes() == payload
+        assert server.corrupt[700] == 0  # the bad byte was served, then repaired
+
+    def test_segments_split_on_chunk_boundaries(self):
+        chunklist = self._chunklist(b"x" * 1000, chunk_size=96)
+        ranges = dl_module._plan_segments([(0, 1000)], 4, chunklist)
+        assert all(start % 96 == 0 for start, _ in ranges)
+
+    def test_persistent_corruption_fails_and_cleans_up(self, tmp_path, monkeypatch):
+        payload = bytes(range(256))
+        server = _CorruptingServer(payload, {10: 99}, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "BaseSystem.dmg"
+        with pytest.raises(DownloadError, match="failed verification"):
+            _download_file(self.URL, dest, None, "recovery", chunklist=self._chunklist(payload))
+
+        assert not dest.exists()
+        assert not (tmp_path / "BaseSystem.dmg.part").exists()
+        assert not (tmp_path / "BaseSystem.dmg.part.json").exists()
+
+    def test_size_mismatch_rejected(self, tmp_path, monkeypatch):
+        payload = bytes(range(256))
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", _FakeRangeServer(payload, etag='"v1"'))
+
+        with pytest.raises(DownloadError, match="does not match its chunklist"):
+            _download_file(
+                self.URL, tmp_path / "BaseSystem.dmg", None, "recovery",
+                chunklist=self._chunklist(payload + b"extra"),
+            )
+
+    def test_resumed_bytes_are_checked_from_disk(self, tmp_path, monkeypatch):
+        payload = bytes(range(256))
+        server = _FakeRangeServer(payload, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "BaseSystem.dmg"
+        kept = bytearray(payload[:128])
+        kept[5] ^= 0xFF  # corrupted on disk by an earlier run
+        _write_resume(tmp_path / "BaseSystem.dmg.part", self.URL, '"v1"', 256, [[0, 128]], bytes(kept))
+
+        _download_file(self.URL, dest, None, "recovery", chunklist=self._chunklist(payload))
+
+        assert dest.read_bytes() == payload
+        assert server.ranges == ["bytes=128-", "bytes=0-31"]
+
+    def test_invalid_chunklist_aborts_recovery(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(dl_module, "_get_recovery_session", lambda: "session=X")
+        monkeypatch.setattr(dl_module, "_get_recovery_image_info", lambda s, b, o="default": {
+            "AU": "https://oscdn.apple.com/img", "AT": "T",
+            "CU": "https://oscdn.apple.com/cl", "CT": "T",
+        })
+
+        def fake_dl(url, token, dest, on_progress, phase, connections=1, chunklist=None, limiter=None):
+            dest.write_bytes(b"not a chunklist")
+
+        monkeypatch.setattr(dl_module, "_download_file_with_token", fake_dl)
+
+        with pytest.raises(DownloadError, match="Invalid recovery chunklist"):
+            download_recovery("sonoma", tmp_path)
+        assert not (tmp_path / "sonoma-BaseSystem.chunklist").exists()
+
+
 class TestFetchGithubReleases:
     def test_tag_success(self, monkeypatch):
         release = {"tag_name": "v0.3.0", "assets": []}
         data = json.dumps(release).encode()
 
-        def fake_urlopen(req, timeout=None):
+        def fake_urlopen(req, timeout=None, max_connections=None):
             return _make_response(data)
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fake_urlopen)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
 
         result = _fetch_github_releases("0.3.0")
         assert any(r["tag_name"] == "v0.3.0" for r in result)
 
     def test_all_fail(self, monkeypatch):
-        def fail(req, timeout=None):
+        def fail(req, timeout=None, max_connections=None):
             raise urllib.error.HTTPError(req.full_url, 404, "Not Found", {}, io.BytesIO(b""))
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fail)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fail)
 
         with pytest.raises(DownloadError, match="Could not fetch any GitHub release"):
             _fetch_github_releases("99.0.0")
@@ -364,15 +1235,12 @@ class TestFetchGithubReleases:
         assets_release = {"tag_name": "assets", "assets": [
             {"name": "opencore-osx-proxmox-vm.iso", "browser_download_url": "https://example.com/oc.iso"}
         ]}
-        call_count = [0]
-
-        def fake_urlopen(req, timeout=None):
-            call_count[0] += 1
-            if call_count[0] <= 2:
+        def fake_urlopen(req, timeout=None, max_connections=None):
+            if not req.full_url.endswith("/tags/assets"):
                 raise urllib.error.HTTPError(req.full_url, 404, "Not Found", {}, io.BytesIO(b""))
             return _make_response(json.dumps(assets_release).encode())
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fake_urlopen)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
 
         result = _fetch_github_releases("99.0.0")
         assert len(result) == 1
@@ -383,16 +1251,54 @@ class TestFetchGithubReleases:
         release = {"tag_name": "v0.3.0", "assets": []}
         data = json.dumps(release).encode()
 
-        def fake_urlopen(req, timeout=None):
+        def fake_urlopen(req, timeout=None, max_connections=None):
             return _make_response(data)
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fake_urlopen)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
 
         result = _fetch_github_releases("0.3.0")
         tags = [r["tag_name"] for r in result]
         assert tags.count("v0.3.0") == 1
 
 
+    def test_lookups_run_concurrently(self, monkeypatch):
+        import threading
+
+        barrier = threading.Barrier(3, timeout=5)
+        release = {"tag_name": "assets", "assets": []}
+
+        def fake_urlopen(req, timeout=None, max_connections=None):
+            barrier.wait()  # only passes when all three requests are in flight
+            return _make_response(json.dumps(release).encode())
+
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
+
+        assert _fetch_github_releases("0.3.0") == [release]
+
+    def test_second_lookup_served_from_cache(self, monkeypatch):
+        release = {"tag_name": "v0.3.0", "assets": []}
+        calls = []
+
+        def fake_urlopen(req, timeout=None, max_connections=None):
+            calls.append(req.full_url)
+            return _make_response(json.dumps(release).encode())
+
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fake_urlopen)
+
+        _fetch_github_releases("0.3.0")
+        _fetch_github_releases("0.3.0")
+        assert len(calls) == 3
+
+    def test_offline_without_cache(self, monkeypatch):
+        def no_network(req, timeout=None, max_connections=None):
+            raise AssertionError("offline mode must not touch the network")
+
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", no_network)
+
+        with pytest.raises(DownloadError, match="offline metadata cache"):
+            _fetch_github_releases("0.3.0", offline=True)
+
+
 class TestFindReleaseAsset:
     def test_found(self):
         release = {
@@ -429,10 +1335,10 @@ class TestHttpGetJson:
     def test_network_error_propagates(self, monkeypatch):
         from osx_proxmox_next.downloader import _http_get_json
 
-        def fail(req, timeout=None):
+        def fail(req, timeout=None, max_connections=None):
             raise ConnectionError("no network")
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fail)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fail)
 
         with pytest.raises(ConnectionError, match="no network"):
             _http_get_json("https://api.github.com/repos/test/releases/latest")
@@ -442,7 +1348,7 @@ class TestGetRecoverySession:
     def test_success(self, monkeypatch):
         resp = _make_response(b"")
         resp.headers = {"Set-Cookie": "session=ABC123; path=/; HttpOnly"}
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: resp)
 
         result = _get_recovery_session()
         assert result == "session=ABC123"
@@ -451,7 +1357,7 @@ class TestGetRecoverySession:
         def fail(req, timeout=None):
             raise ConnectionError("no network")
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fail)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fail)
 
         with pytest.raises(DownloadError, match="Failed to get recovery session"):
             _get_recovery_session()
@@ -460,7 +1366,7 @@ class TestGetRecoverySession:
         """Session cookie found after non-session parts in Set-Cookie."""
         resp = _make_response(b"")
         resp.headers = {"Set-Cookie": "path=/; HttpOnly; session=XYZ789"}
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: resp)
 
         result = _get_recovery_session()
         assert result == "session=XYZ789"
@@ -469,7 +1375,7 @@ class TestGetRecoverySession:
         """Set-Cookie header exists but has no session= part."""
         resp = _make_response(b"")
         resp.headers = {"Set-Cookie": "path=/; HttpOnly; other=value"}
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: resp)
 
         with pytest.raises(DownloadError, match="No session cookie"):
             _get_recovery_session()
@@ -477,7 +1383,7 @@ class TestGetRecoverySession:
     def test_no_session_cookie(self, monkeypatch):
         resp = _make_response(b"")
         resp.headers = {"Content-Type": "text/html"}
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: resp)
 
         with pytest.raises(DownloadError, match="No session cookie"):
             _get_recovery_session()
@@ -490,7 +1396,7 @@ class TestGetRecoveryImageInfo:
             b"AH: abc123\nAT: TOKEN123\nCU: https://oscdn.apple.com/chunklist\n"
             b"CH: def456\nCT: TOKEN456\n"
         )
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: resp)
 
         result = _get_recovery_image_info("session=ABC", "Mac-827FAC58A8FDFA22")
         assert result["AU"] == "https://oscdn.apple.com/BaseSystem.dmg"
@@ -510,7 +1416,7 @@ class TestGetRecoveryImageInfo:
             resp.__exit__ = MagicMock(return_value=False)
             return resp
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", capturing_urlopen)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", capturing_urlopen)
 
         _get_recovery_image_info("session=ABC", "Mac-TEST", os_type="latest")
         assert "os=latest" in captured_body[0]
@@ -519,21 +1425,21 @@ class TestGetRecoveryImageInfo:
         def fail(req, timeout=None):
             raise ConnectionError("no network")
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fail)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fail)
 
         with pytest.raises(DownloadError, match="Failed to get recovery image info"):
             _get_recovery_image_info("session=ABC", "Mac-TEST")
 
     def test_missing_required_key_at(self, monkeypatch):
         resp = _make_response(b"AP: 041-00000\nAU: https://example.com/img\n")
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: resp)
 
         with pytest.raises(DownloadError, match="Missing key 'AT'"):
             _get_recovery_image_info("session=ABC", "Mac-TEST")
 
     def test_missing_required_key_cu(self, monkeypatch):
         resp = _make_response(b"AU: https://example.com/img\nAT: TOKEN\n")
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: resp)
 
         with pytest.raises(DownloadError, match="Missing key 'CU'"):
             _get_recovery_image_info("session=ABC", "Mac-TEST")
@@ -543,7 +1449,7 @@ class TestGetRecoveryImageInfo:
             b"no-separator-line\nAU: https://example.com/img\nAT: TOKEN\n"
             b"CU: https://example.com/chunklist\nCT: CTOKEN\n"
         )
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: resp)
 
         result = _get_recovery_image_info("session=ABC", "Mac-TEST")
         assert result["AU"] == "https://example.com/img"
@@ -556,7 +1462,7 @@ class TestDownloadFileWithToken:
 
         file_data = b"recovery-data"
         file_resp = _make_chunked_response([file_data], len(file_data))
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: file_resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: file_resp)
 
         dest = tmp_path / "recovery.img"
         _download_file_with_token("https://oscdn.apple.com/BaseSystem.dmg", "TOKEN", dest, None, "recovery")
@@ -569,7 +1475,7 @@ class TestDownloadFileWithToken:
         def fail(req, timeout=None):
             raise ConnectionError("network failure")
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", fail)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", fail)
 
         dest = tmp_path / "recovery.img"
         with pytest.raises(DownloadError, match="Download failed after"):
@@ -579,7 +1485,7 @@ class TestDownloadFileWithToken:
     def test_partial_cleanup(self, tmp_path, monkeypatch):
         monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
 
-        def failing_do_download(url, dest, on_progress, phase, extra_headers=None):
+        def failing_do_download(url, dest, on_progress, phase, extra_headers=None, **kwargs):
             dest.write_bytes(b"partial data")
             raise ConnectionError("mid-download failure")
 
@@ -599,7 +1505,7 @@ class TestDownloadFileWithToken:
         total = len(chunk1) + len(chunk2)
         file_resp = _make_chunked_response([chunk1, chunk2], total)
 
-        monkeypatch.setattr(dl_module.urllib.request, "urlopen", lambda req, timeout=None: file_resp)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: file_resp)
 
         progress_calls: list[DownloadProgress] = []
 
@@ -612,98 +1518,169 @@ class TestDownloadFileWithToken:
         assert progress_calls[0].phase == "recovery"
 
 
-class _FakeAdapter:
-    """Test helper that wraps a handler function as a ProxmoxAdapter."""
-    def __init__(self, handler):
-        self._handler = handler
-
-    def run(self, argv):
-        return self._handler(argv)
-
-
 class TestBuildRecoveryImage:
-    def test_success(self, tmp_path, monkeypatch):
-        from osx_proxmox_next.downloader import _build_recovery_image
-        from osx_proxmox_next.infrastructure import CommandResult
-
+    def _inputs(self, tmp_path):
         dmg = tmp_path / "BaseSystem.dmg"
         chunklist = tmp_path / "BaseSystem.chunklist"
         dmg.write_bytes(b"x" * 1024)
         chunklist.write_bytes(b"y" * 64)
-        dest = tmp_path / "recovery.img"
+        return dmg, chunklist, tmp_path / "recovery.img"
 
-        def handler(argv):
-            assert argv[0] == "dmg2img"
-            assert argv[1] == str(dmg)
-            assert argv[2] == str(dest)
-            dest.write_bytes(b"\x00" * 2048)
-            return CommandResult(ok=True, returncode=0, output="")
+    def test_success(self, tmp_path, monkeypatch):
+        from osx_proxmox_next.downloader import _build_recovery_image
 
-        import osx_proxmox_next.services as _svc
-        monkeypatch.setattr(_svc, "get_proxmox_adapter", lambda: _FakeAdapter(handler))
+        dmg, chunklist, dest = self._inputs(tmp_path)
+        calls = []
+
+        def fake_convert(src, out):
+            calls.append((src, out))
+            out.write_bytes(b"\x00" * 2048)
+
+        monkeypatch.setattr(dl_module, "convert_udif", fake_convert)
 
         _build_recovery_image(dmg, chunklist, dest)
+        assert calls == [(dmg, dest)]
         assert dest.exists()
 
     def test_failure_cleans_up(self, tmp_path, monkeypatch):
         from osx_proxmox_next.downloader import _build_recovery_image
-        from osx_proxmox_next.infrastructure import CommandResult
+        from osx_proxmox_next.udif import UdifError
 
-        dmg = tmp_path / "BaseSystem.dmg"
-        chunklist = tmp_path / "BaseSystem.chunklist"
-        dmg.write_bytes(b"x" * 1024)
-        chunklist.write_bytes(b"y" * 64)
-        dest = tmp_path / "recovery.img"
-        dest.write_bytes(b"partial")
+        dmg, chunklist, dest = self._inputs(tmp_path)
 
-        def handler(argv):
-            return CommandResult(ok=False, returncode=1, output="dmg2img failed")
+        def fake_convert(src, out):
+            out.write_bytes(b"partial")
+            raise UdifError("Corrupt block at output offset 0")
 
-        import osx_proxmox_next.services as _svc
-        monkeypatch.setattr(_svc, "get_proxmox_adapter", lambda: _FakeAdapter(handler))
+        monkeypatch.setattr(dl_module, "convert_udif", fake_convert)
 
-        with pytest.raises(DownloadError, match="Failed to convert recovery DMG"):
+        with pytest.raises(DownloadError, match="Failed to convert recovery DMG: Corrupt block"):
             _build_recovery_image(dmg, chunklist, dest)
         assert not dest.exists()
 
-    def test_failure_no_dest_to_clean(self, tmp_path, monkeypatch):
+    def test_not_a_dmg(self, tmp_path):
         from osx_proxmox_next.downloader import _build_recovery_image
-        from osx_proxmox_next.infrastructure import CommandResult
 
-        dmg = tmp_path / "BaseSystem.dmg"
-        chunklist = tmp_path / "BaseSystem.chunklist"
-        dmg.write_bytes(b"x" * 1024)
-        chunklist.write_bytes(b"y" * 64)
-        dest = tmp_path / "recovery.img"
+        dmg, chunklist, dest = self._inputs(tmp_path)
+        with pytest.raises(DownloadError, match="not a UDIF disk image"):
+            _build_recovery_image(dmg, chunklist, dest)
+        assert not dest.exists()
 
-        def handler(argv):
-            return CommandResult(ok=False, returncode=1, output="dmg2img failed")
 
-        import osx_proxmox_next.services as _svc
-        monkeypatch.setattr(_svc, "get_proxmox_adapter", lambda: _FakeAdapter(handler))
+class TestRecoveryPipeline:
+    URL = "https://oscdn.apple.com/BaseSystem.dmg"
 
-        with pytest.raises(DownloadError, match="Failed to convert recovery DMG"):
-            _build_recovery_image(dmg, chunklist, dest)
+    @pytest.fixture(autouse=True)
+    def _fast(self, monkeypatch):
+        monkeypatch.setattr(dl_module, "_CHUNK_SIZE", 100)
+        monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
+
+    @staticmethod
+    def _image(make_udif):
+        from osx_proxmox_next.udif import BLOCK_RAW, BLOCK_ZERO, BLOCK_ZLIB
+        runs = [(BLOCK_ZLIB, bytes(range(256)) * 4), (BLOCK_ZERO, bytes(2048)), (BLOCK_RAW, b"r" * 1024)]
+        dmg, expected = make_udif(runs)
+        return dmg, expected, parse_chunklist(_make_chunklist(dmg, chunk_size=256))
+
+    def test_converts_while_streaming(self, tmp_path, monkeypatch, make_udif):
+        dmg, expected, chunklist = self._image(make_udif)
+        server = _FakeRangeServer(dmg, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+        calls = []
+
+        dest = tmp_path / "sonoma-recovery.img"
+        validator = _stream_recovery_image(self.URL, {}, chunklist, dest, calls.append, "recovery")
+
+        assert validator == '"v1"'
+        assert dest.read_bytes() == expected
+        assert not (tmp_path / "sonoma-recovery.img.part").exists()
+        # Trailer, block map, then the body in one pass
+        assert len(server.ranges) == 3
+        assert server.ranges[-1] == "bytes=0-"
+        assert calls[-1].downloaded == calls[-1].total == len(dmg)
+
+    def test_corrupt_chunk_is_refetched(self, tmp_path, monkeypatch, make_udif):
+        dmg, expected, chunklist = self._image(make_udif)
+        server = _CorruptingServer(dmg, corrupt={300: 1}, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "sonoma-recovery.img"
+        _stream_recovery_image(self.URL, {}, chunklist, dest, None, "recovery")
+
+        assert dest.read_bytes() == expected
+        assert "bytes=256-511" in server.ranges
+
+    def test_dropped_connection_resumes_at_chunk(self, tmp_path, monkeypatch, make_udif):
+        dmg, expected, chunklist = self._image(make_udif)
+        server = _FakeRangeServer(dmg, etag='"v1"')
+        server.fail_once[0] = 700
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+
+        dest = tmp_path / "sonoma-recovery.img"
+        _stream_recovery_image(self.URL, {}, chunklist, dest, None, "recovery")
+
+        assert dest.read_bytes() == expected
+        assert server.ranges[-1] == "bytes=512-"
+        assert server.if_range[-1] == '"v1"'
+
+    def test_no_range_support_falls_back(self, tmp_path, monkeypatch, make_udif):
+        dmg, _, chunklist = self._image(make_udif)
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", _FakeRangeServer(dmg, accept_ranges=False))
+        dest = tmp_path / "sonoma-recovery.img"
+        assert _stream_recovery_image(self.URL, {}, chunklist, dest, None, "recovery") is None
         assert not dest.exists()
 
-    def test_failure_dmg2img_not_found(self, tmp_path, monkeypatch):
-        from osx_proxmox_next.downloader import _build_recovery_image
-        from osx_proxmox_next.infrastructure import CommandResult
+    def test_not_udif_falls_back(self, tmp_path, monkeypatch):
+        payload = b"x" * 2048
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", _FakeRangeServer(payload, etag='"v1"'))
+        chunklist = parse_chunklist(_make_chunklist(payload, chunk_size=256))
+        assert _stream_recovery_image(self.URL, {}, chunklist, tmp_path / "r.img", None, "recovery") is None
+
+    def test_persistent_failure_cleans_up(self, tmp_path, monkeypatch, make_udif):
+        dmg, _, chunklist = self._image(make_udif)
+        server = _FakeRangeServer(dmg, etag='"v1"')
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", server)
+        monkeypatch.setattr(dl_module, "_pipe_chunks", lambda *a: (_ for _ in ()).throw(ConnectionResetError("reset")))
+
+        dest = tmp_path / "sonoma-recovery.img"
+        with pytest.raises(DownloadError, match="after 3 attempts"):
+            _stream_recovery_image(self.URL, {}, chunklist, dest, None, "recovery")
+        assert not dest.exists()
+        assert not (tmp_path / "sonoma-recovery.img.part").exists()
 
-        dmg = tmp_path / "BaseSystem.dmg"
-        chunklist = tmp_path / "BaseSystem.chunklist"
-        dmg.write_bytes(b"x" * 1024)
-        chunklist.write_bytes(b"y" * 64)
-        dest = tmp_path / "recovery.img"
+    def test_download_recovery_never_writes_dmg(self, tmp_path, monkeypatch, make_udif):
+        dmg, expected, _ = self._image(make_udif)
+        servers = {
+            "https://oscdn.apple.com/BaseSystem.chunklist": _FakeRangeServer(_make_chunklist(dmg, chunk_size=256)),
+            self.URL: _FakeRangeServer(dmg, etag='"v1"'),
+        }
+        monkeypatch.setattr(dl_module.http_pool, "urlopen", lambda req, timeout=None: servers[req.full_url](req))
+        monkeypatch.setattr(dl_module, "_get_recovery_session", lambda: "session=X")
+        monkeypatch.setattr(dl_module, "_get_recovery_image_info", lambda s, b, o="default": {
+            "AU": self.URL, "AT": "T", "CU": "https://oscdn.apple.com/BaseSystem.chunklist", "CT": "T",
+        })
 
-        def handler(argv):
-            return CommandResult(ok=False, returncode=127, output="Command not found: dmg2img")
+        def no_dmg(*args, **kwargs):
+            raise AssertionError("pipeline mode must not save the DMG")
 
-        import osx_proxmox_next.services as _svc
-        monkeypatch.setattr(_svc, "get_proxmox_adapter", lambda: _FakeAdapter(handler))
+        monkeypatch.setattr(dl_module, "_build_recovery_image", no_dmg)
 
-        with pytest.raises(DownloadError, match="dmg2img is required but not installed"):
-            _build_recovery_image(dmg, chunklist, dest)
+        result = download_recovery("sonoma", tmp_path)
+        assert result.read_bytes() == expected
+        assert sorted(p.name for p in tmp_path.iterdir() if not p.name.startswith(".")) == ["sonoma-recovery.img"]
+        assert dl_module.AssetStore().entry(result).validator == '"v1"'
+
+    def test_partial_dmg_from_earlier_run_is_resumed(self, tmp_path, monkeypatch):
+        (tmp_path / "sonoma-BaseSystem.dmg.part").write_bytes(b"partial")
+        monkeypatch.setattr(dl_module, "_get_recovery_session", lambda: "session=X")
+        monkeypatch.setattr(dl_module, "_get_recovery_image_info", lambda s, b, o="default": {
+            "AU": self.URL, "AT": "T", "CU": "https://oscdn.apple.com/cl", "CT": "T",
+        })
+        monkeypatch.setattr(dl_module, "_download_file_with_token", _fake_token_download)
+        monkeypatch.setattr(dl_module, "_stream_recovery_image", lambda *a: pytest.fail("pipeline used"))
+        monkeypatch.setattr(dl_module, "_build_recovery_image", lambda dmg, cl, dest: dest.write_bytes(b"img"))
+
+        assert download_recovery("sonoma", tmp_path).read_bytes() == b"img"
 
 
 class TestRecoveryOsType:
@@ -720,13 +1697,12 @@ class TestRecoveryOsType:
 
         monkeypatch.setattr(dl_module, "_get_recovery_image_info", spy_get_info)
         monkeypatch.setattr(dl_module, "_get_recovery_session", lambda: "session=X")
-        monkeypatch.setattr(dl_module, "_download_file_with_token",
-                            lambda *a, **kw: None)
+        monkeypatch.setattr(dl_module, "_download_file_with_token", _fake_token_download)
         monkeypatch.setattr(dl_module, "_build_recovery_image",
                             lambda dmg, cl, dest: dest.write_bytes(b"img"))
         monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
 
-        download_recovery("sonoma", tmp_path)
+        download_recovery("sonoma", tmp_path, options=DownloadOptions(pipeline=False))
         assert captured[0] == "default"
 
     def test_ventura_uses_default(self, tmp_path, monkeypatch):
@@ -742,13 +1718,12 @@ class TestRecoveryOsType:
 
         monkeypatch.setattr(dl_module, "_get_recovery_image_info", spy_get_info)
         monkeypatch.setattr(dl_module, "_get_recovery_session", lambda: "session=X")
-        monkeypatch.setattr(dl_module, "_download_file_with_token",
-                            lambda *a, **kw: None)
+        monkeypatch.setattr(dl_module, "_download_file_with_token", _fake_token_download)
         monkeypatch.setattr(dl_module, "_build_recovery_image",
                             lambda dmg, cl, dest: dest.write_bytes(b"img"))
         monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
 
-        download_recovery("ventura", tmp_path)
+        download_recovery("ventura", tmp_path, options=DownloadOptions(pipeline=False))
         assert captured[0] == "default"
 
     def test_tahoe_uses_latest(self, tmp_path, monkeypatch):
@@ -764,11 +1739,77 @@ class TestRecoveryOsType:
 
         monkeypatch.setattr(dl_module, "_get_recovery_image_info", spy_get_info)
         monkeypatch.setattr(dl_module, "_get_recovery_session", lambda: "session=X")
-        monkeypatch.setattr(dl_module, "_download_file_with_token",
-                            lambda *a, **kw: None)
+        monkeypatch.setattr(dl_module, "_download_file_with_token", _fake_token_download)
         monkeypatch.setattr(dl_module, "_build_recovery_image",
                             lambda dmg, cl, dest: dest.write_bytes(b"img"))
         monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
 
-        download_recovery("tahoe", tmp_path)
+        download_recovery("tahoe", tmp_path, options=DownloadOptions(pipeline=False))
         assert captured[0] == "latest"
+
+
+class TestDeltaRefresh:
+    URL = "https://oscdn.apple.com/BaseSystem.dmg"
+    CL_URL = "https://oscdn.apple.com/BaseSystem.chunklist"
+    REFRESH = DownloadOptions(refresh=True)
+
+    @pytest.fixture(autouse=True)
+    def _recovery(self, monkeypatch):
+        monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
+        self.servers = {}
+        monkeypatch.setattr(
+            dl_module.http_pool, "urlopen", lambda req, timeout=None: self.servers[req.full_url](req),
+        )
+        monkeypatch.setattr(dl_module, "_get_recovery_session", lambda: "session=X")
+        monkeypatch.setattr(dl_module, "_get_recovery_image_info", lambda s, b, o="default": {
+            "AU": self.URL, "AT": "T", "CU": self.CL_URL, "CT": "T",
+        })
+
+    def _publish(self, make_udif, changed: dict[int, bytes]):
+        from osx_proxmox_next.udif import BLOCK_RAW
+        # Raw 1 KiB runs, one per 1 KiB chunk, so a changed run changes one chunk
+        runs = [(BLOCK_RAW, changed.get(i, bytes([i + 1]) * 1024)) for i in range(8)]
+        dmg, expected = make_udif(runs)
+        self.servers[self.URL] = _FakeRangeServer(dmg, etag=f'"{len(changed)}"')
+        self.servers[self.CL_URL] = _FakeRangeServer(_make_chunklist(dmg, chunk_size=1024))
+        return expected
+
+    def test_fetches_only_changed_chunks(self, tmp_path, make_udif):
+        self._publish(make_udif, {})
+        dest = download_recovery("sonoma", tmp_path)
+        old_tag = dl_module.AssetStore().entry(dest).tag
+
+        expected = self._publish(make_udif, {3: b"n" * 1024})
+        assert download_recovery("sonoma", tmp_path, options=self.REFRESH) == dest
+        assert dest.read_bytes() == expected
+        ranges = self.servers[self.URL].ranges
+        # The block map chunks, then run 3 alone
+        assert "bytes=3072-4095" in ranges
+        assert not any(r.startswith(("bytes=0-", "bytes=1024-", "bytes=5120-")) for r in ranges)
+        entry = dl_module.AssetStore().entry(dest)
+        assert entry.tag != old_tag
+        assert entry.validator == ""
+        assert dl_module.load_block_map(entry.tag) is not None
+        assert dl_module.load_block_map(old_tag) is None  # pruned with the old build
+
+    def test_runs_edited_after_conversion_are_refetched(self, tmp_path, make_udif):
+        self._publish(make_udif, {})
+        dest = download_recovery("sonoma", tmp_path)
+        with dest.open("r+b") as f:  # what the recovery stamp does
+            f.seek(5 * 1024 + 10)
+            f.write(b"stamped")
+
+        expected = self._publish(make_udif, {3: b"n" * 1024})
+        download_recovery("sonoma", tmp_path, options=self.REFRESH)
+        assert dest.read_bytes() == expected
+        assert "bytes=5120-6143" in self.servers[self.URL].ranges
+
+    def test_without_block_map_downloads_whole(self, tmp_path, make_udif):
+        self._publish(make_udif, {})
+        dest = download_recovery("sonoma", tmp_path)
+        dl_module.prune_block_maps(set())
+
+        expected = self._publish(make_udif, {3: b"n" * 1024})
+        download_recovery("sonoma", tmp_path, options=self.REFRESH)
+        assert dest.read_bytes() == expected
+        assert self.servers[self.URL].ranges[-1] == "bytes=0-"
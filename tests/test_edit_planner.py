@@ -212,3 +212,11 @@ def test_build_edit_plan_custom_disk_name():
     assert "sata0" in resize.argv
     assert "virtio0" not in resize.argv
     assert steps[0].title == "Stop VM (if running)"
+
+
+def test_build_edit_plan_merges_qm_set_changes():
+    steps = build_edit_plan(900, EditChanges(cores=4, memory_mb=8192, disk_gb_add=10), start_after=True)
+    assert [s.argv[:2] for s in steps[1:]] == [["qm", "set"], ["qm", "resize"], ["qm", "start"]]
+    assert steps[1].argv[3:] == ["--cores", "4", "--memory", "8192"]
+    assert steps[1].parts == ["Set CPU cores to 4", "Set memory to 8192 MB"]
+    assert len(build_edit_plan(900, EditChanges(cores=4, memory_mb=8192), optimize=False)) == 3
@@ -155,3 +155,357 @@ def test_apply_plan_empty_plan():
     assert result.ok is True
     assert result.results == []
     assert result.log_path.exists()
+
+
+class _RecordingAdapter:
+    """Runs steps without subprocesses; ``argv[0]`` picks the behaviour."""
+
+    def __init__(self, barrier=None):
+        import threading
+        self.barrier = barrier
+        self.lock = threading.Lock()
+        self.active: set[str] = set()
+        self.overlaps: list[tuple[str, ...]] = []
+        self.ran: list[str] = []
+
+    def run(self, argv):
+        import time
+        from osx_proxmox_next.infrastructure import CommandResult
+        name = argv[1]
+        with self.lock:
+            self.ran.append(name)
+            self.active.add(name)
+            if len(self.active) > 1:
+                self.overlaps.append(tuple(sorted(self.active)))
+        if argv[0] == "meet":
+            self.barrier.wait()
+        elif argv[0] == "slow":
+            time.sleep(0.05)
+        with self.lock:
+            self.active.discard(name)
+        return CommandResult(ok=argv[0] != "fail", returncode=int(argv[0] == "fail"), output=name)
+
+
+def test_independent_steps_run_together():
+    import threading
+    adapter = _RecordingAdapter(barrier=threading.Barrier(2, timeout=5))
+    steps = [
+        PlanStep("Build", ["meet", "build"], key="build", after=[]),
+        PlanStep("Stamp", ["meet", "stamp"], key="stamp", after=[]),
+        PlanStep("Import", ["ok", "import"], after=["build", "stamp"]),
+    ]
+    result = apply_plan(steps, execute=True, adapter=adapter)
+    assert result.ok
+    assert adapter.ran[-1] == "import"
+    assert [r.title for r in result.results] == ["Build", "Stamp", "Import"]
+
+
+def test_callbacks_and_log_keep_plan_order():
+    adapter = _RecordingAdapter()
+    steps = [
+        PlanStep("Slow", ["slow", "a"], key="a", after=[]),
+        PlanStep("Fast", ["ok", "b"], key="b", after=[]),
+    ]
+    seen = []
+    result = apply_plan(steps, execute=True, adapter=adapter,
+                        on_step=lambda idx, total, step, res: seen.append((idx, res is not None)))
+    # Fast finished first but is reported after Slow
+    assert seen == [(1, False), (1, True), (2, False), (2, True)]
+    log = result.log_path.read_text()
+    assert log.index("## Slow") < log.index("## Fast")
+
+
+def test_shared_resource_serialises():
+    adapter = _RecordingAdapter()
+    steps = [
+        PlanStep("Set A", ["slow", "a"], key="a", after=[], resources=["vm:900"]),
+        PlanStep("Set B", ["slow", "b"], key="b", after=[], resources=["vm:900"]),
+        PlanStep("Build", ["slow", "c"], key="c", after=[]),
+    ]
+    assert apply_plan(steps, execute=True, adapter=adapter).ok
+    assert ("a", "b") not in adapter.overlaps
+
+
+def test_failure_stops_new_work_and_names_branch():
+    adapter = _RecordingAdapter()
+    steps = [
+        PlanStep("Build", ["slow", "build"], key="build", after=[]),
+        PlanStep("Stamp", ["fail", "stamp"], key="stamp", after=[]),
+        PlanStep("Import", ["ok", "import"], after=["build"]),
+        PlanStep("Start", ["ok", "start"], after=["stamp"]),
+    ]
+    result = apply_plan(steps, execute=True, adapter=adapter)
+    assert result.ok is False
+    assert result.failed == "Stamp"
+    assert result.skipped == ["Import", "Start"]
+    # The step already running when Stamp failed was allowed to finish
+    assert [r.title for r in result.results] == ["Build", "Stamp"]
+    assert "# FAILED: Stamp" in result.log_path.read_text()
+
+
+def test_jobs_one_keeps_plan_order():
+    adapter = _RecordingAdapter()
+    steps = [PlanStep(f"S{i}", ["ok", f"s{i}"], key=f"s{i}", after=[]) for i in range(4)]
+    assert apply_plan(steps, execute=True, adapter=adapter, jobs=1).ok
+    assert adapter.ran == ["s0", "s1", "s2", "s3"]
+    assert adapter.overlaps == []
+
+
+def test_unknown_dependency_is_rejected():
+    import pytest
+    from osx_proxmox_next.executor import step_dependencies
+
+    with pytest.raises(ValueError, match="not an earlier step"):
+        step_dependencies([PlanStep("A", ["x"], after=["b"]), PlanStep("B", ["x"], key="b")])
+    with pytest.raises(ValueError, match="ambiguous"):
+        step_dependencies([PlanStep("A", ["x"]), PlanStep("A", ["x"]), PlanStep("C", ["x"], after=["A"])])
+    # Undeclared dependencies chain each step to the one before
+    assert step_dependencies([PlanStep("A", ["x"]), PlanStep("B", ["x"])]) == [set(), {0}]
+
+
+def test_live_output_streams_to_hook_and_log():
+    import sys
+    steps = [
+        PlanStep("Build", [sys.executable, "-c", "print('building'); print('built')"]),
+        PlanStep("Import", [sys.executable, "-c", "print('imported')"]),
+    ]
+    lines = []
+    result = apply_plan(steps, execute=True, adapter=ProxmoxAdapter(),
+                        on_output=lambda idx, step, line: lines.append((idx, step.title, line)))
+    assert result.ok
+    assert lines == [(1, "Build", "building"), (1, "Build", "built"), (2, "Import", "imported")]
+    log = result.log_path.read_text()
+    assert "[01] building\n[01] built\n## Build" in log
+    assert result.results[0].output == "building\nbuilt"
+
+
+def _sleep_step(title, seconds, **kw):
+    import sys
+    return PlanStep(title, [sys.executable, "-c", f"import time; time.sleep({seconds}); print('{title}')"], **kw)
+
+
+def test_async_plans_share_one_loop():
+    import asyncio
+    import time
+    from osx_proxmox_next.executor import apply_plan_async
+
+    async def main():
+        plans = [[_sleep_step(f"VM{n} step", 0.3)] for n in range(6)]
+        return await asyncio.gather(*(apply_plan_async(plan, execute=True) for plan in plans))
+
+    start = time.monotonic()
+    results = asyncio.run(main())
+    assert all(r.ok for r in results)
+    assert len({r.log_path for r in results}) == 6
+    assert [r.results[0].output for r in results] == [f"VM{n} step" for n in range(6)]
+    # Six 0.3 s commands at once, not one after another
+    assert time.monotonic() - start < 1.5
+
+
+def test_async_plan_timeout_cancels_running_steps():
+    import asyncio
+    from osx_proxmox_next.executor import apply_plan_async
+
+    steps = [
+        _sleep_step("Quick", 0, key="quick", after=[]),
+        _sleep_step("Hang", 30, key="hang", after=[]),
+        _sleep_step("Later", 0, after=["hang"]),
+    ]
+    result = asyncio.run(apply_plan_async(steps, execute=True, timeout=0.5))
+    assert result.ok is False
+    assert result.failed == "Hang"
+    assert result.skipped == ["Later"]
+    assert result.results[1].returncode == 124
+    assert result.results[1].output == "Cancelled: plan timed out after 0.5s"
+
+
+def test_async_plan_cancellation_is_logged():
+    import asyncio
+    import pytest
+    from osx_proxmox_next.executor import apply_plan_async
+    logs = []
+
+    async def main():
+        task = asyncio.ensure_future(apply_plan_async([_sleep_step("Hang", 30)], execute=True))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    from pathlib import Path
+    log = max((Path.cwd() / "generated" / "logs").glob("apply-*.log"), key=lambda p: p.stat().st_mtime)
+    assert log.read_text().endswith("# CANCELLED\n")
+
+
+def test_step_that_raises_fails_the_plan_and_cancels_the_rest():
+    import asyncio
+    import time
+    from osx_proxmox_next.executor import apply_plan_async
+    from osx_proxmox_next.infrastructure import AsyncProxmoxAdapter
+
+    class BuggyAdapter(AsyncProxmoxAdapter):
+        async def run(self, argv, **kwargs):
+            if argv[0] == "boom":
+                await asyncio.sleep(0.2)
+                raise RuntimeError("adapter bug")
+            return await super().run(argv, **kwargs)
+
+    steps = [
+        _sleep_step("Hang", 30, key="hang", after=[]),
+        PlanStep("Boom", ["boom"], key="boom", after=[]),
+        _sleep_step("Later", 0, after=["hang", "boom"]),
+    ]
+    start = time.monotonic()
+    result = asyncio.run(apply_plan_async(steps, execute=True, adapter=BuggyAdapter()))
+    assert time.monotonic() - start < 5
+    assert result.ok is False
+    assert result.failed == "Boom"
+    assert result.skipped == ["Later"]
+    hang, boom = result.results
+    assert boom.output == "Step raised RuntimeError: adapter bug"
+    assert hang.output == "Cancelled: another step raised"
+    assert "# FAILED: Boom" in result.log_path.read_text()
+
+
+def test_limits_are_shared_slots_across_plans():
+    import asyncio
+    from osx_proxmox_next.executor import apply_plan_async
+    adapter = _RecordingAdapter()
+
+    async def main():
+        limits = {"io:local-lvm": asyncio.Semaphore(2)}
+        plans = [
+            [
+                PlanStep("Import", ["slow", f"import{n}"], key="import", after=[], resources=["io:local-lvm"]),
+                PlanStep("Set", ["slow", f"set{n}"], after=[]),
+            ]
+            for n in range(4)
+        ]
+        return await asyncio.gather(*(
+            apply_plan_async(plan, execute=True, adapter=adapter, limits=limits) for plan in plans
+        ))
+
+    assert all(r.ok for r in asyncio.run(main()))
+    imports_at_once = max(
+        (sum(name.startswith("import") for name in overlap) for overlap in adapter.overlaps), default=1,
+    )
+    assert imports_at_once == 2
+    # Cheap steps were not held back by the limit
+    assert any(sum(name.startswith("set") for name in overlap) > 2 for overlap in adapter.overlaps)
+
+
+def test_step_results_carry_timing_and_json_log():
+    import json
+    import sys
+    steps = [
+        PlanStep("Alloc", [sys.executable, "-c", "x = bytearray(32 * 1024 * 1024); print('ok')"]),
+        _sleep_step("Wait", 0.2),
+    ]
+    result = apply_plan(steps, execute=True, adapter=ProxmoxAdapter(), on_output=lambda *a: None)
+    alloc, wait = result.results
+    assert alloc.started <= alloc.finished <= wait.started
+    assert wait.duration >= 0.2
+    assert alloc.max_rss_kb > 32 * 1024
+    records = [json.loads(line) for line in result.json_log_path.read_text().splitlines()]
+    assert result.json_log_path == result.log_path.with_suffix(".jsonl")
+    assert [(r["event"], r.get("title")) for r in records] == [("step", "Alloc"), ("step", "Wait"), ("plan", None)]
+    assert records[0]["max_rss_kb"] == alloc.max_rss_kb
+    assert records[2]["ok"] is True and records[2]["finished"] == wait.finished
+
+
+def test_dry_run_json_log_has_untimed_steps():
+    import json
+    result = apply_plan([PlanStep("Echo", ["echo", "hi"])], execute=False)
+    step, plan = (json.loads(line) for line in result.json_log_path.read_text().splitlines())
+    assert (step["title"], step["duration"], plan["execute"]) == ("Echo", 0, False)
+
+
+
+class _FlakyAdapter(_RecordingAdapter):
+    """Fails the named commands, whatever their ``argv[0]``."""
+
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+
+    def run(self, argv):
+        from osx_proxmox_next.infrastructure import CommandResult
+        result = super().run(argv)
+        if argv[1] in self.failing:
+            return CommandResult(ok=False, returncode=1, output=argv[1])
+        return result
+
+
+def _journal_plan(probe_create="ok"):
+    return [
+        PlanStep("Create", ["ok", "create"], key="create", resources=["vm:900"],
+                 probe=[probe_create, "probe-create"]),
+        PlanStep("Profile", ["ok", "profile"], key="profile", after=["create"]),
+        PlanStep("Import", ["ok", "import"], key="import", after=["profile"]),
+        PlanStep("Start", ["ok", "start"], after=["import"]),
+    ]
+
+
+def test_resume_skips_steps_a_failed_run_completed(monkeypatch, tmp_path):
+    from osx_proxmox_next.journal import find_journal
+    monkeypatch.chdir(tmp_path)
+    steps = _journal_plan()
+    assert not apply_plan(steps, execute=True, adapter=_FlakyAdapter({"import"})).ok
+    journal = find_journal("vm:900")
+    assert journal is not None and sorted(journal.completed) == [0, 1]
+
+    adapter = _FlakyAdapter()
+    seen = []
+    result = apply_plan(
+        journal.steps, execute=True, adapter=adapter, resume=True,
+        on_step=lambda idx, total, step, res: res and seen.append((step.title, res.already_done)),
+    )
+    assert result.ok
+    # Create was checked by its probe; Profile has none and is trusted
+    assert adapter.ran == ["probe-create", "import", "start"]
+    assert seen == [("Create", True), ("Profile", True), ("Import", False), ("Start", False)]
+    assert "Resuming" in result.log_path.read_text()
+    assert find_journal("vm:900") is None
+
+
+def test_resume_reruns_a_step_whose_probe_fails(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    steps = _journal_plan(probe_create="fail")
+    apply_plan(steps, execute=True, adapter=_FlakyAdapter({"import"}))
+    adapter = _FlakyAdapter()
+    result = apply_plan(steps, execute=True, adapter=adapter, resume=True)
+    assert result.ok
+    # Profile is journaled as done, but it was built on the new VM shell
+    assert adapter.ran == ["probe-create", "create", "profile", "import", "start"]
+    log = result.log_path.read_text()
+    assert "no longer in place" in log
+    assert "a step it builds on ran again" in log
+
+
+def test_satisfied_probes_skip_steps_without_a_journal(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    steps = _journal_plan()
+    steps[2].probe = ["ok", "probe-import"]
+    adapter = _FlakyAdapter()
+    result = apply_plan(steps, execute=True, adapter=adapter)
+    assert result.ok
+    assert adapter.ran == ["probe-create", "profile", "probe-import", "start"]
+    assert [r.already_done for r in result.results] == [True, False, True, False]
+    assert result.results[0].output == "Skipped: already in place"
+
+
+def test_step_rebuilt_upstream_is_not_probed(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    steps = _journal_plan(probe_create="fail")
+    steps[2].probe = ["ok", "probe-import"]
+    adapter = _FlakyAdapter()
+    assert apply_plan(steps, execute=True, adapter=adapter).ok
+    # Create ran, so Profile (no probe) carries that on and Import's probe is moot
+    assert adapter.ran == ["probe-create", "create", "profile", "import", "start"]
+
+
+def test_dry_run_does_not_probe():
+    adapter = _FlakyAdapter()
+    apply_plan(_journal_plan(), execute=False, adapter=adapter)
+    assert adapter.ran == []
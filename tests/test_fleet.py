@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import osx_proxmox_next.fleet as fleet_module
+from osx_proxmox_next.assets import AssetCheck
+from osx_proxmox_next.domain import PlanStep, VmConfig
+from osx_proxmox_next.fleet import (
+    FAILED,
+    NOT_RUN,
+    OK,
+    ManifestError,
+    apply_fleet,
+    fleet_plan,
+    load_manifest,
+    parse_manifest,
+    stage_assets,
+)
+from osx_proxmox_next.infrastructure import CommandResult
+
+_DEFAULTS = {
+    "macos": "sequoia", "cores": 4, "memory": 8192, "disk": 128,
+    "bridge": "vmbr0", "storage": "local-lvm", "net_model": "vmxnet3",
+}
+
+
+def _config(vmid: int, **kw) -> VmConfig:
+    values = {
+        "vmid": vmid, "name": f"mac-{vmid}", "macos": "sequoia", "cores": 4, "memory_mb": 8192,
+        "disk_gb": 128, "bridge": "vmbr0", "storage": "local-lvm", **kw,
+    }
+    return VmConfig(**values)
+
+
+class TestManifest:
+    def test_defaults_and_aliases(self):
+        configs = parse_manifest({
+            "defaults": _DEFAULTS,
+            "vm": [{"vmid": 910, "name": "build-01"}, {"vmid": 911, "name": "build-02", "cores": 8}],
+        })
+        assert [(c.vmid, c.name, c.cores, c.memory_mb, c.disk_gb) for c in configs] == [
+            (910, "build-01", 4, 8192, 128), (911, "build-02", 8, 8192, 128),
+        ]
+
+    def test_net_model_detected_when_unset(self, monkeypatch):
+        monkeypatch.setattr(fleet_module, "detect_net_model", lambda cpu: "e1000-82545em")
+        defaults = {k: v for k, v in _DEFAULTS.items() if k != "net_model"}
+        (config,) = parse_manifest({"defaults": defaults, "vm": [{"vmid": 910, "name": "mac-a"}]})
+        assert config.net_model == "e1000-82545em"
+
+    def test_every_problem_is_reported(self):
+        with pytest.raises(ManifestError) as exc_info:
+            parse_manifest({"defaults": _DEFAULTS, "vm": [
+                {"vmid": 910, "name": "mac-a", "colour": "blue"},
+                {"vmid": "911", "name": "mac-b"},
+                {"name": "mac-c"},
+                {"vmid": 912, "name": "mac-d", "cores": 1},
+                {"vmid": 913, "name": "mac-e"},
+                {"vmid": 913, "name": "mac-f"},
+            ]})
+        assert str(exc_info.value).splitlines() == [
+            "vm #1: unknown setting 'colour'",
+            "vm #2: vmid must be int, not '911'",
+            "vm #3 (mac-c): missing vmid",
+            "vm #4 (mac-d): At least 2 CPU cores are required.",
+            "VMID 913 is used by both 'mac-e' and 'mac-f'",
+        ]
+
+    def test_empty_manifest(self):
+        with pytest.raises(ManifestError, match="non-empty 'vm' list"):
+            parse_manifest({"defaults": _DEFAULTS})
+
+    @pytest.mark.skipif(fleet_module.tomllib is None, reason="tomllib needs Python 3.11")
+    def test_load_toml(self, tmp_path):
+        path = tmp_path / "fleet.toml"
+        path.write_text(
+            "[defaults]\n" + "".join(f"{k} = {json.dumps(v)}\n" for k, v in _DEFAULTS.items())
+            + "\n[[vm]]\nvmid = 910\nname = \"build-01\"\n"
+        )
+        assert [c.vmid for c in load_manifest(path)] == [910]
+
+    def test_load_json_and_errors(self, tmp_path):
+        path = tmp_path / "fleet.json"
+        path.write_text(json.dumps({"defaults": _DEFAULTS, "vm": [{"vmid": 910, "name": "mac-a"}]}))
+        assert [c.name for c in load_manifest(path)] == ["mac-a"]
+        path.write_text("{")
+        with pytest.raises(ManifestError, match="fleet.json"):
+            load_manifest(path)
+        with pytest.raises(ManifestError, match="Cannot read"):
+            load_manifest(tmp_path / "missing.json")
+
+
+class TestStaging:
+    def test_one_download_per_release(self, monkeypatch, tmp_path):
+        downloads = []
+        monkeypatch.setattr(fleet_module, "required_assets", lambda cfg: [
+            AssetCheck("OpenCore image", tmp_path / f"oc-{cfg.macos}.iso", False, "", downloadable=True),
+        ])
+        monkeypatch.setattr(fleet_module, "detect_iso_storage", lambda: [str(tmp_path)])
+
+        def fake_worker(config, missing, on_progress, options=None):
+            downloads.append((config.macos, config.iso_dir))
+            return ["boom"] if config.macos == "sonoma" else []
+
+        monkeypatch.setattr(fleet_module, "run_download_worker", fake_worker)
+        configs = [_config(910), _config(911), _config(912, macos="sonoma"), _config(913)]
+        assert stage_assets(configs) == ["boom"]
+        assert downloads == [("sequoia", str(tmp_path)), ("sonoma", str(tmp_path))]
+
+
+def test_fleet_plan_tags_io_and_shared_image():
+    steps = {step.name: step for step in fleet_plan(_config(910))}
+    assert "io:local-lvm" in steps["opencore-import"].resources
+    assert "io:local-lvm" in steps["recovery-import"].resources
+    assert "io:local-lvm" not in steps["main-disk"].resources
+    image = [r for r in steps["recovery-stamp"].resources if r.startswith("image:")]
+    assert image and image[0] in steps["recovery-import"].resources
+    opencore = [r for r in steps["opencore-build"].resources if r.startswith("image:")]
+    assert opencore and opencore != image
+
+
+class _FleetAdapter:
+    """Blocking adapter recording which fake commands overlapped."""
+
+    def __init__(self, fail: str = "") -> None:
+        self.fail = fail
+        self.lock = threading.Lock()
+        self.active: set[str] = set()
+        self.max_io = 0
+        self.max_builds = 0
+        self.max_active = 0
+
+    def run(self, argv):
+        kind, name = argv
+        with self.lock:
+            self.active.add(name)
+            self.max_io = max(self.max_io, sum(n.startswith("io ") for n in self.active))
+            self.max_builds = max(self.max_builds, sum(n.startswith("io build ") for n in self.active))
+            self.max_active = max(self.max_active, len(self.active))
+        time.sleep(0.05 if kind == "io" else 0.02)
+        with self.lock:
+            self.active.discard(name)
+        ok = name != self.fail
+        return CommandResult(ok=ok, returncode=0 if ok else 1, output=name)
+
+
+def _fake_plan(config: VmConfig) -> list[PlanStep]:
+    vmid = config.vmid
+    return [
+        PlanStep("Create VM shell", ["qm", f"create {vmid}"], key="create"),
+        PlanStep("Build OpenCore boot disk", ["io", f"io build {vmid}"], key="opencore-build", after=[]),
+        PlanStep("Import OpenCore", ["io", f"io import {vmid}"], key="opencore-import",
+                 after=["create", "opencore-build"]),
+        PlanStep("Set profile", ["qm", f"profile {vmid}"], after=["create"]),
+        PlanStep("Start VM", ["qm", f"start {vmid}"], after=["opencore-import"]),
+    ]
+
+
+@pytest.fixture
+def assets_ok(monkeypatch):
+    monkeypatch.setattr(fleet_module, "required_assets", lambda cfg: [AssetCheck("OC", Path("/tmp/oc.iso"), True, "")])
+    monkeypatch.setattr(fleet_module, "build_plan", _fake_plan)
+
+
+class TestApplyFleet:
+    def test_io_steps_share_slots_per_storage(self, assets_ok):
+        adapter = _FleetAdapter()
+        configs = [_config(910 + n) for n in range(4)]
+        outcomes = apply_fleet(configs, execute=True, adapter=adapter, io_jobs=1)
+        assert [o.status for o in outcomes] == [OK] * 4
+        assert adapter.max_io == 1
+        # The qm steps of other VMs ran alongside the disk work
+        assert adapter.max_active > 1
+        assert len({o.result.log_path for o in outcomes}) == 4
+
+    def test_builds_from_one_opencore_iso_take_turns(self, assets_ok):
+        adapter = _FleetAdapter()
+        configs = [_config(910, storage="fast"), _config(911, storage="slow")]
+        assert all(o.ok for o in apply_fleet(configs, execute=True, adapter=adapter, io_jobs=2))
+        # Separate storages and free I/O slots, but the builds share one source ISO
+        assert adapter.max_builds == 1
+
+    def test_each_storage_has_its_own_slots(self, assets_ok):
+        adapter = _FleetAdapter()
+        configs = [_config(910, storage="fast"), _config(911, storage="slow")]
+        assert all(o.ok for o in apply_fleet(configs, execute=True, adapter=adapter, io_jobs=1))
+        assert adapter.max_io == 2
+
+    def test_failures_and_missing_assets_stay_per_vm(self, assets_ok, monkeypatch):
+        monkeypatch.setattr(fleet_module, "required_assets", lambda cfg: [
+            AssetCheck("Recovery image", Path("/tmp/rec.img"), cfg.vmid != 912, ""),
+        ])
+        seen = []
+        outcomes = apply_fleet(
+            [_config(910), _config(911), _config(912)], execute=True,
+            adapter=_FleetAdapter(fail="io import 911"),
+            on_step=lambda config, idx, total, step, result: seen.append(config.vmid),
+        )
+        assert [(o.status, o.detail) for o in outcomes] == [
+            (OK, ""), (FAILED, "Import OpenCore"), (NOT_RUN, "missing Recovery image"),
+        ]
+        assert outcomes[2].result is None
+        assert set(seen) == {910, 911}
+
+    def test_dry_run(self, assets_ok):
+        outcomes = apply_fleet([_config(910), _config(911)])
+        assert all(o.ok for o in outcomes)
+        assert "[DRY-RUN] Create VM shell" in outcomes[0].result.log_path.read_text()
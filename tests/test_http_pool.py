@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import osx_proxmox_next.http_pool as pool_module
+from osx_proxmox_next.http_pool import ConnectionPool
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.seen.append((self.client_address, self.command, self.path, dict(self.headers)))
+        if self.path == "/missing":
+            self._reply(404, b"nope")
+        elif self.path == "/redirect":
+            self._reply(302, b"", {"Location": "/target"})
+        elif self.path == "/close":
+            self._reply(200, b"bye", {"Connection": "close"})
+        elif self.path == "/big":
+            self._reply(200, b"x" * 100_000)
+        else:
+            self._reply(200, self.path.encode())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.seen.append((self.client_address, self.command, self.path, dict(self.headers)))
+        if self.path == "/see-other":
+            self._reply(303, b"", {"Location": "/target"})
+        else:
+            self._reply(200, body)
+
+    def _reply(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.daemon_threads = True
+    srv.seen = []
+    threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}"
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def pool():
+    p = ConnectionPool()
+    yield p
+    p.close()
+
+
+def _connections(server) -> set:
+    return {client for client, *_ in server.seen}
+
+
+def test_sequential_requests_share_one_connection(server, pool):
+    for path in ("/a", "/b", "/c"):
+        with pool.urlopen(server.url + path) as resp:
+            assert resp.read() == path.encode()
+    assert pool.opened == 1
+    assert len(_connections(server)) == 1
+
+
+def test_unread_response_is_not_reused(server, pool):
+    with pool.urlopen(server.url + "/big") as resp:
+        resp.read(10)
+    with pool.urlopen(server.url + "/a") as resp:
+        resp.read()
+    assert pool.opened == 2
+
+
+def test_server_close_is_honoured(server, pool):
+    with pool.urlopen(server.url + "/close") as resp:
+        assert resp.read() == b"bye"
+    with pool.urlopen(server.url + "/a") as resp:
+        resp.read()
+    assert pool.opened == 2
+
+
+def test_idle_connections_expire(server, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(pool_module.time, "monotonic", lambda: now[0])
+    pool = ConnectionPool(idle_timeout=5)
+    with pool.urlopen(server.url + "/a") as resp:
+        resp.read()
+    now[0] += 10
+    with pool.urlopen(server.url + "/b") as resp:
+        resp.read()
+    assert pool.opened == 2
+    pool.close()
+
+
+def test_idle_connections_are_bounded(server):
+    pool = ConnectionPool(max_idle_per_host=1)
+    barrier = threading.Barrier(3, timeout=5)
+
+    def fetch(path):
+        resp = pool.urlopen(server.url + path)
+        barrier.wait()  # all three connections are open at once
+        resp.read()
+        resp.close()
+
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        list(ex.map(fetch, ["/a", "/b", "/c"]))
+    assert sum(len(idle) for idle in pool._idle.values()) == 1
+    pool.close()
+
+
+def test_max_connections_queues_on_one_connection(server, pool):
+    def fetch(path):
+        with pool.urlopen(server.url + path, max_connections=1) as resp:
+            return resp.read()
+
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        assert list(ex.map(fetch, ["/a", "/b", "/c"])) == [b"/a", b"/b", b"/c"]
+    assert pool.opened == 1
+
+
+def test_stale_connection_is_replaced(server, pool):
+    with pool.urlopen(server.url + "/a") as resp:
+        resp.read()
+    # The server drops the idle connection behind the pool's back
+    conn = pool._idle[("http", "127.0.0.1", server.server_address[1])][0][0]
+    conn.sock.close()
+    conn.sock = _ClosedSocket()
+    with pool.urlopen(server.url + "/b") as resp:
+        assert resp.read() == b"/b"
+    assert pool.opened == 2
+
+
+class _ClosedSocket:
+    def sendall(self, data):
+        raise BrokenPipeError("closed by peer")
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_http_errors_match_urllib(server, pool):
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        pool.urlopen(server.url + "/missing")
+    assert exc.value.code == 404
+    assert exc.value.read() == b"nope"
+    with pool.urlopen(server.url + "/a") as resp:
+        resp.read()
+    assert pool.opened == 1
+
+
+def test_connection_refused_is_url_error(pool):
+    with pytest.raises(urllib.error.URLError):
+        pool.urlopen("http://127.0.0.1:1/")
+
+
+def test_redirects_followed(server, pool):
+    with pool.urlopen(server.url + "/redirect") as resp:
+        assert resp.read() == b"/target"
+        assert resp.url == server.url + "/target"
+    req = urllib.request.Request(server.url + "/see-other", data=b"k=v")
+    with pool.urlopen(req) as resp:
+        assert resp.read() == b"/target"
+    assert [(cmd, path) for _, cmd, path, _ in server.seen][-2:] == [("POST", "/see-other"), ("GET", "/target")]
+
+
+def test_headers_and_body(server, pool):
+    req = urllib.request.Request(
+        server.url + "/echo", data=b"a=1", headers={"Host": "osrecovery.apple.com", "Cookie": "s=1"},
+    )
+    with pool.urlopen(req) as resp:
+        assert resp.read() == b"a=1"
+    headers = server.seen[-1][3]
+    assert headers["Host"] == "osrecovery.apple.com"
+    assert headers["Cookie"] == "s=1"
+    assert headers["Content-Type"] == "application/x-www-form-urlencoded"
+    assert headers["User-Agent"].startswith("Python-urllib/")
+
+
+def test_proxy_falls_back_to_urllib(monkeypatch, pool):
+    monkeypatch.setattr(pool_module.urllib.request, "getproxies", lambda: {"http": "http://proxy:3128"})
+    monkeypatch.setattr(pool_module.urllib.request, "proxy_bypass", lambda host: False)
+    calls = []
+    monkeypatch.setattr(
+        pool_module.urllib.request, "urlopen", lambda req, timeout=None: calls.append(req.full_url) or "resp",
+    )
+    assert pool.urlopen("http://example.com/x") == "resp"
+    assert calls == ["http://example.com/x"]
+    assert pool.opened == 0
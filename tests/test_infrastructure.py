@@ -132,3 +132,135 @@ def test_run_command_timeout(monkeypatch):
     assert result.ok is False
     assert result.returncode == 124
     assert "timed out" in result.output
+
+
+def _py(code: str) -> list[str]:
+    import sys
+    return [sys.executable, "-c", code]
+
+
+def test_run_streams_lines_as_printed():
+    seen = []
+    code = "import sys; print('one', flush=True); print('two', file=sys.stderr, flush=True); print('three')"
+    result = ProxmoxAdapter().run(_py(code), on_output=seen.append)
+    assert result.ok is True
+    assert seen == ["one", "two", "three"]
+    assert result.output == "one\ntwo\nthree"
+
+
+def test_run_streaming_keeps_bounded_tail(monkeypatch):
+    import osx_proxmox_next.infrastructure as infra
+    monkeypatch.setattr(infra, "OUTPUT_TAIL_LINES", 3)
+    seen = []
+    result = ProxmoxAdapter().run(_py("for i in range(10): print(i)"), on_output=seen.append)
+    assert len(seen) == 10
+    assert result.output == "[7 earlier lines not kept]\n7\n8\n9"
+
+
+def test_run_streaming_splits_endless_lines(monkeypatch):
+    import osx_proxmox_next.infrastructure as infra
+    monkeypatch.setattr(infra, "_MAX_LINE", 4)
+    seen = []
+    ProxmoxAdapter().run(_py("print('x' * 10, end='')"), on_output=seen.append)
+    assert seen == ["xxxx", "xxxx", "xx"]
+
+
+def test_run_streaming_failure_and_timeout(monkeypatch):
+    import osx_proxmox_next.infrastructure as infra
+    result = ProxmoxAdapter().run(_py("print('boom'); raise SystemExit(3)"), on_output=lambda line: None)
+    assert (result.ok, result.returncode, result.output) == (False, 3, "boom")
+
+    monkeypatch.setattr(infra, "_SUBPROCESS_TIMEOUT", 0.2)
+    result = ProxmoxAdapter().run(_py("import time; print('start', flush=True); time.sleep(30)"), on_output=lambda line: None)
+    assert result.returncode == 124
+    assert result.output.startswith("Command timed out after 0.2s")
+    assert result.output.endswith("start")
+
+
+def test_run_streaming_command_not_found():
+    result = ProxmoxAdapter().run(["/nonexistent/qm"], on_output=lambda line: None)
+    assert (result.ok, result.returncode) == (False, 127)
+
+
+class TestAsyncProxmoxAdapter:
+    def test_streams_and_returns_tail(self):
+        import asyncio
+        from osx_proxmox_next.infrastructure import AsyncProxmoxAdapter
+        seen = []
+        code = "import sys; print('one'); print('two', file=sys.stderr); print('x' * 5000)"
+        result = asyncio.run(AsyncProxmoxAdapter().run(_py(code), on_output=seen.append))
+        assert result.ok is True
+        assert seen[:2] == ["one", "two"]
+        # Same pieces as the blocking adapter
+        assert [len(line) for line in seen[2:]] == [4096, 904]
+
+    def test_reports_usage(self):
+        import asyncio
+        from osx_proxmox_next.infrastructure import AsyncProxmoxAdapter
+        result = asyncio.run(AsyncProxmoxAdapter().run(_py(_BUSY)))
+        assert result.output == "done"
+        assert result.usage.cpu_seconds > 0
+        assert result.usage.max_rss_kb > 64 * 1024
+
+    def test_failure_and_missing_command(self):
+        import asyncio
+        from osx_proxmox_next.infrastructure import AsyncProxmoxAdapter
+        adapter = AsyncProxmoxAdapter()
+        result = asyncio.run(adapter.run(_py("print('boom'); raise SystemExit(2)")))
+        assert (result.ok, result.returncode, result.output) == (False, 2, "boom")
+        assert asyncio.run(adapter.run(["/nonexistent/qm"])).returncode == 127
+
+    def test_timeout_kills_command(self):
+        import asyncio
+        from osx_proxmox_next.infrastructure import AsyncProxmoxAdapter
+        code = "import time; print('start', flush=True); time.sleep(30)"
+        result = asyncio.run(AsyncProxmoxAdapter(timeout=0.3).run(_py(code)))
+        assert result.returncode == 124
+        assert result.output.startswith("Command timed out after 0.3s")
+        assert result.output.endswith("start")
+
+    def test_cancel_kills_command(self):
+        import asyncio
+        import os
+        import pytest
+        from osx_proxmox_next.infrastructure import AsyncProxmoxAdapter
+        pids = []
+
+        async def main():
+            code = "import os, time; print(os.getpid(), flush=True); time.sleep(30)"
+            task = asyncio.ensure_future(AsyncProxmoxAdapter().run(_py(code), on_output=pids.append))
+            while not pids:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
+        with pytest.raises(ProcessLookupError):
+            os.kill(int(pids[0]), 0)
+
+
+_BUSY = "x = bytearray(64 * 1024 * 1024); sum(range(3_000_000)); print('done')"
+
+
+def test_streamed_command_reports_usage_of_its_children():
+    import sys
+    # The work happens in a grandchild; the shell is charged for it once reaped
+    argv = ["sh", "-c", f"{sys.executable} -c \"{_BUSY}\""]
+    result = ProxmoxAdapter().run(argv, on_output=lambda line: None)
+    assert result.ok and result.output == "done"
+    assert result.usage.cpu_seconds > 0
+    assert result.usage.max_rss_kb > 64 * 1024
+    assert result.usage.read_bytes >= 0 and result.usage.write_bytes >= 0
+
+
+def test_usage_falls_back_to_rusage_blocks(monkeypatch):
+    import osx_proxmox_next.infrastructure as infra
+    monkeypatch.setattr(infra, "_read_proc_io", lambda pid: None)
+    result = ProxmoxAdapter().run(_py("print('hi')"), on_output=lambda line: None)
+    assert result.usage is not None and result.usage.cpu_seconds >= 0
+
+
+def test_non_streaming_run_reports_no_usage(monkeypatch):
+    monkeypatch.setattr(subprocess, "run", lambda argv, **kw: subprocess.CompletedProcess(argv, 0, "ok", ""))
+    assert ProxmoxAdapter().run(["qm", "list"]).usage is None
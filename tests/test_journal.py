@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from osx_proxmox_next.domain import PlanStep
+from osx_proxmox_next.journal import Journal, find_journal, journal_dir, open_journal, plan_hash
+
+
+@pytest.fixture(autouse=True)
+def _in_tmp(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+
+def _plan(vmid: int = 900) -> list[PlanStep]:
+    return [
+        PlanStep("Create VM shell", ["qm", "create", str(vmid)], key="create", resources=[f"vm:{vmid}"],
+                 probe=["qm", "status", str(vmid)]),
+        PlanStep("Start VM", ["qm", "start", str(vmid)], resources=[f"vm:{vmid}"]),
+    ]
+
+
+def test_plan_hash_follows_the_commands():
+    assert plan_hash(_plan()) == plan_hash(_plan())
+    assert plan_hash(_plan()) != plan_hash(_plan(901))
+    changed = _plan()
+    changed[1].after = []
+    assert plan_hash(changed) != plan_hash(_plan())
+
+
+def test_round_trip():
+    journal = open_journal(_plan())
+    journal.record(0, 1234.5)
+    loaded = Journal.load(journal.path)
+    assert loaded is not None
+    assert loaded.steps == _plan()
+    assert loaded.completed == {0: 1234.5}
+    assert loaded.plan_hash == plan_hash(_plan())
+    assert list(journal_dir().iterdir()) == [journal.path]
+
+
+def test_resume_keeps_progress_and_fresh_run_resets_it():
+    open_journal(_plan()).record(0, 1.0)
+    assert open_journal(_plan(), resume=True).completed == {0: 1.0}
+    assert open_journal(_plan()).completed == {}
+
+
+def test_edited_or_corrupt_journal_is_ignored():
+    journal = open_journal(_plan())
+    journal.record(0, 1.0)
+    data = json.loads(journal.path.read_text())
+    data["steps"][1]["argv"] = ["qm", "destroy", "900"]
+    journal.path.write_text(json.dumps(data))
+    assert Journal.load(journal.path) is None
+    journal.path.write_text("{")
+    assert Journal.load(journal.path) is None
+    assert open_journal(_plan(), resume=True).completed == {}
+
+
+def test_find_journal_picks_newest_for_the_vm():
+    assert find_journal("vm:900") is None
+    first = open_journal(_plan())
+    other = _plan()
+    other[1].argv = ["qm", "start", "900", "--timeout", "60"]
+    second = open_journal(other)
+    open_journal(_plan(901))
+    second.updated = first.updated + 10
+    second.save()
+    found = find_journal("vm:900")
+    assert found is not None and found.path == second.path
+    second.remove()
+    assert find_journal("vm:900").path == first.path
+    assert find_journal("vm:902") is None
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import io
+import json
+import urllib.error
+
+import pytest
+
+import osx_proxmox_next.metadata_cache as mc_module
+from osx_proxmox_next.metadata_cache import MetadataCache, MetadataUnavailable, offline_mode
+
+URL = "https://api.github.com/repos/x/y/releases/latest"
+
+
+class _Resp(io.BytesIO):
+    def __init__(self, body: dict, headers: dict[str, str] | None = None):
+        super().__init__(json.dumps(body).encode())
+        self.headers = headers or {}
+
+
+class _FakeGitHub:
+    """urlopen stand-in that answers 304 whenever If-None-Match matches."""
+
+    def __init__(self, body: dict, etag: str = '"e1"', status: int = 200):
+        self.body = body
+        self.etag = etag
+        self.status = status
+        self.requests: list[dict[str, str]] = []
+
+    def __call__(self, req, timeout=None, max_connections=None):
+        self.requests.append(dict(req.header_items()))
+        if self.status == 404:
+            raise urllib.error.HTTPError(req.full_url, 404, "Not Found", {}, io.BytesIO(b""))
+        if req.get_header("If-none-match") == self.etag:
+            raise urllib.error.HTTPError(req.full_url, 304, "Not Modified", {}, io.BytesIO(b""))
+        return _Resp(self.body, {"ETag": self.etag, "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(mc_module.time, "time", lambda: now[0])
+    return now
+
+
+def test_fresh_entry_served_without_request(monkeypatch, clock):
+    server = _FakeGitHub({"tag_name": "v1"})
+    monkeypatch.setattr(mc_module.http_pool, "urlopen", server)
+    cache = MetadataCache(ttl=60)
+
+    assert cache.get_json(URL) == {"tag_name": "v1"}
+    clock[0] += 30
+    assert cache.get_json(URL) == {"tag_name": "v1"}
+    assert len(server.requests) == 1
+
+
+def test_expired_entry_revalidated_with_304(monkeypatch, clock):
+    server = _FakeGitHub({"tag_name": "v1"})
+    monkeypatch.setattr(mc_module.http_pool, "urlopen", server)
+    cache = MetadataCache(ttl=60)
+
+    cache.get_json(URL)
+    clock[0] += 120
+    assert cache.get_json(URL) == {"tag_name": "v1"}
+
+    assert server.requests[1]["If-none-match"] == '"e1"'
+    assert server.requests[1]["If-modified-since"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+    # The 304 refreshed the TTL
+    clock[0] += 30
+    cache.get_json(URL)
+    assert len(server.requests) == 2
+
+
+def test_changed_resource_replaces_body(monkeypatch, clock):
+    server = _FakeGitHub({"tag_name": "v1"})
+    monkeypatch.setattr(mc_module.http_pool, "urlopen", server)
+    cache = MetadataCache(ttl=60)
+
+    cache.get_json(URL)
+    server.body, server.etag = {"tag_name": "v2"}, '"e2"'
+    clock[0] += 120
+    assert cache.get_json(URL) == {"tag_name": "v2"}
+
+
+def test_404_is_remembered(monkeypatch, clock):
+    server = _FakeGitHub({}, status=404)
+    monkeypatch.setattr(mc_module.http_pool, "urlopen", server)
+    cache = MetadataCache(ttl=60)
+
+    with pytest.raises(urllib.error.HTTPError):
+        cache.get_json(URL)
+    with pytest.raises(MetadataUnavailable, match="cached 404"):
+        cache.get_json(URL)
+    assert len(server.requests) == 1
+
+
+def test_offline_serves_stale_entry(monkeypatch, clock):
+    monkeypatch.setattr(mc_module.http_pool, "urlopen", _FakeGitHub({"tag_name": "v1"}))
+    cache = MetadataCache(ttl=60)
+    cache.get_json(URL)
+
+    def no_network(req, timeout=None, max_connections=None):
+        raise AssertionError("offline mode must not touch the network")
+
+    monkeypatch.setattr(mc_module.http_pool, "urlopen", no_network)
+    clock[0] += 10_000
+    assert cache.get_json(URL, offline=True) == {"tag_name": "v1"}
+
+
+def test_offline_without_entry_fails_fast():
+    with pytest.raises(MetadataUnavailable, match="offline"):
+        MetadataCache().get_json(URL, offline=True)
+
+
+def test_corrupt_cache_file_is_ignored(tmp_path, monkeypatch):
+    path = tmp_path / "metadata.json"
+    path.write_text("{not json")
+    monkeypatch.setattr(mc_module.http_pool, "urlopen", _FakeGitHub({"tag_name": "v1"}))
+    assert MetadataCache(path=path).get_json(URL) == {"tag_name": "v1"}
+    assert json.loads(path.read_text())["entries"][URL]["etag"] == '"e1"'
+
+
+@pytest.mark.parametrize("value,expected", [("1", True), ("yes", True), ("", False), ("0", False)])
+def test_offline_mode_env(monkeypatch, value, expected):
+    monkeypatch.setenv("OSX_NEXT_OFFLINE", value)
+    assert offline_mode() is expected
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import osx_proxmox_next.downloader as dl_module
+from osx_proxmox_next.asset_store import AssetStore
+from osx_proxmox_next.downloader import DownloadError, DownloadOptions, download_opencore, download_recovery
+from osx_proxmox_next.mirror import CacheMirror, _parse_range, make_server, parse_peers, peers_from_env
+
+
+@pytest.fixture
+def peer(tmp_path):
+    """A serve-cache peer on localhost holding one OpenCore image."""
+    peer_dir = tmp_path / "peer"
+    peer_dir.mkdir()
+    store = AssetStore(index_path=tmp_path / "peer-index.json")
+    image = peer_dir / "opencore-sequoia.iso"
+    image.write_bytes(bytes(range(256)) * 40)
+    store.add(image, url="https://github.com/x/opencore-sequoia.iso", tag="v1")
+
+    server = make_server("127.0.0.1", 0, store=store)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    server.image = image
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url: str, headers: dict[str, str] | None = None):
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}), timeout=5)
+
+
+class TestServer:
+    def test_index_lists_current_hash(self, peer):
+        with _get(f"{peer.url}/index.json") as resp:
+            assets = json.loads(resp.read())["assets"]
+        data = peer.image.read_bytes()
+        assert assets == [{
+            "name": "opencore-sequoia.iso", "sha256": hashlib.sha256(data).hexdigest(),
+            "size": len(data), "tag": "v1", "url": "https://github.com/x/opencore-sequoia.iso",
+        }]
+
+    def test_full_and_ranged_object(self, peer):
+        data = peer.image.read_bytes()
+        sha = hashlib.sha256(data).hexdigest()
+        with _get(f"{peer.url}/objects/{sha}") as resp:
+            assert resp.status == 200
+            assert resp.headers["Accept-Ranges"] == "bytes"
+            assert resp.read() == data
+        with _get(f"{peer.url}/objects/{sha}", {"Range": "bytes=100-199"}) as resp:
+            assert resp.status == 206
+            assert resp.headers["Content-Range"] == f"bytes 100-199/{len(data)}"
+            assert resp.read() == data[100:200]
+
+    def test_stale_if_range_sends_whole_file(self, peer):
+        sha = hashlib.sha256(peer.image.read_bytes()).hexdigest()
+        with _get(f"{peer.url}/objects/{sha}", {"Range": "bytes=10-", "If-Range": '"old"'}) as resp:
+            assert resp.status == 200
+
+    def test_unsatisfiable_range(self, peer):
+        sha = hashlib.sha256(peer.image.read_bytes()).hexdigest()
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            _get(f"{peer.url}/objects/{sha}", {"Range": "bytes=999999-"})
+        assert exc.value.code == 416
+
+    @pytest.mark.parametrize("path", ["/objects/" + "0" * 64, "/objects/../../etc/passwd", "/"])
+    def test_unknown_paths_404(self, peer, path):
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            _get(peer.url + path)
+        assert exc.value.code == 404
+
+    def test_hash_follows_in_place_edits(self, peer):
+        mirror: CacheMirror = peer.mirror
+        before = mirror.refresh()[0]["sha256"]
+        with peer.image.open("r+b") as f:
+            f.write(b"stamped")
+        os.utime(peer.image, ns=(0, 1))
+        after = mirror.refresh()[0]["sha256"]
+        assert after != before
+        assert mirror.object_path(before) is None
+        assert mirror.object_path(after) == peer.image
+
+
+def test_parse_range():
+    assert _parse_range("bytes=0-9", 100) == (0, 10)
+    assert _parse_range("bytes=90-", 100) == (90, 100)
+    assert _parse_range("bytes=-10", 100) == (90, 100)
+    assert _parse_range("bytes=50-500", 100) == (50, 100)
+    assert _parse_range("bytes=100-", 100) is None
+    assert _parse_range("bytes=0-1,5-6", 100) is None
+
+
+def test_parse_peers(monkeypatch):
+    assert parse_peers("node2, 10.0.0.5:9000,https://n3/mirror/") == [
+        "http://node2:8470", "http://10.0.0.5:9000", "https://n3:8470/mirror",
+    ]
+    with pytest.raises(ValueError):
+        parse_peers("http://")
+    monkeypatch.setenv("OSX_NEXT_PEERS", "node2")
+    assert peers_from_env() == ["http://node2:8470"]
+    monkeypatch.setenv("OSX_NEXT_PEERS", "http://")
+    assert peers_from_env() == []
+
+
+class TestPeerFirstDownload:
+    @pytest.fixture(autouse=True)
+    def _no_upstream(self, monkeypatch):
+        def upstream(*args, **kwargs):
+            raise DownloadError("upstream contacted")
+
+        monkeypatch.setattr(dl_module, "_fetch_github_releases", upstream)
+        monkeypatch.setattr(dl_module, "_get_recovery_session", upstream)
+        monkeypatch.setattr(dl_module.time, "sleep", lambda s: None)
+
+    def test_opencore_from_peer(self, peer, tmp_path):
+        dest_dir = tmp_path / "node"
+        dest_dir.mkdir()
+        result = download_opencore("sequoia", dest_dir, options=DownloadOptions(peers=[peer.url], offline=True))
+        assert result == dest_dir / "opencore-sequoia.iso"
+        assert result.read_bytes() == peer.image.read_bytes()
+        entry = AssetStore().entry(result)
+        assert entry.url == "https://github.com/x/opencore-sequoia.iso"
+        assert entry.tag == "v1"
+
+    def test_segmented_peer_download(self, peer, tmp_path, monkeypatch):
+        monkeypatch.setattr(dl_module, "_MIN_SEGMENT_SIZE", 1024)
+        dest_dir = tmp_path / "node"
+        dest_dir.mkdir()
+        result = download_opencore("sequoia", dest_dir, options=DownloadOptions(peers=[peer.url], connections=4))
+        assert result.read_bytes() == peer.image.read_bytes()
+
+    def test_hash_mismatch_falls_back_to_upstream(self, peer, tmp_path, monkeypatch):
+        real_refresh = peer.mirror.refresh
+
+        def lying_refresh():
+            listing = real_refresh()
+            peer.mirror._objects["f" * 64] = peer.image
+            return [dict(item, sha256="f" * 64) for item in listing]
+
+        monkeypatch.setattr(peer.mirror, "refresh", lying_refresh)
+        dest_dir = tmp_path / "node"
+        dest_dir.mkdir()
+        with pytest.raises(DownloadError, match="upstream contacted"):
+            download_opencore("sequoia", dest_dir, options=DownloadOptions(peers=[peer.url]))
+        assert not (dest_dir / "opencore-sequoia.iso").exists()
+
+    def test_unreachable_and_missing_peers_are_skipped(self, peer, tmp_path):
+        dest_dir = tmp_path / "node"
+        dest_dir.mkdir()
+        peers = ["http://127.0.0.1:1", peer.url]
+        with pytest.raises(DownloadError, match="upstream contacted"):
+            download_recovery("sequoia", dest_dir, options=DownloadOptions(peers=peers))
@@ -41,7 +41,7 @@ def test_build_plan_rejects_invalid_config() -> None:
 
 
 def test_build_plan_includes_core_steps() -> None:
-    steps = build_plan(_cfg("sequoia"))
+    steps = build_plan(_cfg("sequoia"), optimize=False)
     titles = [step.title for step in steps]
     assert "Create VM shell" in titles
     assert "Apply macOS hardware profile" in titles
@@ -53,6 +53,95 @@ def test_build_plan_includes_core_steps() -> None:
     assert any(step.command.startswith("qm start") for step in steps)
 
 
+def test_build_plan_dependency_graph() -> None:
+    from osx_proxmox_next.executor import step_dependencies
+
+    cfg = _cfg("sequoia")
+    cfg.apple_services = True
+    steps = build_plan(cfg)
+    deps = step_dependencies(steps)
+    by_title = {step.title: idx for idx, step in enumerate(steps)}
+    # The two heavy image jobs wait for nothing, so they overlap the qm steps
+    assert deps[by_title["Build OpenCore boot disk"]] == set()
+    assert deps[by_title["Stamp recovery with Apple icon flavour"]] == set()
+    assert deps[by_title["Import and attach macOS recovery"]] == {
+        by_title["Create VM shell"], by_title["Stamp recovery with Apple icon flavour"],
+    }
+    # Start runs last: every other step is among its ancestors
+    ancestors, todo = set(), [by_title["Start VM"]]
+    while todo:
+        for dep in deps[todo.pop()] - ancestors:
+            ancestors.add(dep)
+            todo.append(dep)
+    assert ancestors == set(range(len(steps) - 1))
+    locked = {step.title for step in steps if "vm:901" in step.resources}
+    assert locked == set(by_title) - {"Build OpenCore boot disk", "Stamp recovery with Apple icon flavour"}
+
+
+
+def test_build_plan_probes_check_step_effects(tmp_path, monkeypatch) -> None:
+    import os
+    import subprocess
+    steps = {step.key: step for step in build_plan(_cfg("sequoia")) if step.key}
+    # Fake qm whose VM has the OpenCore disk and a main disk of another size, but no recovery yet
+    qm = tmp_path / "qm"
+    qm.write_text(
+        "#!/bin/sh\nprintf 'boot: order=ide2\\nide0: local-lvm:vm-901-disk-1,media=disk,size=1G\\n"
+        "name: macos-test\\nvirtio0: local-lvm:vm-901-disk-2,size=64G\\n'\n"
+    )
+    qm.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    assert subprocess.run(steps["create"].probe).returncode == 0
+    assert subprocess.run(steps["opencore-import"].probe).returncode == 0
+    assert subprocess.run(steps["main-disk"].probe).returncode != 0
+    assert subprocess.run(steps["recovery-import"].probe).returncode != 0
+    assert subprocess.run(steps["start"].probe).returncode != 0
+
+
+def test_recovery_probe_wants_the_imported_disk(tmp_path, monkeypatch) -> None:
+    import os
+    import subprocess
+    (step,) = [step for step in build_plan(_cfg("sequoia")) if step.key == "recovery-import"]
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    qm = tmp_path / "qm"
+    for ide2, ok in [
+        ("local-lvm:vm-901-disk-3,media=disk,size=2G", True),
+        ("none,media=cdrom", False),
+        ("local:iso/Sequoia-installer.iso,media=cdrom", False),
+        ("other-lvm:vm-901-disk-3,media=disk,size=2G", False),
+    ]:
+        qm.write_text(f"#!/bin/sh\nprintf 'ide2: {ide2}\\nname: macos-test\\n'\n")
+        qm.chmod(0o755)
+        assert (subprocess.run(step.probe).returncode == 0) is ok, ide2
+
+
+def test_opencore_build_probe_checks_image_and_settings(tmp_path) -> None:
+    import subprocess
+    from osx_proxmox_next.planner import _DiskBuildContext, _opencore_steps
+
+    def build_step(verbose_boot):
+        cfg = _cfg("sequoia")
+        cfg.verbose_boot = verbose_boot
+        ctx = _DiskBuildContext(cfg, "901", False, tmp_path / "rec.img", tmp_path / "oc.iso", tmp_path / "oc.img")
+        return _opencore_steps(ctx)[0]
+
+    step = build_step(False)
+    assert step.argv[2].startswith(f"rm -f {tmp_path / 'oc.img'}.*.sha256; ")
+    assert subprocess.run(step.probe, capture_output=True).returncode != 0
+    # What the build step leaves behind on success
+    (tmp_path / "oc.img").write_bytes(b"EFI")
+    subprocess.run(["bash", "-c", step.argv[2].rsplit(" && ", 1)[1]], check=True)
+    assert subprocess.run(step.probe).returncode == 0
+    assert subprocess.run(build_step(True).probe, capture_output=True).returncode != 0
+    (tmp_path / "oc.img").write_bytes(b"EFI, edited")
+    assert subprocess.run(step.probe, capture_output=True).returncode != 0
+
+
+def test_pve_size() -> None:
+    from osx_proxmox_next.planner import _pve_size
+    assert [_pve_size(mib) for mib in (1024, 128 * 1024, 1024 * 1024, 1536)] == ["1G", "128G", "1T", "1536M"]
+
+
 def test_build_plan_tahoe_no_preview_warning() -> None:
     cfg = _cfg("tahoe")
     cfg.installer_path = "/tmp/tahoe.iso"
@@ -75,7 +164,7 @@ def test_build_plan_boot_order_is_shell_safe() -> None:
 
 
 def test_build_plan_sets_applesmc_args() -> None:
-    steps = build_plan(_cfg("sequoia"))
+    steps = build_plan(_cfg("sequoia"), optimize=False)
     profile = next(step for step in steps if step.title == "Apply macOS hardware profile")
     assert "isa-applesmc" in profile.command
     assert "--vga std" in profile.command
@@ -83,7 +172,7 @@ def test_build_plan_sets_applesmc_args() -> None:
 
 def test_build_plan_includes_smbios_step() -> None:
     import base64
-    steps = build_plan(_cfg("sequoia"))
+    steps = build_plan(_cfg("sequoia"), optimize=False)
     titles = [step.title for step in steps]
     assert "Set SMBIOS identity" in titles
     smbios_step = next(step for step in steps if step.title == "Set SMBIOS identity")
@@ -107,7 +196,7 @@ def test_build_plan_uses_provided_smbios() -> None:
     cfg.smbios_serial = "TESTSERIAL12"
     cfg.smbios_uuid = "12345678-1234-1234-1234-123456789ABC"
     cfg.smbios_model = "MacPro7,1"
-    steps = build_plan(cfg)
+    steps = build_plan(cfg, optimize=False)
     smbios_step = next(step for step in steps if step.title == "Set SMBIOS identity")
     assert f"serial={base64.b64encode(b'TESTSERIAL12').decode()}" in smbios_step.command
     assert "12345678-1234-1234-1234-123456789ABC" in smbios_step.command
@@ -156,13 +245,31 @@ def test_build_plan_uses_importdisk_for_recovery(monkeypatch) -> None:
     assert "media=disk" in recovery.command
 
 
+def test_recovery_import_reports_logical_and_allocated_size(monkeypatch) -> None:
+    from pathlib import Path
+    import osx_proxmox_next.planner as planner
+
+    monkeypatch.setattr(
+        planner,
+        "resolve_recovery_or_installer_path",
+        lambda _cfg: Path("/var/lib/vz/template/iso/sonoma-recovery.img"),
+    )
+    steps = build_plan(_cfg("sonoma"))
+    recovery = next(step for step in steps if step.title == "Import and attach macOS recovery")
+    script = recovery.argv[2]
+    assert "du -m --apparent-size /var/lib/vz/template/iso/sonoma-recovery.img" in script
+    assert "MiB allocated" in script
+    assert script.index("MiB allocated") < script.index("$IMPORT_CMD 901")
+    assert "qemu-img info" in script
+
+
 def test_smbios_model_fallback():
     import base64
     cfg = _cfg("sequoia")
     cfg.smbios_serial = "TESTSERIAL12"
     cfg.smbios_uuid = "12345678-1234-1234-1234-123456789ABC"
     cfg.smbios_model = ""  # empty model triggers fallback
-    steps = build_plan(cfg)
+    steps = build_plan(cfg, optimize=False)
     smbios_step = next(step for step in steps if step.title == "Set SMBIOS identity")
     assert f"product={base64.b64encode(b'MacPro7,1').decode()}" in smbios_step.command
 
@@ -214,7 +321,7 @@ def test_smbios_values_are_base64_encoded():
     cfg.smbios_serial = "TESTSERIAL12"
     cfg.smbios_uuid = "12345678-1234-1234-1234-123456789ABC"
     cfg.smbios_model = "MacPro7,1"
-    steps = build_plan(cfg)
+    steps = build_plan(cfg, optimize=False)
     smbios_step = next(step for step in steps if step.title == "Set SMBIOS identity")
     encoded = base64.b64encode(b"MacPro7,1").decode()
     assert "base64=1," in smbios_step.command
@@ -280,7 +387,7 @@ def test_cpu_args_override() -> None:
 def test_build_plan_amd_uses_cascadelake(monkeypatch) -> None:
     import osx_proxmox_next.planner as planner
     monkeypatch.setattr(planner, "detect_cpu_info", lambda: _cpu(vendor="AMD", needs_emulated=True))
-    steps = build_plan(_cfg("sequoia"))
+    steps = build_plan(_cfg("sequoia"), optimize=False)
     profile = next(step for step in steps if step.title == "Apply macOS hardware profile")
     assert "Cascadelake-Server" in profile.command
     assert "vendor=GenuineIntel" in profile.command
@@ -289,7 +396,7 @@ def test_build_plan_amd_uses_cascadelake(monkeypatch) -> None:
 def test_build_plan_intel_uses_host(monkeypatch) -> None:
     import osx_proxmox_next.planner as planner
     monkeypatch.setattr(planner, "detect_cpu_info", lambda: _cpu(vendor="Intel", needs_emulated=False))
-    steps = build_plan(_cfg("sequoia"))
+    steps = build_plan(_cfg("sequoia"), optimize=False)
     profile = next(step for step in steps if step.title == "Apply macOS hardware profile")
     assert "-cpu host," in profile.command
     assert "vendor=GenuineIntel" in profile.command
@@ -299,7 +406,7 @@ def test_build_plan_intel_hybrid_uses_cascadelake(monkeypatch) -> None:
     """Hybrid Intel gets Cascadelake-Server but NOT AMD kernel patches."""
     import osx_proxmox_next.planner as planner
     monkeypatch.setattr(planner, "detect_cpu_info", lambda: _cpu(vendor="Intel", model=151, needs_emulated=True))
-    steps = build_plan(_cfg("sequoia"))
+    steps = build_plan(_cfg("sequoia"), optimize=False)
     profile = next(step for step in steps if step.title == "Apply macOS hardware profile")
     assert "Cascadelake-Server" in profile.command
     # Must NOT have AMD kernel patches
@@ -382,7 +489,7 @@ def test_build_plan_cpu_model_override(monkeypatch) -> None:
     monkeypatch.setattr(planner, "detect_cpu_info", lambda: _cpu(vendor="Intel", model=151, needs_emulated=True))
     cfg = _cfg("sequoia")
     cfg.cpu_model = "Skylake-Server-IBRS"
-    steps = build_plan(cfg)
+    steps = build_plan(cfg, optimize=False)
     profile = next(step for step in steps if step.title == "Apply macOS hardware profile")
     assert "Skylake-Server-IBRS" in profile.command
     assert "Cascadelake" not in profile.command
@@ -517,7 +624,7 @@ def test_build_plan_apple_services_mac_propagated_from_smbios(monkeypatch) -> No
     monkeypatch.setattr(planner, "detect_cpu_info", lambda: _cpu(vendor="Intel", needs_emulated=False))
     cfg = _cfg("sequoia")
     cfg.apple_services = True
-    steps = build_plan(cfg)
+    steps = build_plan(cfg, optimize=False)
     # MAC set by _smbios_steps should be reused — verify ROM matches MAC
     mac_hex = cfg.static_mac.replace(":", "").upper()
     assert cfg.smbios_rom == mac_hex
@@ -573,7 +680,7 @@ def test_build_plan_apple_services_uses_vmxnet3(monkeypatch) -> None:
     monkeypatch.setattr(planner, "detect_cpu_info", lambda: _cpu(vendor="Intel", needs_emulated=False))
     cfg = _cfg("sequoia")
     cfg.apple_services = True
-    steps = build_plan(cfg)
+    steps = build_plan(cfg, optimize=False)
     net_step = next(step for step in steps if step.title == "Configure static MAC for Apple services")
     assert "vmxnet3" in net_step.command
     assert "firewall=0" in net_step.command
@@ -791,7 +898,7 @@ def test_build_plan_oc_base64_no_newlines(monkeypatch) -> None:
     cfg.smbios_serial = "C02LNGSERL12"
     cfg.smbios_uuid = "12345678-1234-1234-1234-123456789ABC"
     cfg.smbios_model = "MacPro7,1"
-    steps = build_plan(cfg)
+    steps = build_plan(cfg, optimize=False)
     smbios = next(s for s in steps if s.title == "Set SMBIOS identity")
     # Encoded values should not contain newlines (Python base64 doesn't wrap)
     encoded = base64.b64encode(b"C02LNGSERL12").decode()
@@ -812,7 +919,7 @@ def test_build_plan_net_model_e1000() -> None:
     cfg = _cfg("sequoia")
     cfg.net_model = "e1000-82545em"
     cfg.apple_services = True
-    steps = build_plan(cfg)
+    steps = build_plan(cfg, optimize=False)
     create = next(s for s in steps if s.title == "Create VM shell")
     assert "e1000-82545em,bridge=vmbr0,firewall=0" in create.command
     mac_step = next(s for s in steps if s.title == "Configure static MAC for Apple services")
@@ -824,8 +931,63 @@ def test_build_plan_intel_host_no_kvm_pv_flags(monkeypatch) -> None:
     import osx_proxmox_next.planner as planner
     monkeypatch.setattr(planner, "detect_cpu_info", lambda: _cpu(vendor="Intel", needs_emulated=False))
     cfg = _cfg("sequoia")
-    steps = build_plan(cfg)
+    steps = build_plan(cfg, optimize=False)
     profile = next(s for s in steps if s.title == "Apply macOS hardware profile")
     assert "kvm_pv_unhalt" not in profile.command
     assert "kvm_pv_eoi" not in profile.command
     assert "-cpu host" in profile.command
+
+
+def test_optimize_plan_merges_adjacent_qm_set() -> None:
+    from osx_proxmox_next.domain import PlanStep
+    from osx_proxmox_next.planner import optimize_plan
+
+    steps = [
+        PlanStep("Create", ["qm", "create", "900"], key="create"),
+        PlanStep("Profile", ["qm", "set", "900", "--args", "x", "--vga", "std"], key="profile", after=["create"]),
+        PlanStep("SMBIOS", ["qm", "set", "900", "--smbios1", "uuid=1"], key="smbios", after=["create"]),
+        PlanStep("EFI", ["qm", "set", "900", "--efidisk0", "s:0"], key="efi", after=["create"], probe=["true"]),
+        PlanStep("Boot", ["qm", "set", "900", "--boot", "order=ide2"], key="boot", after=["efi"]),
+        PlanStep("Boot again", ["qm", "set", "900", "--boot", "order=ide0"]),
+        PlanStep("Other VM", ["qm", "set", "901", "--cores", "2"]),
+        PlanStep("Start", ["qm", "start", "900"], after=["smbios", "profile", "boot"]),
+    ]
+    before = [step.title for step in steps]
+    merged = optimize_plan(steps)
+    assert [step.title for step in merged] == [
+        "Create", "Profile + SMBIOS", "EFI", "Boot", "Boot again", "Other VM", "Start",
+    ]
+    assert merged[1].argv == ["qm", "set", "900", "--args", "x", "--vga", "std", "--smbios1", "uuid=1"]
+    assert (merged[1].key, merged[1].after, merged[1].parts) == ("profile", ["create"], ["Profile", "SMBIOS"])
+    # References to a merged step point at the step it joined
+    assert merged[-1].after == ["profile", "boot"]
+    assert [step.title for step in steps] == before
+
+
+def test_optimize_plan_keeps_steps_with_extra_dependencies_apart() -> None:
+    from osx_proxmox_next.domain import PlanStep
+    from osx_proxmox_next.planner import optimize_plan
+
+    steps = [
+        PlanStep("Create", ["qm", "create", "900"], key="create"),
+        PlanStep("Build", ["bash", "-c", "true"], key="build", after=[]),
+        PlanStep("Profile", ["qm", "set", "900", "--vga", "std"], key="profile", after=["create"]),
+        PlanStep("Attach", ["qm", "set", "900", "--ide0", "x"], after=["create", "build"]),
+    ]
+    assert len(optimize_plan(steps)) == 4
+
+
+def test_build_plan_merges_hardware_profile_and_identity() -> None:
+    cfg = _cfg("sequoia")
+    cfg.apple_services = True
+    merged = build_plan(cfg)
+    plain = build_plan(cfg, optimize=False)
+    profile = next(step for step in merged if step.key == "profile")
+    assert profile.parts == [
+        "Apply macOS hardware profile", "Set SMBIOS identity",
+        "Configure vmgenid for Apple services", "Configure static MAC for Apple services",
+    ]
+    assert len(merged) == len(plain) - 3
+    assert sum(step.argv[0] == "qm" for step in merged) == sum(step.argv[0] == "qm" for step in plain) - 3
+    assert next(step for step in merged if step.key == "start").after == ["profile", "efi", "boot-order"]
+
@@ -16,7 +16,7 @@ def test_preflight_has_expected_checks() -> None:
     assert "qm available" in names
     assert "pvesm available" in names
     assert "/dev/kvm present" in names
-    assert "dmg2img available" in names
+    assert "dmg2img available" not in names
     assert "sgdisk available" in names
     assert "partprobe available" in names
     assert "losetup available" in names
@@ -25,6 +25,7 @@ def test_preflight_has_expected_checks() -> None:
     assert "KVM ignore_msrs" in names
     assert "IOMMU enabled" in names
     assert "initcall_blacklist" in names
+    assert "Asset cache" in names
     assert len(checks) >= 15
 
 
@@ -130,13 +131,23 @@ def test_check_initcall_blacklist_absent(tmp_path):
     assert "not set" in check.details
 
 
+def test_check_asset_cache_reports_last_refresh(tmp_path):
+    from osx_proxmox_next.refresh import STALE, AssetStatus, RefreshReport
+
+    path = tmp_path / "refresh.json"
+    check = preflight._check_asset_cache(report_path=path)
+    assert check.ok is True
+    assert "Never refreshed" in check.details
+    RefreshReport(checked_at=1.0, assets=[AssetStatus("tahoe", "recovery", STALE)]).save(path)
+    check = preflight._check_asset_cache(report_path=path)
+    assert check.ok is True
+    assert "tahoe recovery stale" in check.details
+
+
 def test_build_binary_missing_shows_install_hint(monkeypatch):
     monkeypatch.setattr(preflight.shutil, "which", lambda _cmd: None)
     monkeypatch.setattr(Path, "exists", lambda self: False)
     checks = run_preflight()
-    dmg2img = [c for c in checks if c.name == "dmg2img available"][0]
-    assert dmg2img.ok is False
-    assert "apt install dmg2img" in dmg2img.details
     sgdisk = [c for c in checks if c.name == "sgdisk available"][0]
     assert sgdisk.ok is False
     assert "apt install gdisk" in sgdisk.details
@@ -150,7 +161,7 @@ def test_build_binary_missing_shows_install_hint(monkeypatch):
 
 def test_has_missing_build_deps_none_missing():
     checks = [
-        PreflightCheck("dmg2img available", True, "/usr/bin/dmg2img"),
+        PreflightCheck("partprobe available", True, "/usr/sbin/partprobe"),
         PreflightCheck("sgdisk available", True, "/usr/sbin/sgdisk"),
         PreflightCheck("KVM ignore_msrs", False, "missing"),
     ]
@@ -159,7 +170,7 @@ def test_has_missing_build_deps_none_missing():
 
 def test_has_missing_build_deps_some_missing():
     checks = [
-        PreflightCheck("dmg2img available", False, "Not found"),
+        PreflightCheck("partprobe available", False, "Not found"),
         PreflightCheck("sgdisk available", True, "/usr/sbin/sgdisk"),
     ]
     assert has_missing_build_deps(checks) is True
@@ -189,8 +200,8 @@ def test_find_missing_packages_some_missing(monkeypatch):
     )
     monkeypatch.setattr(Path, "exists", lambda self: False)
     missing = find_missing_packages()
-    assert "dmg2img" in missing
     assert "parted" in missing
+    assert "dmg2img" not in missing
     assert "gdisk" not in missing
 
 
@@ -235,8 +246,7 @@ def test_install_missing_packages_success(monkeypatch):
 
     ok, pkgs = install_missing_packages(on_output=messages.append, adapter=FakeAdapter())
     assert ok is True
-    assert "dmg2img" in pkgs
-    assert "parted" in pkgs
+    assert pkgs == ["parted"]
     assert any("Installing" in m for m in messages)
     assert captured_argv[0] == "apt-get"
     assert "install" in captured_argv
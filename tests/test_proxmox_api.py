@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import pytest
+
+import osx_proxmox_next.proxmox_api as api_module
+from osx_proxmox_next.infrastructure import CommandResult, ProxmoxAdapter
+from osx_proxmox_next.proxmox_api import ProxmoxApiAdapter, ProxmoxApiError, _parse_args
+from osx_proxmox_next.services import detect_next_vmid, detect_storage_targets, fetch_vm_info, proxmox_service
+
+TOKEN = "root@pam!osx-next=0f3a"
+_GiB = 1024 ** 3
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Just enough of pveproxy: VMs, storage, tasks and /cluster/nextid on node pve."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; don't hold the body back
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def do_PUT(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+    def _handle(self):
+        srv = self.server
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            params.update(parse_qsl(self.rfile.read(length).decode()))
+        path = unquote(url.path)
+        srv.seen.append((self.client_address, self.command, path, params))
+        if self.headers.get("Authorization") != f"PVEAPIToken={TOKEN}":
+            return self._reply(401, None, "authentication failure")
+        route = path.removeprefix("/api2/json").split("/")[1:]
+        try:
+            data = srv.route(self.command, route, params)
+        except ProxmoxApiError as exc:
+            return self._reply(exc.status, None, str(exc))
+        self._reply(200, data)
+
+    def _reply(self, status, data, reason=None):
+        body = json.dumps({"data": data}).encode()
+        self.send_response(status, reason)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _FakePve(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.seen = []
+        self.vms = {100: {"name": "ubuntu", "memory": "2048", "digest": "abc"}}
+        self.running = {100}
+        self.tasks = {}
+        # Polls each task answers "running" to before it stops
+        self.task_polls = 1
+
+    def task(self, log, ok=True):
+        upid = f"UPID:pve:{len(self.tasks):08X}:qmtask:"
+        self.tasks[upid] = {"polls": self.task_polls, "log": log, "ok": ok}
+        return upid
+
+    def route(self, method, route, params):
+        def at(verb, pattern):
+            """The ``*`` parts of *route* when it is *verb* *pattern*, else None."""
+            parts = pattern.split("/")
+            if method != verb or len(parts) != len(route):
+                return None
+            if any(p != "*" and p != r for p, r in zip(parts, route)):
+                return None
+            return [r for p, r in zip(parts, route) if p == "*"]
+
+        if at("GET", "cluster/nextid") is not None:
+            return str(max(self.vms) + 1)
+        if at("GET", "nodes/pve/qemu") is not None:
+            return [
+                {"vmid": vmid, "name": cfg.get("name", ""), "status": "running" if vmid in self.running else "stopped",
+                 "maxmem": int(cfg.get("memory", 512)) * 1024 * 1024, "maxdisk": 32 * _GiB}
+                for vmid, cfg in self.vms.items()
+            ]
+        if at("POST", "nodes/pve/qemu") is not None:
+            vmid = int(params.pop("vmid"))
+            if vmid in self.vms:
+                return self.task([f"unable to create VM {vmid} - VM {vmid} already exists on node 'pve'"], ok=False)
+            self.vms[vmid] = params
+            return self.task([])
+        if (found := at("GET", "nodes/pve/qemu/*/config")) is not None:
+            vmid, = found
+            return self._vm(vmid)
+        if (found := at("POST", "nodes/pve/qemu/*/config")) is not None:
+            vmid, = found
+            self._vm(vmid).update(params)
+            return self.task(["update VM: " + ", ".join(f"-{k} {v}" for k, v in params.items())])
+        if (found := at("GET", "nodes/pve/qemu/*/status/current")) is not None:
+            vmid, = found
+            self._vm(vmid)
+            return {"status": "running" if int(vmid) in self.running else "stopped"}
+        if (found := at("POST", "nodes/pve/qemu/*/status/start")) is not None:
+            vmid, = found
+            self._vm(vmid)
+            self.running.add(int(vmid))
+            return self.task([])
+        if (found := at("POST", "nodes/pve/qemu/*/clone")) is not None:
+            vmid, = found
+            self.vms[int(params["newid"])] = {**self._vm(vmid), "name": params.get("name", "copy")}
+            return self.task(["create full clone of drive virtio0"])
+        if (found := at("DELETE", "nodes/pve/qemu/*")) is not None:
+            vmid, = found
+            self._vm(vmid)
+            del self.vms[int(vmid)]
+            return self.task([])
+        if at("GET", "nodes/pve/storage") is not None:
+            storages = [
+                {"storage": "local", "type": "dir", "active": 1, "enabled": 1, "content": "iso,vztmpl",
+                 "total": 100 * _GiB, "used": 25 * _GiB, "avail": 75 * _GiB},
+                {"storage": "local-lvm", "type": "lvmthin", "active": 1, "enabled": 1, "content": "images",
+                 "total": 200 * _GiB, "used": 50 * _GiB, "avail": 150 * _GiB},
+                {"storage": "nas", "type": "nfs", "active": 0, "enabled": 1, "content": "images,iso"},
+            ]
+            content = params.get("content")
+            return [s for s in storages if not content or content in s["content"].split(",")]
+        if (found := at("GET", "nodes/pve/storage/local/content/*")) is not None:
+            volume, = found
+            if volume != "local:iso/present.iso":
+                raise ProxmoxApiError(500, f"volume_size_info on '{volume}' failed")
+            return {"path": "/var/lib/vz/template/iso/present.iso", "format": "iso"}
+        if at("GET", "storage/local") is not None:
+            return {"storage": "local", "type": "dir", "path": "/var/lib/vz"}
+        if (found := at("GET", "nodes/*/tasks/*/status")) is not None:
+            _, upid = found
+            task = self.tasks[upid]
+            if task["polls"]:
+                task["polls"] -= 1
+                return {"status": "running"}
+            return {"status": "stopped", "exitstatus": "OK" if task["ok"] else task["log"][-1]}
+        if (found := at("GET", "nodes/*/tasks/*/log")) is not None:
+            _, upid = found
+            task = self.tasks[upid]
+            end = "TASK OK" if task["ok"] else f"TASK ERROR: {task['log'][-1]}"
+            return [{"n": n, "t": line} for n, line in enumerate(task["log"] + [end], start=1)]
+        if (found := at("DELETE", "nodes/*/tasks/*")) is not None:
+            _, upid = found
+            self.tasks[upid]["stopped"] = True
+            return None
+        raise ProxmoxApiError(501, f"Method '{method} /{'/'.join(route)}' not implemented")
+
+    def _vm(self, vmid):
+        if int(vmid) not in self.vms:
+            raise ProxmoxApiError(500, f"Configuration file 'nodes/pve/qemu-server/{vmid}.conf' does not exist")
+        return self.vms[int(vmid)]
+
+
+@pytest.fixture
+def pve():
+    srv = _FakePve()
+    threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}"
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _requests(pve, method):
+    return [(m, path, params) for _, m, path, params in pve.seen if m == method]
+
+
+@pytest.fixture
+def adapter(pve):
+    return ProxmoxApiAdapter(TOKEN, url=pve.url, node="pve")
+
+
+class TestStructured:
+    def test_reads_return_json(self, adapter):
+        assert adapter.next_vmid() == 101
+        assert adapter.vm_config(100) == {"name": "ubuntu", "memory": "2048", "digest": "abc"}
+        assert adapter.vm_status(100)["status"] == "running"
+        assert [vm["vmid"] for vm in adapter.list_vms()] == [100]
+        assert [s["storage"] for s in adapter.storage_status(content="images")] == ["local-lvm", "nas"]
+
+    def test_actions_wait_for_their_task(self, adapter, pve):
+        pve.task_polls = 3
+        assert adapter.create_vm(900, name="mac", cores=4) == []
+        assert pve.vms[900] == {"name": "mac", "cores": "4"}
+        assert adapter.set_vm(900, vga="std") == ["update VM: -vga std"]
+        assert adapter.clone_vm(900, 901, full=True, name="mac-2") == ["create full clone of drive virtio0"]
+        assert _requests(pve, "POST")[-1][1:] == ("/api2/json/nodes/pve/qemu/900/clone", {"newid": "901", "full": "1", "name": "mac-2"})
+        adapter.destroy_vm(901, purge=True)
+        assert 901 not in pve.vms
+
+    def test_failed_task_raises_with_its_log(self, adapter):
+        with pytest.raises(ProxmoxApiError, match="VM 100 already exists") as exc_info:
+            adapter.create_vm(100, name="dup")
+        assert str(exc_info.value).endswith("TASK ERROR: unable to create VM 100 - VM 100 already exists on node 'pve'")
+
+    def test_task_still_running_is_stopped(self, adapter, pve):
+        pve.task_polls = 1000
+        adapter.timeout = 0.05
+        with pytest.raises(ProxmoxApiError, match="timed out"):
+            adapter.start_vm(100)
+        assert all(task.get("stopped") for task in pve.tasks.values())
+
+    def test_storage_path(self, adapter):
+        assert adapter.storage_path("local:iso/present.iso") == "/var/lib/vz/template/iso/present.iso"
+        # Not uploaded yet: derived from the storage's directory, as pvesm path does
+        assert adapter.storage_path("local:iso/probe.iso") == "/var/lib/vz/template/iso/probe.iso"
+        with pytest.raises(ProxmoxApiError):
+            adapter.storage_path("local:100/vm-100-disk-0.raw")
+
+    def test_bad_token(self, pve):
+        with pytest.raises(ProxmoxApiError, match="401 authentication failure"):
+            ProxmoxApiAdapter("root@pam!x=wrong", url=pve.url, node="pve").next_vmid()
+
+    def test_one_connection_for_many_calls(self, adapter, pve):
+        for _ in range(5):
+            adapter.vm_status(100)
+        adapter.set_vm(100, cores=2)
+        assert adapter.pool.opened == 1
+        assert len({client for client, *_ in pve.seen}) == 1
+
+
+class TestCommandLines:
+    def test_qm_status_and_config_print_like_qm(self, adapter):
+        assert adapter.qm("status", "100") == CommandResult(ok=True, returncode=0, output="status: running")
+        assert adapter.qm("config", "100").output == "memory: 2048\nname: ubuntu"
+
+    def test_qm_list_columns(self, adapter):
+        header, row = adapter.qm("list").output.splitlines()
+        assert header.split() == ["VMID", "NAME", "STATUS", "MEM(MB)", "BOOTDISK(GB)", "PID"]
+        assert row.split() == ["100", "ubuntu", "running", "2048", "32.00", "0"]
+
+    def test_pvesm_status_columns(self, adapter):
+        lines = adapter.pvesm("status", "-content", "images").output.splitlines()
+        assert [line.split() for line in lines] == [
+            ["Name", "Type", "Status", "Total", "Used", "Available", "%"],
+            ["local-lvm", "lvmthin", "active", str(200 * 1024 ** 2), str(50 * 1024 ** 2), str(150 * 1024 ** 2), "25.00%"],
+            ["nas", "nfs", "inactive", "0", "0", "0", "0.00%"],
+        ]
+
+    def test_pvesm_path_and_pvesh(self, adapter):
+        assert adapter.pvesm("path", "local:iso/probe.iso").output == "/var/lib/vz/template/iso/probe.iso"
+        assert adapter.pvesh("get", "/cluster/nextid").output == "101"
+        assert json.loads(adapter.pvesh("get", "/storage/local", "--output-format", "json").output)["path"] == "/var/lib/vz"
+
+    def test_plan_steps_become_api_calls(self, adapter, pve):
+        streamed = []
+        res = adapter.run(
+            ["qm", "create", "900", "--name", "mac", "--agent", "enabled=1", "--boot", "order=ide2;virtio0"],
+            on_output=streamed.append,
+        )
+        assert res.ok and pve.vms[900] == {"name": "mac", "agent": "enabled=1", "boot": "order=ide2;virtio0"}
+        res = adapter.run(["qm", "set", "900", "--vga", "std"], on_output=streamed.append)
+        assert res.output == "update VM: -vga std" and streamed == ["update VM: -vga std"]
+        assert adapter.qm("start", "900").ok and 900 in pve.running
+        assert adapter.qm("destroy", "900", "--purge").ok
+        assert _requests(pve, "DELETE") == [("DELETE", "/api2/json/nodes/pve/qemu/900", {"purge": "1"})]
+
+    def test_api_errors_fail_like_the_command(self, adapter):
+        res = adapter.qm("create", "100", "--name", "dup")
+        assert (res.ok, res.returncode) == (False, 255)
+        assert "VM 100 already exists" in res.output
+        res = adapter.qm("config", "404")
+        assert not res.ok and res.output == "500 Configuration file 'nodes/pve/qemu-server/404.conf' does not exist"
+
+    def test_other_commands_run(self, adapter, pve, monkeypatch):
+        ran = []
+        monkeypatch.setattr(ProxmoxAdapter, "run", lambda self, argv, on_output=None: ran.append(argv) or CommandResult(True, 0, ""))
+        adapter.run(["bash", "-c", "qm status 100"])
+        adapter.qm("resize", "100", "virtio0", "+10G")
+        # Only root@pam itself may set args; qm runs as root
+        adapter.qm("set", "100", "--args", "-device isa-applesmc", "--vga", "std")
+        assert [argv[:2] for argv in ran] == [["bash", "-c"], ["qm", "resize"], ["qm", "set"]]
+        assert pve.seen == []
+
+    def test_unreachable_api_falls_back_to_commands(self, monkeypatch):
+        ran = []
+        monkeypatch.setattr(ProxmoxAdapter, "run", lambda self, argv, on_output=None: ran.append(argv) or CommandResult(True, 0, "status: stopped"))
+        adapter = ProxmoxApiAdapter(TOKEN, url="http://127.0.0.1:9", node="pve")
+        assert adapter.qm("status", "100").output == "status: stopped"
+        assert adapter.unavailable
+        adapter.qm("status", "100")
+        assert ran == [["qm", "status", "100"]] * 2
+
+
+def test_parse_args():
+    assert _parse_args(["900", "--full", "--name", "x"]) == (["900"], {"full": "1", "name": "x"})
+    assert _parse_args(["-content", "iso"]) == ([], {"content": "iso"})
+    assert _parse_args(["--name", "a", "--name", "b"]) is None
+    assert _parse_args(["--name", "a", "900"]) is None
+
+
+def test_detection_uses_structured_data(adapter):
+    assert detect_next_vmid(adapter) == 101
+    # The inactive nas is left out
+    assert detect_storage_targets(adapter) == ["local-lvm"]
+    info = fetch_vm_info(100, adapter=adapter)
+    assert (info.name, info.status) == ("ubuntu", "running")
+
+
+class TestFromEnv:
+    def test_needs_a_token(self, monkeypatch):
+        monkeypatch.delenv("OSX_NEXT_API_TOKEN", raising=False)
+        assert ProxmoxApiAdapter.from_env() is None
+        monkeypatch.setenv("OSX_NEXT_API_TOKEN", "secret-without-id")
+        assert ProxmoxApiAdapter.from_env() is None
+
+    def test_settings(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("OSX_NEXT_API_TOKEN", TOKEN)
+        monkeypatch.setenv("OSX_NEXT_API_URL", "https://pve1.example.com:8006/")
+        monkeypatch.setenv("OSX_NEXT_API_NODE", "pve1")
+        adapter = ProxmoxApiAdapter.from_env()
+        assert (adapter.base, adapter.node) == ("https://pve1.example.com:8006/api2/json", "pve1")
+        monkeypatch.setenv("OSX_NEXT_API_CA", str(tmp_path / "missing.pem"))
+        assert ProxmoxApiAdapter.from_env() is None
+
+    def test_selected_by_get_proxmox_adapter(self, monkeypatch):
+        monkeypatch.setattr(proxmox_service, "_pve", None)
+        monkeypatch.setattr(api_module, "PVE_ROOT_CA", api_module.Path("/nonexistent/pve-root-ca.pem"))
+        monkeypatch.setenv("OSX_NEXT_API_TOKEN", TOKEN)
+        assert isinstance(proxmox_service.get_proxmox_adapter(), ProxmoxApiAdapter)
+        monkeypatch.setattr(proxmox_service, "_pve", None)
+        monkeypatch.delenv("OSX_NEXT_API_TOKEN")
+        assert type(proxmox_service.get_proxmox_adapter()) is ProxmoxAdapter
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import pytest
+
+import osx_proxmox_next.ratelimit as rl_module
+from osx_proxmox_next.ratelimit import (
+    RateLimit,
+    RateWindow,
+    TokenBucket,
+    parse_rate,
+    parse_rate_limit,
+    parse_window,
+    rate_limit_from_env,
+    shared_bucket,
+)
+
+_M = 1024 * 1024
+
+
+class _Clock:
+    """Fake monotonic clock; sleeping advances it."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.slept: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(rl_module.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(rl_module.time, "sleep", fake.sleep)
+    return fake
+
+
+class TestParse:
+    def test_plain_rate(self):
+        assert parse_rate("5M") == 5 * _M
+        assert parse_rate("800K/s") == 800 * 1024
+        assert parse_rate_limit("20M") == RateLimit(default=20 * _M)
+
+    def test_schedule(self):
+        limit = parse_rate_limit("08:00-18:00=5M, 22:00-06:00=0, 20M")
+        assert limit.windows == (
+            RateWindow(8 * 60, 18 * 60, 5 * _M),
+            RateWindow(22 * 60, 6 * 60, 0),
+        )
+        assert limit.default == 20 * _M
+
+    def test_window_without_default_is_unlimited_outside(self):
+        limit = parse_rate_limit("08:00-18:00=5M")
+        assert limit.rate_at(7 * 60) == 0
+        assert limit.rate_at(9 * 60) == 5 * _M
+
+    @pytest.mark.parametrize("text", ["fast", "25:00-06:00=1M", "08:00-08:70=1M", "08:00-18:00=lots"])
+    def test_invalid(self, text):
+        with pytest.raises(ValueError):
+            parse_rate_limit(text)
+
+    def test_bare_window(self):
+        assert parse_window("22:00-06:00") == RateWindow(22 * 60, 6 * 60, 0)
+        with pytest.raises(ValueError, match="HH:MM-HH:MM"):
+            parse_window("22:00-06:00=1M")
+        with pytest.raises(ValueError):
+            parse_window("22:00-30:00")
+
+    def test_env(self, monkeypatch):
+        monkeypatch.setenv("OSX_NEXT_LIMIT_RATE", "10M")
+        assert rate_limit_from_env() == RateLimit(default=10 * _M)
+        monkeypatch.setenv("OSX_NEXT_LIMIT_RATE", "bogus")
+        assert rate_limit_from_env() is None
+        monkeypatch.delenv("OSX_NEXT_LIMIT_RATE")
+        assert rate_limit_from_env() is None
+
+
+class TestRateLimit:
+    def test_window_crossing_midnight(self):
+        limit = RateLimit(default=1, windows=(RateWindow(22 * 60, 6 * 60, 2),))
+        assert limit.rate_at(23 * 60) == 2
+        assert limit.rate_at(3 * 60) == 2
+        assert limit.rate_at(12 * 60) == 1
+
+    def test_first_window_wins(self):
+        limit = RateLimit(windows=(RateWindow(0, 600, 1), RateWindow(0, 1440, 2)))
+        assert limit.rate_at(300) == 1
+        assert limit.rate_at(900) == 2
+
+    def test_unlimited(self):
+        assert RateLimit().unlimited
+        assert RateLimit(windows=(RateWindow(0, 60, 0),)).unlimited
+        assert not RateLimit(windows=(RateWindow(0, 60, 1),)).unlimited
+
+
+class TestTokenBucket:
+    def test_sustained_rate(self, clock):
+        bucket = TokenBucket(RateLimit(default=1000))
+        for _ in range(10):
+            bucket.consume(500)
+        # A new bucket starts empty, so 5000 bytes at 1000 B/s take five seconds
+        assert sum(clock.slept) == pytest.approx(5.0)
+
+    def test_idle_time_refills_up_to_burst(self, clock):
+        bucket = TokenBucket(RateLimit(default=1000))
+        bucket.consume(0)
+        clock.now += 60  # long idle period only earns one burst
+        assert bucket.consume(250) == 0.0
+        assert bucket.consume(100) == pytest.approx(0.1)
+
+    def test_throttling_flag(self, clock):
+        bucket = TokenBucket(RateLimit(default=1000))
+        assert not bucket.throttling
+        bucket.consume(2000)
+        assert bucket.throttling
+        clock.now += 5
+        assert not bucket.throttling
+
+    def test_unlimited_never_sleeps(self, clock):
+        bucket = TokenBucket(RateLimit())
+        assert bucket.consume(10 * _M) == 0.0
+        assert clock.slept == []
+
+    def test_schedule_change_picks_up_new_rate(self, clock, monkeypatch):
+        rates = iter([1000, 4000])
+        limit = RateLimit(default=1)
+        monkeypatch.setattr(RateLimit, "current_rate", lambda self: next(rates))
+        bucket = TokenBucket(limit)
+        assert bucket.rate == 1000
+        clock.now += rl_module._SCHEDULE_RECHECK
+        assert bucket.rate == 4000
+        assert bucket.consume(4000) == pytest.approx(1.0)
+
+
+def test_shared_bucket_is_per_limit():
+    limit = RateLimit(default=123)
+    assert shared_bucket(limit) is shared_bucket(RateLimit(default=123))
+    assert shared_bucket(limit) is not shared_bucket(RateLimit(default=456))
+    assert shared_bucket(None) is None
+    assert shared_bucket(RateLimit()) is None
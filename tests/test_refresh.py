@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import pytest
+
+import osx_proxmox_next.refresh as refresh_module
+from osx_proxmox_next.asset_store import AssetStore
+from osx_proxmox_next.downloader import DownloadError, DownloadOptions, UpstreamBuild
+from osx_proxmox_next.ratelimit import RateWindow
+from osx_proxmox_next.refresh import (
+    CURRENT,
+    MISSING,
+    STALE,
+    UNKNOWN,
+    AssetStatus,
+    RefreshReport,
+    check_assets,
+    describe_report,
+    refresh_assets,
+)
+
+
+class _Upstream:
+    """Fake GitHub/Apple answers plus downloads that place files in the store."""
+
+    def __init__(self, monkeypatch) -> None:
+        self.opencore_tag = "v1"
+        self.recovery_digest = "d1"
+        # One OpenCore file for every release, as the real ISO is
+        self.shared_opencore = False
+        self.fail: set[str] = set()
+        self.downloads: list[tuple[str, str, bool]] = []
+        monkeypatch.setattr(refresh_module, "opencore_upstream", self.opencore)
+        monkeypatch.setattr(refresh_module, "recovery_upstream", self.recovery)
+        monkeypatch.setattr(refresh_module, "download_opencore", self.fetcher("opencore"))
+        monkeypatch.setattr(refresh_module, "download_recovery", self.fetcher("recovery"))
+
+    def opencore(self, macos, offline=False):
+        if self.shared_opencore:
+            return UpstreamBuild("opencore-osx-proxmox-vm.iso", f"https://gh/{self.opencore_tag}/oc", self.opencore_tag, 3)
+        return UpstreamBuild(f"opencore-{macos}.iso", f"https://gh/{self.opencore_tag}/oc-{macos}", self.opencore_tag, 3)
+
+    def recovery(self, macos):
+        if "recovery-check" in self.fail:
+            raise DownloadError("osrecovery unreachable")
+        return UpstreamBuild(f"{macos}-recovery.img", f"https://apple/{macos}.dmg", self.recovery_digest, 100)
+
+    def fetcher(self, kind):
+        def fetch(macos, dest_dir, on_progress=None, options=None):
+            self.downloads.append((kind, macos, options.refresh))
+            if kind in self.fail:
+                raise DownloadError("connection reset")
+            build = self.opencore(macos) if kind == "opencore" else self.recovery(macos)
+            dest = dest_dir / build.name
+            dest.write_bytes(b"img")
+            AssetStore().add(dest, url=build.url, tag=build.tag)
+            return dest
+        return fetch
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    return _Upstream(monkeypatch)
+
+
+def _states(report_or_list) -> dict[str, str]:
+    statuses = report_or_list.assets if isinstance(report_or_list, RefreshReport) else report_or_list
+    return {s.label: s.state for s in statuses}
+
+
+class TestCheck:
+    def test_empty_cache_is_missing(self, upstream, tmp_path):
+        assert _states(check_assets(tmp_path, ["sonoma"])) == {
+            "sonoma opencore": MISSING, "sonoma recovery": MISSING,
+        }
+
+    def test_new_upstream_build_is_stale(self, upstream, tmp_path):
+        refresh_assets(tmp_path, ["sonoma"])
+        assert _states(check_assets(tmp_path, ["sonoma"])) == {
+            "sonoma opencore": CURRENT, "sonoma recovery": CURRENT,
+        }
+        upstream.recovery_digest = "d2"
+        statuses = check_assets(tmp_path, ["sonoma"])
+        assert _states(statuses)["sonoma recovery"] == STALE
+        assert (statuses[1].cached, statuses[1].upstream) == ("d1", "d2")
+
+    def test_reuploaded_opencore_is_stale(self, upstream, tmp_path, monkeypatch):
+        refresh_assets(tmp_path, ["sonoma"])
+        monkeypatch.setattr(
+            refresh_module, "opencore_upstream",
+            lambda macos, offline=False: UpstreamBuild(
+                "opencore-sonoma.iso", "https://gh/v1/oc-sonoma", "v1", size=4096,
+            ),
+        )
+        assert _states(check_assets(tmp_path, ["sonoma"]))["sonoma opencore"] == STALE
+
+    def test_hand_placed_image_is_left_alone(self, upstream, tmp_path):
+        (tmp_path / "sonoma-recovery.img").write_bytes(b"mine")
+        report = refresh_assets(tmp_path, ["sonoma"])
+        assert _states(report)["sonoma recovery"] == UNKNOWN
+        assert ("recovery", "sonoma", False) not in upstream.downloads
+        assert (tmp_path / "sonoma-recovery.img").read_bytes() == b"mine"
+
+    def test_offline_cannot_check_recovery(self, upstream, tmp_path):
+        statuses = check_assets(tmp_path, ["sonoma"], DownloadOptions(offline=True))
+        assert _states(statuses) == {"sonoma opencore": MISSING, "sonoma recovery": UNKNOWN}
+
+
+class TestRefresh:
+    def test_downloads_missing_then_stale(self, upstream, tmp_path):
+        report = refresh_assets(tmp_path, ["sonoma", "sequoia"])
+        assert report.up_to_date
+        assert report.refreshed_at == report.checked_at
+        # Missing images may come from peers; stale ones bypass every cache
+        assert all(not forced for _, _, forced in upstream.downloads)
+
+        upstream.downloads.clear()
+        upstream.opencore_tag = "v2"
+        report = refresh_assets(tmp_path, ["sonoma", "sequoia"])
+        assert report.up_to_date
+        assert upstream.downloads == [("opencore", "sonoma", True), ("opencore", "sequoia", True)]
+
+    def test_shared_image_downloads_once(self, upstream, tmp_path):
+        upstream.shared_opencore = True
+        refresh_assets(tmp_path, ["sonoma", "sequoia"])
+        assert [d for d in upstream.downloads if d[0] == "opencore"] == [("opencore", "sonoma", False)]
+
+        upstream.downloads.clear()
+        upstream.opencore_tag = "v2"
+        report = refresh_assets(tmp_path, ["sonoma", "sequoia"])
+        assert upstream.downloads == [("opencore", "sonoma", True)]
+        assert report.up_to_date
+        assert [a.detail for a in report.assets if a.kind == "opencore"] == ["downloaded", "downloaded"]
+
+    def test_shared_image_failure_reported_for_each_release(self, upstream, tmp_path):
+        upstream.shared_opencore = True
+        upstream.fail.add("opencore")
+        report = refresh_assets(tmp_path, ["sonoma", "sequoia"])
+        assert len(upstream.downloads) == 3  # one OpenCore, two recovery images
+        assert [(a.state, a.detail) for a in report.assets if a.kind == "opencore"] == [
+            (MISSING, "download failed: connection reset"),
+        ] * 2
+
+    def test_current_cache_downloads_nothing(self, upstream, tmp_path):
+        refresh_assets(tmp_path, ["sonoma"])
+        upstream.downloads.clear()
+        refresh_assets(tmp_path, ["sonoma"])
+        assert upstream.downloads == []
+
+    def test_check_only(self, upstream, tmp_path):
+        report = refresh_assets(tmp_path, ["sonoma"], check_only=True)
+        assert upstream.downloads == []
+        assert not report.up_to_date
+        assert report.refreshed_at == 0.0
+
+    def test_outside_window_defers(self, upstream, tmp_path, monkeypatch):
+        closed = RateWindow(0, 0, 0)  # an empty window is never open
+        report = refresh_assets(tmp_path, ["sonoma"], window=closed)
+        assert upstream.downloads == []
+        assert report.assets[0].detail == "waiting for the 00:00-00:00 download window"
+        open_all_day = RateWindow(0, 24 * 60, 0)
+        assert refresh_assets(tmp_path, ["sonoma"], window=open_all_day).up_to_date
+
+    def test_failure_keeps_previous_refresh_time(self, upstream, tmp_path):
+        first = refresh_assets(tmp_path, ["sonoma"])
+        upstream.recovery_digest = "d2"
+        upstream.fail.add("recovery")
+        report = refresh_assets(tmp_path, ["sonoma"])
+        assert _states(report)["sonoma recovery"] == STALE
+        assert report.assets[1].detail == "download failed: connection reset"
+        assert report.refreshed_at == first.refreshed_at
+
+    def test_report_round_trips(self, upstream, tmp_path):
+        saved = refresh_assets(tmp_path, ["sonoma"])
+        assert RefreshReport.load() == saved
+
+
+class TestDescribe:
+    def test_never_refreshed(self, tmp_path):
+        assert RefreshReport.load(tmp_path / "missing.json") is None
+        assert describe_report(None).startswith("Never refreshed")
+
+    def test_current_and_stale(self):
+        current = RefreshReport(checked_at=1000.0, refreshed_at=1000.0, assets=[
+            AssetStatus("sonoma", "opencore", CURRENT), AssetStatus("sonoma", "recovery", CURRENT),
+        ])
+        assert describe_report(current, now=1000.0 + 3 * 3600) == "All 2 images current (checked 3h ago)"
+        current.assets[1].state = STALE
+        assert describe_report(current, now=1000.0 + 300) == (
+            "sonoma recovery stale (checked 5m ago); run: osx-next-cli assets refresh"
+        )
+
+    def test_corrupt_report(self, tmp_path):
+        path = tmp_path / "refresh.json"
+        path.write_text('{"assets": [{"bogus": 1}]}')
+        assert RefreshReport.load(path) is None
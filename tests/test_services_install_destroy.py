@@ -8,8 +8,8 @@ import pytest
 from osx_proxmox_next.domain import PlanStep
 from osx_proxmox_next.executor import ApplyResult, StepResult
 from osx_proxmox_next.rollback import RollbackSnapshot
-from osx_proxmox_next.services.install_service import run_dry_apply, run_live_install
-from osx_proxmox_next.services.destroy_service import run_destroy_worker
+from osx_proxmox_next.services.install_service import run_dry_apply, run_live_install, run_live_install_async
+from osx_proxmox_next.services.destroy_service import run_destroy_async, run_destroy_worker
 
 
 def _make_step(title: str = "Test step") -> PlanStep:
@@ -36,7 +36,7 @@ def _make_snapshot(vmid: int = 901) -> RollbackSnapshot:
 def test_run_dry_apply_calls_apply_plan_with_execute_false(monkeypatch) -> None:
     captured = {}
 
-    def fake_apply_plan(steps, execute=False, on_step=None):
+    def fake_apply_plan(steps, execute=False, on_step=None, **kw):
         captured["execute"] = execute
         return _make_apply_result()
 
@@ -54,7 +54,7 @@ def test_run_dry_apply_returns_apply_result(monkeypatch) -> None:
 
     monkeypatch.setattr(
         "osx_proxmox_next.services.install_service.apply_plan",
-        lambda steps, execute=False, on_step=None: expected,
+        lambda steps, execute=False, on_step=None, **kw: expected,
     )
     result = run_dry_apply([_make_step()])
     assert isinstance(result, ApplyResult)
@@ -64,7 +64,7 @@ def test_run_dry_apply_returns_apply_result(monkeypatch) -> None:
 def test_run_dry_apply_passes_steps_to_apply_plan(monkeypatch) -> None:
     captured = {}
 
-    def fake_apply_plan(steps, execute=False, on_step=None):
+    def fake_apply_plan(steps, execute=False, on_step=None, **kw):
         captured["steps"] = steps
         return _make_apply_result()
 
@@ -80,7 +80,7 @@ def test_run_dry_apply_passes_steps_to_apply_plan(monkeypatch) -> None:
 def test_run_dry_apply_passes_on_step_callback(monkeypatch) -> None:
     captured = {}
 
-    def fake_apply_plan(steps, execute=False, on_step=None):
+    def fake_apply_plan(steps, execute=False, on_step=None, **kw):
         captured["on_step"] = on_step
         return _make_apply_result()
 
@@ -96,7 +96,7 @@ def test_run_dry_apply_passes_on_step_callback(monkeypatch) -> None:
 def test_run_dry_apply_empty_steps(monkeypatch) -> None:
     monkeypatch.setattr(
         "osx_proxmox_next.services.install_service.apply_plan",
-        lambda steps, execute=False, on_step=None: _make_apply_result(),
+        lambda steps, execute=False, on_step=None, **kw: _make_apply_result(),
     )
     result = run_dry_apply([])
     assert isinstance(result, ApplyResult)
@@ -115,7 +115,7 @@ def test_run_live_install_calls_apply_plan_with_execute_true(monkeypatch) -> Non
         lambda vmid: _make_snapshot(vmid),
     )
 
-    def fake_apply_plan(steps, execute=False, on_step=None):
+    def fake_apply_plan(steps, execute=False, on_step=None, **kw):
         captured["execute"] = execute
         return _make_apply_result()
 
@@ -127,6 +127,26 @@ def test_run_live_install_calls_apply_plan_with_execute_true(monkeypatch) -> Non
     assert captured["execute"] is True
 
 
+
+def test_run_live_install_passes_resume(monkeypatch) -> None:
+    captured = {}
+
+    monkeypatch.setattr(
+        "osx_proxmox_next.services.install_service.create_snapshot",
+        lambda vmid: _make_snapshot(vmid),
+    )
+
+    def fake_apply_plan(steps, execute=False, resume=False, **kw):
+        captured["resume"] = resume
+        return _make_apply_result()
+
+    monkeypatch.setattr(
+        "osx_proxmox_next.services.install_service.apply_plan",
+        fake_apply_plan,
+    )
+    run_live_install(901, [_make_step()], resume=True)
+    assert captured["resume"] is True
+
 def test_run_live_install_returns_tuple(monkeypatch) -> None:
     monkeypatch.setattr(
         "osx_proxmox_next.services.install_service.create_snapshot",
@@ -134,7 +154,7 @@ def test_run_live_install_returns_tuple(monkeypatch) -> None:
     )
     monkeypatch.setattr(
         "osx_proxmox_next.services.install_service.apply_plan",
-        lambda steps, execute=False, on_step=None: _make_apply_result(),
+        lambda steps, execute=False, on_step=None, **kw: _make_apply_result(),
     )
     result = run_live_install(901, [_make_step()])
     assert isinstance(result, tuple)
@@ -148,7 +168,7 @@ def test_run_live_install_first_element_is_apply_result(monkeypatch) -> None:
     )
     monkeypatch.setattr(
         "osx_proxmox_next.services.install_service.apply_plan",
-        lambda steps, execute=False, on_step=None: _make_apply_result(ok=True),
+        lambda steps, execute=False, on_step=None, **kw: _make_apply_result(ok=True),
     )
     apply_result, _ = run_live_install(901, [_make_step()])
     assert isinstance(apply_result, ApplyResult)
@@ -163,7 +183,7 @@ def test_run_live_install_second_element_is_snapshot(monkeypatch) -> None:
     )
     monkeypatch.setattr(
         "osx_proxmox_next.services.install_service.apply_plan",
-        lambda steps, execute=False, on_step=None: _make_apply_result(),
+        lambda steps, execute=False, on_step=None, **kw: _make_apply_result(),
     )
     _, returned_snapshot = run_live_install(901, [_make_step()])
     assert returned_snapshot is snapshot
@@ -182,7 +202,7 @@ def test_run_live_install_creates_snapshot_with_correct_vmid(monkeypatch) -> Non
     )
     monkeypatch.setattr(
         "osx_proxmox_next.services.install_service.apply_plan",
-        lambda steps, execute=False, on_step=None: _make_apply_result(),
+        lambda steps, execute=False, on_step=None, **kw: _make_apply_result(),
     )
     run_live_install(555, [_make_step()])
     assert captured["vmid"] == 555
@@ -204,7 +224,7 @@ def test_run_destroy_worker_returns_tuple(monkeypatch) -> None:
     )
     monkeypatch.setattr(
         "osx_proxmox_next.services.destroy_service.apply_plan",
-        lambda steps, execute=False, on_step=None: _make_apply_result(),
+        lambda steps, execute=False, on_step=None, **kw: _make_apply_result(),
     )
     result = run_destroy_worker(901)
     assert isinstance(result, tuple)
@@ -223,7 +243,7 @@ def test_run_destroy_worker_calls_apply_plan_with_execute_true(monkeypatch) -> N
         lambda vmid, purge=False: [_make_step()],
     )
 
-    def fake_apply_plan(steps, execute=False, on_step=None):
+    def fake_apply_plan(steps, execute=False, on_step=None, **kw):
         captured["execute"] = execute
         return _make_apply_result()
 
@@ -253,7 +273,7 @@ def test_run_destroy_worker_passes_purge_to_build_destroy_plan(monkeypatch) -> N
     )
     monkeypatch.setattr(
         "osx_proxmox_next.services.destroy_service.apply_plan",
-        lambda steps, execute=False, on_step=None: _make_apply_result(),
+        lambda steps, execute=False, on_step=None, **kw: _make_apply_result(),
     )
     run_destroy_worker(901, purge=True)
     assert captured["purge"] is True
@@ -276,7 +296,7 @@ def test_run_destroy_worker_snapshot_has_correct_vmid(monkeypatch) -> None:
     )
     monkeypatch.setattr(
         "osx_proxmox_next.services.destroy_service.apply_plan",
-        lambda steps, execute=False, on_step=None: _make_apply_result(),
+        lambda steps, execute=False, on_step=None, **kw: _make_apply_result(),
     )
     run_destroy_worker(777)
     assert captured["vmid"] == 777
@@ -293,8 +313,46 @@ def test_run_destroy_worker_result_is_apply_result(monkeypatch) -> None:
     )
     monkeypatch.setattr(
         "osx_proxmox_next.services.destroy_service.apply_plan",
-        lambda steps, execute=False, on_step=None: _make_apply_result(ok=False),
+        lambda steps, execute=False, on_step=None, **kw: _make_apply_result(ok=False),
     )
     apply_result, snapshot = run_destroy_worker(901)
     assert isinstance(apply_result, ApplyResult)
     assert apply_result.ok is False
+
+
+# ---------------------------------------------------------------------------
+# async variants
+# ---------------------------------------------------------------------------
+
+
+def test_run_live_install_async(monkeypatch) -> None:
+    import asyncio
+    captured = {}
+
+    async def fake_apply_plan_async(steps, execute=False, **kw):
+        captured["execute"] = execute
+        captured["adapter"] = kw.get("adapter")
+        return _make_apply_result()
+
+    monkeypatch.setattr("osx_proxmox_next.services.install_service.create_snapshot", _make_snapshot)
+    monkeypatch.setattr("osx_proxmox_next.services.install_service.apply_plan_async", fake_apply_plan_async)
+    adapter = object()
+    result, snapshot = asyncio.run(run_live_install_async(901, [_make_step()], adapter=adapter))
+    assert result.ok is True
+    assert snapshot.vmid == 901
+    assert captured == {"execute": True, "adapter": adapter}
+
+
+def test_run_destroy_async_builds_destroy_plan(monkeypatch) -> None:
+    import asyncio
+    captured = {}
+
+    async def fake_apply_plan_async(steps, execute=False, **kw):
+        captured["titles"] = [step.title for step in steps]
+        return _make_apply_result()
+
+    monkeypatch.setattr("osx_proxmox_next.services.destroy_service.create_snapshot", _make_snapshot)
+    monkeypatch.setattr("osx_proxmox_next.services.destroy_service.apply_plan_async", fake_apply_plan_async)
+    result, _ = asyncio.run(run_destroy_async(901, purge=True))
+    assert result.ok is True
+    assert captured["titles"] == ["Stop VM", "Destroy VM"]
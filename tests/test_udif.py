@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import bz2
+import os
+import zlib
+
+import pytest
+
+import osx_proxmox_next.udif as udif_module
+from osx_proxmox_next.udif import (
+    BLOCK_ADC,
+    BLOCK_BZIP2,
+    BLOCK_IGNORE,
+    BLOCK_LZFSE,
+    BLOCK_LZMA,
+    BLOCK_RAW,
+    BLOCK_ZERO,
+    BLOCK_ZLIB,
+    Block,
+    StreamConverter,
+    UdifError,
+    adc_decompress,
+    convert_udif,
+    decompress_block,
+    disk_usage,
+    parse_block_map,
+    parse_koly,
+)
+
+SECTOR = 512
+
+def _pattern(n_sectors: int, seed: int) -> bytes:
+    return bytes((i * 7 + seed) % 251 for i in range(n_sectors * SECTOR))
+
+
+def _write(tmp_path, dmg: bytes):
+    path = tmp_path / "BaseSystem.dmg"
+    path.write_bytes(dmg)
+    return path
+
+
+class TestConvert:
+    def test_all_block_types(self, make_udif, tmp_path):
+        dmg, expected = make_udif([
+            (BLOCK_ZLIB, _pattern(4, 1)),
+            (BLOCK_ZERO, bytes(2 * SECTOR)),
+            (BLOCK_BZIP2, _pattern(3, 2)),
+            (BLOCK_RAW, _pattern(1, 3)),
+            (BLOCK_ADC, _pattern(2, 4)),
+            (BLOCK_IGNORE, bytes(SECTOR)),
+            (BLOCK_LZMA, _pattern(2, 5)),
+        ])
+        dest = tmp_path / "recovery.img"
+        convert_udif(_write(tmp_path, dmg), dest, workers=1)
+        assert dest.read_bytes() == expected
+
+    def test_multiple_blkx_partitions(self, make_udif, tmp_path):
+        runs = [(BLOCK_ZLIB, _pattern(2, i)) for i in range(6)]
+        dmg, expected = make_udif(runs, split_every=2)
+        dest = tmp_path / "recovery.img"
+        convert_udif(_write(tmp_path, dmg), dest, workers=1)
+        assert dest.read_bytes() == expected
+
+    def test_trailing_zero_run_keeps_full_size(self, make_udif, tmp_path):
+        dmg, expected = make_udif([(BLOCK_ZLIB, _pattern(1, 0)), (BLOCK_ZERO, bytes(8 * SECTOR))])
+        dest = tmp_path / "recovery.img"
+        convert_udif(_write(tmp_path, dmg), dest, workers=1)
+        assert dest.stat().st_size == len(expected)
+        assert dest.read_bytes() == expected
+
+    def test_zero_runs_are_holes(self, make_udif, tmp_path):
+        zero = bytes(4 * 1024 * 1024)
+        dmg, expected = make_udif([(BLOCK_ZLIB, _pattern(1, 0)), (BLOCK_ZERO, zero)])
+        dest = tmp_path / "recovery.img"
+        convert_udif(_write(tmp_path, dmg), dest, workers=1)
+        assert dest.stat().st_blocks * 512 < len(zero)
+
+    def test_zeros_inside_compressed_runs_are_holes(self, make_udif, tmp_path):
+        data = _pattern(1, 0) + bytes(4 * 1024 * 1024) + _pattern(1, 3)
+        dmg, expected = make_udif([(BLOCK_ZLIB, data)])
+        dest = tmp_path / "recovery.img"
+        convert_udif(_write(tmp_path, dmg), dest, workers=1)
+        assert dest.read_bytes() == expected
+        size, allocated = disk_usage(dest)
+        assert size == len(expected)
+        assert allocated < 1024 * 1024
+
+    def test_process_pool_matches_inline(self, make_udif, tmp_path, monkeypatch):
+        monkeypatch.setattr(udif_module, "_BATCH_BYTES", 1)
+        runs = [(BLOCK_ZLIB, _pattern(8, i)) for i in range(8)]
+        dmg, expected = make_udif(runs)
+        dest = tmp_path / "recovery.img"
+        convert_udif(_write(tmp_path, dmg), dest, workers=2)
+        assert dest.read_bytes() == expected
+
+    def test_corrupt_block(self, make_udif, tmp_path):
+        dmg, _ = make_udif([(BLOCK_ZLIB, _pattern(4, 1))])
+        dmg = b"\xff" * 8 + dmg[8:]
+        with pytest.raises(UdifError, match="Corrupt block"):
+            convert_udif(_write(tmp_path, dmg), tmp_path / "out.img", workers=1)
+
+    def test_truncated_bzip2_block(self, tmp_path):
+        data = bz2.compress(_pattern(4, 1))[:-16]
+        with open(tmp_path / "out.img", "wb") as f:
+            with pytest.raises(UdifError, match="Corrupt block"):
+                udif_module._write_block(f.fileno(), Block(BLOCK_BZIP2, 0, 4 * SECTOR, 0, len(data)), data)
+
+    def test_not_a_dmg(self, tmp_path):
+        with pytest.raises(UdifError, match="koly"):
+            convert_udif(_write(tmp_path, b"\x00" * 4096), tmp_path / "out.img")
+
+    def test_too_small(self, tmp_path):
+        with pytest.raises(UdifError, match="too small"):
+            convert_udif(_write(tmp_path, b"x" * 10), tmp_path / "out.img")
+
+
+class TestStreamConverter:
+    @staticmethod
+    def _open(dmg: bytes, dest):
+        koly = parse_koly(dmg[-512:])
+        size, blocks = parse_block_map(dmg[koly.xml_offset:koly.xml_offset + koly.xml_length], koly)
+        return StreamConverter(blocks, dest, size, workers=2)
+
+    @pytest.mark.parametrize("piece", [1, 7, 512, 100_000])
+    def test_any_feed_size(self, make_udif, tmp_path, piece):
+        dmg, expected = make_udif([
+            (BLOCK_ZLIB, _pattern(4, 1)),
+            (BLOCK_ZERO, bytes(2 * SECTOR)),
+            (BLOCK_BZIP2, _pattern(3, 2)),
+            (BLOCK_RAW, _pattern(1, 3)),
+            (BLOCK_LZMA, _pattern(2, 5)),
+        ])
+        dest = tmp_path / "recovery.img"
+        with self._open(dmg, dest) as converter:
+            for i in range(0, len(dmg), piece):
+                converter.feed(dmg[i:i + piece])
+            converter.finish()
+        assert dest.read_bytes() == expected
+
+    def test_only_incomplete_run_is_buffered(self, make_udif, tmp_path):
+        dmg, _ = make_udif([(BLOCK_RAW, _pattern(4, i)) for i in range(4)])
+        with self._open(dmg, tmp_path / "recovery.img") as converter:
+            converter.feed(dmg[:5 * SECTOR])
+            # Run 0 is handed off; only the first sector of run 1 is held
+            assert len(converter._buf) == SECTOR
+            converter.feed(dmg[5 * SECTOR:])
+            converter.finish()
+
+    def test_truncated_stream(self, make_udif, tmp_path):
+        dmg, _ = make_udif([(BLOCK_ZLIB, _pattern(4, 1)), (BLOCK_ZLIB, _pattern(4, 2))])
+        with self._open(dmg, tmp_path / "recovery.img") as converter:
+            converter.feed(dmg[:10])
+            with pytest.raises(UdifError, match="DMG ended"):
+                converter.finish()
+
+    def test_corrupt_run_surfaces(self, make_udif, tmp_path):
+        dmg, _ = make_udif([(BLOCK_ZLIB, _pattern(4, 1))])
+        with self._open(dmg, tmp_path / "recovery.img") as converter:
+            converter.feed(b"\xff" * 8 + dmg[8:])
+            with pytest.raises(UdifError, match="Corrupt block"):
+                converter.finish()
+
+    def test_skip_to_feeds_only_some_runs(self, make_udif, tmp_path):
+        dmg, expected = make_udif([(BLOCK_RAW, _pattern(2, i)) for i in range(3)])
+        koly = parse_koly(dmg[-512:])
+        size, blocks = parse_block_map(dmg[koly.xml_offset:koly.xml_offset + koly.xml_length], koly)
+        dest = tmp_path / "recovery.img"
+        # The caller already placed runs 0 and 2
+        dest.write_bytes(expected[:2 * SECTOR] + bytes(2 * SECTOR) + expected[4 * SECTOR:])
+        run = blocks[1]
+        with StreamConverter([run], dest, size, workers=2, truncate=False) as converter:
+            converter.skip_to(run.in_offset)
+            converter.feed(dmg[run.in_offset:run.in_offset + run.in_length])
+            converter.finish()
+        assert dest.read_bytes() == expected
+
+    def test_skip_past_pending_run(self, make_udif, tmp_path):
+        dmg, _ = make_udif([(BLOCK_RAW, _pattern(2, i)) for i in range(2)])
+        with self._open(dmg, tmp_path / "recovery.img") as converter:
+            with pytest.raises(UdifError, match="pending"):
+                converter.skip_to(2 * SECTOR)
+
+
+class TestWriteSparse:
+    @pytest.mark.parametrize("offset", [0, 512, 4096 - 1])
+    def test_unaligned_spans(self, tmp_path, monkeypatch, offset):
+        granule = udif_module._SPARSE_GRANULE
+        data = b"a" * 100 + bytes(3 * granule) + b"b" * 10 + bytes(granule // 2)
+        dest = tmp_path / "out.img"
+        with dest.open("wb") as f:
+            f.truncate(offset + len(data))
+        writes = []
+        real_pwrite = os.pwrite
+
+        def pwrite(fd, buf, pos):
+            writes.append(len(buf))
+            return real_pwrite(fd, buf, pos)
+
+        monkeypatch.setattr(udif_module.os, "pwrite", pwrite)
+        fd = os.open(dest, os.O_WRONLY)
+        try:
+            udif_module.write_sparse(fd, data, offset)
+        finally:
+            os.close(fd)
+        assert dest.read_bytes() == bytes(offset) + data
+        assert sum(writes) < len(data) - granule
+
+    def test_all_zero_writes_nothing(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(udif_module.os, "pwrite", lambda *a: pytest.fail("wrote zeros"))
+        udif_module.write_sparse(-1, bytes(10000), 123)
+
+
+class TestDecompressBlock:
+    def test_lzfse_rejected(self):
+        with pytest.raises(UdifError, match="LZFSE"):
+            decompress_block(Block(BLOCK_LZFSE, 0, SECTOR, 0, 1), b"x")
+
+    def test_unknown_type(self):
+        with pytest.raises(UdifError, match="Unknown"):
+            decompress_block(Block(0x1234, 0, SECTOR, 0, 1), b"x")
+
+    def test_short_output(self):
+        with pytest.raises(UdifError, match="expected"):
+            decompress_block(Block(BLOCK_ZLIB, 0, 2 * SECTOR, 0, 1), zlib.compress(b"a" * SECTOR))
+
+
+class TestAdc:
+    def test_literals(self):
+        assert adc_decompress(b"\x82abc", 3) == b"abc"
+
+    def test_short_backref_overlapping(self):
+        # literal "ab", then copy 3 from distance 2 -> "ababa"
+        assert adc_decompress(b"\x81ab" + bytes([0x00, 0x01]), 5) == b"ababa"
+
+    def test_long_backref(self):
+        # literal "xyz", then copy 4 from distance 3 -> "xyzxyzx"
+        assert adc_decompress(b"\x82xyz" + bytes([0x40, 0x00, 0x02]), 7) == b"xyzxyzx"
+
+    def test_backref_before_start(self):
+        with pytest.raises(UdifError, match="before start"):
+            adc_decompress(bytes([0x00, 0x05]), 3)
+
+
+def test_parse_koly_reads_offsets(make_udif):
+    dmg, _ = make_udif([(BLOCK_RAW, _pattern(2, 0))])
+    koly = parse_koly(dmg[-512:])
+    assert koly.data_fork_length == 2 * SECTOR
+    assert koly.xml_offset == 2 * SECTOR
+    assert koly.sector_count == 2